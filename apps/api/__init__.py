@@ -1,6 +1,7 @@
 from fastapi import APIRouter
 
 from apps.api.v1.handlers import analytics_handler
+from apps.api.v1.handlers import ingest_handler
 from apps.api.v1.handlers import log_entry_handler
 from apps.api.v1.handlers import server_handler
 from apps.utils import health_check
@@ -25,4 +26,10 @@ router.include_router(
     tags=['analytics'],
 )
 
+router.include_router(
+    ingest_handler.router,
+    prefix='/api',
+    tags=['ingest'],
+)
+
 router.include_router(health_check.health_check_router, tags=['health_check'])
@@ -1,13 +1,43 @@
 from fastapi import Depends
+from sqlalchemy import Select
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from apps.api.v1.cruds.base_crud import BaseCrud
+from apps.api.v1.models.dimension_models import ReferrerModel
+from apps.api.v1.models.dimension_models import UriModel
+from apps.api.v1.models.dimension_models import UserAgentModel
 from apps.api.v1.models.log_entry_model import LogEntryModel
 from apps.api.v1.schemas.log_entry_schema import GetLogEntryOutSchema
 from apps.auth.schemas.user_schema import UserSchema
 from apps.db.session import connector
 
+LOG_ENTRY_FIELDS = tuple(GetLogEntryOutSchema.model_fields)
+DIMENSION_VALUES = {
+    'uri': UriModel.value,
+    'referrer': ReferrerModel.value,
+    'user_agent': UserAgentModel.value,
+}
+
+
+def log_entry_columns() -> list:
+    """Колонки GetLogEntryOutSchema; URI, referrer и user agent — из справочников."""
+    return [
+        DIMENSION_VALUES[field].label(field)
+        if field in DIMENSION_VALUES
+        else getattr(LogEntryModel, field)
+        for field in LOG_ENTRY_FIELDS
+    ]
+
+
+def join_dimensions(stmt: Select) -> Select:
+    """Присоединяет к запросу по LogEntryModel справочники URI, referrer и user agent."""
+    return (
+        stmt.outerjoin(UriModel, UriModel.id == LogEntryModel.uri_id)
+        .outerjoin(ReferrerModel, ReferrerModel.id == LogEntryModel.referrer_id)
+        .outerjoin(UserAgentModel, UserAgentModel.id == LogEntryModel.user_agent_id)
+    )
+
 
 class LogEntryCrud(BaseCrud):
     async def get_entry_logs(
@@ -24,12 +54,13 @@ class LogEntryCrud(BaseCrud):
         Returns:
             list[GetLogEntryOutSchema]: Список всех записей логов в формате Pydantic-схемы.
         """
-        stmt = select(LogEntryModel).order_by(LogEntryModel.timestamp)
+        stmt = join_dimensions(select(*log_entry_columns()).select_from(LogEntryModel)).order_by(
+            LogEntryModel.timestamp
+        )
 
         res = await db.execute(stmt)
-        entries = res.scalars().all()
 
-        return [GetLogEntryOutSchema.model_validate(entry) for entry in entries]
+        return [GetLogEntryOutSchema.model_validate(entry) for entry in res.mappings().all()]
 
 
 log_entry_crud_obj = LogEntryCrud(LogEntryModel)
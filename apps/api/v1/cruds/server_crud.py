@@ -4,10 +4,16 @@ from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from apps.api.v1.cruds.base_crud import BaseCrud
+from apps.api.v1.cruds.log_entry_crud import join_dimensions
+from apps.api.v1.models.dimension_models import ReferrerModel
+from apps.api.v1.models.dimension_models import UriModel
+from apps.api.v1.models.dimension_models import UserAgentModel
 from apps.api.v1.models.log_entry_model import LogEntryModel
 from apps.api.v1.models.server_model import ServerModel
 from apps.api.v1.schemas.log_entry_schema import GetLogEntryOutSchema
+from apps.api.v1.schemas.server_schema import ServerCreateSchema
 from apps.api.v1.schemas.server_schema import ServerOutSchema
+from apps.api.v1.schemas.server_schema import ServerUpdateSchema
 from apps.api.v1.schemas.server_schema import ServerWithLogsOutSchema
 from apps.auth.schemas.user_schema import UserSchema
 from apps.db.session import connector
@@ -60,6 +66,7 @@ class ServerCrud(BaseCrud):
                 ServerModel.id,
                 ServerModel.name,
                 ServerModel.ip_address,
+                ServerModel.log_format,
                 func.json_agg(
                     func.json_build_object(
                         'id',
@@ -71,7 +78,7 @@ class ServerCrud(BaseCrud):
                         'method',
                         LogEntryModel.method,
                         'uri',
-                        LogEntryModel.uri,
+                        UriModel.value,
                         'http_version',
                         LogEntryModel.http_version,
                         'status',
@@ -79,9 +86,19 @@ class ServerCrud(BaseCrud):
                         'size',
                         LogEntryModel.size,
                         'referrer',
-                        LogEntryModel.referrer,
+                        ReferrerModel.value,
                         'user_agent',
-                        LogEntryModel.user_agent,
+                        UserAgentModel.value,
+                        'request_time',
+                        LogEntryModel.request_time,
+                        'upstream_response_time',
+                        LogEntryModel.upstream_response_time,
+                        'host',
+                        LogEntryModel.host,
+                        'request_id',
+                        LogEntryModel.request_id,
+                        'extra',
+                        LogEntryModel.extra,
                     )
                 )
                 .filter(LogEntryModel.id.is_not(None))
@@ -91,6 +108,7 @@ class ServerCrud(BaseCrud):
             .where(ServerModel.id == server_id)
             .group_by(ServerModel.id)
         )
+        stmt = join_dimensions(stmt)
 
         res = await db.execute(stmt)
         row = res.fetchone()
@@ -102,8 +120,72 @@ class ServerCrud(BaseCrud):
             id=row.id,
             name=row.name,
             ip_address=row.ip_address,
+            log_format=row.log_format,
             logs=[GetLogEntryOutSchema(**log) for log in row.logs or []],
         )
 
+    async def create_server(
+        self,
+        db: AsyncSession,
+        user: UserSchema,
+        server: ServerCreateSchema,
+    ) -> ServerOutSchema:
+        """Создаём сервер.
+
+        Args:
+            db (AsyncSession): Асинхронная сессия SQLAlchemy.
+            user (UserSchema): Аутентифицированный пользователь.
+            server (ServerCreateSchema): Данные сервера.
+
+        Returns:
+            ServerOutSchema: Созданный сервер.
+
+        Raises:
+            HTTPException: 409, если сервер с таким именем уже есть.
+        """
+        entry = await self.create(db, obj_in=server)
+
+        return ServerOutSchema.model_validate(entry)
+
+    async def update_server(
+        self,
+        db: AsyncSession,
+        user: UserSchema,
+        server_id: int,
+        server: ServerUpdateSchema,
+    ) -> ServerOutSchema:
+        """Меняем переданные поля сервера.
+
+        Args:
+            db (AsyncSession): Асинхронная сессия SQLAlchemy.
+            user (UserSchema): Аутентифицированный пользователь.
+            server_id (int): ID сервера.
+            server (ServerUpdateSchema): Изменённые поля; null сбрасывает поле.
+
+        Returns:
+            ServerOutSchema: Сервер после изменения.
+
+        Raises:
+            HTTPException: 404, если сервера нет; 409, если имя занято.
+        """
+        entry = await self.update(db, _id=server_id, obj_in=server.model_dump(exclude_unset=True))
+
+        return ServerOutSchema.model_validate(entry)
+
+    async def get_log_format(self, db: AsyncSession, server_id: int) -> str | None:
+        """Получаем log_format сервера.
+
+        Args:
+            db (AsyncSession): Асинхронная сессия SQLAlchemy.
+            server_id (int): ID сервера.
+
+        Returns:
+            str | None: log_format или None, если он не задан или сервера нет.
+        """
+        stmt = select(ServerModel.log_format).where(ServerModel.id == server_id)
+
+        res = await db.execute(stmt)
+        return res.scalar_one_or_none()
+
 
 server_crud_obj = ServerCrud(ServerModel)
@@ -1,17 +1,26 @@
+from collections import Counter
 from datetime import UTC
 from datetime import datetime
-from datetime import timedelta
+from functools import partial
+from typing import TypeVar
 
 from fastapi import APIRouter
 from fastapi import Depends
 from fastapi import Query
+from sqlalchemy import BigInteger
+from sqlalchemy import Label
+from sqlalchemy import Select
+from sqlalchemy import Subquery
 from sqlalchemy import and_
 from sqlalchemy import func
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from apps.api.v1.models.dimension_models import UriModel
+from apps.api.v1.models.dimension_models import UserAgentModel
 from apps.api.v1.models.log_entry_model import LogEntryModel
 from apps.api.v1.schemas.analytics_schema import ErrorStats
+from apps.api.v1.schemas.analytics_schema import PercentileStats
 from apps.api.v1.schemas.analytics_schema import StatusCodeStats
 from apps.api.v1.schemas.analytics_schema import TimeSeriesData
 from apps.api.v1.schemas.analytics_schema import TopIPsStats
@@ -20,8 +29,371 @@ from apps.api.v1.schemas.analytics_schema import TrafficStats
 from apps.auth.dependencies.auth_dependency import auth_dependency
 from apps.auth.schemas.user_schema import UserSchema
 from apps.db.session import connector
+from apps.services.analytics_cache import ANALYTICS_CACHE
+from apps.services.analytics_cache import closed_buckets
+from apps.services.analytics_cache import split_window
+from apps.services.ddsketch import DDSketch
+from apps.services.hyperloglog import HyperLogLog
+from apps.services.rollups import closed_sketches
+from apps.services.rollups import estimate_quantiles
+from apps.services.rollups import rollup_rows
+from apps.services.rollups import top_summary
+from apps.services.rollups import unique_ips_sketch
+from apps.services.space_saving import CAPACITY
+from apps.services.space_saving import SpaceSaving
+
+S = TypeVar('S', HyperLogLog, SpaceSaving, DDSketch)
 
 router = APIRouter()
+ERRORS_LIMIT = 100
+PERCENTILES = (0.5, 0.95, 0.99)
+# Метрика перцентилей -> колонка скетчей (apps/services/sketches.py).
+PERCENTILE_METRICS = {'size': 'sizes', 'request_time': 'request_times'}
+
+
+# Запросы собраны отдельно от обработчиков, чтобы тесты планов
+# (tests/api/handlers/test_analytics_plans.py) проверяли ровно их.
+# Индексы под них описаны в LogEntryModel. Статус коды, трафик и
+# временные ряды считаются по сводкам (apps/services/rollups.py), сырые
+# строки читаются только для неполных минут по краям окна. Уникальные IP,
+# топы и перцентили оцениваются по скетчам, точные запросы ниже — только
+# по exact=true.
+#
+# Обработчики делят окно на закрытую часть до head и открытую после
+# (apps/services/analytics_cache.py). Частичный результат закрытой части
+# берётся из ANALYTICS_CACHE, а на промахе собирается из тоже
+# закешированных корзин: из базы читаются только корзины, которых в кеше
+# ещё нет. Открытая часть считается при каждом запросе, и частичные
+# результаты складываются.
+
+
+def status_codes_query(since: datetime, now: datetime) -> Select:
+    """Число запросов по статус кодам с момента since."""
+    rows = rollup_rows(since, now)
+    count = func.sum(rows.c.requests).cast(BigInteger)
+    return (
+        select(rows.c.status, count.label('count')).group_by(rows.c.status).order_by(count.desc())
+    )
+
+
+def closed_status_codes_query(since: datetime, until: datetime) -> Select:
+    """Число запросов по минутам и часам сводок и статус кодам закрытого окна [since, until)."""
+    rows = rollup_rows(since, until, closed=True)
+    return select(
+        rows.c.bucket, rows.c.status, func.sum(rows.c.requests).cast(BigInteger).label('count')
+    ).group_by(rows.c.bucket, rows.c.status)
+
+
+def top_ips_query(since: datetime, limit: int) -> Select:
+    """Топ limit IP адресов по числу запросов с момента since."""
+    return (
+        select(
+            LogEntryModel.remote_addr,
+            func.count().label('requests'),
+            func.avg(LogEntryModel.size).label('avg_size'),
+        )
+        .where(LogEntryModel.timestamp >= since)
+        .group_by(LogEntryModel.remote_addr)
+        .order_by(func.count().desc())
+        .limit(limit)
+    )
+
+
+def top_urls_query(since: datetime, limit: int) -> Select:
+    """Топ limit URL по числу запросов с момента since.
+
+    Группировка идёт по uri_id, а справочник URI присоединяется только к
+    limit строкам результата.
+    """
+    top = (
+        select(
+            LogEntryModel.uri_id,
+            func.count().label('requests'),
+            func.avg(LogEntryModel.size).label('avg_size'),
+        )
+        .where(LogEntryModel.timestamp >= since)
+        .group_by(LogEntryModel.uri_id)
+        .order_by(func.count().desc())
+        .limit(limit)
+        .subquery()
+    )
+    return (
+        select(UriModel.value.label('uri'), top.c.requests, top.c.avg_size)
+        .join(UriModel, UriModel.id == top.c.uri_id)
+        .order_by(top.c.requests.desc())
+    )
+
+
+def traffic_query(since: datetime, now: datetime) -> Select:
+    """Запросы и байты с момента since."""
+    rows = rollup_rows(since, now)
+    requests = func.sum(rows.c.requests)
+    total_bytes = func.sum(rows.c.bytes)
+    return select(
+        requests.cast(BigInteger).label('total_requests'),
+        total_bytes.cast(BigInteger).label('total_bytes'),
+        (total_bytes / func.nullif(requests, 0)).label('avg_request_size'),
+    )
+
+
+def closed_traffic_query(since: datetime, until: datetime) -> Select:
+    """Запросы и байты по минутам и часам сводок закрытого окна [since, until)."""
+    rows = rollup_rows(since, until, closed=True)
+    return select(
+        rows.c.bucket,
+        func.sum(rows.c.requests).cast(BigInteger).label('requests'),
+        func.sum(rows.c.bytes).cast(BigInteger).label('bytes'),
+    ).group_by(rows.c.bucket)
+
+
+def unique_ips_query(since: datetime) -> Select:
+    """Точное число уникальных IP с момента since по сырым строкам."""
+    return select(func.count(LogEntryModel.remote_addr.distinct())).where(
+        LogEntryModel.timestamp >= since
+    )
+
+
+def percentiles_query(since: datetime, metric: str) -> Select:
+    """Число значений metric (size или request_time) и их точные перцентили PERCENTILES.
+
+    percentile_disc, а не percentile_cont: перцентиль — значение из строк
+    без интерполяции, как у оценки по скетчам.
+    """
+    value = getattr(LogEntryModel, metric)
+    return select(
+        func.count(value).label('count'),
+        *(
+            func.percentile_disc(percentile).within_group(value).label(f'p{percentile * 100:g}')
+            for percentile in PERCENTILES
+        ),
+    ).where(LogEntryModel.timestamp >= since)
+
+
+def errors_query(since: datetime, until: datetime | None = None) -> Select:
+    """Последние ERRORS_LIMIT ответов 4xx и 5xx с момента since (до until, если задан)."""
+    window = [LogEntryModel.timestamp >= since, LogEntryModel.status >= 400]
+    if until is not None:
+        window.append(LogEntryModel.timestamp < until)
+    errors = (
+        select(
+            LogEntryModel.status,
+            LogEntryModel.uri_id,
+            LogEntryModel.remote_addr,
+            LogEntryModel.timestamp,
+            LogEntryModel.user_agent_id,
+        )
+        .where(and_(*window))
+        .order_by(LogEntryModel.timestamp.desc())
+        .limit(ERRORS_LIMIT)
+        .subquery()
+    )
+    return (
+        select(
+            errors.c.status,
+            UriModel.value.label('uri'),
+            errors.c.remote_addr,
+            errors.c.timestamp,
+            UserAgentModel.value.label('user_agent'),
+        )
+        .select_from(errors)
+        .outerjoin(UriModel, UriModel.id == errors.c.uri_id)
+        .outerjoin(UserAgentModel, UserAgentModel.id == errors.c.user_agent_id)
+        .order_by(errors.c.timestamp.desc())
+    )
+
+
+def _series_bucket(rows: Subquery, bucket_seconds: int) -> Label:
+    """Начало интервала ряда bucket_seconds, в который попадает строка rows."""
+    return func.to_timestamp(
+        func.floor(func.extract('epoch', rows.c.bucket) / bucket_seconds) * bucket_seconds
+    ).label('time_bucket')
+
+
+def time_series_query(since: datetime, now: datetime, bucket_seconds: int) -> Select:
+    """Запросы и байты по интервалам bucket_seconds с момента since.
+
+    Интервалы, кратные часу, собираются из часовых сводок, кратные
+    минуте — из минутных.
+    """
+    rows = rollup_rows(since, now, bucket_seconds)
+    time_bucket = _series_bucket(rows, bucket_seconds)
+
+    return (
+        select(
+            time_bucket,
+            func.sum(rows.c.requests).cast(BigInteger).label('requests'),
+            func.sum(rows.c.bytes).cast(BigInteger).label('bytes'),
+        )
+        .group_by(time_bucket)
+        .order_by(time_bucket)
+    )
+
+
+def closed_time_series_query(since: datetime, until: datetime, bucket_seconds: int) -> Select:
+    """Запросы и байты по минутам и часам сводок и интервалам bucket_seconds окна [since, until)."""
+    rows = rollup_rows(since, until, bucket_seconds, closed=True)
+    time_bucket = _series_bucket(rows, bucket_seconds)
+    return select(
+        rows.c.bucket,
+        time_bucket,
+        func.sum(rows.c.requests).cast(BigInteger).label('requests'),
+        func.sum(rows.c.bytes).cast(BigInteger).label('bytes'),
+    ).group_by(rows.c.bucket, time_bucket)
+
+
+async def _status_counts(db: AsyncSession, since: datetime, now: datetime) -> Counter[int]:
+    """Статус код -> число запросов открытой части окна."""
+    result = await db.execute(status_codes_query(since, now))
+    return Counter({status: count for status, count in result.all()})
+
+
+async def _status_rows(
+    db: AsyncSession, since: datetime, until: datetime
+) -> list[tuple[datetime, tuple[int, int]]]:
+    """(сводка, (статус код, запросы)) закрытого диапазона [since, until)."""
+    result = await db.execute(closed_status_codes_query(since, until))
+    return [(bucket, (status, count)) for bucket, status, count in result.all()]
+
+
+async def _closed_status_counts(db: AsyncSession, since: datetime, head: datetime) -> Counter[int]:
+    """Статус код -> число запросов закрытой части окна по корзинам."""
+    counts: Counter[int] = Counter()
+    for status, count in await ANALYTICS_CACHE.cached_buckets(
+        'status-codes', (), closed_buckets(since, head), partial(_status_rows, db)
+    ):
+        counts[status] += count
+    return counts
+
+
+async def _traffic(
+    db: AsyncSession, since: datetime, now: datetime
+) -> tuple[int, int, HyperLogLog]:
+    """Запросы, байты и скетч адресов открытой части окна."""
+    row = (await db.execute(traffic_query(since, now))).one()
+    sketch = await unique_ips_sketch(db, since, now)
+    return row.total_requests or 0, row.total_bytes or 0, sketch
+
+
+async def _traffic_rows(
+    db: AsyncSession, since: datetime, until: datetime
+) -> list[tuple[datetime, tuple[int, int]]]:
+    """(сводка, (запросы, байты)) закрытого диапазона [since, until)."""
+    result = await db.execute(closed_traffic_query(since, until))
+    return [(bucket, (requests, total_bytes or 0)) for bucket, requests, total_bytes in result]
+
+
+async def _closed_traffic(
+    db: AsyncSession, since: datetime, head: datetime
+) -> tuple[int, int, HyperLogLog]:
+    """Запросы, байты и скетч адресов закрытой части окна по корзинам."""
+    parts = await ANALYTICS_CACHE.cached_buckets(
+        'traffic', (), closed_buckets(since, head), partial(_traffic_rows, db)
+    )
+    sketch = await _closed_sketch(db, 'traffic', 'unique_ips', HyperLogLog, since, head)
+    return sum(requests for requests, _ in parts), sum(size for _, size in parts), sketch
+
+
+async def _time_series(
+    db: AsyncSession, since: datetime, now: datetime, bucket_seconds: int
+) -> dict[datetime, list[int]]:
+    """Интервал -> [запросы, байты] открытой части окна."""
+    result = await db.execute(time_series_query(since, now, bucket_seconds))
+    return {row.time_bucket: [row.requests, row.bytes or 0] for row in result}
+
+
+async def _time_series_rows(
+    db: AsyncSession, since: datetime, until: datetime, bucket_seconds: int
+) -> list[tuple[datetime, tuple[datetime, int, int]]]:
+    """(сводка, (интервал, запросы, байты)) закрытого диапазона [since, until)."""
+    result = await db.execute(closed_time_series_query(since, until, bucket_seconds))
+    return [
+        (bucket, (time_bucket, requests, total_bytes or 0))
+        for bucket, time_bucket, requests, total_bytes in result
+    ]
+
+
+async def _closed_time_series(
+    db: AsyncSession, since: datetime, head: datetime, interval_minutes: int
+) -> dict[datetime, list[int]]:
+    """Интервал -> [запросы, байты] закрытой части окна по корзинам."""
+    series: dict[datetime, list[int]] = {}
+    for time_bucket, requests, total_bytes in await ANALYTICS_CACHE.cached_buckets(
+        'time-series',
+        (interval_minutes,),
+        closed_buckets(since, head),
+        partial(_time_series_rows, db, bucket_seconds=interval_minutes * 60),
+    ):
+        totals = series.setdefault(time_bucket, [0, 0])
+        totals[0] += requests
+        totals[1] += total_bytes
+    return series
+
+
+async def _errors(db: AsyncSession, since: datetime, until: datetime | None = None) -> list[tuple]:
+    """Последние ошибки части окна: (статус, URI, IP, время, user agent)."""
+    return [tuple(row) for row in await db.execute(errors_query(since, until))]
+
+
+async def _closed_errors(db: AsyncSession, since: datetime, head: datetime) -> list[tuple]:
+    """Последние ERRORS_LIMIT ошибок закрытой части окна.
+
+    Корзины читаются от новых к старым, пока не наберётся ERRORS_LIMIT
+    ошибок.
+    """
+    rows: list[tuple] = []
+    for lower, upper in reversed(closed_buckets(since, head)):
+        if len(rows) >= ERRORS_LIMIT:
+            break
+        rows += await ANALYTICS_CACHE.cached(
+            'errors', (lower, upper), partial(_errors, db, lower, upper)
+        )
+    return rows[:ERRORS_LIMIT]
+
+
+async def _closed_sketch(
+    db: AsyncSession,
+    endpoint: str,
+    column: str,
+    sketch_type: type[S],
+    since: datetime,
+    head: datetime,
+) -> S:
+    """Скетч column закрытой части окна: объединение скетчей корзин."""
+    sketch = sketch_type()
+    for part in await ANALYTICS_CACHE.cached_buckets(
+        endpoint,
+        (column,),
+        closed_buckets(since, head),
+        lambda lower, upper: closed_sketches(db, lower, upper, column, sketch_type),
+    ):
+        sketch.update(part)
+    return sketch
+
+
+async def _closed_quantiles(
+    db: AsyncSession, since: datetime, head: datetime
+) -> dict[str, DDSketch]:
+    """Колонка скетчей -> DDSketch закрытой части окна."""
+    return {
+        column: await _closed_sketch(db, 'percentiles', column, DDSketch, since, head)
+        for column in PERCENTILE_METRICS.values()
+    }
+
+
+async def _top(
+    db: AsyncSession, endpoint: str, hours: int, column: str, now: datetime
+) -> SpaceSaving:
+    """Сводка Space-Saving column за окно: закрытая часть из кеша и открытая."""
+    since, head = split_window(now, hours)
+    summary = await top_summary(db, head, now, column)
+    summary.update(
+        await ANALYTICS_CACHE.cached(
+            endpoint,
+            (hours, head),
+            lambda: _closed_sketch(db, endpoint, column, SpaceSaving, since, head),
+        )
+    )
+    return summary
 
 
 @router.get('/analytics/status-codes', response_model=list[StatusCodeStats])
@@ -31,42 +403,46 @@ async def get_status_code_stats(
     db: AsyncSession = Depends(connector.get_pg_session),
 ) -> list[StatusCodeStats]:
     """Получает статистику по HTTP статус кодам."""
-    since = datetime.now(UTC) - timedelta(hours=hours)
+    now = datetime.now(UTC)
+    since, head = split_window(now, hours)
 
-    stmt = (
-        select(LogEntryModel.status, func.count(LogEntryModel.id).label('count'))
-        .where(LogEntryModel.timestamp >= since)
-        .group_by(LogEntryModel.status)
-        .order_by(func.count(LogEntryModel.id).desc())
+    counts = await _status_counts(db, head, now)
+    counts.update(
+        await ANALYTICS_CACHE.cached(
+            'status-codes', (hours, head), partial(_closed_status_counts, db, since, head)
+        )
     )
-
-    result = await db.execute(stmt)
-    return [StatusCodeStats(status=row.status, count=row.count) for row in result.fetchall()]
+    return [StatusCodeStats(status=status, count=count) for status, count in counts.most_common()]
 
 
 @router.get('/analytics/top-ips', response_model=list[TopIPsStats])
 async def get_top_ips(
     limit: int = Query(10, description='Количество топ IP адресов'),
     hours: int = Query(24, description='Количество часов для анализа'),
+    exact: bool = Query(False, description='Точный топ по сырым строкам вместо оценки по сводкам'),
     user: UserSchema = Depends(auth_dependency.check_token),
     db: AsyncSession = Depends(connector.get_pg_session),
 ) -> list[TopIPsStats]:
-    """Получает топ IP адресов по количеству запросов."""
-    since = datetime.now(UTC) - timedelta(hours=hours)
+    """Получает топ IP адресов по количеству запросов.
 
-    stmt = (
-        select(
-            LogEntryModel.remote_addr,
-            func.count(LogEntryModel.id).label('requests'),
-            func.avg(LogEntryModel.size).label('avg_size'),
-        )
-        .where(LogEntryModel.timestamp >= since)
-        .group_by(LogEntryModel.remote_addr)
-        .order_by(func.count(LogEntryModel.id).desc())
-        .limit(limit)
-    )
+    Топ больше CAPACITY сводки не хранят, и он всегда считается точно.
+    """
+    now = datetime.now(UTC)
+
+    if not exact and limit <= CAPACITY:
+        summary = await _top(db, 'top-ips', hours, 'top_ips', now)
+        return [
+            TopIPsStats(
+                ip=value,
+                requests=requests,
+                avg_size=size // max(requests - error, 1),
+                requests_error=error,
+            )
+            for value, requests, error, size in summary.top(limit)
+        ]
 
-    result = await db.execute(stmt)
+    since, _ = split_window(now, hours)
+    result = await db.execute(top_ips_query(since, limit))
     return [
         TopIPsStats(ip=row.remote_addr, requests=row.requests, avg_size=int(row.avg_size or 0))
         for row in result.fetchall()
@@ -77,25 +453,30 @@ async def get_top_ips(
 async def get_top_urls(
     limit: int = Query(10, description='Количество топ URL'),
     hours: int = Query(24, description='Количество часов для анализа'),
+    exact: bool = Query(False, description='Точный топ по сырым строкам вместо оценки по сводкам'),
     user: UserSchema = Depends(auth_dependency.check_token),
     db: AsyncSession = Depends(connector.get_pg_session),
 ) -> list[TopURLsStats]:
-    """Получает топ URL по количеству запросов."""
-    since = datetime.now(UTC) - timedelta(hours=hours)
+    """Получает топ URL по количеству запросов.
 
-    stmt = (
-        select(
-            LogEntryModel.uri,
-            func.count(LogEntryModel.id).label('requests'),
-            func.avg(LogEntryModel.size).label('avg_size'),
-        )
-        .where(LogEntryModel.timestamp >= since)
-        .group_by(LogEntryModel.uri)
-        .order_by(func.count(LogEntryModel.id).desc())
-        .limit(limit)
-    )
+    Топ больше CAPACITY сводки не хранят, и он всегда считается точно.
+    """
+    now = datetime.now(UTC)
+
+    if not exact and limit <= CAPACITY:
+        summary = await _top(db, 'top-urls', hours, 'top_uris', now)
+        return [
+            TopURLsStats(
+                url=value,
+                requests=requests,
+                avg_size=size // max(requests - error, 1),
+                requests_error=error,
+            )
+            for value, requests, error, size in summary.top(limit)
+        ]
 
-    result = await db.execute(stmt)
+    since, _ = split_window(now, hours)
+    result = await db.execute(top_urls_query(since, limit))
     return [
         TopURLsStats(url=row.uri, requests=row.requests, avg_size=int(row.avg_size or 0))
         for row in result.fetchall()
@@ -105,31 +486,76 @@ async def get_top_urls(
 @router.get('/analytics/traffic', response_model=TrafficStats)
 async def get_traffic_stats(
     hours: int = Query(24, description='Количество часов для анализа'),
+    exact: bool = Query(
+        False,
+        description='Точное число уникальных IP по сырым строкам вместо оценки (ошибка ~1%)',
+    ),
     user: UserSchema = Depends(auth_dependency.check_token),
     db: AsyncSession = Depends(connector.get_pg_session),
 ) -> TrafficStats:
     """Получает общую статистику трафика."""
-    since = datetime.now(UTC) - timedelta(hours=hours)
+    now = datetime.now(UTC)
+    since, head = split_window(now, hours)
 
-    stmt = select(
-        func.count(LogEntryModel.id).label('total_requests'),
-        func.sum(LogEntryModel.size).label('total_bytes'),
-        func.avg(LogEntryModel.size).label('avg_request_size'),
-        func.count(LogEntryModel.remote_addr.distinct()).label('unique_ips'),
-    ).where(LogEntryModel.timestamp >= since)
-
-    result = await db.execute(stmt)
-    row = result.fetchone()
+    total_requests, total_bytes, sketch = await _traffic(db, head, now)
+    closed_requests, closed_bytes, closed_sketch = await ANALYTICS_CACHE.cached(
+        'traffic', (hours, head), partial(_closed_traffic, db, since, head)
+    )
+    total_requests += closed_requests
+    total_bytes += closed_bytes
+    if exact:
+        unique_ips = await db.scalar(unique_ips_query(since))
+    else:
+        sketch.update(closed_sketch)
+        unique_ips = sketch.count()
 
     return TrafficStats(
-        total_requests=row.total_requests or 0,
-        total_bytes=row.total_bytes or 0,
-        avg_request_size=int(row.avg_request_size or 0),
-        unique_ips=row.unique_ips or 0,
+        total_requests=total_requests,
+        total_bytes=total_bytes,
+        avg_request_size=total_bytes // total_requests if total_requests else 0,
+        unique_ips=unique_ips or 0,
+        unique_ips_exact=exact,
         period_hours=hours,
     )
 
 
+@router.get('/analytics/percentiles', response_model=list[PercentileStats])
+async def get_percentiles(
+    hours: int = Query(24, description='Количество часов для анализа'),
+    exact: bool = Query(
+        False,
+        description='Точные перцентили по сырым строкам вместо оценки (ошибка до 1%)',
+    ),
+    user: UserSchema = Depends(auth_dependency.check_token),
+    db: AsyncSession = Depends(connector.get_pg_session),
+) -> list[PercentileStats]:
+    """Получает p50, p95 и p99 размера ответа и времени обработки запроса."""
+    now = datetime.now(UTC)
+    since, head = split_window(now, hours)
+
+    if not exact:
+        closed = await ANALYTICS_CACHE.cached(
+            'percentiles', (hours, head), partial(_closed_quantiles, db, since, head)
+        )
+        sketches = {}
+        for column, closed_sketch in closed.items():
+            sketches[column] = await estimate_quantiles(db, head, now, column)
+            sketches[column].update(closed_sketch)
+
+    stats = []
+    for metric, column in PERCENTILE_METRICS.items():
+        if exact:
+            count, *values = (await db.execute(percentiles_query(since, metric))).one()
+        else:
+            sketch = sketches[column]
+            count, values = sketch.count(), [sketch.quantile(p) for p in PERCENTILES]
+        p50, p95, p99 = values
+        stats.append(
+            PercentileStats(metric=metric, count=count, p50=p50, p95=p95, p99=p99, exact=exact)
+        )
+    return stats
+
+
 @router.get('/analytics/errors', response_model=list[ErrorStats])
 async def get_error_stats(
     hours: int = Query(24, description='Количество часов для анализа'),
@@ -137,31 +563,16 @@ async def get_error_stats(
     db: AsyncSession = Depends(connector.get_pg_session),
 ) -> list[ErrorStats]:
     """Получает статистику ошибок (4xx, 5xx)."""
-    since = datetime.now(UTC) - timedelta(hours=hours)
+    now = datetime.now(UTC)
+    since, head = split_window(now, hours)
 
-    stmt = (
-        select(
-            LogEntryModel.status,
-            LogEntryModel.uri,
-            LogEntryModel.remote_addr,
-            LogEntryModel.timestamp,
-            LogEntryModel.user_agent,
-        )
-        .where(and_(LogEntryModel.timestamp >= since, LogEntryModel.status >= 400))
-        .order_by(LogEntryModel.timestamp.desc())
-        .limit(100)
+    closed = await ANALYTICS_CACHE.cached(
+        'errors', (hours, head), partial(_closed_errors, db, since, head)
     )
-
-    result = await db.execute(stmt)
+    rows = (await _errors(db, head) + closed)[:ERRORS_LIMIT]
     return [
-        ErrorStats(
-            status=row.status,
-            url=row.uri,
-            ip=row.remote_addr,
-            timestamp=row.timestamp,
-            user_agent=row.user_agent,
-        )
-        for row in result.fetchall()
+        ErrorStats(status=status, url=uri, ip=remote_addr, timestamp=timestamp, user_agent=agent)
+        for status, uri, remote_addr, timestamp, agent in rows
     ]
 
 
@@ -173,25 +584,21 @@ async def get_time_series_data(
     db: AsyncSession = Depends(connector.get_pg_session),
 ) -> list[TimeSeriesData]:
     """Получает временные ряды запросов."""
-    since = datetime.now(UTC) - timedelta(hours=hours)
+    now = datetime.now(UTC)
+    since, head = split_window(now, hours)
     bucket_seconds = interval_minutes * 60
-    time_bucket = func.to_timestamp(
-        func.floor(func.extract('epoch', LogEntryModel.timestamp) / bucket_seconds) * bucket_seconds
-    ).label('time_bucket')
 
-    stmt = (
-        select(
-            time_bucket,
-            func.count(LogEntryModel.id).label('requests'),
-            func.sum(LogEntryModel.size).label('bytes'),
-        )
-        .where(LogEntryModel.timestamp >= since)
-        .group_by(time_bucket)
-        .order_by(time_bucket)
+    series = await _time_series(db, head, now, bucket_seconds)
+    closed = await ANALYTICS_CACHE.cached(
+        'time-series',
+        (hours, interval_minutes, head),
+        partial(_closed_time_series, db, since, head, interval_minutes),
     )
-
-    result = await db.execute(stmt)
+    for bucket, (requests, total_bytes) in closed.items():
+        totals = series.setdefault(bucket, [0, 0])
+        totals[0] += requests
+        totals[1] += total_bytes
     return [
-        TimeSeriesData(timestamp=row.time_bucket, requests=row.requests, bytes=row.bytes or 0)
-        for row in result.fetchall()
+        TimeSeriesData(timestamp=bucket, requests=requests, bytes=total_bytes)
+        for bucket, (requests, total_bytes) in sorted(series.items())
     ]
@@ -0,0 +1,97 @@
+import zlib
+
+from fastapi import APIRouter
+from fastapi import Depends
+from fastapi import HTTPException
+from fastapi import Query
+from fastapi import Request
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.status import HTTP_400_BAD_REQUEST
+from starlette.status import HTTP_415_UNSUPPORTED_MEDIA_TYPE
+
+from apps.api.v1.cruds.server_crud import server_crud_obj
+from apps.api.v1.schemas.ingest_schema import IngestFailureSchema
+from apps.api.v1.schemas.ingest_schema import IngestResultSchema
+from apps.auth.dependencies.auth_dependency import auth_dependency
+from apps.auth.schemas.user_schema import UserSchema
+from apps.db.session import connector
+
+NDJSON_CONTENT_TYPES = frozenset(
+    ('application/x-ndjson', 'application/ndjson', 'application/jsonl')
+)
+
+router = APIRouter()
+
+
+@router.post(
+    '/ingest/{server_id}',
+    response_model=IngestResultSchema,
+)
+async def ingest_logs(
+    server_id: int,
+    request: Request,
+    source: str | None = None,
+    offset: int = Query(default=0, ge=0),
+    user: UserSchema = Depends(auth_dependency.check_token),
+    db: AsyncSession = Depends(connector.get_pg_session),
+) -> IngestResultSchema:
+    """Принимаем строки лога сервера из тела запроса.
+
+    Тело читается и пишется в БД кусками, не целиком. Сырые строки
+    принимаются по умолчанию, NDJSON — при Content-Type
+    application/x-ndjson; gzip — при Content-Encoding: gzip. С source
+    повтор того же тела не дублирует записи.
+
+    Args:
+        server_id (int): ID сервера.
+        request (Request): Запрос с телом.
+        source (str | None): Идентичность источника у сборщика.
+        offset (int): Смещение начала тела в источнике.
+        user (UserSchema): Аутентифицированный пользователь.
+        db (AsyncSession): Асинхронная сессия SQLAlchemy.
+
+    Returns:
+        IngestResultSchema: Сколько строк записано, отвергнуто, потеряно и повторов;
+            строки, отвергнутые базой, с ошибкой.
+    """
+    # Сервисы монитора импортируют модели через apps.api: импорт здесь
+    # разрывает цикл apps.api -> ingest_handler -> log_batch_writer -> apps.api.
+    from apps.services.log_ingest import StreamIngester
+    from apps.services.log_pipeline import default_dead_letter
+
+    encoding = request.headers.get('content-encoding', 'identity').strip().lower()
+    if encoding not in ('identity', 'gzip'):
+        raise HTTPException(
+            status_code=HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+            detail=f'Content-Encoding {encoding} не поддерживается',
+        )
+
+    server = await server_crud_obj.get(db, server_id)
+    log_format = server.log_format
+    # Загрузка может идти минутами: соединение сессии на это время не нужно.
+    await db.close()
+
+    content_type = request.headers.get('content-type', '').split(';')[0].strip().lower()
+    ingester = StreamIngester(
+        server_id,
+        log_format=log_format,
+        ndjson=content_type in NDJSON_CONTENT_TYPES,
+        dead_letter=default_dead_letter(),
+        source=source,
+        offset=offset,
+    )
+    try:
+        await ingester.ingest(request.stream(), gzip=encoding == 'gzip')
+    except zlib.error as e:
+        raise HTTPException(
+            status_code=HTTP_400_BAD_REQUEST,
+            detail=f'Тело не распаковывается как gzip: {e}',
+        ) from e
+
+    return IngestResultSchema(
+        accepted=ingester.written,
+        rejected=ingester.rejected,
+        failed=ingester.failed,
+        duplicates=ingester.duplicates,
+        failures=[IngestFailureSchema(**failure) for failure in ingester.failed_rows],
+    )
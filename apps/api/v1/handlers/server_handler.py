@@ -1,9 +1,12 @@
 from fastapi import APIRouter
 from fastapi import Depends
 from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.status import HTTP_201_CREATED
 
 from apps.api.v1.cruds.server_crud import server_crud_obj
+from apps.api.v1.schemas.server_schema import ServerCreateSchema
 from apps.api.v1.schemas.server_schema import ServerOutSchema
+from apps.api.v1.schemas.server_schema import ServerUpdateSchema
 from apps.api.v1.schemas.server_schema import ServerWithLogsOutSchema
 from apps.auth.dependencies.auth_dependency import auth_dependency
 from apps.auth.schemas.user_schema import UserSchema
@@ -59,3 +62,62 @@ async def get_server_by_id(
         user=user,
         server_id=server_id,
     )
+
+
+@router.post(
+    '/servers',
+    response_model=ServerOutSchema,
+    status_code=HTTP_201_CREATED,
+)
+async def create_server(
+    server: ServerCreateSchema,
+    user: UserSchema = Depends(auth_dependency.check_token),
+    db: AsyncSession = Depends(connector.get_pg_session),
+) -> ServerOutSchema:
+    """Создаём сервер.
+
+    log_format проверяется сразу: формат, из которого не собирается
+    парсер, отвергается с 422, а не ломает монитор и приём строк позже.
+
+    Args:
+        server (ServerCreateSchema): Данные сервера.
+        user (UserSchema): Аутентифицированный пользователь.
+        db (AsyncSession): Асинхронная сессия SQLAlchemy.
+
+    Returns:
+        ServerOutSchema: Созданный сервер.
+    """
+    return await server_crud_obj.create_server(
+        db=db,
+        user=user,
+        server=server,
+    )
+
+
+@router.patch(
+    '/servers/{server_id}',
+    response_model=ServerOutSchema,
+)
+async def update_server(
+    server_id: int,
+    server: ServerUpdateSchema,
+    user: UserSchema = Depends(auth_dependency.check_token),
+    db: AsyncSession = Depends(connector.get_pg_session),
+) -> ServerOutSchema:
+    """Меняем переданные поля сервера, в том числе log_format.
+
+    Args:
+        server_id (int): ID сервера.
+        server (ServerUpdateSchema): Изменённые поля.
+        user (UserSchema): Аутентифицированный пользователь.
+        db (AsyncSession): Асинхронная сессия SQLAlchemy.
+
+    Returns:
+        ServerOutSchema: Сервер после изменения.
+    """
+    return await server_crud_obj.update_server(
+        db=db,
+        user=user,
+        server_id=server_id,
+        server=server,
+    )
@@ -1,2 +1,9 @@
 from .server_model import ServerModel  # noqa
 from .log_entry_model import LogEntryModel  # noqa
+from .dimension_models import UriModel  # noqa
+from .dimension_models import ReferrerModel  # noqa
+from .dimension_models import UserAgentModel  # noqa
+from .rollup_models import LogRollupMinuteModel  # noqa
+from .rollup_models import LogRollupHourModel  # noqa
+from .rollup_models import LogSketchMinuteModel  # noqa
+from .rollup_models import LogSketchHourModel  # noqa
@@ -0,0 +1,56 @@
+import uuid
+
+from sqlalchemy import Computed
+from sqlalchemy import Index
+from sqlalchemy import String
+from sqlalchemy import Uuid
+from sqlalchemy.orm import Mapped
+from sqlalchemy.orm import mapped_column
+
+from apps.db.base_db_class import BaseDBModel
+
+# Уникальность — по md5 значения, а не по самому значению: строка в 2048
+# символов UTF-8 может не поместиться в ключ btree.
+VALUE_HASH_SQL = 'md5(value)::uuid'
+
+
+class UriModel(BaseDBModel):
+    """Справочник URI: в log_entry_model хранится только uri_id."""
+
+    __tablename__ = 'uri_model'
+    __table_args__: dict[str, str] | tuple = (
+        Index('ix_uri_model_value_hash', 'value_hash', unique=True),
+        {'schema': 'nginx_parser_schema'},
+    )
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    value: Mapped[str] = mapped_column(String(2048), nullable=False)
+    value_hash: Mapped[uuid.UUID] = mapped_column(Uuid, Computed(VALUE_HASH_SQL, persisted=True))
+
+
+class ReferrerModel(BaseDBModel):
+    """Справочник referrer: в log_entry_model хранится только referrer_id."""
+
+    __tablename__ = 'referrer_model'
+    __table_args__: dict[str, str] | tuple = (
+        Index('ix_referrer_model_value_hash', 'value_hash', unique=True),
+        {'schema': 'nginx_parser_schema'},
+    )
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    value: Mapped[str] = mapped_column(String(2048), nullable=False)
+    value_hash: Mapped[uuid.UUID] = mapped_column(Uuid, Computed(VALUE_HASH_SQL, persisted=True))
+
+
+class UserAgentModel(BaseDBModel):
+    """Справочник user agent: в log_entry_model хранится только user_agent_id."""
+
+    __tablename__ = 'user_agent_model'
+    __table_args__: dict[str, str] | tuple = (
+        Index('ix_user_agent_model_value_hash', 'value_hash', unique=True),
+        {'schema': 'nginx_parser_schema'},
+    )
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    value: Mapped[str] = mapped_column(String(1024), nullable=False)
+    value_hash: Mapped[uuid.UUID] = mapped_column(Uuid, Computed(VALUE_HASH_SQL, persisted=True))
@@ -1,9 +1,19 @@
+import uuid
+
 from datetime import datetime
+from typing import Any
 
+from sqlalchemy import DDL
 from sqlalchemy import DateTime
+from sqlalchemy import Float
 from sqlalchemy import ForeignKey
+from sqlalchemy import Index
 from sqlalchemy import Integer
 from sqlalchemy import String
+from sqlalchemy import Uuid
+from sqlalchemy import event
+from sqlalchemy import text
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import Mapped
 from sqlalchemy.orm import mapped_column
 
@@ -11,10 +21,47 @@ from apps.db.base_db_class import BaseDBModel
 
 
 class LogEntryModel(BaseDBModel):
+    """Строка лога nginx.
+
+    Таблица секционирована по timestamp (apps/services/partitions.py):
+    ключ секционирования входит в первичный ключ и в уникальный индекс
+    source_key, как того требует PostgreSQL.
+
+    Индексы — под запросы аналитики (analytics_handler.py), все они
+    ограничены timestamp >= since:
+    - timestamp с колонками агрегатов в INCLUDE — статус коды, топы IP и
+      URL, трафик и временные ряды читаются index-only scan без таблицы;
+    - частичный по status >= 400 — последние ошибки берутся обратным
+      проходом по индексу до LIMIT без сортировки всех 4xx/5xx;
+    - (server_id, timestamp) — записи одного сервера за период и
+      каскадное удаление сервера.
+    """
+
     __tablename__ = 'log_entry_model'
-    __table_args__: dict[str, str] | tuple = ({'schema': 'nginx_parser_schema'},)
+    __table_args__: dict[str, str] | tuple = (
+        Index(
+            'ix_log_entry_model_server_id_source_key',
+            'server_id',
+            'source_key',
+            'timestamp',
+            unique=True,
+        ),
+        Index('ix_log_entry_model_server_id_timestamp', 'server_id', 'timestamp'),
+        Index(
+            'ix_log_entry_model_timestamp_covering',
+            'timestamp',
+            postgresql_include=['status', 'size', 'remote_addr', 'uri_id'],
+        ),
+        Index(
+            'ix_log_entry_model_timestamp_errors',
+            'timestamp',
+            postgresql_include=['status', 'uri_id', 'user_agent_id', 'remote_addr'],
+            postgresql_where=text('status >= 400'),
+        ),
+        {'schema': 'nginx_parser_schema', 'postgresql_partition_by': 'RANGE (timestamp)'},
+    )
 
-    id: Mapped[int] = mapped_column(primary_key=True)
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
 
     server_id: Mapped[int] = mapped_column(
         Integer,
@@ -26,19 +73,34 @@ class LogEntryModel(BaseDBModel):
 
     timestamp: Mapped[datetime] = mapped_column(
         DateTime(timezone=True),
+        primary_key=True,
         nullable=False,
     )
     remote_addr: Mapped[str] = mapped_column(String(45))
     method: Mapped[str] = mapped_column(String(10))
-    uri: Mapped[str] = mapped_column(String(2048))
+    # URI, referrer и user agent лежат в справочниках (dimension_models.py),
+    # здесь — только их id. Внешних ключей нет: они проверялись бы на каждой
+    # строке COPY, а id берутся из справочника до записи.
+    uri_id: Mapped[int] = mapped_column(Integer)
     http_version: Mapped[str] = mapped_column(String(10))
     status: Mapped[int] = mapped_column(Integer)
     size: Mapped[int] = mapped_column(Integer)
-    referrer: Mapped[str | None] = mapped_column(
-        String(2048),
-        nullable=True,
-    )
-    user_agent: Mapped[str | None] = mapped_column(
-        String(1024),
-        nullable=True,
-    )
+    referrer_id: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    user_agent_id: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    request_time: Mapped[float | None] = mapped_column(Float, nullable=True)
+    upstream_response_time: Mapped[float | None] = mapped_column(Float, nullable=True)
+    host: Mapped[str | None] = mapped_column(String(255), nullable=True)
+    request_id: Mapped[str | None] = mapped_column(String(128), nullable=True)
+    extra: Mapped[dict[str, Any] | None] = mapped_column(JSONB, nullable=True)
+    # Ключ источника строки (apps/services/source_key.py): повторно
+    # прочитанная строка не записывается второй раз.
+    source_key: Mapped[uuid.UUID | None] = mapped_column(Uuid, nullable=True)
+
+
+# Секция по умолчанию принимает строки, для которых ещё нет секции по
+# дате; обслуживание секций переносит их, создавая недостающую.
+event.listen(
+    LogEntryModel.__table__,
+    'after_create',
+    DDL('CREATE TABLE %(schema)s.%(table)s_default PARTITION OF %(schema)s.%(table)s DEFAULT'),
+)
@@ -0,0 +1,199 @@
+from datetime import datetime
+
+from sqlalchemy import BigInteger
+from sqlalchemy import Boolean
+from sqlalchemy import Connection
+from sqlalchemy import DateTime
+from sqlalchemy import ForeignKey
+from sqlalchemy import Index
+from sqlalchemy import Integer
+from sqlalchemy import LargeBinary
+from sqlalchemy import PrimaryKeyConstraint
+from sqlalchemy import Row
+from sqlalchemy import event
+from sqlalchemy import false
+from sqlalchemy import func
+from sqlalchemy import literal
+from sqlalchemy import select
+from sqlalchemy import text
+from sqlalchemy import update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Mapped
+from sqlalchemy.orm import Mapper
+from sqlalchemy.orm import mapped_column
+
+from apps.api.v1.models.dimension_models import UriModel
+from apps.api.v1.models.log_entry_model import LogEntryModel
+from apps.db.base_db_class import BaseDBModel
+from apps.services.sketches import SKETCH_COLUMNS
+from apps.services.sketches import BucketSketches
+from apps.services.sketches import bucket_sketches
+
+
+class LogRollupMinuteModel(BaseDBModel):
+    """Число запросов и байт за минуту UTC по серверу и статус коду.
+
+    Пополняется при записи логов (apps/services/rollups.py) в той же
+    транзакции, что и сами строки. compacted сбрасывается при каждом
+    пополнении: часы с несвёрнутыми минутами ещё не перенесены в
+    LogRollupHourModel, и аналитика читает их по минутам.
+
+    Первичный ключ начинается с bucket — сводки читаются по диапазону
+    времени сразу всех серверов.
+    """
+
+    __tablename__ = 'log_rollup_minute_model'
+    __table_args__: dict[str, str] | tuple = (
+        PrimaryKeyConstraint('bucket', 'server_id', 'status'),
+        Index(
+            'ix_log_rollup_minute_model_pending',
+            'bucket',
+            postgresql_where=text('NOT compacted'),
+        ),
+        {'schema': 'nginx_parser_schema'},
+    )
+
+    bucket: Mapped[datetime] = mapped_column(DateTime(timezone=True))
+    server_id: Mapped[int] = mapped_column(
+        Integer,
+        ForeignKey(column='nginx_parser_schema.server_model.id', ondelete='CASCADE'),
+    )
+    status: Mapped[int] = mapped_column(Integer)
+    requests: Mapped[int] = mapped_column(BigInteger)
+    bytes: Mapped[int] = mapped_column(BigInteger)
+    compacted: Mapped[bool] = mapped_column(Boolean, server_default=false())
+
+
+class LogRollupHourModel(BaseDBModel):
+    """Число запросов и байт за час UTC по серверу и статус коду.
+
+    Свёртка минутных сводок завершившихся часов (apps/services/rollups.py).
+    """
+
+    __tablename__ = 'log_rollup_hour_model'
+    __table_args__: dict[str, str] | tuple = (
+        PrimaryKeyConstraint('bucket', 'server_id', 'status'),
+        {'schema': 'nginx_parser_schema'},
+    )
+
+    bucket: Mapped[datetime] = mapped_column(DateTime(timezone=True))
+    server_id: Mapped[int] = mapped_column(
+        Integer,
+        ForeignKey(column='nginx_parser_schema.server_model.id', ondelete='CASCADE'),
+    )
+    status: Mapped[int] = mapped_column(Integer)
+    requests: Mapped[int] = mapped_column(BigInteger)
+    bytes: Mapped[int] = mapped_column(BigInteger)
+
+
+class LogSketchMinuteModel(BaseDBModel):
+    """Скетчи адресов клиентов, URI, размеров и времени ответа за минуту UTC по серверу.
+
+    Пополняются при записи логов вместе с LogRollupMinuteModel, колонки —
+    BucketSketches.to_bytes() (apps/services/sketches.py): HyperLogLog
+    адресов, сводки Space-Saving самых частых адресов и URI и DDSketch
+    size и request_time. compacted — как у минутных сводок: скетчи уже
+    собраны в LogSketchHourModel.
+    """
+
+    __tablename__ = 'log_sketch_minute_model'
+    __table_args__: dict[str, str] | tuple = (
+        PrimaryKeyConstraint('bucket', 'server_id'),
+        Index(
+            'ix_log_sketch_minute_model_pending',
+            'bucket',
+            postgresql_where=text('NOT compacted'),
+        ),
+        {'schema': 'nginx_parser_schema'},
+    )
+
+    bucket: Mapped[datetime] = mapped_column(DateTime(timezone=True))
+    server_id: Mapped[int] = mapped_column(
+        Integer,
+        ForeignKey(column='nginx_parser_schema.server_model.id', ondelete='CASCADE'),
+    )
+    unique_ips: Mapped[bytes] = mapped_column(LargeBinary)
+    top_ips: Mapped[bytes] = mapped_column(LargeBinary)
+    top_uris: Mapped[bytes] = mapped_column(LargeBinary)
+    sizes: Mapped[bytes] = mapped_column(LargeBinary)
+    request_times: Mapped[bytes] = mapped_column(LargeBinary)
+    compacted: Mapped[bool] = mapped_column(Boolean, server_default=false())
+
+
+class LogSketchHourModel(BaseDBModel):
+    """Скетчи адресов клиентов, URI, размеров и времени ответа за час UTC по серверу."""
+
+    __tablename__ = 'log_sketch_hour_model'
+    __table_args__: dict[str, str] | tuple = (
+        PrimaryKeyConstraint('bucket', 'server_id'),
+        {'schema': 'nginx_parser_schema'},
+    )
+
+    bucket: Mapped[datetime] = mapped_column(DateTime(timezone=True))
+    server_id: Mapped[int] = mapped_column(
+        Integer,
+        ForeignKey(column='nginx_parser_schema.server_model.id', ondelete='CASCADE'),
+    )
+    unique_ips: Mapped[bytes] = mapped_column(LargeBinary)
+    top_ips: Mapped[bytes] = mapped_column(LargeBinary)
+    top_uris: Mapped[bytes] = mapped_column(LargeBinary)
+    sizes: Mapped[bytes] = mapped_column(LargeBinary)
+    request_times: Mapped[bytes] = mapped_column(LargeBinary)
+
+
+@event.listens_for(LogEntryModel, 'after_insert')
+def add_entry_to_rollups(mapper: Mapper, connection: Connection, target: LogEntryModel) -> None:
+    """Пополняет минутную сводку и скетч строкой, записанной через ORM.
+
+    Пакетная запись и импорт пополняют их сами, одним запросом на пакет.
+    """
+    bucket = func.date_trunc('minute', literal(target.timestamp, DateTime(timezone=True)), 'UTC')
+    statement = insert(LogRollupMinuteModel).values(
+        bucket=bucket,
+        server_id=target.server_id,
+        status=target.status,
+        requests=1,
+        bytes=target.size,
+    )
+    connection.execute(
+        statement.on_conflict_do_update(
+            index_elements=['bucket', 'server_id', 'status'],
+            set_={
+                'requests': LogRollupMinuteModel.requests + 1,
+                'bytes': LogRollupMinuteModel.bytes + statement.excluded.bytes,
+                'compacted': False,
+            },
+        )
+    )
+
+    # Строка скетчей блокируется upsert'ом (новая — с пустыми скетчами), и
+    # строка лога добавляется к их текущему значению.
+    sketches = LogSketchMinuteModel.__table__.c
+    locked = insert(LogSketchMinuteModel).values(
+        bucket=bucket, server_id=target.server_id, **dict.fromkeys(SKETCH_COLUMNS, b'')
+    )
+    row: Row[tuple[datetime, bytes, bytes, bytes, bytes, bytes]] = connection.execute(
+        locked.on_conflict_do_update(
+            index_elements=['bucket', 'server_id'], set_={'compacted': False}
+        ).returning(sketches.bucket, *(sketches[column] for column in SKETCH_COLUMNS))
+    ).one()
+    uri = connection.scalar(select(UriModel.value).where(UriModel.id == target.uri_id))
+    (sketch,) = bucket_sketches(
+        [
+            (
+                row.bucket,
+                target.server_id,
+                target.remote_addr,
+                uri,
+                1,
+                target.size,
+                target.request_time,
+            )
+        ]
+    ).values()
+    sketch.update(BucketSketches.from_bytes(*row[1:]))
+    connection.execute(
+        update(LogSketchMinuteModel)
+        .where(sketches.bucket == row.bucket, sketches.server_id == target.server_id)
+        .values(dict(zip(SKETCH_COLUMNS, sketch.to_bytes(), strict=True)))
+    )
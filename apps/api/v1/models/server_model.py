@@ -1,4 +1,5 @@
 from sqlalchemy import String
+from sqlalchemy import Text
 from sqlalchemy.orm import Mapped
 from sqlalchemy.orm import mapped_column
 
@@ -13,3 +14,4 @@ class ServerModel(BaseDBModel):
     name: Mapped[str] = mapped_column(String(100), unique=True)
     description: Mapped[str | None] = mapped_column(String(255), nullable=True)
     ip_address: Mapped[str] = mapped_column(String(45), nullable=False)
+    log_format: Mapped[str | None] = mapped_column(Text, nullable=True)
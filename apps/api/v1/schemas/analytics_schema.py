@@ -11,31 +11,62 @@ class StatusCodeStats(BaseSchema):
 
 
 class TopIPsStats(BaseSchema):
-    """Статистика по топ IP адресам."""
+    """Статистика по топ IP адресам.
+
+    requests оценки по сводкам завышено не больше чем на requests_error;
+    у точного топа requests_error = 0.
+    """
 
     ip: str
     requests: int
     avg_size: int
+    requests_error: int = 0
 
 
 class TopURLsStats(BaseSchema):
-    """Статистика по топ URL."""
+    """Статистика по топ URL.
+
+    requests оценки по сводкам завышено не больше чем на requests_error;
+    у точного топа requests_error = 0.
+    """
 
     url: str
     requests: int
     avg_size: int
+    requests_error: int = 0
 
 
 class TrafficStats(BaseSchema):
-    """Общая статистика трафика."""
+    """Общая статистика трафика.
+
+    unique_ips — оценка по скетчам HyperLogLog с ошибкой около 1% или,
+    если unique_ips_exact, точное число.
+    """
 
     total_requests: int
     total_bytes: int
     avg_request_size: int
     unique_ips: int
+    unique_ips_exact: bool = False
     period_hours: int
 
 
+class PercentileStats(BaseSchema):
+    """Перцентили размера ответа (size) или времени обработки запроса (request_time).
+
+    Оценка по скетчам DDSketch отличается от точного перцентиля не больше
+    чем на 1%; если exact, перцентили точные. count — число запросов, в
+    которых значение записано; без них перцентили None.
+    """
+
+    metric: str
+    count: int
+    p50: float | None = None
+    p95: float | None = None
+    p99: float | None = None
+    exact: bool = False
+
+
 class ErrorStats(BaseSchema):
     """Статистика ошибок."""
 
@@ -0,0 +1,20 @@
+from typing import Any
+
+from apps.api.v1.schemas.base_schema import BaseSchema
+
+
+class IngestFailureSchema(BaseSchema):
+    """Строка, которую база отвергла при записи."""
+
+    row: dict[str, Any]
+    error: str
+
+
+class IngestResultSchema(BaseSchema):
+    """Итог приёма тела POST /api/ingest/{server_id}."""
+
+    accepted: int
+    rejected: int
+    failed: int
+    duplicates: int
+    failures: list[IngestFailureSchema] = []
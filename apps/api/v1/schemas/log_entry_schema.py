@@ -1,4 +1,5 @@
 from datetime import datetime
+from typing import Any
 
 from apps.api.v1.schemas.base_schema import BaseSchema
 
@@ -13,5 +14,10 @@ class GetLogEntryOutSchema(BaseSchema):
     size: int
     referrer: str | None = None
     user_agent: str | None = None
+    request_time: float | None = None
+    upstream_response_time: float | None = None
+    host: str | None = None
+    request_id: str | None = None
+    extra: dict[str, Any] | None = None
 
     model_config = {'from_attributes': True}
@@ -1,12 +1,64 @@
+from typing import Annotated
+
+from pydantic import AfterValidator
 from pydantic import ConfigDict
+from pydantic import Field
+from pydantic import field_validator
 
 from apps.api.v1.schemas.base_schema import BaseSchema
 from apps.api.v1.schemas.log_entry_schema import GetLogEntryOutSchema
+from apps.services.log_format import compile_log_format
+
+
+def check_log_format(value: str | None) -> str | None:
+    """Пропускает log_format, только если из него собирается парсер.
+
+    Raises:
+        ValueError: формат не компилируется; pydantic отвечает на это 422
+    """
+    if value is not None:
+        compile_log_format(value)
+    return value
+
+
+LogFormat = Annotated[str | None, AfterValidator(check_log_format)]
+
+
+class ServerCreateSchema(BaseSchema):
+    """Новый сервер; без log_format его строки разбираются как combined."""
+
+    name: str = Field(max_length=100)
+    description: str | None = Field(default=None, max_length=255)
+    ip_address: str = Field(max_length=45)
+    log_format: LogFormat = None
+
+
+class ServerUpdateSchema(BaseSchema):
+    """Изменения сервера: меняются только переданные поля.
+
+    null в description и log_format сбрасывает их, log_format — обратно на combined.
+    """
+
+    name: str | None = Field(default=None, max_length=100)
+    description: str | None = Field(default=None, max_length=255)
+    ip_address: str | None = Field(default=None, max_length=45)
+    log_format: LogFormat = None
+
+    @field_validator('name', 'ip_address')
+    @classmethod
+    def check_not_null(cls, value: str | None) -> str:
+        """Name и ip_address нельзя сбросить в null."""
+        if value is None:
+            raise ValueError('Поле не может быть null')
+        return value
 
 
 class ServerOutSchema(BaseSchema):
+    id: int
     name: str
-    description: str
+    description: str | None
+    ip_address: str
+    log_format: str | None
 
     model_config = {'from_attributes': True}
 
@@ -15,6 +67,7 @@ class ServerWithLogsOutSchema(BaseSchema):
     id: int
     name: str
     ip_address: str
+    log_format: str | None
     logs: list[GetLogEntryOutSchema]
 
     model_config = ConfigDict(from_attributes=True)
@@ -6,18 +6,53 @@ from pathlib import Path
 
 from loguru import logger
 
-from apps.services.nginx_log_parser import start_log_monitoring
+from apps.services.log_format import compile_log_format
+from apps.services.log_import import LogImporter
+from apps.services.log_pipeline import resolve_log_format
+from apps.services.log_pipeline import start_log_monitoring
+from apps.services.log_pipeline import start_multi_log_monitoring
+from apps.services.monitor_targets import MonitorTarget
+from apps.services.monitor_targets import load_monitor_config
+from apps.services.monitor_targets import parse_file_option
+from apps.services.partitions import PartitionManager
+from apps.services.syslog_receiver import Address
+from apps.services.syslog_receiver import SyslogRoutes
+from apps.services.syslog_receiver import parse_address
+from apps.services.syslog_receiver import parse_route_option
+from apps.services.syslog_receiver import start_syslog_receiver
 
 PREVIEW_LINES = 5
 
 
-async def start_monitoring(log_file_path: str, server_id: int = 1) -> None:
+async def start_monitoring(
+    log_file_path: str,
+    server_id: int = 1,
+    batch_size: int | None = None,
+    flush_interval_ms: int | None = None,
+    writers: int | None = None,
+    queue_size: int | None = None,
+    log_format: str | None = None,
+    parse_workers: int | None = None,
+    metrics_port: int | None = None,
+) -> None:
     """Запускает мониторинг логов nginx."""
     logger.info(f'Запуск мониторинга логов: {log_file_path}')
     logger.info(f'Server ID: {server_id}')
 
+    flush_interval = flush_interval_ms / 1000 if flush_interval_ms is not None else None
+
     try:
-        await start_log_monitoring(log_file_path, server_id)
+        await start_log_monitoring(
+            log_file_path,
+            server_id,
+            batch_size=batch_size,
+            flush_interval=flush_interval,
+            writers=writers,
+            queue_size=queue_size,
+            log_format=log_format,
+            parse_workers=parse_workers,
+            metrics_port=metrics_port,
+        )
     except KeyboardInterrupt:
         logger.info('Мониторинг остановлен пользователем')
     except Exception:
@@ -25,16 +60,313 @@ async def start_monitoring(log_file_path: str, server_id: int = 1) -> None:
         sys.exit(1)
 
 
+async def start_multi_monitoring(
+    targets: list[MonitorTarget],
+    batch_size: int | None = None,
+    flush_interval_ms: int | None = None,
+    writers: int | None = None,
+    queue_size: int | None = None,
+    parse_workers: int | None = None,
+    metrics_port: int | None = None,
+) -> None:
+    """Запускает мониторинг нескольких файлов и серверов в одном процессе."""
+    for target in targets:
+        logger.info(f'Цель мониторинга: {target.path}, Server ID: {target.server_id}')
+
+    flush_interval = flush_interval_ms / 1000 if flush_interval_ms is not None else None
+
+    try:
+        await start_multi_log_monitoring(
+            targets,
+            batch_size=batch_size,
+            flush_interval=flush_interval,
+            writers=writers,
+            queue_size=queue_size,
+            parse_workers=parse_workers,
+            metrics_port=metrics_port,
+        )
+    except KeyboardInterrupt:
+        logger.info('Мониторинг остановлен пользователем')
+    except Exception:
+        logger.exception('Ошибка мониторинга')
+        sys.exit(1)
+
+
+def collect_monitor_targets(args: argparse.Namespace) -> list[MonitorTarget]:
+    """Цели мониторинга из --config, --file и позиционного пути-шаблона.
+
+    Пустой список означает обычный мониторинг одного файла log_file.
+
+    Raises:
+        ValueError: некорректный конфиг или значение --file
+    """
+    targets = load_monitor_config(args.config) if args.config else []
+    targets.extend(parse_file_option(value, args.log_format) for value in args.file)
+
+    if args.log_file:
+        target = MonitorTarget(args.log_file, args.server_id, args.log_format)
+        if targets or target.is_pattern:
+            targets.append(target)
+    return targets
+
+
+async def start_import(
+    log_file_paths: list[str],
+    server_id: int = 1,
+    log_format: str | None = None,
+    workers: int | None = None,
+    writers: int | None = None,
+    dead_letter: bool = False,
+) -> None:
+    """Импортирует исторические файлы логов, в том числе сжатые .gz и .zst."""
+    logger.info(f'Импорт файлов: {len(log_file_paths)}, Server ID: {server_id}')
+
+    try:
+        log_format = await resolve_log_format(server_id, log_format)
+        importer = LogImporter(
+            log_file_paths,
+            server_id,
+            log_format=log_format,
+            workers=workers,
+            writers=writers,
+            dead_letter=dead_letter,
+        )
+        await importer.run()
+    except KeyboardInterrupt:
+        logger.info('Импорт остановлен пользователем')
+    except Exception:
+        logger.exception('Ошибка импорта')
+        sys.exit(1)
+
+
+async def start_syslog(
+    routes: SyslogRoutes,
+    udp: list[Address],
+    tcp: list[Address],
+    batch_size: int | None = None,
+    flush_interval_ms: int | None = None,
+    writers: int | None = None,
+    queue_size: int | None = None,
+    parse_workers: int | None = None,
+    metrics_port: int | None = None,
+) -> None:
+    """Запускает приём логов nginx по syslog."""
+    for name, server_id in routes.routes.items():
+        logger.info(f'Маршрут syslog: {name} → Server ID: {server_id}')
+
+    flush_interval = flush_interval_ms / 1000 if flush_interval_ms is not None else None
+
+    try:
+        await start_syslog_receiver(
+            routes,
+            udp=udp,
+            tcp=tcp,
+            batch_size=batch_size,
+            flush_interval=flush_interval,
+            writers=writers,
+            queue_size=queue_size,
+            parse_workers=parse_workers,
+            metrics_port=metrics_port,
+        )
+    except KeyboardInterrupt:
+        logger.info('Приём syslog остановлен пользователем')
+    except Exception:
+        logger.exception('Ошибка приёма syslog')
+        sys.exit(1)
+
+
+async def start_partition_maintenance(
+    retention_days: int | None = None, precreate: int | None = None
+) -> None:
+    """Один проход обслуживания секций таблицы логов — для cron."""
+    try:
+        result = await PartitionManager(
+            retention_days=retention_days, precreate=precreate
+        ).maintain()
+    except Exception:
+        logger.exception('Ошибка обслуживания секций')
+        sys.exit(1)
+
+    logger.info(f'Создано секций: {len(result.created)}, отсоединено: {len(result.detached)}')
+
+
 def main():
     """Основная функция CLI."""
     parser = argparse.ArgumentParser(description='Nginx Log Analyzer CLI')
     subparsers = parser.add_subparsers(dest='command', help='Доступные команды')
 
     monitor_parser = subparsers.add_parser('monitor', help='Запустить мониторинг логов')
-    monitor_parser.add_argument('log_file', help='Путь к файлу логов nginx')
     monitor_parser.add_argument(
+        'log_file', nargs='?', help='Путь к файлу логов nginx или glob-шаблон'
+    )
+    monitor_parser.add_argument(
+        '--file',
+        action='append',
+        default=[],
+        metavar='PATH:SERVER_ID',
+        help='Файл или glob-шаблон и ID его сервера, можно повторять',
+    )
+    monitor_parser.add_argument(
+        '--config', default=None, help='TOML-файл с целями мониторинга [[files]]'
+    )
+    monitor_parser.add_argument(
+        '--server-id', type=int, default=1, help='ID сервера (по умолчанию: 1)'
+    )
+    monitor_parser.add_argument(
+        '--batch-size',
+        type=int,
+        default=None,
+        help='Размер пакета записи в БД (по умолчанию: MONITOR_BATCH_SIZE)',
+    )
+    monitor_parser.add_argument(
+        '--flush-interval-ms',
+        type=int,
+        default=None,
+        help='Максимальный возраст пакета в мс (по умолчанию: MONITOR_FLUSH_INTERVAL_MS)',
+    )
+    monitor_parser.add_argument(
+        '--writers',
+        type=int,
+        default=None,
+        help='Количество параллельных писателей в БД (по умолчанию: MONITOR_WRITERS)',
+    )
+    monitor_parser.add_argument(
+        '--queue-size',
+        type=int,
+        default=None,
+        help='Ёмкость очередей конвейера в пачках (по умолчанию: MONITOR_QUEUE_SIZE)',
+    )
+    monitor_parser.add_argument(
+        '--parse-workers',
+        type=int,
+        default=None,
+        help='Процессов разбора строк, 0 — разбор в event loop (по умолчанию: '
+        'MONITOR_PARSE_WORKERS)',
+    )
+    monitor_parser.add_argument(
+        '--metrics-port',
+        type=int,
+        default=None,
+        help='Порт HTTP-слушателя /metrics, 0 — выключен (по умолчанию: MONITOR_METRICS_PORT)',
+    )
+    monitor_parser.add_argument(
+        '--log-format',
+        default=None,
+        help=(
+            'Формат строк: combined, main, строка log_format или директива из nginx.conf '
+            '(по умолчанию: log_format сервера, иначе combined)'
+        ),
+    )
+
+    import_parser = subparsers.add_parser(
+        'import', help='Импортировать исторические файлы логов (.gz и .zst распаковываются)'
+    )
+    import_parser.add_argument('log_files', nargs='+', help='Пути к файлам логов nginx')
+    import_parser.add_argument(
         '--server-id', type=int, default=1, help='ID сервера (по умолчанию: 1)'
     )
+    import_parser.add_argument(
+        '--log-format',
+        default=None,
+        help='Формат строк, как у monitor (по умолчанию: log_format сервера, иначе combined)',
+    )
+    import_parser.add_argument(
+        '--workers',
+        type=int,
+        default=None,
+        help='Процессов разбора (по умолчанию: IMPORT_WORKERS, иначе число ядер)',
+    )
+    import_parser.add_argument(
+        '--writers',
+        type=int,
+        default=None,
+        help='Количество параллельных писателей в БД (по умолчанию: MONITOR_WRITERS)',
+    )
+
+    import_parser.add_argument(
+        '--dead-letter',
+        action='store_true',
+        help='Файлы — dead-letter файлы монитора, импортировать сохранённые в них строки',
+    )
+
+    syslog_parser = subparsers.add_parser(
+        'syslog', help='Принимать логи, которые nginx отправляет по syslog'
+    )
+    syslog_parser.add_argument(
+        '--udp',
+        action='append',
+        default=[],
+        metavar='HOST:PORT',
+        help='Адрес приёма по UDP, можно повторять (по умолчанию: SYSLOG_HOST:SYSLOG_PORT)',
+    )
+    syslog_parser.add_argument(
+        '--tcp', action='append', default=[], metavar='HOST:PORT', help='Адрес приёма по TCP'
+    )
+    syslog_parser.add_argument(
+        '--route',
+        action='append',
+        default=[],
+        metavar='NAME:SERVER_ID',
+        help='Имя хоста или тег syslog и ID его сервера, можно повторять',
+    )
+    syslog_parser.add_argument(
+        '--server-id',
+        type=int,
+        default=None,
+        help='ID сервера для сообщений без маршрута (по умолчанию такие сообщения отбрасываются)',
+    )
+    syslog_parser.add_argument(
+        '--batch-size',
+        type=int,
+        default=None,
+        help='Размер пакета записи в БД (по умолчанию: MONITOR_BATCH_SIZE)',
+    )
+    syslog_parser.add_argument(
+        '--flush-interval-ms',
+        type=int,
+        default=None,
+        help='Максимальный возраст пакета в мс (по умолчанию: MONITOR_FLUSH_INTERVAL_MS)',
+    )
+    syslog_parser.add_argument(
+        '--writers',
+        type=int,
+        default=None,
+        help='Количество параллельных писателей в БД (по умолчанию: MONITOR_WRITERS)',
+    )
+    syslog_parser.add_argument(
+        '--queue-size',
+        type=int,
+        default=None,
+        help='Ёмкость очередей конвейера в пачках (по умолчанию: MONITOR_QUEUE_SIZE)',
+    )
+    syslog_parser.add_argument(
+        '--parse-workers',
+        type=int,
+        default=None,
+        help='Процессов разбора строк (по умолчанию: MONITOR_PARSE_WORKERS)',
+    )
+    syslog_parser.add_argument(
+        '--metrics-port',
+        type=int,
+        default=None,
+        help='Порт HTTP-слушателя /metrics (по умолчанию: MONITOR_METRICS_PORT)',
+    )
+
+    partitions_parser = subparsers.add_parser(
+        'partitions', help='Создать будущие и отсоединить устаревшие секции таблицы логов'
+    )
+    partitions_parser.add_argument(
+        '--retention-days',
+        type=int,
+        default=None,
+        help='Срок хранения в сутках, 0 — бессрочно (по умолчанию: PARTITION_RETENTION_DAYS)',
+    )
+    partitions_parser.add_argument(
+        '--precreate',
+        type=int,
+        default=None,
+        help='Сколько секций создать впрок (по умолчанию: PARTITION_PRECREATE)',
+    )
 
     check_parser = subparsers.add_parser('check', help='Проверить файл логов')
     check_parser.add_argument('log_file', help='Путь к файлу логов nginx')
@@ -42,12 +374,115 @@ def main():
     args = parser.parse_args()
 
     if args.command == 'monitor':
+        if args.log_format:
+            try:
+                compile_log_format(args.log_format)
+            except ValueError as e:
+                logger.error(f'Некорректный log_format: {e}')
+                sys.exit(1)
+
+        try:
+            targets = collect_monitor_targets(args)
+        except (OSError, ValueError) as e:
+            logger.error(f'Некорректные цели мониторинга: {e}')
+            sys.exit(1)
+
+        if targets:
+            asyncio.run(
+                start_multi_monitoring(
+                    targets,
+                    batch_size=args.batch_size,
+                    flush_interval_ms=args.flush_interval_ms,
+                    writers=args.writers,
+                    queue_size=args.queue_size,
+                    parse_workers=args.parse_workers,
+                    metrics_port=args.metrics_port,
+                )
+            )
+            return
+
+        if not args.log_file:
+            logger.error('Укажите файл логов, --file или --config')
+            sys.exit(1)
+
         log_path = Path(args.log_file)
         if not log_path.exists():
             logger.error(f'Файл логов не найден: {log_path}')
             sys.exit(1)
 
-        asyncio.run(start_monitoring(str(log_path), args.server_id))
+        asyncio.run(
+            start_monitoring(
+                str(log_path),
+                args.server_id,
+                batch_size=args.batch_size,
+                flush_interval_ms=args.flush_interval_ms,
+                writers=args.writers,
+                queue_size=args.queue_size,
+                log_format=args.log_format,
+                parse_workers=args.parse_workers,
+                metrics_port=args.metrics_port,
+            )
+        )
+
+    elif args.command == 'import':
+        missing = [path for path in args.log_files if not Path(path).is_file()]
+        if missing:
+            logger.error(f'Файлы логов не найдены: {", ".join(missing)}')
+            sys.exit(1)
+
+        if args.log_format:
+            try:
+                compile_log_format(args.log_format)
+            except ValueError as e:
+                logger.error(f'Некорректный log_format: {e}')
+                sys.exit(1)
+
+        asyncio.run(
+            start_import(
+                args.log_files,
+                args.server_id,
+                log_format=args.log_format,
+                workers=args.workers,
+                writers=args.writers,
+                dead_letter=args.dead_letter,
+            )
+        )
+
+    elif args.command == 'syslog':
+        try:
+            routes = SyslogRoutes(
+                dict(parse_route_option(value) for value in args.route), args.server_id
+            )
+            udp = [parse_address(value) for value in args.udp]
+            tcp = [parse_address(value) for value in args.tcp]
+        except ValueError as e:
+            logger.error(f'Некорректные параметры syslog: {e}')
+            sys.exit(1)
+
+        if not routes.server_ids:
+            logger.error('Укажите --route или --server-id')
+            sys.exit(1)
+
+        asyncio.run(
+            start_syslog(
+                routes,
+                udp,
+                tcp,
+                batch_size=args.batch_size,
+                flush_interval_ms=args.flush_interval_ms,
+                writers=args.writers,
+                queue_size=args.queue_size,
+                parse_workers=args.parse_workers,
+                metrics_port=args.metrics_port,
+            )
+        )
+
+    elif args.command == 'partitions':
+        asyncio.run(
+            start_partition_maintenance(
+                retention_days=args.retention_days, precreate=args.precreate
+            )
+        )
 
     elif args.command == 'check':
         log_path = Path(args.log_file)
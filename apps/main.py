@@ -1,3 +1,5 @@
+import asyncio
+import contextlib
 import logging
 import sys
 import time
@@ -18,9 +20,13 @@ from starlette.responses import Response
 
 from apps.api import router as api_router
 from apps.auth import router as auth_router
+from apps.services.partitions import run_partition_maintenance
+from apps.services.rollups import run_rollup_compaction
 from apps.settings import SETTINGS
 from apps.utils.enums.env_enum import EnvEnum
 from apps.utils.health_check import health_check_router
+from apps.utils.metrics import MetricsMiddleware
+from apps.utils.metrics import metrics_router
 
 
 async def init_logger() -> None:
@@ -47,9 +53,23 @@ async def init_logger() -> None:
 
 @asynccontextmanager
 async def lifespan(*args, **kwargs) -> AsyncGenerator[None, None]:
-    """Действия перед стартом аппа."""
+    """Действия перед стартом аппа.
+
+    Пока апп работает, в фоне обслуживаются секции таблицы логов, если
+    PARTITION_MAINTENANCE_INTERVAL_SECONDS не 0, и сворачиваются сводки
+    аналитики, если ROLLUP_COMPACTION_INTERVAL_SECONDS не 0.
+    """
     await init_logger()
+    tasks = []
+    if SETTINGS.PARTITION_MAINTENANCE_INTERVAL_SECONDS > 0:
+        tasks.append(asyncio.create_task(run_partition_maintenance()))
+    if SETTINGS.ROLLUP_COMPACTION_INTERVAL_SECONDS > 0:
+        tasks.append(asyncio.create_task(run_rollup_compaction()))
     yield
+    for task in tasks:
+        task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await task
 
 
 def get_fastapi_app() -> FastAPI:
@@ -67,6 +87,8 @@ def get_fastapi_app() -> FastAPI:
     fast_api_app.include_router(api_router)
     fast_api_app.include_router(auth_router)
     fast_api_app.include_router(health_check_router)
+    fast_api_app.include_router(metrics_router)
+    fast_api_app.add_middleware(MetricsMiddleware)  # type: ignore[arg-type, call-arg]
 
     try:
         fast_api_app.mount('/static', StaticFiles(directory='apps/static'), name='static')
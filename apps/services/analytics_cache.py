@@ -0,0 +1,238 @@
+"""Кеш ответов аналитики по закрытым корзинам окна.
+
+Дашборд раз в 30 секунд запрашивает одни и те же эндпоинты из каждой
+открытой вкладки, но окно [now - hours, now) сдвигается каждую
+микросекунду, и готовый ответ переиспользовать нельзя. Поэтому окно
+делится split_window() на две части по границам минут:
+- закрытая [since, head): head — начало минуты, в которой now отстаёт
+  на ANALYTICS_CACHE_SETTLE_SECONDS (строки завершившейся минуты
+  успевают дойти от писателей), since — на hours часов раньше.
+  closed_buckets() режет её на корзины: целые часы UTC и минуты
+  неполных часов по краям. Частичный результат корзины не меняется и
+  хранится в ANALYTICS_CACHE под ключом (эндпоинт, параметры, корзина),
+  пока его не вытеснят;
+- открытая [head, now) — последняя минута-две, считается при каждом
+  запросе по сырым строкам.
+
+Обработчик складывает частичные результаты корзин и открытой части:
+счётчики суммирует, скетчи объединяет. Корзина не зависит от hours,
+так что окна разной длины делят корзины, а окно, сдвинувшееся на
+минуту, запрашивает из базы только одну новую минуту и открытую часть.
+Раз посчитанная корзина не пересчитывается: строки, которые import
+дописал в уже закрытые минуты, видны в ответе, когда их корзину
+вытеснят или кеш очистят (перезапуск API).
+
+Значения хранятся сериализованными pickle: размер записи известен
+точно, а обработчик получает свою копию и может менять её, не трогая
+кеш. Объём кеша ограничен ANALYTICS_CACHE_MAX_MB (0 — выключить),
+попадания и промахи по корзинам видны в метриках.
+"""
+
+import pickle
+
+from bisect import bisect_right
+from collections import OrderedDict
+from collections.abc import Awaitable
+from collections.abc import Callable
+from collections.abc import Hashable
+from datetime import datetime
+from datetime import timedelta
+from typing import Any
+from typing import TypeVar
+
+from apps.settings import SETTINGS
+from apps.utils.metrics import REGISTRY
+from apps.utils.metrics import Counter
+from apps.utils.metrics import Gauge
+
+T = TypeVar('T')
+
+MINUTE = timedelta(minutes=1)
+HOUR = timedelta(hours=1)
+
+ANALYTICS_CACHE_LOOKUPS = Counter(
+    'nginx_analyzer_analytics_cache_lookups_total',
+    'Закрытые корзины окна аналитики, найденные в кеше (hit) или посчитанные (miss)',
+    ('endpoint', 'result'),
+)
+ANALYTICS_CACHE_BYTES = Gauge(
+    'nginx_analyzer_analytics_cache_bytes', 'Байт в кеше ответов аналитики'
+)
+ANALYTICS_CACHE_HIT_RATIO = Gauge(
+    'nginx_analyzer_analytics_cache_hit_ratio', 'Доля попаданий в кеш ответов аналитики'
+)
+
+
+class ResponseCache:
+    """LRU-кеш частичных результатов аналитики на max_bytes байт.
+
+    Args:
+        max_bytes: наибольший суммарный размер значений; 0 — не хранить ничего
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._items: OrderedDict[Hashable, bytes] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def get(self, key: Hashable) -> Any | None:
+        """Копия значения или None, если его нет в кеше."""
+        data = self._items.get(key)
+        if data is None:
+            return None
+        self._items.move_to_end(key)
+        return pickle.loads(data)
+
+    def put(self, key: Hashable, value: Any) -> None:
+        """Запоминает значение, вытесняя самые давние, пока не уложится в max_bytes.
+
+        Значение больше max_bytes не запоминается.
+        """
+        data = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        previous = self._items.pop(key, None)
+        if previous is not None:
+            self.bytes -= len(previous)
+        if len(data) > self.max_bytes:
+            return
+        self._items[key] = data
+        self.bytes += len(data)
+        while self.bytes > self.max_bytes:
+            _, evicted = self._items.popitem(last=False)
+            self.bytes -= len(evicted)
+
+    def _lookup(self, endpoint: str, key: tuple) -> Any | None:
+        """Значение (endpoint, *key) из кеша с учётом попадания или промаха."""
+        value = self.get((endpoint, *key))
+        hit = value is not None
+        if hit:
+            self.hits += 1
+        else:
+            self.misses += 1
+        ANALYTICS_CACHE_LOOKUPS.labels(endpoint, 'hit' if hit else 'miss').inc()
+        return value
+
+    async def cached(self, endpoint: str, key: tuple, compute: Callable[[], Awaitable[T]]) -> T:
+        """Значение для (endpoint, *key) из кеша или из compute() с запоминанием."""
+        value = self._lookup(endpoint, key)
+        if value is None:
+            value = await compute()
+            self.put((endpoint, *key), value)
+        return value
+
+    async def cached_buckets(
+        self,
+        endpoint: str,
+        key: tuple,
+        buckets: list[tuple[datetime, datetime]],
+        compute: Callable[[datetime, datetime], Awaitable[list[tuple[datetime, T]]]],
+    ) -> list[T]:
+        """Строки корзин buckets для (endpoint, *key): из кеша или из compute с запоминанием.
+
+        compute(lower, upper) отдаёт строки (момент, значение) диапазона
+        [lower, upper); каждая строка относится к корзине, в которую попал
+        момент. Недостающие подряд корзины считаются одним вызовом
+        compute, и каждая запоминается отдельно — вместе с пустыми.
+
+        Args:
+            endpoint: эндпоинт — первая часть ключа и метка метрики
+            key: параметры эндпоинта
+            buckets: корзины [lower, upper) по возрастанию, без промежутков
+            compute: строки диапазона из базы
+
+        Returns:
+            list[T]: значения строк всех корзин по порядку корзин
+        """
+        parts = [self._lookup(endpoint, (*key, *bucket)) for bucket in buckets]
+        index = 0
+        while index < len(parts):
+            if parts[index] is not None:
+                index += 1
+                continue
+            end = index
+            while end < len(parts) and parts[end] is None:
+                end += 1
+            run = buckets[index:end]
+            lowers = [lower for lower, _ in run]
+            grouped: list[list[T]] = [[] for _ in run]
+            for moment, value in await compute(run[0][0], run[-1][1]):
+                grouped[bisect_right(lowers, moment) - 1].append(value)
+            for bucket, values in zip(run, grouped, strict=True):
+                self.put((endpoint, *key, *bucket), values)
+            parts[index:end] = grouped
+            index = end
+        return [value for values in parts for value in values]
+
+    def clear(self) -> None:
+        """Удаляет все значения; счётчики попаданий остаются."""
+        self._items.clear()
+        self.bytes = 0
+
+    def hit_ratio(self) -> float:
+        """Доля попаданий среди всех обращений; 0, если обращений не было."""
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def stats(self) -> dict[str, int | float]:
+        """Записи, байты, попадания, промахи и их доля."""
+        return {
+            'entries': len(self._items),
+            'bytes': self.bytes,
+            'max_bytes': self.max_bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': self.hit_ratio(),
+        }
+
+    def collect_metrics(self) -> None:
+        """Обновляет gauge кеша перед выводом метрик."""
+        ANALYTICS_CACHE_BYTES.set(self.bytes)
+        ANALYTICS_CACHE_HIT_RATIO.set(self.hit_ratio())
+
+
+def split_window(now: datetime, hours: int) -> tuple[datetime, datetime]:
+    """Границы since и head окна аналитики за hours часов до now.
+
+    head — начало минуты, в которой now отстаёт на
+    ANALYTICS_CACHE_SETTLE_SECONDS, since — ровно на hours часов раньше.
+    Окно длиннее hours часов меньше чем на минуту с секундами ожидания,
+    зато head определяет его целиком.
+
+    Returns:
+        tuple[datetime, datetime]: since и head
+    """
+    settled = now - timedelta(seconds=SETTINGS.ANALYTICS_CACHE_SETTLE_SECONDS)
+    head = settled.replace(second=0, microsecond=0)
+    return head - timedelta(hours=hours), head
+
+
+def closed_buckets(since: datetime, head: datetime) -> list[tuple[datetime, datetime]]:
+    """Корзины закрытой части [since, head) по возрастанию.
+
+    Целые часы UTC — корзинами по часу, минуты неполных часов по краям —
+    корзинами по минуте. Границы since и head — начала минут.
+    """
+    first_hour = since.replace(minute=0) + HOUR if since.minute else since
+    last_hour = head.replace(minute=0)
+    if first_hour >= last_hour:
+        return _buckets(since, head, MINUTE)
+    return (
+        _buckets(since, first_hour, MINUTE)
+        + _buckets(first_hour, last_hour, HOUR)
+        + _buckets(last_hour, head, MINUTE)
+    )
+
+
+def _buckets(start: datetime, end: datetime, step: timedelta) -> list[tuple[datetime, datetime]]:
+    """Корзины [lower, lower + step) от start до end."""
+    return [
+        (start + step * index, start + step * (index + 1)) for index in range((end - start) // step)
+    ]
+
+
+ANALYTICS_CACHE = ResponseCache(SETTINGS.ANALYTICS_CACHE_MAX_MB * 1024 * 1024)
+REGISTRY.add_hook(ANALYTICS_CACHE.collect_metrics)
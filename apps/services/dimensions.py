@@ -0,0 +1,213 @@
+"""Справочники URI, referrer и user agent для записи логов.
+
+Длинные строки хранятся в таблице логов не на каждой строке, а один раз
+в справочнике (apps/api/v1/models/dimension_models.py); в строке лежит
+целочисленный id. Перед COPY писатель заменяет значения пачки на id:
+известные берутся из LRU-кеша процесса, промахи всей пачки ищутся одним
+запросом на справочник, а отсутствующие в нём добавляются одним
+INSERT ... ON CONFLICT DO NOTHING.
+
+Справочник пополняется в отдельной транзакции до COPY, поэтому id в
+кеше не пропадают при откате пакета: в худшем случае в справочнике
+остаётся значение, на которое ещё нет строк.
+"""
+
+from collections import OrderedDict
+from collections.abc import Sequence
+from itertools import chain
+from typing import Any
+
+from asyncpg import Connection
+from sqlalchemy import Uuid
+from sqlalchemy import func
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from apps.api.v1.models.dimension_models import ReferrerModel
+from apps.api.v1.models.dimension_models import UriModel
+from apps.api.v1.models.dimension_models import UserAgentModel
+from apps.services.log_rows import COLUMN_INDEX
+from apps.services.log_rows import DIMENSION_COLUMNS
+from apps.services.log_rows import ColumnBatch
+from apps.settings import SETTINGS
+from apps.utils.metrics import Counter
+
+DIMENSION_MODELS = {'uri': UriModel, 'referrer': ReferrerModel, 'user_agent': UserAgentModel}
+RESOLVE_ATTEMPTS = 3
+
+DIMENSION_LOOKUPS = Counter(
+    'nginx_analyzer_dimension_lookups_total',
+    'Значения справочников, найденные в кеше (hit) или в БД (miss)',
+    ('dimension', 'result'),
+)
+
+
+class LruCache:
+    """Кеш значение -> id на max_size записей с вытеснением давно не нужных."""
+
+    __slots__ = ('_items', 'max_size')
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._items: OrderedDict[str, int] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def get(self, value: str) -> int | None:
+        """Id значения или None, если его нет в кеше."""
+        dimension_id = self._items.get(value)
+        if dimension_id is not None:
+            self._items.move_to_end(value)
+        return dimension_id
+
+    def put(self, value: str, dimension_id: int) -> None:
+        """Запоминает id значения, вытесняя самое давнее при переполнении."""
+        self._items[value] = dimension_id
+        self._items.move_to_end(value)
+        if len(self._items) > self.max_size:
+            self._items.popitem(last=False)
+
+
+class DimensionCache:
+    """id значений одного справочника: кеш и пакетный поиск промахов в БД."""
+
+    def __init__(self, column: str, max_size: int):
+        model = DIMENSION_MODELS[column]
+        target = f'{model.__table__.schema}.{model.__tablename__}'
+        self.column = column
+        self.cache = LruCache(max_size)
+        self.hits = 0
+        self.misses = 0
+        self._select_sql = (
+            f'SELECT dimension.value, dimension.id FROM {target} AS dimension '
+            'JOIN unnest($1::text[]) AS input(value) '
+            'ON dimension.value_hash = md5(input.value)::uuid'
+        )
+        # Порядок вставки одинаков у всех писателей, поэтому параллельные
+        # пакеты с одними и теми же новыми значениями не ловят deadlock.
+        self._insert_sql = (
+            f'INSERT INTO {target} (value) '
+            'SELECT value FROM unnest($1::text[]) AS input(value) ORDER BY md5(value) '
+            'ON CONFLICT (value_hash) DO NOTHING RETURNING value, id'
+        )
+
+    async def resolve(
+        self, connection: Connection, values: Sequence[str | None]
+    ) -> list[int | None]:
+        """Id для значений колонки пачки; None остаётся None.
+
+        Промахи кеша ищутся в справочнике, отсутствующие добавляются. Если
+        значение одновременно добавил другой писатель, вставка его
+        пропускает, и оно находится следующим поиском.
+
+        Raises:
+            LookupError: значение не удалось ни найти, ни добавить
+        """
+        cache = self.cache
+        resolved: dict[str | None, int | None] = {None: None}
+        missing = []
+        for value in set(values):
+            if value is None:
+                continue
+            dimension_id = cache.get(value)
+            if dimension_id is None:
+                missing.append(value)
+            else:
+                resolved[value] = dimension_id
+
+        self.hits += len(resolved) - 1
+        self.misses += len(missing)
+        DIMENSION_LOOKUPS.labels(self.column, 'hit').inc(len(resolved) - 1)
+        DIMENSION_LOOKUPS.labels(self.column, 'miss').inc(len(missing))
+
+        if missing:
+            for value, dimension_id in (await self._fetch(connection, missing)).items():
+                cache.put(value, dimension_id)
+                resolved[value] = dimension_id
+
+        return [resolved[value] for value in values]
+
+    async def _fetch(self, connection: Connection, values: list[str]) -> dict[str, int]:
+        """Id значений из справочника; отсутствующие добавляются."""
+        found: dict[str, int] = {}
+        for _ in range(RESOLVE_ATTEMPTS):
+            found.update(await connection.fetch(self._select_sql, values))
+            values = [value for value in values if value not in found]
+            if not values:
+                return found
+
+            found.update(await connection.fetch(self._insert_sql, values))
+            values = [value for value in values if value not in found]
+            if not values:
+                return found
+
+        raise LookupError(f'Не удалось получить id справочника {self.column}: {values[:3]}')
+
+
+class DimensionResolver:
+    """Кеши всех справочников; один на процесс записи, общий для его писателей.
+
+    Args:
+        max_size: размер кеша каждого справочника; по умолчанию DIMENSION_CACHE_SIZE
+    """
+
+    def __init__(self, max_size: int | None = None):
+        max_size = max_size or SETTINGS.DIMENSION_CACHE_SIZE
+        self.caches = {column: DimensionCache(column, max_size) for column in DIMENSION_MODELS}
+
+    def stats(self) -> dict[str, dict[str, int]]:
+        """Попадания, промахи и размер кеша по справочникам."""
+        return {
+            column: {'hits': cache.hits, 'misses': cache.misses, 'cached': len(cache.cache)}
+            for column, cache in self.caches.items()
+        }
+
+    async def resolve(
+        self, connection: Connection, batches: Sequence[ColumnBatch]
+    ) -> list[ColumnBatch]:
+        """Пачки в колонках таблицы: значения справочников заменены на id.
+
+        Значения всех пачек разрешаются вместе, одним запросом на справочник.
+        """
+        lengths = [len(batch) for batch in batches]
+        resolved = [list(batch.columns) for batch in batches]
+        for column, cache in self.caches.items():
+            index = COLUMN_INDEX[column]
+            ids = await cache.resolve(
+                connection, list(chain.from_iterable(batch.columns[index] for batch in batches))
+            )
+            start = 0
+            for columns, length in zip(resolved, lengths, strict=True):
+                columns[index] = ids[start : start + length]
+                start += length
+
+        return [
+            ColumnBatch(columns, length) for columns, length in zip(resolved, lengths, strict=True)
+        ]
+
+
+async def resolve_dimensions(db: AsyncSession, record: dict[str, Any]) -> dict[str, Any]:
+    """Запись лога для LogEntryModel: значения справочников заменены на id.
+
+    Для одиночных вставок через ORM; пакетная запись идёт через
+    DimensionResolver.
+    """
+    record = dict(record)
+    for column, id_column in DIMENSION_COLUMNS.items():
+        value = record.pop(column, None)
+        if value is None:
+            record[id_column] = None
+            continue
+
+        model = DIMENSION_MODELS[column]
+        await db.execute(
+            insert(model).values(value=value).on_conflict_do_nothing(index_elements=['value_hash'])
+        )
+        columns = model.__table__.c
+        result = await db.execute(
+            select(columns.id).where(columns.value_hash == func.md5(value).cast(Uuid))
+        )
+        record[id_column] = result.scalar_one()
+    return record
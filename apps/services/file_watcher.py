@@ -0,0 +1,189 @@
+import asyncio
+import ctypes
+import ctypes.util
+import os
+import struct
+import sys
+
+from pathlib import Path
+from typing import Protocol
+
+from loguru import logger
+
+from apps.settings import SETTINGS
+
+POLL_INTERVAL_SECONDS = 1
+
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+FILE_EVENTS_MASK = IN_MODIFY | IN_ATTRIB | IN_MOVE_SELF | IN_DELETE_SELF
+DIR_EVENTS_MASK = IN_CREATE | IN_MOVED_TO
+
+EVENT_HEADER = struct.Struct('iIII')
+READ_BUFFER_SIZE = 64 * 1024
+
+
+class FileWatcher(Protocol):
+    """Ожидание изменений файла логов."""
+
+    async def wait(self) -> None:
+        """Возвращает управление, когда в файле могли появиться новые данные."""
+
+    def close(self) -> None:
+        """Освобождает ресурсы наблюдателя."""
+
+
+class PollingFileWatcher:
+    """Наблюдатель опросом: просыпается раз в interval секунд."""
+
+    def __init__(self, path: Path, interval: float = POLL_INTERVAL_SECONDS):
+        self.path = path
+        self.interval = interval
+
+    async def wait(self) -> None:
+        """Ждёт следующего тика опроса."""
+        await asyncio.sleep(self.interval)
+
+    def close(self) -> None:
+        """Ресурсов нет, закрывать нечего."""
+
+
+class InotifyFileWatcher:
+    """Наблюдатель на inotify (Linux) через ctypes, без сторонних зависимостей.
+
+    Следит за самим файлом (запись, переименование, удаление) и за его
+    каталогом (появление файла с тем же именем после ротации). После
+    ротации наблюдение за старым файлом остаётся, пока в новый никто не
+    пишет: nginx пишет в старый, пока не переоткроет лог, и эти записи
+    тоже нужно дочитать. Первая запись в новый файл значит, что nginx
+    переоткрыл лог, и наблюдения за старыми файлами снимаются; сверх
+    одного предыдущего файла они не копятся в любом случае. Дескриптор
+    inotify регистрируется в event loop через add_reader, поэтому пока файл
+    не меняется, наблюдатель не просыпается вовсе, а дописанная строка
+    будит его сразу, без ожидания тика опроса.
+
+    Если очередь событий ядра переполнилась (IN_Q_OVERFLOW), часть событий
+    потеряна: файл считается изменившимся, а наблюдение за путём
+    ставится заново — вдруг пропущено появление нового файла.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        self._fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+
+        self._changed = asyncio.Event()
+        # Наблюдения за файлами по пути path от старых к текущему.
+        self._file_wds: list[int] = []
+
+        try:
+            self._dir_wd = self._add_watch(self.path.parent, DIR_EVENTS_MASK)
+            self._watch_file()
+        except OSError:
+            os.close(self._fd)
+            raise
+
+        self._loop = asyncio.get_running_loop()
+        self._loop.add_reader(self._fd, self._on_readable)
+
+    def _add_watch(self, path: Path, mask: int) -> int:
+        wd = self._libc.inotify_add_watch(self._fd, os.fsencode(path), mask)
+        if wd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno), str(path))
+        return wd
+
+    def _watch_file(self) -> None:
+        """Ставит наблюдение на файл, который сейчас лежит по пути path.
+
+        Наблюдения за файлами старше предыдущего снимаются.
+        """
+        try:
+            wd = self._add_watch(self.path, FILE_EVENTS_MASK)
+        except FileNotFoundError:
+            logger.debug(f'Файл {self.path} пока не создан, ждём события каталога')
+            return
+
+        if wd in self._file_wds:
+            return
+        self._file_wds.append(wd)
+        for old_wd in self._file_wds[:-2]:
+            self._remove_watch(old_wd)
+
+    def _remove_watch(self, wd: int) -> None:
+        """Снимает наблюдение за файлом; уже снятое ядром пропускается."""
+        self._file_wds.remove(wd)
+        self._libc.inotify_rm_watch(self._fd, wd)
+
+    def _on_readable(self) -> None:
+        """Вычитывает события и будит ожидающего, если они касаются нашего файла."""
+        try:
+            data = os.read(self._fd, READ_BUFFER_SIZE)
+        except BlockingIOError:
+            return
+
+        relevant = False
+        offset = 0
+        while offset < len(data):
+            wd, mask, _cookie, name_length = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            name = data[offset : offset + name_length].rstrip(b'\0')
+            offset += name_length
+
+            if mask & IN_Q_OVERFLOW:
+                logger.warning(f'Очередь событий inotify переполнена, перечитываем {self.path}')
+                self._watch_file()
+                relevant = True
+            elif wd == self._dir_wd:
+                if name == os.fsencode(self.path.name):
+                    self._watch_file()
+                    relevant = True
+            elif wd in self._file_wds:
+                relevant = True
+                if mask & IN_IGNORED:
+                    self._file_wds.remove(wd)
+                elif mask & IN_MODIFY and wd == self._file_wds[-1]:
+                    for old_wd in self._file_wds[:-1]:
+                        self._remove_watch(old_wd)
+
+        if relevant:
+            self._changed.set()
+
+    async def wait(self) -> None:
+        """Ждёт события по файлу; на простое не тратит ни одного пробуждения."""
+        await self._changed.wait()
+        self._changed.clear()
+
+    def close(self) -> None:
+        """Снимает дескриптор с event loop и закрывает его."""
+        if self._fd < 0:
+            return
+
+        self._loop.remove_reader(self._fd)
+        os.close(self._fd)
+        self._fd = -1
+
+
+def create_file_watcher(path: Path) -> FileWatcher:
+    """Выбирает наблюдатель: inotify на Linux, опрос по таймеру в остальных случаях.
+
+    Должна вызываться из работающего event loop.
+    """
+    if SETTINGS.MONITOR_USE_INOTIFY and sys.platform.startswith('linux'):
+        try:
+            return InotifyFileWatcher(path)
+        except (OSError, AttributeError):
+            logger.exception(f'inotify недоступен для {path}, переходим на опрос')
+
+    return PollingFileWatcher(path)
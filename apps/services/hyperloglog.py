@@ -0,0 +1,163 @@
+"""HyperLogLog: оценка числа различных значений по скетчу фиксированного размера.
+
+Скетч — REGISTERS регистров, в каждом максимальный ранг (позиция первой
+единицы) хешей попавших в него значений. Стандартная ошибка оценки —
+1.04 / sqrt(REGISTERS), при PRECISION = 14 около 0.8%: для 100 тысяч
+различных IP оценка почти всегда в пределах ±2%. Скетчи объединяются
+без потерь — объединение двух скетчей равно скетчу объединения их
+значений, — поэтому скетчи по минутам складываются в скетч любого окна.
+
+Регистры хранятся не массивом, а слоями: слой r — битовая маска
+регистров со значением не меньше r в одном int. Объединение скетчей —
+OR слоёв, а оценке нужны только числа единиц в слоях (int.bit_count):
+то и другое идёт в C, и слияние сотен скетчей без NumPy занимает
+миллисекунды. Оценка — улучшенный estimator Ertl (arXiv:1702.01284),
+которому не нужны эмпирические поправки смещения на малых значениях.
+"""
+
+import math
+import zlib
+
+from collections.abc import Iterable
+from hashlib import blake2b
+
+PRECISION = 14
+REGISTERS = 1 << PRECISION
+HASH_BITS = 64
+RANK_BITS = HASH_BITS - PRECISION
+RANK_MASK = (1 << RANK_BITS) - 1
+LAYER_BYTES = REGISTERS // 8
+FORMAT_VERSION = 1
+# Регистры -> слой r: байт регистра становится символом '1', если его
+# значение не меньше r, и '0' иначе; строка из '0' и '1' разбирается int(..., 2).
+LAYER_TABLES = [
+    bytes(ord('1') if value >= rank else ord('0') for value in range(256))
+    for rank in range(RANK_BITS + 2)
+]
+ALPHA = 1 / (2 * math.log(2))
+
+
+def value_hash(value: str) -> int:
+    """64-битный хеш значения, одинаковый во всех процессах."""
+    return int.from_bytes(blake2b(value.encode(), digest_size=8).digest())
+
+
+def _sigma(x: float) -> float:
+    """Поправка на пустые регистры из estimator Ertl."""
+    if x == 1:
+        return math.inf
+    y = 1.0
+    z = x
+    while True:
+        x *= x
+        previous = z
+        z += x * y
+        y += y
+        if z == previous:
+            return z
+
+
+def _tau(x: float) -> float:
+    """Поправка на регистры с максимальным значением из estimator Ertl."""
+    if x in (0, 1):
+        return 0.0
+    y = 1.0
+    z = 1 - x
+    while True:
+        x = math.sqrt(x)
+        previous = z
+        y *= 0.5
+        z -= (1 - x) ** 2 * y
+        if z == previous:
+            return z / 3
+
+
+class HyperLogLog:
+    """Скетч HyperLogLog на REGISTERS регистров.
+
+    Args:
+        layers: слои регистров; layers[r - 1] — маска регистров со значением >= r
+    """
+
+    __slots__ = ('layers',)
+
+    def __init__(self, layers: list[int] | None = None):
+        self.layers = layers or []
+
+    @classmethod
+    def from_values(cls, values: Iterable[str]) -> 'HyperLogLog':
+        """Скетч значений."""
+        registers = bytearray(REGISTERS)
+        for value in values:
+            hashed = value_hash(value)
+            index = hashed >> RANK_BITS
+            rank = RANK_BITS - (hashed & RANK_MASK).bit_length() + 1
+            if rank > registers[index]:
+                registers[index] = rank
+        return cls.from_registers(registers)
+
+    @classmethod
+    def from_registers(cls, registers: bytes | bytearray) -> 'HyperLogLog':
+        """Скетч по массиву из REGISTERS значений регистров."""
+        top = max(registers)
+        return cls([int(registers.translate(LAYER_TABLES[rank]), 2) for rank in range(1, top + 1)])
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> 'HyperLogLog':
+        """Скетч из to_bytes(); пустые данные — пустой скетч.
+
+        Raises:
+            ValueError: данные другого формата или другой точности
+        """
+        if not data:
+            return cls()
+        if data[:2] != bytes((FORMAT_VERSION, PRECISION)):
+            raise ValueError('Неизвестный формат скетча HyperLogLog')
+        packed = zlib.decompress(data[2:])
+        return cls(
+            [
+                int.from_bytes(packed[start : start + LAYER_BYTES])
+                for start in range(0, len(packed), LAYER_BYTES)
+            ]
+        )
+
+    def to_bytes(self) -> bytes:
+        """Скетч для хранения в bytea: версия, точность и сжатые слои."""
+        packed = b''.join(layer.to_bytes(LAYER_BYTES) for layer in self.layers)
+        return bytes((FORMAT_VERSION, PRECISION)) + zlib.compress(packed, 1)
+
+    def add(self, value: str) -> None:
+        """Добавляет одно значение."""
+        hashed = value_hash(value)
+        bit = 1 << (REGISTERS - 1 - (hashed >> RANK_BITS))
+        rank = RANK_BITS - (hashed & RANK_MASK).bit_length() + 1
+        if len(self.layers) < rank:
+            self.layers.extend([0] * (rank - len(self.layers)))
+        for layer in range(rank):
+            self.layers[layer] |= bit
+
+    def update(self, other: 'HyperLogLog') -> None:
+        """Объединяет с другим скетчем на месте."""
+        layers = self.layers
+        if len(layers) < len(other.layers):
+            layers.extend([0] * (len(other.layers) - len(layers)))
+        for index, layer in enumerate(other.layers):
+            layers[index] |= layer
+
+    def count(self) -> int:
+        """Оценка числа различных добавленных значений."""
+        if not self.layers:
+            return 0
+
+        filled = [layer.bit_count() for layer in self.layers] + [0]
+        # Число регистров со значением ровно k, k от 0 до RANK_BITS + 1.
+        counts = [REGISTERS - filled[0]] + [
+            filled[rank] - filled[rank + 1] for rank in range(len(self.layers))
+        ]
+        counts += [0] * (RANK_BITS + 2 - len(counts))
+
+        z = REGISTERS * _tau(1 - counts[RANK_BITS + 1] / REGISTERS)
+        for rank in range(RANK_BITS, 0, -1):
+            z = 0.5 * (z + counts[rank])
+        z += REGISTERS * _sigma(counts[0] / REGISTERS)
+        return round(ALPHA * REGISTERS * REGISTERS / z)
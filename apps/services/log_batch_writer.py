@@ -0,0 +1,366 @@
+import asyncio
+import contextlib
+import time
+
+from collections.abc import Callable
+from itertools import chain
+from types import TracebackType
+from typing import Any
+
+from asyncpg import InterfaceError as AsyncpgInterfaceError
+from asyncpg import PostgresConnectionError
+from loguru import logger
+from sqlalchemy.exc import InterfaceError
+from sqlalchemy.exc import OperationalError
+
+from apps.api.v1.models.log_entry_model import LogEntryModel
+from apps.db.session import PGEngineConnector
+from apps.db.session import connector
+from apps.services.dimensions import DimensionResolver
+from apps.services.log_rows import LOG_ENTRY_COLUMNS
+from apps.services.log_rows import TABLE_COLUMNS
+from apps.services.log_rows import ColumnBatch
+from apps.services.log_rows import RowPart
+from apps.services.log_rows import has_source_keys
+from apps.services.log_rows import record_to_row
+from apps.services.parse_failures import DB_REJECTED
+from apps.services.parse_failures import DeadLetterFile
+from apps.services.parse_failures import sampled_warning
+from apps.services.rollups import add_to_rollups
+from apps.services.rollups import add_to_sketches
+from apps.services.rollups import batch_sketches
+from apps.services.rollups import with_rollups
+from apps.settings import SETTINGS
+from apps.utils.metrics import Counter
+from apps.utils.metrics import Histogram
+
+STAGING_TABLE = 'log_entry_staging'
+
+RETRY_BACKOFF_SECONDS = (0.5, 1, 2, 5, 10, 30)
+RETRYABLE_ERRORS = (
+    OSError,
+    TimeoutError,
+    OperationalError,
+    InterfaceError,
+    PostgresConnectionError,
+    AsyncpgInterfaceError,
+)
+
+ROWS_WRITTEN = Counter('nginx_analyzer_rows_written_total', 'Строк лога записано в БД')
+ROWS_FAILED = Counter('nginx_analyzer_rows_failed_total', 'Строк лога отброшено базой')
+ROWS_DUPLICATE = Counter(
+    'nginx_analyzer_rows_duplicate_total', 'Повторно прочитанных строк лога, уже бывших в БД'
+)
+BATCH_WRITE_SECONDS = Histogram(
+    'nginx_analyzer_batch_write_seconds',
+    'Время записи одного пакета COPY',
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
+
+
+def _staging_sql() -> tuple[str, str]:
+    """DDL временной таблицы пакета и INSERT из неё в таблицу логов и сводки."""
+    target = f'{LogEntryModel.__table__.schema}.{LogEntryModel.__tablename__}'
+    columns = ', '.join(f'"{column}"' for column in TABLE_COLUMNS)
+    create = (
+        f'CREATE TEMP TABLE IF NOT EXISTS {STAGING_TABLE} ON COMMIT DELETE ROWS '
+        f'AS SELECT {columns} FROM {target} WITH NO DATA'
+    )
+    merge = with_rollups(
+        f'INSERT INTO {target} ({columns}) SELECT {columns} FROM {STAGING_TABLE} '
+        'ON CONFLICT (server_id, source_key, timestamp) DO NOTHING'
+    )
+    return create, merge
+
+
+CREATE_STAGING_SQL, MERGE_STAGING_SQL = _staging_sql()
+
+
+class LogBatchWriter:
+    """Пакетная запись разобранных строк лога в PostgreSQL.
+
+    Копит записи в буфере и сбрасывает их одним COPY в одной транзакции,
+    когда буфер дорос до batch_size или самая старая запись в нём ждёт
+    дольше flush_interval секунд.
+
+    Если БД недоступна, пакет повторяется с нарастающей паузой, и add()
+    на это время блокируется — так недоступность базы превращается в
+    обратное давление на читателя, а не в потерю строк. Пакет, который
+    база отвергла по содержимому (например, нарушен внешний ключ или
+    значение длиннее колонки), делится пополам, и половины пишутся
+    отдельно, пока отвергнутой не останется одна строка: теряются только
+    такие строки. Они учитываются в failed_rows, пишутся в dead-letter
+    файл с причиной DB_REJECTED и передаются в on_reject вместе с ошибкой.
+
+    Пакет, в котором у строк есть source_key, пишется через COPY во
+    временную таблицу и INSERT ... ON CONFLICT DO NOTHING из неё: строки,
+    уже записанные раньше (повторное чтение после падения, повторный
+    импорт), пропускаются и учитываются в duplicate_rows. Пакет без
+    ключей идёт прямым COPY.
+
+    В той же транзакции пополняются минутные сводки аналитики
+    (apps/services/rollups.py): у пакета с ключами — тем же запросом и
+    только добавленными строками, у пакета без ключей — отдельным
+    upsert'ом, посчитанным по колонкам пачки. Минутные скетчи unique_ips
+    и топов считаются по колонкам пачки; если часть строк пакета с
+    ключами оказалась повтором, скетчи его минут пересчитываются по
+    таблице.
+
+    URI, referrer и user agent перед COPY заменяются на id справочников
+    (apps/services/dimensions.py). Писатели одного конвейера делят один
+    DimensionResolver, чтобы кеш id был общим.
+
+    Через mark() в поток записей можно вставить метку; после того как все
+    добавленные до неё записи записаны (или отброшены), метка передаётся
+    в on_flush. По меткам конвейер понимает, до какого места файла
+    данные уже в БД.
+
+    async with LogBatchWriter() as writer:
+        await writer.add(log_data)
+    """
+
+    def __init__(
+        self,
+        batch_size: int | None = None,
+        flush_interval: float | None = None,
+        db_connector: PGEngineConnector = connector,
+        on_flush: Callable[[list[Any]], None] | None = None,
+        dimensions: DimensionResolver | None = None,
+        dead_letter: DeadLetterFile | None = None,
+        on_reject: Callable[[dict[str, Any], Exception], None] | None = None,
+    ):
+        self.batch_size = batch_size or SETTINGS.MONITOR_BATCH_SIZE
+        self.flush_interval = (
+            flush_interval
+            if flush_interval is not None
+            else SETTINGS.MONITOR_FLUSH_INTERVAL_MS / 1000
+        )
+        self.connector = db_connector
+        self.on_flush = on_flush
+        self.dimensions = dimensions or DimensionResolver()
+        self.dead_letter = dead_letter
+        self.on_reject = on_reject
+        self.written_rows = 0
+        self.failed_rows = 0
+        self.duplicate_rows = 0
+
+        self._buffer: list[RowPart] = []
+        self._pending = 0
+        self._markers: list[Any] = []
+        self._batch_started_at: float | None = None
+        self._has_data = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._flusher: asyncio.Task | None = None
+
+    async def __aenter__(self) -> 'LogBatchWriter':
+        self._flusher = asyncio.create_task(self._flush_periodically())
+        return self
+
+    async def __aexit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc: BaseException | None,
+        tb: TracebackType | None,
+    ) -> None:
+        if self._flusher:
+            self._flusher.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._flusher
+            self._flusher = None
+
+        await self.flush()
+
+    @property
+    def pending_rows(self) -> int:
+        """Количество записей, ожидающих сброса в БД."""
+        return self._pending
+
+    async def add(self, log_data: dict) -> None:
+        """Добавляет разобранную строку в буфер, при переполнении сбрасывает пакет."""
+        await self.add_rows([record_to_row(log_data)])
+
+    async def add_rows(self, rows: ColumnBatch | list[tuple]) -> None:
+        """Добавляет готовые строки, при переполнении сбрасывает пакет.
+
+        Args:
+            rows: пачка разбора (ColumnBatch) или список строк record_to_row;
+                пачка не копируется, а пишется в COPY как есть
+        """
+        if not rows:
+            return
+
+        if not self._buffer:
+            self._batch_started_at = time.monotonic()
+            self._has_data.set()
+
+        self._buffer.append(rows)
+        self._pending += len(rows)
+
+        if self._pending >= self.batch_size:
+            await self.flush()
+
+    def mark(self, marker: Any) -> None:
+        """Ставит метку после уже добавленных записей."""
+        if self._buffer:
+            self._markers.append(marker)
+        elif self.on_flush:
+            self.on_flush([marker])
+
+    async def flush(self) -> int:
+        """Сбрасывает накопленный буфер в БД.
+
+        Returns:
+            int: количество записанных строк
+        """
+        async with self._flush_lock:
+            if not self._buffer:
+                return 0
+
+            batch = self._buffer
+            size = self._pending
+            markers = self._markers
+            self._buffer = []
+            self._pending = 0
+            self._markers = []
+            self._batch_started_at = None
+            self._has_data.clear()
+
+            written = await self._write_with_retry(batch, size)
+
+            if self.on_flush and markers:
+                self.on_flush(markers)
+
+            return written
+
+    async def _write_with_retry(self, batch: list[RowPart], size: int) -> int:
+        """Пишет пакет из частей с size строками, повторяя попытки, пока БД недоступна.
+
+        Отвергнутый базой пакет пишется по половинам (_write_halves).
+        """
+        attempt = 0
+        while True:
+            started = time.perf_counter()
+            try:
+                written = await self._copy_records(batch)
+            except RETRYABLE_ERRORS:
+                delay = RETRY_BACKOFF_SECONDS[min(attempt, len(RETRY_BACKOFF_SECONDS) - 1)]
+                attempt += 1
+                logger.exception(f'БД недоступна, повтор записи пакета через {delay} с')
+                await asyncio.sleep(delay)
+                continue
+            except Exception as error:
+                return await self._write_halves(batch, size, error)
+
+            BATCH_WRITE_SECONDS.observe(time.perf_counter() - started)
+            duplicates = size - written
+            self.written_rows += written
+            self.duplicate_rows += duplicates
+            ROWS_WRITTEN.inc(written)
+            ROWS_DUPLICATE.inc(duplicates)
+            logger.debug('Записан пакет логов: {} строк, повторов {}', written, duplicates)
+            return written
+
+    async def _write_halves(self, batch: list[RowPart], size: int, error: Exception) -> int:
+        """Пишет отвергнутый базой пакет по половинам; одиночную строку отбрасывает.
+
+        Строка с ошибкой находится за log2(size) делений, остальные строки
+        пакета записываются.
+        """
+        rows = [row for part in batch for row in part]
+        if size == 1:
+            self._reject(rows[0], error)
+            return 0
+
+        logger.debug(f'Пакет из {size} строк отвергнут ({error!r}), запись по половинам')
+        middle = size // 2
+        written = await self._write_with_retry([rows[:middle]], middle)
+        return written + await self._write_with_retry([rows[middle:]], size - middle)
+
+    def _reject(self, row: tuple, error: Exception) -> None:
+        """Учитывает строку, отвергнутую базой, и пишет её в dead-letter файл.
+
+        Исходной строки лога у писателя нет, поэтому в записи вместо line
+        лежат значения колонок (row): повторно импортировать её нельзя,
+        но видно, какое значение не подошло.
+        """
+        values = dict(zip(LOG_ENTRY_COLUMNS, row, strict=True))
+        self.failed_rows += 1
+        ROWS_FAILED.inc()
+        sampled_warning.warn(DB_REJECTED, f'Строка лога отвергнута базой ({error!r}): {values}')
+        if self.on_reject:
+            self.on_reject(values, error)
+        if self.dead_letter is not None:
+            self.dead_letter.write(
+                [
+                    {
+                        'file': None,
+                        'offset': None,
+                        'server_id': values['server_id'],
+                        'reason': DB_REJECTED,
+                        'line': None,
+                        'error': repr(error),
+                        'row': values,
+                    }
+                ]
+            )
+
+    async def _copy_records(self, batch: list[RowPart]) -> int:
+        """Пишет пакет из частей через asyncpg COPY в одной транзакции.
+
+        id справочников для пакета получаются до неё, вне транзакции.
+
+        Returns:
+            int: сколько строк пакета добавлено в таблицу
+        """
+        engine = self.connector.get_pg_engine(sql_alchemy_uri=self.connector.sql_alchemy_uri)
+        keyed = has_source_keys(batch)
+        parts = [
+            part if isinstance(part, ColumnBatch) else ColumnBatch.from_rows(part) for part in batch
+        ]
+
+        async with engine.connect() as conn:
+            raw_connection = await conn.get_raw_connection()
+            driver_connection = raw_connection.driver_connection
+            stored = await self.dimensions.resolve(driver_connection, parts)
+
+            async with driver_connection.transaction():
+                if not keyed:
+                    await driver_connection.copy_records_to_table(
+                        LogEntryModel.__tablename__,
+                        schema_name=LogEntryModel.__table__.schema,
+                        columns=TABLE_COLUMNS,
+                        records=chain.from_iterable(stored),
+                    )
+                    await add_to_rollups(driver_connection, stored)
+                    written = sum(map(len, stored))
+                else:
+                    await driver_connection.execute(CREATE_STAGING_SQL)
+                    await driver_connection.copy_records_to_table(
+                        STAGING_TABLE,
+                        columns=TABLE_COLUMNS,
+                        records=chain.from_iterable(stored),
+                    )
+                    written = await driver_connection.fetchval(MERGE_STAGING_SQL)
+                await add_to_sketches(
+                    driver_connection,
+                    batch_sketches(parts),
+                    duplicates=written < sum(map(len, parts)),
+                )
+                return written
+
+    async def _flush_periodically(self) -> None:
+        """Сбрасывает пакет, как только его возраст достигает flush_interval."""
+        while True:
+            await self._has_data.wait()
+
+            started_at = self._batch_started_at
+            if started_at is None:
+                self._has_data.clear()
+                continue
+
+            delay = started_at + self.flush_interval - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+            if self._batch_started_at == started_at:
+                await self.flush()
@@ -0,0 +1,233 @@
+"""Разбор строк лога по директиве log_format nginx.
+
+Строка формата компилируется один раз: литералы между переменными
+становятся разделителями регулярного выражения, каждой переменной
+соответствует позиционная группа и заранее выбранный обработчик.
+Известные переменные раскладываются по типизированным колонкам
+LogEntryModel, остальные попадают в extra. Скомпилированные парсеры
+кешируются по строке формата, поэтому сколько бы файлов ни писались в
+одном формате, разбор формата выполняется один раз.
+"""
+
+import re
+
+from collections.abc import Callable
+from datetime import UTC
+from datetime import datetime
+from functools import lru_cache
+from typing import Any
+
+from apps.services.nginx_timestamp import parse_nginx_timestamp
+
+LOG_FORMAT_CACHE_SIZE = 64
+
+COMBINED_FORMAT = (
+    '$remote_addr - $remote_user [$time_local] "$request" '
+    '$status $body_bytes_sent "$http_referer" "$http_user_agent"'
+)
+MAIN_FORMAT = f'{COMBINED_FORMAT} "$http_x_forwarded_for"'
+LOG_FORMAT_PRESETS = {
+    'combined': COMBINED_FORMAT,
+    'main': MAIN_FORMAT,
+}
+
+EMPTY_VALUE = '-'
+REQUIRED_COLUMNS = ('timestamp', 'remote_addr', 'method', 'uri', 'http_version', 'status', 'size')
+
+VARIABLE_PATTERN = re.compile(r'\$(?:\{(\w+)\}|(\w+))')
+DIRECTIVE_PATTERN = re.compile(r'\s*log_format\s+\S+\s+(?:escape=\S+\s+)?(?P<body>.*?);?\s*$', re.S)
+QUOTED_PATTERN = re.compile(r"'([^']*)'|\"([^\"]*)\"")
+
+DIGIT_VARIABLES = frozenset(
+    ('status', 'body_bytes_sent', 'bytes_sent', 'request_length', 'connection', 'pid')
+)
+
+Setter = Callable[[dict[str, Any], str], None]
+
+
+def _text(value: str) -> str | None:
+    return None if value == EMPTY_VALUE else value
+
+
+def _seconds(value: str) -> float | None:
+    return None if value == EMPTY_VALUE else float(value)
+
+
+def _upstream_seconds(value: str) -> float | None:
+    """Суммарное время ответа апстримов.
+
+    При повторах nginx перечисляет времена через запятую, при внутренних
+    перенаправлениях — через двоеточие; недоступный апстрим даёт '-'.
+    """
+    total = None
+    for part in value.replace(':', ',').split(','):
+        part = part.strip()
+        if part and part != EMPTY_VALUE:
+            total = (total or 0.0) + float(part)
+    return total
+
+
+def _msec(value: str) -> datetime:
+    return datetime.fromtimestamp(float(value), UTC)
+
+
+def _iso8601(value: str) -> datetime:
+    parsed = datetime.fromisoformat(value)
+    if parsed.tzinfo is None:
+        raise ValueError(f'Время без часового пояса: {value}')
+    return parsed
+
+
+def _column(column: str, convert: Callable[[str], Any]) -> Setter:
+    def setter(record: dict[str, Any], value: str) -> None:
+        record[column] = convert(value)
+
+    return setter
+
+
+def _set_request(record: dict[str, Any], value: str) -> None:
+    method, uri, http_version = value.split(' ', 2)
+    if not method or not uri or not http_version:
+        raise ValueError(f'Некорректная строка запроса: {value}')
+    record['method'] = method
+    record['uri'] = uri
+    record['http_version'] = http_version
+
+
+KNOWN_VARIABLES: dict[str, tuple[tuple[str, ...], Setter]] = {
+    'remote_addr': (('remote_addr',), _column('remote_addr', str)),
+    'time_local': (('timestamp',), _column('timestamp', parse_nginx_timestamp)),
+    'time_iso8601': (('timestamp',), _column('timestamp', _iso8601)),
+    'msec': (('timestamp',), _column('timestamp', _msec)),
+    'request': (('method', 'uri', 'http_version'), _set_request),
+    'request_method': (('method',), _column('method', str)),
+    'request_uri': (('uri',), _column('uri', str)),
+    'server_protocol': (('http_version',), _column('http_version', str)),
+    'status': (('status',), _column('status', int)),
+    'body_bytes_sent': (('size',), _column('size', int)),
+    'http_referer': (('referrer',), _column('referrer', _text)),
+    'http_user_agent': (('user_agent',), _column('user_agent', _text)),
+    'request_time': (('request_time',), _column('request_time', _seconds)),
+    'upstream_response_time': (
+        ('upstream_response_time',),
+        _column('upstream_response_time', _upstream_seconds),
+    ),
+    'host': (('host',), _column('host', _text)),
+    'request_id': (('request_id',), _column('request_id', _text)),
+}
+
+
+def unwrap_log_format(log_format: str) -> str:
+    """Строка формата из директивы nginx.conf или сама строка формата.
+
+    Директиву можно вставить как есть, например
+    ``log_format main '$remote_addr ...' '"$http_user_agent"';`` —
+    части в кавычках склеиваются, как это делает nginx.
+    """
+    directive = DIRECTIVE_PATTERN.fullmatch(log_format)
+    if directive is None:
+        return log_format
+
+    parts = QUOTED_PATTERN.findall(directive['body'])
+    if not parts:
+        return directive['body']
+    return ''.join(single or double for single, double in parts)
+
+
+class LogFormatParser:
+    """Парсер строк лога, скомпилированный из строки log_format."""
+
+    def __init__(self, log_format: str):
+        self.log_format = log_format
+        self.variables: list[str] = []
+
+        pattern_parts: list[str] = []
+        position = 0
+        matches = list(VARIABLE_PATTERN.finditer(log_format))
+        for index, match in enumerate(matches):
+            pattern_parts.append(re.escape(log_format[position : match.start()]))
+            position = match.end()
+
+            variable = match[1] or match[2]
+            following = (
+                log_format[position : matches[index + 1].start()]
+                if index + 1 < len(matches)
+                else log_format[position:]
+            )
+            if index + 1 < len(matches) and not following:
+                raise ValueError(
+                    f'Переменные ${variable} и ${matches[index + 1][0]} не разделены в log_format'
+                )
+
+            self.variables.append(variable)
+            pattern_parts.append(self._group_pattern(variable, following))
+
+        pattern_parts.append(re.escape(log_format[position:]))
+        self.pattern = re.compile(''.join(pattern_parts))
+
+        self.columns: set[str] = set()
+        self._known: list[tuple[int, Setter]] = []
+        self._extra: list[tuple[int, str]] = []
+        for index, variable in enumerate(self.variables):
+            known = KNOWN_VARIABLES.get(variable)
+            if known is None:
+                self._extra.append((index, variable))
+                continue
+            columns, setter = known
+            self._known.append((index, setter))
+            self.columns.update(columns)
+
+        missing = [column for column in REQUIRED_COLUMNS if column not in self.columns]
+        if missing:
+            raise ValueError(f'В log_format нет переменных для колонок: {", ".join(missing)}')
+
+    @staticmethod
+    def _group_pattern(variable: str, following: str) -> str:
+        """Группа для переменной: цифры или всё до первого символа-разделителя."""
+        if variable in DIGIT_VARIABLES:
+            return r'(\d+)'
+        if not following:
+            return '(.*)'
+        return f'([^{re.escape(following[0])}]*)'
+
+    def parse(self, line: str) -> dict[str, Any] | None:
+        """Разбирает строку лога.
+
+        Returns:
+            словарь колонок LogEntryModel (без server_id) или None, если
+            строка не соответствует формату
+
+        Raises:
+            ValueError: строка по форме подходит, но значение переменной
+                некорректно (например, время)
+        """
+        match = self.pattern.match(line)
+        if match is None:
+            return None
+
+        values = match.groups()
+        record: dict[str, Any] = {}
+        for index, setter in self._known:
+            setter(record, values[index])
+
+        extra = {
+            variable: values[index]
+            for index, variable in self._extra
+            if values[index] != EMPTY_VALUE
+        }
+        record['extra'] = extra or None
+        return record
+
+
+@lru_cache(maxsize=LOG_FORMAT_CACHE_SIZE)
+def compile_log_format(log_format: str) -> LogFormatParser:
+    """Парсер для строки log_format, имени пресета или директивы nginx.conf.
+
+    Args:
+        log_format: 'combined', 'main', строка формата или директива целиком
+
+    Raises:
+        ValueError: формат не содержит обязательных переменных или
+            переменные в нём не разделены литералами
+    """
+    return LogFormatParser(unwrap_log_format(LOG_FORMAT_PRESETS.get(log_format, log_format)))
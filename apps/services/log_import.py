@@ -0,0 +1,607 @@
+"""Импорт исторических логов nginx на всех ядрах.
+
+Несжатый файл режется на куски по IMPORT_CHUNK_MB с границами,
+выровненными по переводу строки, и каждый процесс пула сам читает свой
+кусок. Сжатые файлы (.gz, .zst) последовательно распаковываются потоком
+в основном процессе, и в пул уходят уже распакованные блоки целых строк.
+
+Процессы пула не только разбирают строки, но и сразу кодируют их в
+текстовый формат COPY, поэтому основному процессу остаётся только
+передать готовые байты в PostgreSQL. Данные идут во временную таблицу
+со значениями URI, referrer и user agent, а в таблицу логов — одним
+INSERT ... SELECT, который заменяет значения на id справочников: у
+процессов пула нет доступа к кешу id, и справочники пополняются на
+стороне базы. Скетчи unique_ips и топов процессы пула строят сами, по
+минутам своего куска, и писатель только объединяет их с сохранёнными
+(apps/services/rollups.py).
+"""
+
+import asyncio
+import gzip
+import io
+import os
+import time
+import uuid
+
+from collections.abc import AsyncGenerator
+from collections.abc import Awaitable
+from collections.abc import Callable
+from collections.abc import Iterator
+from collections.abc import Sequence
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from functools import partial
+from pathlib import Path
+from typing import IO
+from typing import Any
+from typing import TypeVar
+from typing import cast
+
+import orjson
+
+from loguru import logger
+
+from apps.api.v1.models.log_entry_model import LogEntryModel
+from apps.db.session import PGEngineConnector
+from apps.db.session import connector
+from apps.services.dimensions import DIMENSION_MODELS
+from apps.services.log_batch_writer import RETRY_BACKOFF_SECONDS
+from apps.services.log_batch_writer import RETRYABLE_ERRORS
+from apps.services.log_rows import DIMENSION_COLUMNS
+from apps.services.log_rows import LOG_ENTRY_COLUMNS
+from apps.services.log_rows import TABLE_COLUMNS
+from apps.services.nginx_log_parser import NginxLogParser
+from apps.services.parse_failures import DB_REJECTED
+from apps.services.parse_failures import sampled_warning
+from apps.services.rollups import add_to_sketches
+from apps.services.rollups import rebuild_sketches
+from apps.services.rollups import with_rollups
+from apps.services.sketches import BucketSketches
+from apps.services.sketches import SketchKey
+from apps.services.sketches import bucket_sketches
+from apps.services.source_key import file_identity
+from apps.services.source_key import source_key
+from apps.services.source_key import split_lines
+from apps.services.tail_checkpoint import first_line_fingerprint
+from apps.services.tail_checkpoint import head_fingerprint
+from apps.settings import SETTINGS
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+COPY_NULL = '\\N'
+COPY_ESCAPES = str.maketrans({'\\': '\\\\', '\t': '\\t', '\n': '\\n', '\r': '\\r', '\x00': ''})
+
+IMPORT_STAGING_TABLE = 'log_entry_import_staging'
+
+T = TypeVar('T')
+
+Sketches = dict[SketchKey, BucketSketches]
+ChunkResult = tuple[bytes, int, int, bool, Sketches]
+WriteItem = tuple[ChunkResult, int]
+
+_worker_parser: NginxLogParser | None = None
+
+
+def _encode_text(value: str | None) -> str:
+    if value is None:
+        return COPY_NULL
+    # Табуляция, переводы строк и NUL непечатаемы: в обычной строке
+    # экранировать нечего, и дорогой translate не нужен.
+    if value.isprintable() and '\\' not in value:
+        return value
+    return value.translate(COPY_ESCAPES)
+
+
+def _encode_number(value: float | None) -> str:
+    return COPY_NULL if value is None else str(value)
+
+
+def _encode_timestamp(value: datetime) -> str:
+    return value.isoformat()
+
+
+def _encode_json(value: dict | None) -> str:
+    return COPY_NULL if not value else orjson.dumps(value).decode().translate(COPY_ESCAPES)
+
+
+def _encode_uuid(value: uuid.UUID | None) -> str:
+    return COPY_NULL if value is None else str(value)
+
+
+COLUMN_ENCODERS: dict[str, Callable[[Any], str]] = {
+    'server_id': _encode_number,
+    'timestamp': _encode_timestamp,
+    'status': _encode_number,
+    'size': _encode_number,
+    'request_time': _encode_number,
+    'upstream_response_time': _encode_number,
+    'extra': _encode_json,
+    'source_key': _encode_uuid,
+}
+_ROW_ENCODERS = tuple(
+    (column, COLUMN_ENCODERS.get(column, _encode_text)) for column in LOG_ENTRY_COLUMNS
+)
+
+
+def _import_sql() -> tuple[str, list[str], str]:
+    """DDL временной таблицы импорта, пополнение справочников и INSERT из неё."""
+    target = f'{LogEntryModel.__table__.schema}.{LogEntryModel.__tablename__}'
+    staged = ', '.join(
+        f'NULL::text AS "{column}"' if column in DIMENSION_COLUMNS else f'"{column}"'
+        for column in LOG_ENTRY_COLUMNS
+    )
+    create = (
+        f'CREATE TEMP TABLE IF NOT EXISTS {IMPORT_STAGING_TABLE} ON COMMIT DELETE ROWS '
+        f'AS SELECT {staged} FROM {target} WITH NO DATA'
+    )
+
+    dimensions = []
+    selected = []
+    joins = []
+    for column in LOG_ENTRY_COLUMNS:
+        if column not in DIMENSION_COLUMNS:
+            selected.append(f'staging."{column}"')
+            continue
+
+        dimension = DIMENSION_MODELS[column]
+        dimension_table = f'{dimension.__table__.schema}.{dimension.__tablename__}'
+        # Значения, которых ещё нет в справочнике, в одном порядке у всех
+        # параллельных писателей импорта — так они не ловят deadlock.
+        dimensions.append(
+            f'INSERT INTO {dimension_table} (value) SELECT value FROM ('
+            f'SELECT DISTINCT staging."{column}" AS value FROM {IMPORT_STAGING_TABLE} AS staging '
+            f'WHERE staging."{column}" IS NOT NULL AND NOT EXISTS (SELECT 1 FROM '
+            f'{dimension_table} AS known WHERE known.value_hash = md5(staging."{column}")::uuid)'
+            ') AS missing ORDER BY md5(value) ON CONFLICT (value_hash) DO NOTHING'
+        )
+        selected.append(f'{column}_dimension.id')
+        joins.append(
+            f'LEFT JOIN {dimension_table} AS {column}_dimension '
+            f'ON {column}_dimension.value_hash = md5(staging."{column}")::uuid'
+        )
+
+    columns = ', '.join(f'"{column}"' for column in TABLE_COLUMNS)
+    insert = (
+        f'INSERT INTO {target} ({columns}) SELECT {", ".join(selected)} '
+        f'FROM {IMPORT_STAGING_TABLE} AS staging {" ".join(joins)}'
+    )
+    return create, dimensions, insert
+
+
+CREATE_IMPORT_STAGING_SQL, INSERT_DIMENSIONS_SQL, _INSERT_SQL = _import_sql()
+INSERT_IMPORT_SQL = with_rollups(_INSERT_SQL)
+MERGE_IMPORT_SQL = with_rollups(
+    f'{_INSERT_SQL} ON CONFLICT (server_id, source_key, timestamp) DO NOTHING'
+)
+
+
+def encode_copy_row(record: dict[str, Any]) -> str:
+    """Строка текстового формата COPY для записи лога, колонки LOG_ENTRY_COLUMNS."""
+    return '\t'.join([encode(record.get(column)) for column, encode in _ROW_ENCODERS])
+
+
+def _init_worker(server_id: int, log_format: str | None) -> None:
+    """Создаёт парсер один раз на процесс пула."""
+    global _worker_parser
+    _worker_parser = NginxLogParser('-', server_id, log_format=log_format)
+
+
+def parse_block(data: bytes, identity: str | None = None, offset: int = 0) -> ChunkResult:
+    """Разбирает блок целых строк в процессе пула.
+
+    Args:
+        data: блок целых строк
+        identity: идентичность файла; с ней строки получают source_key
+        offset: смещение начала блока в (распакованном) файле
+
+    Returns:
+        данные для COPY, количество записей, количество отвергнутых строк,
+        есть ли у записей source_key и скетчи записей по (минута, сервер)
+    """
+    if _worker_parser is None:
+        raise RuntimeError('Процесс пула не инициализирован')
+
+    parse_line = _worker_parser.parse_line
+    rows = []
+    sketch_rows = []
+    rejected = 0
+    lines, offsets = split_lines(data, offset)
+    for line, line_offset in zip(lines, offsets, strict=True):
+        record = parse_line(line)
+        if record is None:
+            rejected += 1
+            continue
+        if identity is not None:
+            record['source_key'] = source_key(identity, line_offset)
+        rows.append(encode_copy_row(record))
+        sketch_rows.append(
+            (
+                record['timestamp'].replace(second=0, microsecond=0),
+                record['server_id'],
+                record['remote_addr'],
+                record.get('uri'),
+                1,
+                record.get('size'),
+                record.get('request_time'),
+            )
+        )
+
+    payload = ('\n'.join(rows) + '\n').encode() if rows else b''
+    return payload, len(rows), rejected, identity is not None, bucket_sketches(sketch_rows)
+
+
+def parse_file_range(path: str, start: int, end: int, identity: str | None = None) -> ChunkResult:
+    """Читает и разбирает байты [start, end) файла в процессе пула."""
+    with open(path, 'rb') as f:
+        f.seek(start)
+        return parse_block(f.read(end - start), identity, start)
+
+
+def split_file(path: Path, chunk_bytes: int) -> list[tuple[int, int]]:
+    """Диапазоны по ~chunk_bytes байт, каждый заканчивается переводом строки."""
+    size = path.stat().st_size
+    ranges = []
+    start = 0
+    with open(path, 'rb') as f:
+        while start < size:
+            end = start + chunk_bytes
+            if end < size:
+                f.seek(end)
+                f.readline()
+                end = f.tell()
+            else:
+                end = size
+            ranges.append((start, end))
+            start = end
+    return ranges
+
+
+def open_decompressed(path: Path, raw: IO[bytes]) -> IO[bytes] | None:
+    """Поток распаковки для .gz и .zst; None для несжатого файла.
+
+    Raises:
+        RuntimeError: файл .zst, а пакет zstandard не установлен
+    """
+    if path.suffix == '.gz':
+        return cast(IO[bytes], gzip.GzipFile(fileobj=raw))
+    if path.suffix == '.zst':
+        if zstandard is None:
+            raise RuntimeError(f'Для {path} нужен пакет zstandard: pip install zstandard')
+        return zstandard.ZstdDecompressor().stream_reader(raw)
+    return None
+
+
+async def next_block(blocks: Iterator[T]) -> T | None:
+    """Следующий элемент итератора блоков в потоке; None, когда блоки кончились."""
+    return await asyncio.to_thread(lambda: next(blocks, None))
+
+
+def is_compressed(path: Path) -> bool:
+    """Файл нужно распаковывать потоком, а не резать по смещениям."""
+    return path.suffix in ('.gz', '.zst')
+
+
+def iter_compressed_blocks(path: Path, chunk_bytes: int) -> Iterator[tuple[int, bytes]]:
+    """Распакованные блоки по ~chunk_bytes байт, разрезанные по переводу строки.
+
+    Вместе с блоком отдаётся, сколько байт сжатого файла прочитано с
+    предыдущего блока, — по ним считается прогресс.
+    """
+    with open(path, 'rb') as raw:
+        stream = open_decompressed(path, raw)
+        if stream is None:
+            raise ValueError(f'{path} не сжат')
+
+        carry = b''
+        consumed = 0
+        while chunk := stream.read(chunk_bytes):
+            data = carry + chunk
+            cut = data.rfind(b'\n') + 1
+            if not cut:
+                carry = data
+                continue
+            position = raw.tell()
+            yield position - consumed, data[:cut]
+            consumed = position
+            carry = data[cut:]
+
+        if carry or raw.tell() > consumed:
+            yield raw.tell() - consumed, carry
+
+
+def iter_dead_letter_blocks(path: Path, chunk_bytes: int) -> Iterator[tuple[int, bytes]]:
+    """Исходные строки из dead-letter файла монитора блоками по ~chunk_bytes байт.
+
+    Вместе с блоком отдаётся, сколько байт dead-letter файла прочитано с
+    предыдущего блока. Повреждённые записи пропускаются с предупреждением,
+    записи строк, отвергнутых базой, — молча.
+    """
+    with open(path, 'rb') as f:
+        lines: list[bytes] = []
+        size = 0
+        consumed = 0
+        for number, entry in enumerate(f, 1):
+            consumed += len(entry)
+            try:
+                line = orjson.loads(entry)['line']
+            except (orjson.JSONDecodeError, KeyError, TypeError):
+                logger.warning(f'{path}:{number}: запись dead-letter повреждена, пропущена')
+                continue
+            if line is None:
+                # Строка, отвергнутая базой: исходного текста нет, только значения колонок.
+                continue
+
+            encoded = line.encode()
+            lines.append(encoded)
+            size += len(encoded) + 1
+            if size >= chunk_bytes:
+                yield consumed, b'\n'.join(lines) + b'\n'
+                lines, size, consumed = [], 0, 0
+
+        if lines or consumed:
+            yield consumed, b'\n'.join(lines) + b'\n' if lines else b''
+
+
+class LogImporter:
+    """Параллельный импорт файлов логов в БД.
+
+    В работе одновременно не больше 2 * workers кусков: кусок занимает
+    слот от отправки в пул до записи в БД, поэтому память не растёт,
+    даже если база пишет медленнее, чем ядра разбирают.
+
+    С dead_letter файлы считаются dead-letter файлами монитора, и
+    импортируются сохранённые в них строки — например, после исправления
+    log_format.
+
+    Строки файлов получают source_key по идентичности файла и смещению,
+    поэтому повторный импорт того же файла или его сжатой копии не
+    дублирует записи. Строки dead-letter файла ключей не получают.
+
+    Raises:
+        RuntimeError: среди файлов есть .zst, а пакет zstandard не установлен
+    """
+
+    def __init__(
+        self,
+        paths: Sequence[str | Path],
+        server_id: int = 1,
+        log_format: str | None = None,
+        workers: int | None = None,
+        writers: int | None = None,
+        chunk_bytes: int | None = None,
+        db_connector: PGEngineConnector = connector,
+        dead_letter: bool = False,
+    ):
+        self.paths = [Path(path) for path in paths]
+        self.dead_letter = dead_letter
+        if zstandard is None and any(path.suffix == '.zst' for path in self.paths):
+            raise RuntimeError('Для файлов .zst нужен пакет zstandard: pip install zstandard')
+
+        self.server_id = server_id
+        self.log_format = log_format
+        self.workers = workers or SETTINGS.IMPORT_WORKERS or os.cpu_count() or 1
+        self.writers = writers or SETTINGS.MONITOR_WRITERS
+        self.chunk_bytes = chunk_bytes or SETTINGS.IMPORT_CHUNK_MB * 1024 * 1024
+        self.connector = db_connector
+
+        self.total_bytes = sum(path.stat().st_size for path in self.paths)
+        self.done_bytes = 0
+        self.written_rows = 0
+        self.rejected_rows = 0
+        self.failed_rows = 0
+        self.duplicate_rows = 0
+        self._started_at = time.monotonic()
+
+    async def run(self) -> None:
+        """Импортирует все файлы и пишет итоговую статистику."""
+        loop = asyncio.get_running_loop()
+        slots = asyncio.Semaphore(self.workers * 2)
+        queue: asyncio.Queue[WriteItem | None] = asyncio.Queue()
+        self._started_at = time.monotonic()
+
+        with ProcessPoolExecutor(
+            max_workers=self.workers,
+            initializer=_init_worker,
+            initargs=(self.server_id, self.log_format),
+        ) as pool:
+            async with asyncio.TaskGroup() as task_group:
+                reporter = task_group.create_task(self._report_progress())
+                writer_tasks = [
+                    task_group.create_task(self._write(queue, slots)) for _ in range(self.writers)
+                ]
+
+                parse_tasks = []
+                for path in self.paths:
+                    logger.info(f'Импорт {path}')
+                    async for size, func, args in self._chunks(path):
+                        await slots.acquire()
+                        future = loop.run_in_executor(pool, func, *args)
+                        parse_tasks.append(task_group.create_task(self._parse(future, size, queue)))
+
+                await asyncio.gather(*parse_tasks)
+                for _ in writer_tasks:
+                    await queue.put(None)
+                await asyncio.gather(*writer_tasks)
+                reporter.cancel()
+
+        self._log_progress('Импорт завершён')
+
+    async def _chunks(self, path: Path) -> AsyncGenerator[tuple[int, Callable, tuple], None]:
+        """Куски файла для пула: размер в байтах файла, функция и её аргументы."""
+        if self.dead_letter:
+            blocks = iter_dead_letter_blocks(path, self.chunk_bytes)
+            while (item := await next_block(blocks)) is not None:
+                size, block = item
+                yield size, parse_block, (block,)
+            return
+
+        if not is_compressed(path):
+            stat = await asyncio.to_thread(path.stat)
+            fingerprint = await asyncio.to_thread(first_line_fingerprint, path)
+            identity = file_identity(fingerprint, stat.st_dev, stat.st_ino)
+            for start, end in await asyncio.to_thread(split_file, path, self.chunk_bytes):
+                yield end - start, parse_file_range, (str(path), start, end, identity)
+            return
+
+        # Смещения строк сжатого файла считаются в распакованных байтах:
+        # ключи совпадают с ключами, полученными при чтении живого файла.
+        blocks = iter_compressed_blocks(path, self.chunk_bytes)
+        identity = None
+        offset = 0
+        while (item := await next_block(blocks)) is not None:
+            size, block = item
+            if not offset:
+                identity = file_identity(head_fingerprint(block), None, None)
+            yield size, parse_block, (block, identity, offset)
+            offset += len(block)
+
+    async def _parse(
+        self, future: asyncio.Future, size: int, queue: asyncio.Queue[WriteItem | None]
+    ) -> None:
+        """Ждёт разбора куска и передаёт результат писателям."""
+        result = await future
+        self.rejected_rows += result[2]
+        await queue.put((result, size))
+
+    async def _write(
+        self, queue: asyncio.Queue[WriteItem | None], slots: asyncio.Semaphore
+    ) -> None:
+        """Писатель: отправляет готовые данные COPY в БД и освобождает слот куска."""
+        while (item := await queue.get()) is not None:
+            (payload, rows, _rejected, keyed, sketches), size = item
+            if rows:
+                await self._copy_with_retry(payload, rows, keyed, sketches)
+            self.done_bytes += size
+            slots.release()
+
+    async def _copy_with_retry(
+        self, payload: bytes, rows: int, keyed: bool, sketches: Sketches
+    ) -> None:
+        """Пишет кусок, повторяя попытки, пока БД недоступна.
+
+        Если база отвергает кусок, он пишется половинами, пока отвергнутые
+        строки не останутся по одной: теряются только они, а скетчи минут
+        куска пересчитываются по записанным строкам.
+        """
+        try:
+            written = await self._copy_retrying(payload, rows, keyed, sketches)
+        except Exception as error:
+            logger.warning(f'Кусок импорта отвергнут ({error!r}), запись по половинам')
+            await self._copy_halves(payload.splitlines(keepends=True), keyed, error)
+            await self._retrying(partial(self._rebuild_sketches, list(sketches)))
+            return
+
+        self.written_rows += written
+        self.duplicate_rows += rows - written
+
+    async def _copy_halves(self, lines: list[bytes], keyed: bool, error: Exception) -> None:
+        """Пишет строки COPY отвергнутого куска половинами, отбрасывая отвергнутые строки."""
+        if len(lines) == 1:
+            self.failed_rows += 1
+            sampled_warning.warn(
+                DB_REJECTED, f'Строка импорта отвергнута базой ({error!r}): {lines[0]!r}'
+            )
+            return
+
+        middle = len(lines) // 2
+        for part in (lines[:middle], lines[middle:]):
+            try:
+                written = await self._copy_retrying(b''.join(part), len(part), keyed, {})
+            except Exception as part_error:
+                await self._copy_halves(part, keyed, part_error)
+                continue
+            self.written_rows += written
+            self.duplicate_rows += len(part) - written
+
+    async def _copy_retrying(
+        self, payload: bytes, rows: int, keyed: bool, sketches: Sketches
+    ) -> int:
+        """_copy_payload с повтором, пока БД недоступна; прочие ошибки пробрасываются."""
+        return await self._retrying(partial(self._copy_payload, payload, rows, keyed, sketches))
+
+    @staticmethod
+    async def _retrying(call: Callable[[], Awaitable[T]]) -> T:
+        """Вызывает call, повторяя попытки, пока БД недоступна."""
+        attempt = 0
+        while True:
+            try:
+                return await call()
+            except RETRYABLE_ERRORS:
+                delay = RETRY_BACKOFF_SECONDS[min(attempt, len(RETRY_BACKOFF_SECONDS) - 1)]
+                attempt += 1
+                logger.exception(f'БД недоступна, повтор записи куска через {delay} с')
+                await asyncio.sleep(delay)
+
+    async def _rebuild_sketches(self, keys: list[SketchKey]) -> None:
+        """Пересчитывает минутные скетчи по строкам таблицы логов в своей транзакции."""
+        if not keys:
+            return
+        engine = self.connector.get_pg_engine(sql_alchemy_uri=self.connector.sql_alchemy_uri)
+        async with engine.connect() as conn:
+            raw_connection = await conn.get_raw_connection()
+            driver_connection = raw_connection.driver_connection
+            async with driver_connection.transaction():
+                await rebuild_sketches(driver_connection, keys)
+
+    async def _copy_payload(
+        self, payload: bytes, rows: int, keyed: bool, sketches: Sketches
+    ) -> int:
+        """Передаёт готовые данные текстового формата COPY в таблицу логов.
+
+        Кусок идёт через временную таблицу: из неё пополняются справочники
+        и строки переносятся в таблицу логов с id вместо значений. Куски
+        со source_key переносятся с ON CONFLICT DO NOTHING, как у
+        LogBatchWriter. Тем же запросом пополняются минутные сводки
+        аналитики, в той же транзакции — минутные скетчи. Если часть строк
+        куска уже была в таблице, скетчи его минут пересчитываются по ней.
+
+        Returns:
+            int: сколько строк куска добавлено в таблицу
+        """
+        engine = self.connector.get_pg_engine(sql_alchemy_uri=self.connector.sql_alchemy_uri)
+
+        async with engine.connect() as conn:
+            raw_connection = await conn.get_raw_connection()
+            driver_connection = raw_connection.driver_connection
+
+            async with driver_connection.transaction():
+                await driver_connection.execute(CREATE_IMPORT_STAGING_SQL)
+                await driver_connection.copy_to_table(
+                    IMPORT_STAGING_TABLE,
+                    columns=LOG_ENTRY_COLUMNS,
+                    source=io.BytesIO(payload),
+                    format='text',
+                )
+                for statement in INSERT_DIMENSIONS_SQL:
+                    await driver_connection.execute(statement)
+                written = await driver_connection.fetchval(
+                    MERGE_IMPORT_SQL if keyed else INSERT_IMPORT_SQL
+                )
+                await add_to_sketches(driver_connection, sketches, duplicates=written < rows)
+                return written
+
+    async def _report_progress(self) -> None:
+        """Раз в IMPORT_PROGRESS_INTERVAL_SECONDS пишет скорость и оценку времени."""
+        while True:
+            await asyncio.sleep(SETTINGS.IMPORT_PROGRESS_INTERVAL_SECONDS)
+            self._log_progress('Импорт')
+
+    def _log_progress(self, title: str) -> None:
+        elapsed = max(time.monotonic() - self._started_at, 1e-9)
+        rows_per_second = self.written_rows / elapsed
+        bytes_per_second = self.done_bytes / elapsed
+        remaining = max(self.total_bytes - self.done_bytes, 0)
+        eta = remaining / bytes_per_second if bytes_per_second else float('inf')
+        percent = self.done_bytes / self.total_bytes * 100 if self.total_bytes else 100
+
+        logger.info(
+            f'{title}: {percent:.1f}% '
+            f'({self.done_bytes / 2**20:.0f}/{self.total_bytes / 2**20:.0f} МБ), '
+            f'записано {self.written_rows}, отвергнуто {self.rejected_rows}, '
+            f'потеряно {self.failed_rows}, повторов {self.duplicate_rows}, '
+            f'{rows_per_second:,.0f} строк/с, '
+            f'осталось ~{eta:.0f} с'
+        )
@@ -0,0 +1,243 @@
+"""Приём строк лога из тела HTTP-запроса по мере его поступления.
+
+Удалённые сборщики (Vector, Fluent Bit, свой скрипт) шлют логи в
+POST /api/ingest/{server_id}, и им не нужен доступ к БД. Тело читается
+кусками: строки режутся, разбираются пачками по LINE_BATCH_SIZE и
+уходят в тот же LogBatchWriter, что и у монитора, пока остаток тела ещё
+передаётся. В памяти одновременно лежат кусок тела, пачка строк и
+незаписанный пакет COPY, поэтому размер тела не ограничен.
+
+Тело — сырые строки лога или NDJSON, где строка лога лежит в поле line,
+message или log. Тело может быть сжато gzip (Content-Encoding: gzip).
+
+Строки, которые база отвергла при записи, возвращаются сборщику в
+ответе — первые MAX_REPORTED_FAILURES со значениями колонок и ошибкой.
+
+Если сборщик называет источник (source) и смещение начала тела в нём,
+строки получают source_key, и повтор того же тела после обрыва не
+дублирует записи.
+"""
+
+import zlib
+
+from collections.abc import AsyncGenerator
+from collections.abc import AsyncIterator
+from collections.abc import Iterator
+from pathlib import Path
+from typing import Any
+
+import orjson
+
+from apps.db.session import PGEngineConnector
+from apps.db.session import connector
+from apps.services.log_batch_writer import LogBatchWriter
+from apps.services.log_pipeline import LINE_BATCH_SIZE
+from apps.services.log_rows import ColumnBatch
+from apps.services.nginx_log_parser import MAX_LINE_BYTES
+from apps.services.nginx_log_parser import NginxLogParser
+from apps.services.parse_failures import NO_MATCH
+from apps.services.parse_failures import DeadLetterFile
+from apps.services.parse_failures import LineRejectedError
+from apps.services.parse_failures import ParseFailures
+from apps.services.parse_pool import ParsedBatch
+from apps.services.parse_pool import parse_rows
+from apps.services.source_key import source_key
+from apps.services.source_key import split_lines
+from apps.settings import SETTINGS
+
+GZIP_WBITS = 16 + zlib.MAX_WBITS
+INFLATE_CHUNK_BYTES = 1024 * 1024
+NDJSON_LINE_FIELDS = ('line', 'message', 'log')
+MAX_REPORTED_FAILURES = 100
+
+
+def parse_ndjson_rows(
+    parser: NginxLogParser,
+    lines: list[str],
+    identity: str | None = None,
+    offsets: list[int] | None = None,
+) -> ParsedBatch:
+    """parse_rows для строк NDJSON: строка лога берётся из NDJSON_LINE_FIELDS."""
+    parse_row = parser.parse_row
+    keyed = identity is not None and offsets is not None
+    rows = []
+    rejects = []
+    for index, line in enumerate(lines):
+        try:
+            document = orjson.loads(line)
+            message = next(field for field in NDJSON_LINE_FIELDS if field in document)
+            key = source_key(identity, offsets[index]) if keyed else None
+            rows.append(parse_row(document[message], key))
+        except LineRejectedError as e:
+            rejects.append((index, e.reason, str(e)))
+        except (orjson.JSONDecodeError, TypeError, AttributeError, StopIteration):
+            rejects.append((index, NO_MATCH, 'не JSON-объект с полем line, message или log'))
+    return ColumnBatch.from_rows(rows), rejects
+
+
+class GzipStream:
+    """Потоковая распаковка gzip с ограничением на размер выдаваемых кусков.
+
+    Кусок тела в несколько килобайт может распаковаться в гигабайты,
+    поэтому за один вызов распаковывается не больше INFLATE_CHUNK_BYTES.
+    Склеенные gzip-потоки (как у ``cat a.gz b.gz``) распаковываются подряд.
+    """
+
+    def __init__(self):
+        self._decompressor = zlib.decompressobj(GZIP_WBITS)
+
+    def feed(self, data: bytes) -> Iterator[bytes]:
+        """Распакованные куски для очередного куска сжатых данных.
+
+        Raises:
+            zlib.error: данные не gzip
+        """
+        while True:
+            chunk = self._decompressor.decompress(data, INFLATE_CHUNK_BYTES)
+            if chunk:
+                yield chunk
+
+            if self._decompressor.eof:
+                data = self._decompressor.unused_data
+                self._decompressor = zlib.decompressobj(GZIP_WBITS)
+                if not data:
+                    return
+                continue
+
+            data = self._decompressor.unconsumed_tail
+            if not data and not chunk:
+                return
+
+
+class StreamIngester:
+    """Разбор и запись строк одного тела запроса.
+
+    Args:
+        server_id: сервер, к которому относятся строки
+        log_format: формат строк; по умолчанию combined
+        ndjson: тело — NDJSON, а не сырые строки
+        dead_letter: куда писать нераспознанные строки
+        batch_size: размер пакета COPY; по умолчанию MONITOR_BATCH_SIZE
+        source: идентичность источника у сборщика (например, хост и путь
+            файла); без неё строки пишутся без source_key
+        offset: смещение начала тела в источнике
+    """
+
+    def __init__(
+        self,
+        server_id: int,
+        log_format: str | None = None,
+        ndjson: bool = False,
+        dead_letter: DeadLetterFile | None = None,
+        batch_size: int | None = None,
+        db_connector: PGEngineConnector = connector,
+        source: str | None = None,
+        offset: int = 0,
+    ):
+        self.server_id = server_id
+        self.identity = source if SETTINGS.DEDUP_SOURCE_KEYS else None
+        self.offset = offset
+        self.parser = NginxLogParser('-', server_id, log_format=log_format)
+        self.parse = parse_ndjson_rows if ndjson else parse_rows
+        self.failures = ParseFailures(dead_letter)
+        self.source = Path(f'ingest:{server_id}')
+        self.batch_size = batch_size
+        self.connector = db_connector
+        self.written = 0
+        self.failed = 0
+        self.duplicates = 0
+        self.failed_rows: list[dict[str, Any]] = []
+
+    @property
+    def rejected(self) -> int:
+        """Строк, которые не удалось разобрать."""
+        return sum(self.failures.rejected.values())
+
+    async def ingest(self, chunks: AsyncIterator[bytes], gzip: bool = False) -> None:
+        """Читает тело по кускам, разбирает строки и пишет их в БД.
+
+        Пакеты пишутся по мере заполнения, так что при медленной базе
+        чтение тела ждёт записи, а не копит строки в памяти.
+
+        Raises:
+            zlib.error: gzip=True, но тело не gzip
+        """
+        writer = LogBatchWriter(
+            batch_size=self.batch_size,
+            db_connector=self.connector,
+            dead_letter=self.failures.dead_letter,
+            on_reject=self._on_reject,
+        )
+        async with writer:
+            async for offsets, lines in self._batches(chunks, gzip):
+                rows, rejects = self.parse(self.parser, lines, self.identity, offsets)
+                self.failures.record(
+                    self.source, self.server_id, offsets[0], lines, len(rows), rejects
+                )
+                await writer.add_rows(rows)
+
+        self.written = writer.written_rows
+        self.failed = writer.failed_rows
+        self.duplicates = writer.duplicate_rows
+
+    def _on_reject(self, row: dict[str, Any], error: Exception) -> None:
+        """Запоминает строку, отвергнутую базой, для ответа сборщику."""
+        if len(self.failed_rows) < MAX_REPORTED_FAILURES:
+            self.failed_rows.append({'row': row, 'error': str(error)})
+
+    async def _batches(
+        self, chunks: AsyncIterator[bytes], gzip: bool
+    ) -> AsyncGenerator[tuple[list[int], list[str]], None]:
+        """Пачки непустых строк тела и смещения их начал в источнике."""
+        stream = GzipStream() if gzip else None
+        position = self.offset
+        carry = b''
+        skipping = False
+
+        async for chunk in chunks:
+            for data in stream.feed(chunk) if stream else (chunk,):
+                data = carry + data
+                carry = b''
+
+                if skipping:
+                    newline = data.find(b'\n')
+                    if newline == -1:
+                        position += len(data)
+                        continue
+                    position += newline + 1
+                    data = data[newline + 1 :]
+                    skipping = False
+
+                line_end = data.rfind(b'\n')
+                if line_end == -1:
+                    carry = data
+                    if len(carry) > MAX_LINE_BYTES:
+                        self._reject_oversized(position, carry)
+                        position += len(carry)
+                        carry = b''
+                        skipping = True
+                    continue
+
+                complete, carry = data[: line_end + 1], data[line_end + 1 :]
+                for batch in self._split(position, complete):
+                    yield batch
+                position += len(complete)
+
+        if carry and not skipping:
+            for batch in self._split(position, carry):
+                yield batch
+
+    @staticmethod
+    def _split(offset: int, data: bytes) -> Iterator[tuple[list[int], list[str]]]:
+        """Режет полные строки на пачки по LINE_BATCH_SIZE."""
+        lines, offsets = split_lines(data, offset)
+        for start in range(0, len(lines), LINE_BATCH_SIZE):
+            end = start + LINE_BATCH_SIZE
+            yield offsets[start:end], lines[start:end]
+
+    def _reject_oversized(self, offset: int, data: bytes) -> None:
+        """Учитывает строку длиннее MAX_LINE_BYTES: она пропускается целиком."""
+        line = data[:MAX_LINE_BYTES].decode('utf-8', errors='replace')
+        detail = f'строка длиннее {MAX_LINE_BYTES} байт'
+        reject = (0, NO_MATCH, detail)
+        self.failures.record(self.source, self.server_id, offset, [line], 0, [reject])
@@ -0,0 +1,528 @@
+import asyncio
+
+from dataclasses import replace
+from datetime import UTC
+from datetime import datetime
+from pathlib import Path
+from typing import Any
+
+from loguru import logger
+
+from apps.api.v1.cruds.server_crud import server_crud_obj
+from apps.db.session import PGEngineConnector
+from apps.db.session import connector
+from apps.services.dimensions import DimensionResolver
+from apps.services.log_batch_writer import LogBatchWriter
+from apps.services.log_rows import ColumnBatch
+from apps.services.monitor_targets import MonitorTarget
+from apps.services.monitor_targets import expand_targets
+from apps.services.nginx_log_parser import NginxLogParser
+from apps.services.parse_failures import DeadLetterFile
+from apps.services.parse_failures import ParseFailures
+from apps.services.parse_failures import Reject
+from apps.services.parse_pool import ParsedBatch
+from apps.services.parse_pool import ParsePool
+from apps.services.parse_pool import parse_rows
+from apps.services.tail_checkpoint import CheckpointTracker
+from apps.services.tail_checkpoint import TailCheckpoint
+from apps.services.tail_checkpoint import TailCheckpointStore
+from apps.settings import SETTINGS
+from apps.utils.metrics import REGISTRY
+from apps.utils.metrics import Gauge
+from apps.utils.metrics import start_metrics_server
+
+LINE_BATCH_SIZE = 1000
+
+MONITOR_QUEUE_DEPTH = Gauge(
+    'nginx_analyzer_monitor_queue_depth', 'Пачек в очередях конвейера', ('queue',)
+)
+MONITOR_WRITER_PENDING_ROWS = Gauge(
+    'nginx_analyzer_monitor_writer_pending_rows', 'Записей в буферах писателей'
+)
+MONITOR_TAIL_LAG_BYTES = Gauge(
+    'nginx_analyzer_monitor_tail_lag_bytes',
+    'Непрочитанные байты файла',
+    ('file', 'server_id'),
+)
+MONITOR_TAIL_LAG_SECONDS = Gauge(
+    'nginx_analyzer_monitor_tail_lag_seconds',
+    'Возраст самой свежей разобранной записи файла, пока он не дочитан',
+    ('file', 'server_id'),
+)
+
+Marker = tuple['LogSource', int]
+LineBatch = tuple['LogSource', int, str | None, list[int] | None, list[str]]
+
+
+class LogSource:
+    """Файл под наблюдением конвейера: свой парсер и свой трекер чекпоинтов.
+
+    Args:
+        parser: парсер файла, задаёт путь, server_id и формат строк
+        from_start: без чекпоинта читать файл с начала, а не с конца —
+            для файлов, появившихся уже после запуска монитора
+    """
+
+    def __init__(self, parser: NginxLogParser, from_start: bool = False):
+        self.parser = parser
+        self.from_start = from_start
+        self.tracker = CheckpointTracker()
+        self.newest_timestamp: datetime | None = None
+
+    def lag(self) -> dict[str, Any]:
+        """Отставание от файла: непрочитанные байты, незаписанные пачки и секунды.
+
+        Отставание в секундах — возраст самой свежей разобранной записи,
+        пока в файле есть непрочитанные байты или незаписанные пачки;
+        когда файл дочитан и записан, оно равно нулю, сколько бы nginx ни
+        молчал.
+        """
+        parser = self.parser
+        try:
+            stat = parser.log_file_path.stat()
+        except OSError:
+            unread_bytes = 0
+        else:
+            same_file = (stat.st_dev, stat.st_ino) == (parser.device, parser.inode)
+            unread_bytes = max(stat.st_size - parser.position, 0) if same_file else stat.st_size
+
+        in_flight = self.tracker.in_flight
+        lag_seconds = 0.0
+        if (unread_bytes or in_flight) and self.newest_timestamp is not None:
+            lag_seconds = max((datetime.now(UTC) - self.newest_timestamp).total_seconds(), 0.0)
+
+        return {
+            'server_id': parser.server_id,
+            'unread_bytes': unread_bytes,
+            'in_flight_batches': in_flight,
+            'lag_seconds': round(lag_seconds, 3),
+        }
+
+
+def _start_of_file(path: Path) -> TailCheckpoint | None:
+    """Чекпоинт на начало файла или None, если файла нет."""
+    try:
+        stat = path.stat()
+    except OSError:
+        return None
+    return TailCheckpoint(device=stat.st_dev, inode=stat.st_ino, offset=0, fingerprint='')
+
+
+class LogPipeline:
+    """Конвейер чтение → разбор → запись для одного или нескольких файлов логов.
+
+    Стадии связаны ограниченными очередями: если писатели не успевают,
+    очередь записей заполняется, разбор встаёт на put(), следом заполняется
+    очередь строк и чтение файлов приостанавливается. Память при этом не
+    растёт, а непрочитанные строки остаются в файлах.
+
+    Элемент очереди — пачка до LINE_BATCH_SIZE строк или записей, а не
+    одна строка: так накладные расходы очереди не зависят от потока.
+
+    Каждый файл читается своей задачей, а стадия разбора и писатели в БД
+    общие для всех файлов: сколько бы vhost ни писали отдельные логи,
+    процесс держит один пул соединений и одни пакеты COPY. С целями
+    (targets) конвейер раз в MONITOR_DISCOVERY_INTERVAL_SECONDS заново
+    раскрывает их шаблоны и начинает читать новые файлы с начала.
+
+    С parse_workers > 0 (по умолчанию MONITOR_PARSE_WORKERS) строки
+    разбирает пул процессов ParsePool, а event loop только читает файлы
+    и пишет в БД; без него разбор идёт прямо в loop.
+
+    Если передано хранилище чекпоинтов, конвейер продолжает чтение каждого
+    файла с сохранённой позиции и периодически сохраняет позиции, до
+    которых все строки уже записаны в БД. Строки между этой позицией и
+    падением процесса будут прочитаны повторно (at-least-once), но
+    получат те же source_key и не попадут в таблицу второй раз.
+    """
+
+    def __init__(
+        self,
+        parser: NginxLogParser | None = None,
+        writers: int | None = None,
+        queue_size: int | None = None,
+        batch_size: int | None = None,
+        flush_interval: float | None = None,
+        db_connector: PGEngineConnector = connector,
+        checkpoint_store: TailCheckpointStore | None = None,
+        targets: list[MonitorTarget] | None = None,
+        parse_workers: int | None = None,
+        dead_letter: DeadLetterFile | None = None,
+    ):
+        self.checkpoint_store = checkpoint_store
+        self.failures = ParseFailures(dead_letter)
+        self.parse_workers = (
+            parse_workers if parse_workers is not None else SETTINGS.MONITOR_PARSE_WORKERS
+        )
+        self.targets = targets or []
+        self.sources: dict[Path, LogSource] = {}
+        if parser is not None:
+            self.sources[parser.log_file_path.absolute()] = LogSource(parser)
+        self._discover()
+
+        self.writers_count = writers or SETTINGS.MONITOR_WRITERS
+        queue_size = queue_size or SETTINGS.MONITOR_QUEUE_SIZE
+
+        self.line_queue: asyncio.Queue[LineBatch | None] = asyncio.Queue(maxsize=queue_size)
+        self.record_queue: asyncio.Queue[tuple[Marker, ColumnBatch] | None] = asyncio.Queue(
+            maxsize=queue_size
+        )
+        self.dimensions = DimensionResolver()
+        self.writers = [
+            LogBatchWriter(
+                batch_size=batch_size,
+                flush_interval=flush_interval,
+                db_connector=db_connector,
+                on_flush=self._complete,
+                dimensions=self.dimensions,
+                dead_letter=dead_letter,
+            )
+            for _ in range(self.writers_count)
+        ]
+
+    def collect_metrics(self) -> None:
+        """Обновляет gauge конвейера перед выводом /metrics."""
+        stats = self.stats()
+        MONITOR_QUEUE_DEPTH.labels('line').set(stats['line_queue'])
+        MONITOR_QUEUE_DEPTH.labels('record').set(stats['record_queue'])
+        MONITOR_WRITER_PENDING_ROWS.set(stats['writer_pending_rows'])
+
+        MONITOR_TAIL_LAG_BYTES.clear()
+        MONITOR_TAIL_LAG_SECONDS.clear()
+        for path, lag in stats['files'].items():
+            MONITOR_TAIL_LAG_BYTES.labels(path, lag['server_id']).set(lag['unread_bytes'])
+            MONITOR_TAIL_LAG_SECONDS.labels(path, lag['server_id']).set(lag['lag_seconds'])
+
+    def stats(self) -> dict[str, Any]:
+        """Глубина очередей и буферов, по ней видно, какая стадия не успевает.
+
+        Полная line_queue при пустой record_queue — узкое место в разборе,
+        полная record_queue — в записи в БД. В files — отставание каждого
+        файла: по нему видно, какой из логов не успевает читаться.
+        """
+        return {
+            'line_queue': self.line_queue.qsize(),
+            'line_queue_max': self.line_queue.maxsize,
+            'record_queue': self.record_queue.qsize(),
+            'record_queue_max': self.record_queue.maxsize,
+            'writer_pending_rows': sum(writer.pending_rows for writer in self.writers),
+            'written_rows': sum(writer.written_rows for writer in self.writers),
+            'failed_rows': sum(writer.failed_rows for writer in self.writers),
+            'duplicate_rows': sum(writer.duplicate_rows for writer in self.writers),
+            'in_flight_batches': sum(source.tracker.in_flight for source in self.sources.values()),
+            **self.failures.stats(),
+            'dimension_cache': self.dimensions.stats(),
+            'files': {str(path): source.lag() for path, source in self.sources.items()},
+        }
+
+    async def run(self) -> None:
+        """Запускает все стадии и ждёт их завершения.
+
+        Конвейер завершается сам, только если чтение всех файлов
+        закончилось (например, файлов нет) и целей с шаблонами нет; в
+        остальных случаях работает до отмены задачи.
+        """
+        parse_pool = ParsePool(self.parse_workers) if self.parse_workers > 0 else None
+        REGISTRY.add_hook(self.collect_metrics)
+        try:
+            async with asyncio.TaskGroup() as task_group:
+                service_tasks = [
+                    task_group.create_task(self._report_stats()),
+                    task_group.create_task(self._save_checkpoint_periodically()),
+                ]
+                task_group.create_task(self._read_sources())
+                task_group.create_task(
+                    self._parse_in_pool(parse_pool) if parse_pool else self._parse()
+                )
+                writer_tasks = [
+                    task_group.create_task(self._write(writer)) for writer in self.writers
+                ]
+
+                await asyncio.gather(*writer_tasks)
+                for task in service_tasks:
+                    task.cancel()
+        finally:
+            REGISTRY.remove_hook(self.collect_metrics)
+            if parse_pool:
+                parse_pool.close()
+            self.save_checkpoint()
+
+    def save_checkpoint(self) -> None:
+        """Сохраняет для каждого файла позицию, до которой строки записаны в БД."""
+        if not self.checkpoint_store:
+            return
+
+        durable = {
+            source.parser.log_file_path: source.tracker.durable
+            for source in self.sources.values()
+            if source.tracker.durable
+        }
+        if durable:
+            self.checkpoint_store.save_many(durable)
+
+    def _discover(self, from_start: bool = False) -> list[LogSource]:
+        """Заводит источники для файлов целей, которые ещё не читаются."""
+        added = []
+        for path, target in expand_targets(self.targets).items():
+            if path in self.sources:
+                continue
+
+            parser = NginxLogParser(str(path), target.server_id, log_format=target.log_format)
+            source = self.sources[path] = LogSource(parser, from_start=from_start)
+            added.append(source)
+            if from_start:
+                logger.info(f'Новый файл логов {path}, server_id {target.server_id}')
+        return added
+
+    async def _read_sources(self) -> None:
+        """Запускает чтение каждого файла и подхватывает новые файлы целей."""
+        async with asyncio.TaskGroup() as readers:
+            for source in self.sources.values():
+                readers.create_task(self._read(source))
+
+            while any(target.is_pattern for target in self.targets):
+                await asyncio.sleep(SETTINGS.MONITOR_DISCOVERY_INTERVAL_SECONDS)
+                for source in self._discover(from_start=True):
+                    readers.create_task(self._read(source))
+
+        await self.line_queue.put(None)
+
+    async def _read(self, source: LogSource) -> None:
+        """Стадия чтения: новые строки файла режутся на пачки и ставятся в очередь.
+
+        Каждая пачка регистрируется в трекере файла; последняя пачка куска
+        несёт позицию файла сразу после него. Вместе с пачкой передаются
+        идентичность файла и смещения её строк — из них получаются
+        source_key строк, а смещение первой строки идёт в dead-letter файл.
+        Идентичность берётся при чтении: к разбору пачки парсер может уже
+        перейти на новый файл после ротации.
+        """
+        parser = source.parser
+        checkpoint = (
+            self.checkpoint_store.load(parser.log_file_path) if self.checkpoint_store else None
+        )
+        if checkpoint is None and source.from_start:
+            checkpoint = _start_of_file(parser.log_file_path)
+
+        async for lines in parser.tail_log_file(checkpoint):
+            position = parser.checkpoint()
+            identity = parser.source_identity()
+            offsets = parser.line_offsets
+            for start in range(0, len(lines), LINE_BATCH_SIZE):
+                end = start + LINE_BATCH_SIZE
+                seq = source.tracker.register(position if end >= len(lines) else None)
+                await self.line_queue.put(
+                    (source, seq, identity, offsets[start:end], lines[start:end])
+                )
+
+    async def _parse(self) -> None:
+        """Стадия разбора: пачка строк превращается в пачку строк таблицы.
+
+        Пачка передаётся дальше даже пустой, иначе её номер никогда не
+        будет подтверждён и чекпоинт застрянет.
+        """
+        while (item := await self.line_queue.get()) is not None:
+            source, seq, identity, offsets, lines = item
+            rows, rejects = parse_rows(source.parser, lines, identity, offsets)
+            self._account(source, offsets, lines, rows, rejects)
+            await self.record_queue.put(((source, seq), rows))
+
+        for _ in self.writers:
+            await self.record_queue.put(None)
+
+    async def _parse_in_pool(self, parse_pool: ParsePool) -> None:
+        """Стадия разбора в пуле процессов.
+
+        Пачки отправляются в пул по мере чтения, а результаты забираются
+        отдельной задачей строго в порядке отправки, поэтому порядок строк
+        внутри файла сохраняется. Ёмкость очереди отправленных пачек
+        ограничивает, сколько их разбирается одновременно.
+        """
+        parsing: asyncio.Queue[tuple[LineBatch, asyncio.Future[ParsedBatch]] | None] = (
+            asyncio.Queue(maxsize=parse_pool.window)
+        )
+
+        async def collect() -> None:
+            while (item := await parsing.get()) is not None:
+                (source, seq, _, offsets, lines), future = item
+                rows, rejects = await future
+                self._account(source, offsets, lines, rows, rejects)
+                await self.record_queue.put(((source, seq), rows))
+
+            for _ in self.writers:
+                await self.record_queue.put(None)
+
+        async with asyncio.TaskGroup() as task_group:
+            task_group.create_task(collect())
+
+            while (item := await self.line_queue.get()) is not None:
+                source, _, identity, offsets, lines = item
+                future = parse_pool.submit(source.parser, lines, identity, offsets)
+                await parsing.put((item, future))
+
+            await parsing.put(None)
+
+    def _account(
+        self,
+        source: LogSource,
+        offsets: list[int] | None,
+        lines: list[str],
+        rows: ColumnBatch,
+        rejects: list[Reject],
+    ) -> None:
+        """Учитывает разобранную пачку в счётчиках и dead-letter файле."""
+        parser = source.parser
+        if rows:
+            source.newest_timestamp = rows.column('timestamp')[-1]
+        offset = offsets[0] if offsets else 0
+        self.failures.record(
+            parser.log_file_path, parser.server_id, offset, lines, len(rows), rejects
+        )
+
+    async def _write(self, writer: LogBatchWriter) -> None:
+        """Стадия записи: каждый писатель копит свой пакет и пишет его через COPY."""
+        async with writer:
+            while (item := await self.record_queue.get()) is not None:
+                marker, rows = item
+                await writer.add_rows(rows)
+                writer.mark(marker)
+
+    @staticmethod
+    def _complete(markers: list[Marker]) -> None:
+        """Подтверждает записанные пачки в трекерах их файлов."""
+        for source, seq in markers:
+            source.tracker.complete([seq])
+
+    async def _save_checkpoint_periodically(self) -> None:
+        """Раз в MONITOR_CHECKPOINT_INTERVAL_SECONDS сохраняет надёжные позиции."""
+        while True:
+            await asyncio.sleep(SETTINGS.MONITOR_CHECKPOINT_INTERVAL_SECONDS)
+            self.save_checkpoint()
+
+    async def _report_stats(self) -> None:
+        """Периодически пишет в лог глубину очередей и отставание каждого файла."""
+        while True:
+            await asyncio.sleep(SETTINGS.MONITOR_STATS_INTERVAL_SECONDS)
+            stats = self.stats()
+            files = stats.pop('files')
+            logger.info('Состояние конвейера: {}', stats)
+            for path, lag in files.items():
+                logger.info('Отставание {}: {}', path, lag)
+
+
+async def resolve_log_format(server_id: int, log_format: str | None) -> str | None:
+    """Формат строк: явно переданный или log_format сервера из БД."""
+    if log_format is not None:
+        return log_format
+
+    async with connector.get_pg_session_cm() as db:
+        return await server_crud_obj.get_log_format(db, server_id)
+
+
+def _checkpoint_store() -> TailCheckpointStore | None:
+    """Хранилище чекпоинтов из MONITOR_CHECKPOINT_PATH, если путь задан."""
+    if not SETTINGS.MONITOR_CHECKPOINT_PATH:
+        return None
+    return TailCheckpointStore(SETTINGS.MONITOR_CHECKPOINT_PATH)
+
+
+def default_dead_letter() -> DeadLetterFile | None:
+    """Dead-letter файл из MONITOR_DEAD_LETTER_PATH, если путь задан."""
+    if not SETTINGS.MONITOR_DEAD_LETTER_PATH:
+        return None
+    return DeadLetterFile(SETTINGS.MONITOR_DEAD_LETTER_PATH)
+
+
+async def run_pipeline(pipeline: LogPipeline, metrics_port: int | None) -> None:
+    """Запускает конвейер и, если задан порт, HTTP-слушатель /metrics рядом с ним."""
+    port = metrics_port if metrics_port is not None else SETTINGS.MONITOR_METRICS_PORT
+    if not port:
+        await pipeline.run()
+        return
+
+    server = await start_metrics_server(SETTINGS.MONITOR_METRICS_HOST, port)
+    try:
+        await pipeline.run()
+    finally:
+        server.close()
+
+
+async def start_log_monitoring(
+    log_file_path: str,
+    server_id: int = 1,
+    batch_size: int | None = None,
+    flush_interval: float | None = None,
+    writers: int | None = None,
+    queue_size: int | None = None,
+    log_format: str | None = None,
+    parse_workers: int | None = None,
+    metrics_port: int | None = None,
+) -> None:
+    """Запускает мониторинг логов nginx.
+
+    Чтение, разбор и запись идут отдельными стадиями LogPipeline; записи
+    пишутся в БД пакетами по batch_size строк или раз в flush_interval
+    секунд, что наступит раньше.
+
+    Позиция чтения сохраняется в MONITOR_CHECKPOINT_PATH: после
+    перезапуска мониторинг продолжит с неё, а не с конца файла.
+
+    Формат строк берётся из log_format, если он передан, иначе из
+    log_format сервера в БД; если не задан и там — combined.
+
+    С metrics_port (по умолчанию MONITOR_METRICS_PORT, 0 — выключено)
+    метрики монитора отдаются по HTTP на MONITOR_METRICS_HOST:port/metrics.
+    """
+    log_format = await resolve_log_format(server_id, log_format)
+    parser = NginxLogParser(log_file_path, server_id, log_format=log_format)
+    logger.info(f'Запуск мониторинга логов: {log_file_path}')
+
+    pipeline = LogPipeline(
+        parser,
+        checkpoint_store=_checkpoint_store(),
+        dead_letter=default_dead_letter(),
+        writers=writers,
+        queue_size=queue_size,
+        batch_size=batch_size,
+        flush_interval=flush_interval,
+        parse_workers=parse_workers,
+    )
+    await run_pipeline(pipeline, metrics_port)
+
+
+async def start_multi_log_monitoring(
+    targets: list[MonitorTarget],
+    batch_size: int | None = None,
+    flush_interval: float | None = None,
+    writers: int | None = None,
+    queue_size: int | None = None,
+    parse_workers: int | None = None,
+    metrics_port: int | None = None,
+) -> None:
+    """Запускает мониторинг нескольких файлов и серверов в одном процессе.
+
+    Все файлы пишутся через общих писателей и общий пул соединений.
+    Формат строк цели без log_format берётся из log_format её сервера в
+    БД, один раз на сервер. metrics_port — как у start_log_monitoring.
+    """
+    server_formats: dict[int, str | None] = {}
+    resolved = []
+    for target in targets:
+        if target.log_format is None:
+            if target.server_id not in server_formats:
+                server_formats[target.server_id] = await resolve_log_format(target.server_id, None)
+            target = replace(target, log_format=server_formats[target.server_id])
+        resolved.append(target)
+
+    pipeline = LogPipeline(
+        targets=resolved,
+        checkpoint_store=_checkpoint_store(),
+        dead_letter=default_dead_letter(),
+        writers=writers,
+        queue_size=queue_size,
+        batch_size=batch_size,
+        flush_interval=flush_interval,
+        parse_workers=parse_workers,
+    )
+    logger.info(f'Запуск мониторинга файлов: {len(pipeline.sources)}')
+    await run_pipeline(pipeline, metrics_port)
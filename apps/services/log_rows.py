@@ -0,0 +1,213 @@
+"""Компактное представление разобранных строк лога.
+
+Строка таблицы — LogRow: NamedTuple в порядке колонок COPY, без словаря
+атрибутов и без ORM. Пачка, которая идёт от разбора к писателю (и из
+процессов пула обратно в loop), — ColumnBatch: те же значения,
+разложенные по колонкам. Колонка — один кортеж указателей вместо
+кортежа на строку, а status и size лежат в array по 2 и 8 байт вместо
+отдельного объекта int на каждое значение.
+
+Повторяющиеся строки — метод, версия HTTP, горячие URI, referrer и
+user agent — проходят через StringCache парсера: тысяча строк с одним
+и тем же user agent держит в памяти один объект str, и pickle при
+передаче пачки из процесса пула записывает его один раз.
+
+Замеры до и после — python -m benchmarks.bench_rows.
+"""
+
+import contextlib
+import uuid
+
+from array import array
+from collections.abc import Iterable
+from collections.abc import Iterator
+from collections.abc import Sequence
+from datetime import datetime
+from typing import Any
+from typing import NamedTuple
+
+import orjson
+
+STRING_CACHE_SIZE = 4096
+
+
+class LogRow(NamedTuple):
+    """Строка таблицы лога в порядке колонок COPY; extra — уже JSON."""
+
+    server_id: int
+    timestamp: datetime
+    remote_addr: str | None
+    method: str | None
+    uri: str | None
+    http_version: str | None
+    status: int | None
+    size: int | None
+    referrer: str | None
+    user_agent: str | None
+    request_time: float | None
+    upstream_response_time: float | None
+    host: str | None
+    request_id: str | None
+    extra: str | None
+    source_key: uuid.UUID | None
+
+
+LOG_ENTRY_COLUMNS = LogRow._fields
+COLUMN_INDEX = {column: index for index, column in enumerate(LOG_ENTRY_COLUMNS)}
+EXTRA_COLUMN = COLUMN_INDEX['extra']
+SOURCE_KEY_COLUMN = COLUMN_INDEX['source_key']
+TIMESTAMP_COLUMN = COLUMN_INDEX['timestamp']
+INTERNED_COLUMNS = ('method', 'uri', 'http_version', 'referrer', 'user_agent', 'host')
+ARRAY_COLUMNS = ((COLUMN_INDEX['status'], 'H'), (COLUMN_INDEX['size'], 'q'))
+# Колонки, которые в таблице хранятся id справочника (apps/services/dimensions.py),
+# и колонки таблицы в порядке LOG_ENTRY_COLUMNS.
+DIMENSION_COLUMNS = {'uri': 'uri_id', 'referrer': 'referrer_id', 'user_agent': 'user_agent_id'}
+TABLE_COLUMNS = tuple(DIMENSION_COLUMNS.get(column, column) for column in LOG_ENTRY_COLUMNS)
+# Длина varchar строковых колонок в LogEntryModel и справочниках
+# (apps/api/v1/models/dimension_models.py): более длинное значение база
+# отвергнет, поэтому строка с ним отвергается уже при разборе.
+COLUMN_LIMITS = {
+    'remote_addr': 45,
+    'method': 10,
+    'uri': 2048,
+    'http_version': 10,
+    'referrer': 2048,
+    'user_agent': 1024,
+    'host': 255,
+    'request_id': 128,
+}
+_LIMITED_COLUMNS = tuple(
+    (COLUMN_INDEX[column], column, limit) for column, limit in COLUMN_LIMITS.items()
+)
+
+
+def record_to_row(record: dict[str, Any]) -> LogRow:
+    """Строка для COPY: значения записи в порядке LOG_ENTRY_COLUMNS, extra — JSON."""
+    extra = record.get('extra')
+    return LogRow._make(
+        (
+            *(record.get(column) for column in LOG_ENTRY_COLUMNS[:EXTRA_COLUMN]),
+            orjson.dumps(extra).decode() if extra else None,
+            record.get('source_key'),
+        )
+    )
+
+
+def _check_length(column: str, value: Any, limit: int) -> None:
+    if value is not None and len(value) > limit:
+        raise ValueError(f'{column} длиннее {limit} символов')
+
+
+def check_row_lengths(row: Sequence[Any]) -> None:
+    """Проверяет, что строковые значения строки таблицы умещаются в колонки.
+
+    Raises:
+        ValueError: значение длиннее COLUMN_LIMITS своей колонки
+    """
+    for index, column, limit in _LIMITED_COLUMNS:
+        _check_length(column, row[index], limit)
+
+
+def check_record_lengths(record: dict[str, Any]) -> None:
+    """check_row_lengths для записи-словаря.
+
+    Raises:
+        ValueError: значение длиннее COLUMN_LIMITS своей колонки
+    """
+    for column, limit in COLUMN_LIMITS.items():
+        _check_length(column, record.get(column), limit)
+
+
+class StringCache:
+    """Ограниченный кеш повторяющихся строк: равные строки — один объект.
+
+    В отличие от sys.intern, кеш принадлежит парсеру и не растёт без
+    предела: когда в нём max_size строк, он очищается и набирается
+    заново из текущего потока.
+    """
+
+    __slots__ = ('_strings', 'max_size')
+
+    def __init__(self, max_size: int = STRING_CACHE_SIZE):
+        self.max_size = max_size
+        self._strings: dict[str, str] = {}
+
+    def __call__(self, value: str) -> str:
+        """Ранее виденный объект, равный value, или сам value."""
+        cached = self._strings.get(value)
+        if cached is not None:
+            return cached
+        if len(self._strings) >= self.max_size:
+            self._strings.clear()
+        self._strings[value] = value
+        return value
+
+
+class ColumnBatch:
+    """Пачка строк таблицы лога, разложенная по колонкам.
+
+    Строится один раз из списка строк: транспонирование через zip идёт в
+    C, и временные кортежи строк сразу освобождаются. Итерация отдаёт
+    строки-кортежи в порядке LOG_ENTRY_COLUMNS — в таком виде их
+    принимает COPY. Колонка status или size, в которой встретилось
+    не целое значение, остаётся кортежем.
+    """
+
+    __slots__ = ('_length', 'columns')
+
+    def __init__(self, columns: Sequence[Sequence[Any]], length: int):
+        self.columns = columns
+        self._length = length
+
+    @classmethod
+    def from_rows(cls, rows: Sequence[tuple]) -> 'ColumnBatch':
+        """Пачка из строк в порядке LOG_ENTRY_COLUMNS."""
+        if not rows:
+            return cls([() for _ in LOG_ENTRY_COLUMNS], 0)
+
+        columns: list[Sequence[Any]] = list(zip(*rows, strict=True))
+        for index, typecode in ARRAY_COLUMNS:
+            with contextlib.suppress(TypeError, OverflowError):
+                columns[index] = array(typecode, columns[index])
+        return cls(columns, len(rows))
+
+    def __len__(self) -> int:
+        return self._length
+
+    def __iter__(self) -> Iterator[tuple]:
+        return zip(*self.columns, strict=True)
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, ColumnBatch):
+            return NotImplemented
+        return list(self) == list(other)
+
+    __hash__ = None  # type: ignore[assignment]
+
+    def __repr__(self) -> str:
+        return f'ColumnBatch({self._length} строк)'
+
+    def column(self, name: str) -> Sequence[Any]:
+        """Значения одной колонки."""
+        return self.columns[COLUMN_INDEX[name]]
+
+    def row(self, index: int) -> LogRow:
+        """Одна строка пачки."""
+        return LogRow._make(column[index] for column in self.columns)
+
+
+# Часть пакета писателя: пачка разбора или список строк record_to_row.
+RowPart = ColumnBatch | Sequence[tuple]
+
+
+def has_source_keys(parts: Iterable[RowPart]) -> bool:
+    """Есть ли source_key хотя бы у одной строки в частях пакета."""
+    for part in parts:
+        keys = (
+            part.column('source_key')
+            if isinstance(part, ColumnBatch)
+            else (row[SOURCE_KEY_COLUMN] for row in part)
+        )
+        if any(key is not None for key in keys):
+            return True
+    return False
@@ -0,0 +1,32 @@
+"""Разбиение строки combined-формата nginx на поля.
+
+Поля достаются позиционно через match.groups(), без groupdict: словарь
+групп на каждую строку стоил больше, чем само сопоставление. Разбор
+вручную через str.split/partition на CPython оказался медленнее
+регулярного выражения, которое работает в C (см. benchmarks/bench_parser.py).
+"""
+
+import re
+
+COMBINED_PATTERN = re.compile(
+    r'(?P<remote_addr>\S+) - - \[(?P<timestamp>[^\]]+)\] '
+    r'"(?P<method>\S+) (?P<uri>\S+) (?P<http_version>[^"]+)" '
+    r'(?P<status>\d{3}) (?P<size>\d+) "(?P<referrer>[^"]*)" "(?P<user_agent>[^"]*)"'
+)
+
+CombinedFields = tuple[str, str, str, str, str, str, str, str, str]
+
+_match_combined = COMBINED_PATTERN.match
+
+
+def split_combined(line: str) -> CombinedFields | None:
+    """Поля строки combined-формата в порядке групп COMBINED_PATTERN.
+
+    Args:
+        line: строка лога без завершающего перевода строки
+
+    Returns:
+        кортеж из девяти строк или None, если строка не в combined-формате
+    """
+    match = _match_combined(line)
+    return match.groups() if match else None  # type: ignore[return-value]
@@ -0,0 +1,102 @@
+"""Какие файлы логов слушает монитор и к какому серверу они относятся.
+
+Цель мониторинга — путь или glob-шаблон вместе с ID сервера и, при
+необходимости, log_format. Цели задаются повторяющейся опцией
+``--file путь:server_id`` или TOML-файлом::
+
+    [[files]]
+    path = "/var/log/nginx/*.access.log"
+    server_id = 3
+    log_format = "main"
+
+Шаблоны раскрываются заново при каждом обходе, поэтому новые файлы
+(например, лог только что добавленного vhost) подхватываются без
+перезапуска монитора.
+"""
+
+import glob
+import tomllib
+
+from dataclasses import dataclass
+from pathlib import Path
+
+from apps.services.log_import import is_compressed
+
+GLOB_CHARS = frozenset('*?[')
+
+
+@dataclass(frozen=True)
+class MonitorTarget:
+    """Путь или glob-шаблон файлов логов одного сервера."""
+
+    path: str
+    server_id: int
+    log_format: str | None = None
+
+    @property
+    def is_pattern(self) -> bool:
+        """Путь содержит символы glob и может совпасть с несколькими файлами."""
+        return any(char in GLOB_CHARS for char in self.path)
+
+
+def parse_file_option(value: str, log_format: str | None = None) -> MonitorTarget:
+    """Цель из значения опции ``--file путь:server_id``.
+
+    Raises:
+        ValueError: нет двоеточия или ID сервера не целое число
+    """
+    path, separator, server_id = value.rpartition(':')
+    if not separator or not path:
+        raise ValueError(f'Ожидается путь:server_id, получено: {value}')
+
+    try:
+        return MonitorTarget(path, int(server_id), log_format)
+    except ValueError:
+        raise ValueError(f'ID сервера должен быть целым числом: {value}') from None
+
+
+def load_monitor_config(path: str | Path) -> list[MonitorTarget]:
+    """Цели мониторинга из TOML-файла с массивом таблиц [[files]].
+
+    Raises:
+        ValueError: файл не TOML или у записи нет path/server_id
+    """
+    try:
+        config = tomllib.loads(Path(path).read_text())
+    except tomllib.TOMLDecodeError as e:
+        raise ValueError(f'Некорректный TOML в {path}: {e}') from None
+
+    targets = []
+    for index, entry in enumerate(config.get('files', [])):
+        try:
+            targets.append(
+                MonitorTarget(str(entry['path']), int(entry['server_id']), entry.get('log_format'))
+            )
+        except (KeyError, TypeError, ValueError):
+            raise ValueError(
+                f'{path}: в записи files[{index}] нужны path и целый server_id'
+            ) from None
+
+    if not targets:
+        raise ValueError(f'{path}: не задано ни одной записи [[files]]')
+    return targets
+
+
+def expand_targets(targets: list[MonitorTarget]) -> dict[Path, MonitorTarget]:
+    """Файлы, подходящие под цели, с целью для каждого файла.
+
+    Сжатые файлы пропускаются — nginx в них не пишет, а их импорт — задача
+    команды import. Если файл подходит под несколько целей, побеждает
+    первая.
+    """
+    files: dict[Path, MonitorTarget] = {}
+    for target in targets:
+        paths = (
+            sorted(glob.glob(target.path, recursive=True)) if target.is_pattern else [target.path]
+        )
+        for raw_path in paths:
+            path = Path(raw_path).absolute()
+            if is_compressed(path) or (target.is_pattern and not path.is_file()):
+                continue
+            files.setdefault(path, target)
+    return files
@@ -1,8 +1,9 @@
 import asyncio
-import re
+import os
+import uuid
 
 from collections.abc import AsyncGenerator
-from datetime import datetime
+from collections.abc import Callable
 from pathlib import Path
 
 import aiofiles
@@ -11,90 +12,402 @@ from loguru import logger
 
 from apps.api.v1.models.log_entry_model import LogEntryModel
 from apps.db.session import connector
+from apps.services.dimensions import resolve_dimensions
+from apps.services.file_watcher import create_file_watcher
+from apps.services.log_format import LogFormatParser
+from apps.services.log_format import compile_log_format
+from apps.services.log_rows import INTERNED_COLUMNS
+from apps.services.log_rows import LOG_ENTRY_COLUMNS
+from apps.services.log_rows import LogRow
+from apps.services.log_rows import StringCache
+from apps.services.log_rows import check_record_lengths
+from apps.services.log_rows import check_row_lengths
+from apps.services.log_rows import record_to_row
+from apps.services.log_tokenizer import COMBINED_PATTERN
+from apps.services.log_tokenizer import split_combined
+from apps.services.nginx_timestamp import parse_nginx_timestamp
+from apps.services.parse_failures import BAD_VALUE
+from apps.services.parse_failures import NO_MATCH
+from apps.services.parse_failures import LineRejectedError
+from apps.services.parse_failures import excerpt
+from apps.services.parse_failures import sampled_warning
+from apps.services.source_key import file_identity
+from apps.services.source_key import split_lines
+from apps.services.tail_checkpoint import TailCheckpoint
+from apps.services.tail_checkpoint import first_line_fingerprint
 
-POLL_INTERVAL_SECONDS = 1
 ERROR_BACKOFF_SECONDS = 5
+READ_CHUNK_SIZE = 1024 * 1024
+MAX_LINE_BYTES = READ_CHUNK_SIZE
+COMBINED_COLUMNS = LOG_ENTRY_COLUMNS[: LOG_ENTRY_COLUMNS.index('user_agent') + 1]
 
 
 class NginxLogParser:
-    """Парсер логов nginx в реальном времени."""
+    """Парсер логов nginx в реальном времени.
 
-    def __init__(self, log_file_path: str, server_id: int = 1):
+    Без log_format строки разбираются как combined. С log_format — парсером,
+    скомпилированным из директивы nginx: 'combined', 'main', строка формата
+    или директива log_format из nginx.conf целиком.
+    """
+
+    def __init__(self, log_file_path: str, server_id: int = 1, log_format: str | None = None):
         self.log_file_path = Path(log_file_path)
         self.server_id = server_id
+        self.log_format: LogFormatParser | None = (
+            compile_log_format(log_format) if log_format else None
+        )
         self.position = 0
-        self.log_pattern = re.compile(
-            r'(?P<remote_addr>\S+) - - \[(?P<timestamp>[^\]]+)\] '
-            r'"(?P<method>\S+) (?P<uri>\S+) (?P<http_version>[^"]+)" '
-            r'(?P<status>\d{3}) (?P<size>\d+) "(?P<referrer>[^"]*)" "(?P<user_agent>[^"]*)"'
+        self.chunk_offset = 0
+        self.line_offsets: list[int] = []
+        self.device: int | None = None
+        self.inode: int | None = None
+        self.fingerprint = ''
+        self.log_pattern = COMBINED_PATTERN
+        self.strings: Callable[[str], str] = StringCache()
+
+    def parse_record(self, line: str) -> dict:
+        """Разбирает одну строку лога nginx в словарь колонок LogEntryModel.
+
+        Raises:
+            LineRejectedError: строка не подходит под формат (NO_MATCH) или
+                значение поля некорректно либо длиннее колонки таблицы (BAD_VALUE)
+        """
+        line = line.strip()
+        if self.log_format is not None:
+            return self._parse_with_format(line, self.log_format)
+        return dict(zip(COMBINED_COLUMNS, self._parse_combined(line, None), strict=False))
+
+    def parse_row(self, line: str, key: uuid.UUID | None = None) -> LogRow:
+        """Разбирает одну строку лога nginx сразу в строку таблицы для COPY.
+
+        В отличие от parse_record, combined разбирается без промежуточного
+        словаря, а повторяющиеся строки (метод, URI, user agent...)
+        берутся из кеша парсера, так что одинаковые значения в пачке —
+        один объект.
+
+        Args:
+            line: строка лога
+            key: source_key строки
+
+        Raises:
+            LineRejectedError: как у parse_record
+        """
+        line = line.strip()
+        if self.log_format is None:
+            return self._parse_combined(line, key)
+
+        record = self._parse_with_format(line, self.log_format)
+        strings = self.strings
+        for column in INTERNED_COLUMNS:
+            value = record.get(column)
+            if isinstance(value, str):
+                record[column] = strings(value)
+        record['source_key'] = key
+        return record_to_row(record)
+
+    def _parse_combined(self, line: str, key: uuid.UUID | None) -> LogRow:
+        """Разбор строки формата combined."""
+        fields = split_combined(line)
+        if fields is None:
+            raise LineRejectedError(NO_MATCH, 'строка не в формате combined')
+
+        remote_addr, timestamp, method, uri, http_version, status, size, referrer, user_agent = (
+            fields
         )
+        strings = self.strings
+
+        try:
+            row = LogRow(
+                self.server_id,
+                parse_nginx_timestamp(timestamp),
+                strings(remote_addr),
+                strings(method),
+                strings(uri),
+                strings(http_version),
+                int(status),
+                int(size),
+                strings(referrer) if referrer != '-' else None,
+                strings(user_agent) if user_agent != '-' else None,
+                None,
+                None,
+                None,
+                None,
+                None,
+                key,
+            )
+            check_row_lengths(row)
+        except ValueError as e:
+            raise LineRejectedError(BAD_VALUE, str(e)) from None
+        return row
+
+    def parse_line(self, line: str) -> dict | None:
+        """Парсит одну строку лога nginx; None, если строка не разобрана.
+
+        О строках с некорректными значениями пишется предупреждение, но не
+        чаще одного за PARSE_WARNING_INTERVAL_SECONDS.
+        """
+        try:
+            return self.parse_record(line)
+        except LineRejectedError as e:
+            if e.reason == BAD_VALUE:
+                sampled_warning.warn(
+                    e.reason, f'Ошибка парсинга строки: {excerpt(line.strip())}, ошибка: {e}'
+                )
+            return None
+
+    def _parse_with_format(self, line: str, log_format: LogFormatParser) -> dict:
+        """Разбор строки парсером, скомпилированным из log_format."""
+        try:
+            record = log_format.parse(line)
+            if record is not None:
+                check_record_lengths(record)
+        except ValueError as e:
+            raise LineRejectedError(BAD_VALUE, str(e)) from None
+
+        if record is None:
+            raise LineRejectedError(NO_MATCH, 'строка не подходит под log_format')
+        record['server_id'] = self.server_id
+        return record
 
     async def parse_log_line(self, line: str) -> dict | None:
         """Парсит одну строку лога nginx."""
-        match = self.log_pattern.match(line.strip())
-        if not match:
+        return self.parse_line(line)
+
+    async def read_new_lines(
+        self, file_path: Path | None = None
+    ) -> AsyncGenerator[list[str], None]:
+        """Читает файл от position до конца кусками по READ_CHUNK_SIZE байт.
+
+        Отдаёт по пачке непустых строк на каждый прочитанный кусок, поэтому
+        в памяти одновременно лежит не больше одного куска независимо от
+        размера хвоста. Незавершённая последняя строка не разбирается:
+        position сдвигается только на конец последней полной строки, и
+        остаток будет перечитан, когда writer допишет перевод строки.
+        Смещение начала отданного куска — в chunk_offset, смещения начал
+        его строк — в line_offsets.
+
+        Args:
+            file_path: файл для чтения, по умолчанию log_file_path; после
+                ротации сюда передаётся путь, под которым лежит старый файл
+        """
+        async with aiofiles.open(file_path or self.log_file_path, 'rb') as f:
+            await f.seek(self.position)
+            carry = b''
+            skipping = False
+
+            while chunk := await f.read(READ_CHUNK_SIZE):
+                data = carry + chunk
+                carry = b''
+
+                if skipping:
+                    newline = data.find(b'\n')
+                    if newline == -1:
+                        self.position += len(data)
+                        continue
+                    self.position += newline + 1
+                    data = data[newline + 1 :]
+                    skipping = False
+
+                line_end = data.rfind(b'\n')
+
+                if line_end == -1:
+                    carry = data
+                    if len(carry) > MAX_LINE_BYTES:
+                        logger.warning(
+                            f'Строка длиннее {MAX_LINE_BYTES} байт в {self.log_file_path} '
+                            f'на смещении {self.position} пропущена'
+                        )
+                        self.position += len(carry)
+                        carry = b''
+                        skipping = True
+                    continue
+
+                complete, carry = data[: line_end + 1], data[line_end + 1 :]
+                self.chunk_offset = self.position
+                lines, self.line_offsets = split_lines(complete, self.position)
+                self.position += len(complete)
+
+                if lines:
+                    yield lines
+
+    def checkpoint(self) -> TailCheckpoint | None:
+        """Текущая позиция чтения вместе с идентичностью читаемого файла."""
+        if self.device is None or self.inode is None:
             return None
 
-        data = match.groupdict()
+        if not self.fingerprint and self.position:
+            self.fingerprint = first_line_fingerprint(self._current_file_path())
+
+        return TailCheckpoint(
+            device=self.device,
+            inode=self.inode,
+            offset=self.position,
+            fingerprint=self.fingerprint,
+        )
+
+    def source_identity(self) -> str | None:
+        """Идентичность читаемого файла для source_key строк; см. file_identity."""
+        return file_identity(self.fingerprint, self.device, self.inode)
+
+    def _switch_to(self, stat: os.stat_result, position: int, fingerprint: str = '') -> None:
+        """Начинает читать файл с указанной идентичностью с позиции position."""
+        self.device = stat.st_dev
+        self.inode = stat.st_ino
+        self.position = position
+        self.fingerprint = fingerprint
 
+    def _find_rotated_file(self, device: int, inode: int) -> Path | None:
+        """Ищет рядом с логом файл с заданным inode — так logrotate переименовывает лог."""
+        for candidate in sorted(self.log_file_path.parent.glob(f'{self.log_file_path.name}*')):
+            if candidate == self.log_file_path:
+                continue
+            try:
+                stat = candidate.stat()
+            except OSError:
+                continue
+            if (stat.st_dev, stat.st_ino) == (device, inode):
+                return candidate
+        return None
+
+    def _current_file_path(self) -> Path:
+        """Путь, под которым сейчас лежит читаемый файл."""
         try:
-            parsed_time = datetime.strptime(data['timestamp'], '%d/%b/%Y:%H:%M:%S %z')
-
-            return {
-                'server_id': self.server_id,
-                'timestamp': parsed_time,
-                'remote_addr': data['remote_addr'],
-                'method': data['method'],
-                'uri': data['uri'],
-                'http_version': data['http_version'],
-                'status': int(data['status']),
-                'size': int(data['size']),
-                'referrer': data['referrer'] if data['referrer'] != '-' else None,
-                'user_agent': data['user_agent'] if data['user_agent'] != '-' else None,
-            }
-        except (ValueError, KeyError) as e:
-            logger.warning(f'Ошибка парсинга строки: {line.strip()}, ошибка: {e}')
-            return None
+            stat = self.log_file_path.stat()
+            if (stat.st_dev, stat.st_ino) == (self.device, self.inode):
+                return self.log_file_path
+        except OSError:
+            pass
 
-    async def monitor_log_file(self) -> AsyncGenerator[dict, None]:
-        """Мониторит файл логов в реальном времени."""
+        if self.device is not None and self.inode is not None:
+            rotated = self._find_rotated_file(self.device, self.inode)
+            if rotated:
+                return rotated
+
+        return self.log_file_path
+
+    async def _resume(self, checkpoint: TailCheckpoint | None) -> AsyncGenerator[list[str], None]:
+        """Восстанавливает позицию после перезапуска.
+
+        Без чекпоинта чтение начинается с конца файла. Если файл тот же и
+        не стал короче, чтение продолжается со смещения чекпоинта. Если за
+        время простоя лог провернули, сначала дочитывается старый файл
+        (например, access.log.1), а новый читается с начала.
+        """
+        stat = self.log_file_path.stat()
+
+        if checkpoint is None:
+            self._switch_to(stat, stat.st_size)
+            return
+
+        same_file = (stat.st_dev, stat.st_ino) == (checkpoint.device, checkpoint.inode)
+        if (
+            same_file
+            and stat.st_size >= checkpoint.offset
+            and checkpoint.fingerprint in ('', first_line_fingerprint(self.log_file_path))
+        ):
+            self._switch_to(stat, checkpoint.offset, checkpoint.fingerprint)
+            return
+
+        rotated = (
+            None if same_file else self._find_rotated_file(checkpoint.device, checkpoint.inode)
+        )
+        if rotated and checkpoint.fingerprint in ('', first_line_fingerprint(rotated)):
+            logger.info(f'Дочитываем провёрнутый файл {rotated} со смещения {checkpoint.offset}')
+            self.device, self.inode = checkpoint.device, checkpoint.inode
+            self.position, self.fingerprint = checkpoint.offset, checkpoint.fingerprint
+            async for lines in self.read_new_lines(rotated):
+                yield lines
+        else:
+            logger.warning(f'Файл из чекпоинта для {self.log_file_path} не найден, читаем с начала')
+
+        self._switch_to(stat, 0)
+
+    async def _drain_rotated(self) -> AsyncGenerator[list[str], None]:
+        """Дочитывает старый файл после ротации по его новому имени."""
+        if self.device is None or self.inode is None:
+            return
+
+        rotated = self._find_rotated_file(self.device, self.inode)
+        if rotated is None:
+            logger.warning(
+                f'Провёрнутый файл {self.log_file_path} не найден, '
+                f'его хвост после смещения {self.position} потерян'
+            )
+            return
+
+        async for lines in self.read_new_lines(rotated):
+            yield lines
+
+    async def tail_log_file(
+        self, checkpoint: TailCheckpoint | None = None
+    ) -> AsyncGenerator[list[str], None]:
+        """Следит за файлом логов и отдаёт пачки новых непустых строк без разбора.
+
+        Между чтениями ждёт события наблюдателя: inotify на Linux, опрос
+        по таймеру в остальных случаях. Ротация определяется по смене
+        inode: старый файл дочитывается до конца, пока nginx не начнёт
+        писать в новый, и только потом чтение переходит на новый файл.
+
+        Args:
+            checkpoint: позиция, с которой продолжить; без неё — конец файла
+        """
         if not self.log_file_path.exists():
             logger.error(f'Файл логов не найден: {self.log_file_path}')
             return
 
-        self.position = self.log_file_path.stat().st_size
+        watcher = create_file_watcher(self.log_file_path)
 
-        while True:
-            try:
-                current_size = self.log_file_path.stat().st_size
+        try:
+            async for lines in self._resume(checkpoint):
+                yield lines
+
+            while True:
+                try:
+                    stat = self.log_file_path.stat()
 
-                if current_size < self.position:
-                    self.position = 0
+                    if (stat.st_dev, stat.st_ino) != (self.device, self.inode):
+                        async for lines in self._drain_rotated():
+                            yield lines
 
-                if current_size > self.position:
-                    async with aiofiles.open(self.log_file_path, encoding='utf-8') as f:
-                        await f.seek(self.position)
-                        new_lines = await f.read()
+                        if stat.st_size == 0:
+                            await watcher.wait()
+                            continue
 
-                        for line in new_lines.splitlines():
-                            if line.strip():
-                                parsed_data = await self.parse_log_line(line)
-                                if parsed_data:
-                                    yield parsed_data
+                        logger.info(f'Файл {self.log_file_path} провёрнут, читаем новый')
+                        self._switch_to(stat, 0)
 
-                    self.position = current_size
+                    elif stat.st_size < self.position:
+                        logger.info(f'Файл {self.log_file_path} усечён, читаем с начала')
+                        self._switch_to(stat, 0)
 
-                await asyncio.sleep(POLL_INTERVAL_SECONDS)
+                    if stat.st_size > self.position:
+                        async for lines in self.read_new_lines():
+                            yield lines
 
-            except Exception:
-                logger.exception('Ошибка мониторинга логов')
-                await asyncio.sleep(ERROR_BACKOFF_SECONDS)
+                    await watcher.wait()
+
+                except FileNotFoundError:
+                    await watcher.wait()
+
+                except Exception:
+                    logger.exception('Ошибка мониторинга логов')
+                    await asyncio.sleep(ERROR_BACKOFF_SECONDS)
+        finally:
+            watcher.close()
+
+    async def monitor_log_file(self) -> AsyncGenerator[dict, None]:
+        """Мониторит файл логов в реальном времени."""
+        async for lines in self.tail_log_file():
+            for line in lines:
+                parsed_data = await self.parse_log_line(line)
+                if parsed_data:
+                    yield parsed_data
 
     async def save_log_entry(self, log_data: dict) -> None:
         """Сохраняет запись лога в базу данных."""
         try:
             async with connector.get_pg_session_cm() as db_session:
-                log_entry = LogEntryModel(**log_data)
+                log_entry = LogEntryModel(**await resolve_dimensions(db_session, log_data))
                 db_session.add(log_entry)
                 await db_session.commit()
                 logger.debug(
@@ -105,12 +418,3 @@ class NginxLogParser:
                 )
         except Exception:
             logger.exception('Ошибка сохранения лога')
-
-
-async def start_log_monitoring(log_file_path: str, server_id: int = 1) -> None:
-    """Запускает мониторинг логов nginx."""
-    parser = NginxLogParser(log_file_path, server_id)
-    logger.info(f'Запуск мониторинга логов: {log_file_path}')
-
-    async for log_data in parser.monitor_log_file():
-        await parser.save_log_entry(log_data)
@@ -0,0 +1,105 @@
+"""Разбор времени из $time_local nginx.
+
+Формат фиксированный: '25/Dec/2024:10:30:15 +0300'. Вместо
+datetime.strptime, который на каждый вызов разбирает строку формата,
+поля вырезаются срезами по известным позициям, месяц берётся из таблицы,
+а объект timezone создаётся один раз на смещение. Результат кешируется
+по исходной строке: nginx пишет тысячи строк с одной и той же секундой.
+"""
+
+from datetime import datetime
+from datetime import timedelta
+from datetime import timezone
+from functools import lru_cache
+
+TIMESTAMP_CACHE_SIZE = 4096
+TIMESTAMP_LENGTH = len('25/Dec/2024:10:30:15 +0300')
+
+MONTHS = {
+    'Jan': 1,
+    'Feb': 2,
+    'Mar': 3,
+    'Apr': 4,
+    'May': 5,
+    'Jun': 6,
+    'Jul': 7,
+    'Aug': 8,
+    'Sep': 9,
+    'Oct': 10,
+    'Nov': 11,
+    'Dec': 12,
+}
+
+_timezones: dict[str, timezone] = {}
+
+
+def _get_timezone(offset: str) -> timezone:
+    """Объект timezone для смещения вида '+0300', один на всё время работы."""
+    if tz := _timezones.get(offset):
+        return tz
+
+    sign = offset[0]
+    digits = offset[1:]
+    if (
+        sign not in '+-'
+        or len(digits) != 4
+        or not digits.isascii()
+        or not digits.isdigit()
+        or digits[2] > '5'
+    ):
+        raise ValueError(f'Некорректное смещение часового пояса: {offset}')
+
+    minutes = int(digits[:2]) * 60 + int(digits[2:])
+    delta = timedelta(minutes=-minutes if sign == '-' else minutes)
+    tz = timezone(delta)
+    _timezones[offset] = tz
+    return tz
+
+
+def _parse_fixed(raw: str) -> datetime:
+    """Разбор по фиксированным позициям; ValueError, если формат не тот."""
+    if (
+        len(raw) != TIMESTAMP_LENGTH
+        or raw[2] != '/'
+        or raw[6] != '/'
+        or raw[11] != ':'
+        or raw[14] != ':'
+        or raw[17] != ':'
+        or raw[20] != ' '
+    ):
+        raise ValueError(f'Некорректное время: {raw}')
+
+    digits = raw[0:2] + raw[7:11] + raw[12:14] + raw[15:17] + raw[18:20]
+    if not digits.isascii() or not digits.isdigit():
+        raise ValueError(f'Некорректное время: {raw}')
+
+    month = MONTHS.get(raw[3:6])
+    if month is None:
+        raise ValueError(f'Некорректный месяц: {raw}')
+
+    return datetime(
+        int(raw[7:11]),
+        month,
+        int(raw[0:2]),
+        int(raw[12:14]),
+        int(raw[15:17]),
+        int(raw[18:20]),
+        tzinfo=_get_timezone(raw[21:]),
+    )
+
+
+@lru_cache(maxsize=TIMESTAMP_CACHE_SIZE)
+def parse_nginx_timestamp(raw: str) -> datetime:
+    """Переводит $time_local nginx в datetime с часовым поясом.
+
+    Строки нестандартного вида (например, без ведущего нуля в дне)
+    разбираются через strptime, поэтому результат и ошибки совпадают с
+    прежним поведением.
+
+    Raises:
+        ValueError: строка не является временем nginx
+    """
+    try:
+        return _parse_fixed(raw)
+    except ValueError:
+        return datetime.strptime(raw, '%d/%b/%Y:%H:%M:%S %z')
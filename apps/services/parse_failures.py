@@ -0,0 +1,244 @@
+"""Учёт строк лога, которые не удалось разобрать.
+
+Поток битых строк (например, бот шлёт мусорные запросы) не должен
+стоить дороже, чем поток нормальных: предупреждение на каждую строку с
+полным текстом удваивало CPU монитора. Поэтому строки считаются по
+причинам, в лог попадает не больше одного предупреждения за
+PARSE_WARNING_INTERVAL_SECONDS на причину, а сами строки с файлом и
+смещением пишутся в dead-letter файл, откуда их можно импортировать
+повторно (python cli.py import --dead-letter).
+"""
+
+import os
+import time
+
+from pathlib import Path
+from typing import Any
+
+import orjson
+
+from loguru import logger
+
+from apps.settings import SETTINGS
+from apps.utils.metrics import Counter
+
+NO_MATCH = 'no_match'
+BAD_VALUE = 'bad_value'
+FAILURE_REASONS = (NO_MATCH, BAD_VALUE)
+# Строка разобрана, но база её не приняла (apps/services/log_batch_writer.py).
+DB_REJECTED = 'db_rejected'
+
+LINE_EXCERPT_CHARS = 200
+
+Reject = tuple[int, str, str]
+
+PARSED = 'parsed'
+MONITOR_LINES = Counter(
+    'nginx_analyzer_monitor_lines_total',
+    'Строки, прочитанные монитором: разобранные и отвергнутые по причинам',
+    ('server_id', 'outcome'),
+)
+
+
+class LineRejectedError(ValueError):
+    """Строка лога не разобрана.
+
+    Args:
+        reason: NO_MATCH — строка не подходит под формат, BAD_VALUE —
+            подходит, но значение поля некорректно (например, время)
+        detail: пояснение для лога
+    """
+
+    def __init__(self, reason: str, detail: str = ''):
+        super().__init__(detail or reason)
+        self.reason = reason
+
+
+def excerpt(line: str) -> str:
+    """Начало строки для лога: мусорные строки бывают очень длинными."""
+    if len(line) <= LINE_EXCERPT_CHARS:
+        return line
+    return f'{line[:LINE_EXCERPT_CHARS]}... ({len(line)} символов)'
+
+
+class SampledWarning:
+    """Предупреждения не чаще одного за interval секунд на причину.
+
+    Подавленные предупреждения считаются, и их число добавляется к
+    следующему выведенному.
+    """
+
+    def __init__(self, interval: float | None = None):
+        self.interval = (
+            interval if interval is not None else SETTINGS.PARSE_WARNING_INTERVAL_SECONDS
+        )
+        self._last_at: dict[str, float] = {}
+        self._suppressed: dict[str, int] = {}
+
+    def warn(self, reason: str, message: str, count: int = 1) -> None:
+        """Пишет предупреждение, если по этой причине давно не писали.
+
+        Args:
+            reason: причина, по которой ограничивается частота
+            message: текст о последней из строк
+            count: сколько строк описывает предупреждение
+        """
+        now = time.monotonic()
+        last_at = self._last_at.get(reason)
+        if last_at is not None and now - last_at < self.interval:
+            self._suppressed[reason] = self._suppressed.get(reason, 0) + count
+            return
+
+        self._last_at[reason] = now
+        suppressed = self._suppressed.pop(reason, 0) + count - 1
+        if suppressed:
+            message = f'{message} (и ещё {suppressed} таких строк с прошлого предупреждения)'
+        logger.warning(message)
+
+
+sampled_warning = SampledWarning()
+
+
+class DeadLetterFile:
+    """Файл отвергнутых строк в формате JSON Lines с ротацией по размеру.
+
+    Запись — объект с полями file, offset, server_id, reason и line. У
+    строк, отвергнутых базой (DB_REJECTED), исходной строки нет: line —
+    None, а значения колонок лежат в row.
+    Когда файл дорастает до max_bytes, он переименовывается в .1, старые
+    копии сдвигаются, и хранится не больше backups копий.
+    """
+
+    def __init__(
+        self,
+        path: str | Path,
+        max_bytes: int | None = None,
+        backups: int | None = None,
+    ):
+        self.path = Path(path)
+        self.max_bytes = max_bytes or SETTINGS.MONITOR_DEAD_LETTER_MAX_MB * 1024 * 1024
+        self.backups = backups if backups is not None else SETTINGS.MONITOR_DEAD_LETTER_BACKUPS
+        try:
+            self._size = self.path.stat().st_size
+        except OSError:
+            self._size = 0
+
+    def write(self, entries: list[dict[str, Any]]) -> None:
+        """Дописывает записи одной операцией записи."""
+        data = b''.join(orjson.dumps(entry) + b'\n' for entry in entries)
+        if self._size and self._size + len(data) > self.max_bytes:
+            self._rotate()
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.path, 'ab') as f:
+            f.write(data)
+        self._size += len(data)
+
+    def _rotate(self) -> None:
+        for index in range(self.backups - 1, 0, -1):
+            backup = self.path.with_name(f'{self.path.name}.{index}')
+            if backup.exists():
+                os.replace(backup, self.path.with_name(f'{self.path.name}.{index + 1}'))
+
+        if self.backups:
+            os.replace(self.path, self.path.with_name(f'{self.path.name}.1'))
+        else:
+            self.path.unlink()
+        self._size = 0
+
+
+class ParseFailures:
+    """Счётчики разобранных и отвергнутых строк монитора по причинам."""
+
+    def __init__(self, dead_letter: DeadLetterFile | None = None):
+        self.dead_letter = dead_letter
+        self.parsed = 0
+        self.rejected = dict.fromkeys(FAILURE_REASONS, 0)
+
+    @property
+    def ratio(self) -> float:
+        """Доля отвергнутых строк среди всех прочитанных."""
+        rejected = sum(self.rejected.values())
+        total = self.parsed + rejected
+        return rejected / total if total else 0.0
+
+    def stats(self) -> dict[str, Any]:
+        """Счётчики строк и доля отвергнутых для статистики конвейера."""
+        return {
+            'parsed_lines': self.parsed,
+            'rejected_lines': dict(self.rejected),
+            'failure_ratio': round(self.ratio, 6),
+        }
+
+    def record(
+        self,
+        path: Path,
+        server_id: int,
+        offset: int,
+        lines: list[str],
+        parsed: int,
+        rejects: list[Reject],
+    ) -> None:
+        """Учитывает разобранную пачку строк.
+
+        Args:
+            path: файл, из которого прочитана пачка
+            server_id: сервер файла
+            offset: смещение первой строки пачки в файле
+            lines: строки пачки
+            parsed: сколько строк разобрано
+            rejects: отвергнутые строки — индекс в пачке, причина, пояснение
+        """
+        self.parsed += parsed
+        MONITOR_LINES.labels(server_id, PARSED).inc(parsed)
+        if not rejects:
+            return
+
+        last_rejects: dict[str, Reject] = {}
+        counts: dict[str, int] = {}
+        for reject in rejects:
+            reason = reject[1]
+            counts[reason] = counts.get(reason, 0) + 1
+            last_rejects[reason] = reject
+
+        for reason, (index, _, detail) in last_rejects.items():
+            self.rejected[reason] += counts[reason]
+            MONITOR_LINES.labels(server_id, reason).inc(counts[reason])
+            sampled_warning.warn(
+                reason,
+                f'Строка {path} не разобрана ({reason}: {detail}): {excerpt(lines[index])}',
+                counts[reason],
+            )
+
+        if self.dead_letter is not None:
+            self.dead_letter.write(
+                [
+                    {
+                        'file': str(path),
+                        'offset': line_offset,
+                        'server_id': server_id,
+                        'reason': reason,
+                        'line': lines[index],
+                    }
+                    for (index, reason, _), line_offset in zip(
+                        rejects, _line_offsets(offset, lines, rejects), strict=True
+                    )
+                ]
+            )
+
+
+def _line_offsets(offset: int, lines: list[str], rejects: list[Reject]) -> list[int]:
+    """Смещения отвергнутых строк: пачка — подряд идущие строки файла.
+
+    Длина строки считается в UTF-8, поэтому после пустых строк или битых
+    байт UTF-8 внутри пачки смещение может оказаться неточным.
+    """
+    offsets = []
+    position = offset
+    next_index = 0
+    for index, _, _ in rejects:
+        for line in lines[next_index:index]:
+            position += len(line.encode()) + 1
+        next_index = index
+        offsets.append(position)
+    return offsets
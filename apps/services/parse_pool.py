@@ -0,0 +1,109 @@
+"""Разбор пачек строк лога в пуле процессов.
+
+Регулярное выражение, разбор времени и сборка записи держат ядро, на
+котором работает event loop. С пулом loop только читает файлы и пишет в
+БД, а строки разбирают процессы. Обратно процессы возвращают не словари,
+а ColumnBatch — пачку по колонкам с общими объектами повторяющихся строк:
+её дешевле передавать между процессами, и писатель кладёт её в пакет
+COPY без преобразования.
+"""
+
+import asyncio
+
+from concurrent.futures import ProcessPoolExecutor
+
+from apps.services.log_rows import ColumnBatch
+from apps.services.nginx_log_parser import NginxLogParser
+from apps.services.parse_failures import LineRejectedError
+from apps.services.parse_failures import Reject
+from apps.services.source_key import source_key
+
+ParsedBatch = tuple[ColumnBatch, list[Reject]]
+
+_worker_parsers: dict[tuple[int, str | None], NginxLogParser] = {}
+
+
+def parse_rows(
+    parser: NginxLogParser,
+    lines: list[str],
+    identity: str | None = None,
+    offsets: list[int] | None = None,
+) -> ParsedBatch:
+    """Строки таблицы лога для пачки строк и отвергнутые строки с причинами.
+
+    Args:
+        parser: парсер источника строк
+        lines: пачка строк
+        identity: идентичность источника; с ней и offsets строки получают source_key
+        offsets: смещения начал строк в источнике
+
+    Returns:
+        пачку разобранных строк и список (индекс строки в пачке, причина,
+        пояснение) для нераспознанных строк
+    """
+    parse_row = parser.parse_row
+    keyed = identity is not None and offsets is not None
+    rows = []
+    rejects = []
+    for index, line in enumerate(lines):
+        try:
+            rows.append(parse_row(line, source_key(identity, offsets[index]) if keyed else None))
+        except LineRejectedError as e:
+            rejects.append((index, e.reason, str(e)))
+    return ColumnBatch.from_rows(rows), rejects
+
+
+def parse_rows_in_worker(
+    server_id: int,
+    log_format: str | None,
+    lines: list[str],
+    identity: str | None,
+    offsets: list[int] | None,
+) -> ParsedBatch:
+    """parse_rows в процессе пула; парсер создаётся один раз на сервер и формат."""
+    key = (server_id, log_format)
+    parser = _worker_parsers.get(key)
+    if parser is None:
+        parser = _worker_parsers[key] = NginxLogParser('-', server_id, log_format=log_format)
+    return parse_rows(parser, lines, identity, offsets)
+
+
+class ParsePool:
+    """Пул процессов разбора, сохраняющий порядок пачек.
+
+    submit() сразу возвращает future, а результаты забираются в порядке
+    отправки, поэтому строки каждого файла доходят до БД в том порядке,
+    в каком были записаны, сколько бы процессов их ни разбирало.
+
+    В работе одновременно не больше window пачек — этого хватает, чтобы
+    занять все процессы, и обратное давление от писателей доходит до
+    чтения файлов, как и без пула.
+    """
+
+    def __init__(self, workers: int):
+        self.workers = workers
+        self.window = workers * 2
+        self._executor = ProcessPoolExecutor(max_workers=workers)
+
+    def submit(
+        self,
+        parser: NginxLogParser,
+        lines: list[str],
+        identity: str | None = None,
+        offsets: list[int] | None = None,
+    ) -> asyncio.Future[ParsedBatch]:
+        """Отправляет пачку строк на разбор в пул; аргументы — как у parse_rows."""
+        log_format = parser.log_format.log_format if parser.log_format else None
+        return asyncio.get_running_loop().run_in_executor(
+            self._executor,
+            parse_rows_in_worker,
+            parser.server_id,
+            log_format,
+            lines,
+            identity,
+            offsets,
+        )
+
+    def close(self) -> None:
+        """Останавливает процессы, не дожидаясь недоразобранных пачек."""
+        self._executor.shutdown(wait=False, cancel_futures=True)
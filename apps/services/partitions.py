@@ -0,0 +1,317 @@
+"""Секции таблицы логов по времени.
+
+log_entry_model секционирована по timestamp (PARTITION BY RANGE): каждая
+секция покрывает PARTITION_INTERVAL_DAYS суток UTC. Запросы с условием
+по timestamp читают только подходящие секции, а срок хранения
+соблюдается отсоединением секции целиком вместо DELETE по строкам.
+
+PartitionManager.maintain() заранее создаёт секции на PARTITION_PRECREATE
+интервалов вперёд и отсоединяет секции, все строки которых старше
+PARTITION_RETENTION_DAYS (при PARTITION_DROP_EXPIRED они удаляются, иначе
+остаются отдельными таблицами для архивации). Его запускают фоновая
+задача API (run_partition_maintenance) и команда partitions CLI.
+
+Срок хранения касается только сырых строк: минутные и часовые сводки
+и скетчи (apps/services/rollups.py) остаются намеренно. Они в тысячи
+раз меньше строк, и графики, топы и перцентили за период старше срока
+хранения по ним по-прежнему строятся; точные запросы (exact) и
+последние ошибки за такой период пусты.
+
+Строки, для которых секции ещё нет, попадают в секцию default. Новая
+секция создаётся отдельной таблицей, строки её диапазона переносятся в
+неё из default, и только затем она присоединяется — в одной транзакции.
+ATTACH PARTITION берёт на родительской таблице SHARE UPDATE EXCLUSIVE,
+так что запись в остальные секции не останавливается, но на секции
+default — ACCESS EXCLUSIVE, и просматривает её, проверяя, что строк
+нового диапазона в ней нет. Поэтому default блокируется (SHARE ROW
+EXCLUSIVE) ещё до переноса: писатели, которым нужна default, ждут
+конца транзакции, а не вставляют в неё строки между переносом и
+ATTACH, на которых он бы упал. Пока default мала, ожидание короткое.
+"""
+
+import asyncio
+import re
+
+from dataclasses import dataclass
+from dataclasses import field
+from datetime import UTC
+from datetime import datetime
+from datetime import timedelta
+
+from asyncpg import Connection
+from loguru import logger
+
+from apps.api.v1.models.log_entry_model import LogEntryModel
+from apps.db.session import PGEngineConnector
+from apps.db.session import connector
+from apps.settings import SETTINGS
+
+EPOCH = datetime(1970, 1, 1, tzinfo=UTC)
+# Ключ pg_advisory_lock: обслуживание из нескольких процессов не
+# создаёт одну секцию дважды.
+MAINTENANCE_LOCK_ID = 0x6C6F6770
+TRY_LOCK_SQL = 'SELECT pg_try_advisory_lock($1)'
+UNLOCK_SQL = 'SELECT pg_advisory_unlock($1)'
+PARTITION_BOUND_RE = re.compile(
+    r"FROM \((?:'(?P<lower>[^']+)'|MINVALUE)\) TO \((?:'(?P<upper>[^']+)'|MAXVALUE)\)"
+)
+
+LIST_PARTITIONS_SQL = (
+    'SELECT child.relname, pg_get_expr(child.relpartbound, child.oid) '
+    'FROM pg_inherits JOIN pg_class AS child ON child.oid = pg_inherits.inhrelid '
+    'WHERE pg_inherits.inhparent = $1::regclass'
+)
+
+
+@dataclass(frozen=True)
+class Partition:
+    """Секция таблицы логов; lower/upper — None для MINVALUE/MAXVALUE."""
+
+    name: str
+    lower: datetime | None = None
+    upper: datetime | None = None
+    is_default: bool = False
+
+
+@dataclass
+class MaintenanceResult:
+    """Итог обслуживания: имена секций и moved — строки, перенесённые из default."""
+
+    created: list[str] = field(default_factory=list)
+    moved: int = 0
+    detached: list[str] = field(default_factory=list)
+    dropped: list[str] = field(default_factory=list)
+
+
+def parse_partition(name: str, bound: str) -> Partition:
+    """Секция по выражению границ из pg_get_expr(relpartbound).
+
+    Raises:
+        ValueError: границы не по диапазону времени
+    """
+    if bound == 'DEFAULT':
+        return Partition(name, is_default=True)
+
+    match = PARTITION_BOUND_RE.search(bound)
+    if match is None:
+        raise ValueError(f'Неизвестные границы секции {name}: {bound}')
+
+    lower, upper = match.group('lower'), match.group('upper')
+    return Partition(
+        name,
+        datetime.fromisoformat(lower) if lower else None,
+        datetime.fromisoformat(upper) if upper else None,
+    )
+
+
+def partition_name(lower: datetime) -> str:
+    """Имя секции, начинающейся в lower: log_entry_model_pYYYYMMDD."""
+    return f'{LogEntryModel.__tablename__}_p{lower.astimezone(UTC):%Y%m%d}'
+
+
+def is_partition_name(name: str) -> bool:
+    """Таблица — секция log_entry_model (в том числе отсоединённая)."""
+    return name.startswith(f'{LogEntryModel.__tablename__}_')
+
+
+class PartitionManager:
+    """Создание будущих и отсоединение устаревших секций log_entry_model.
+
+    Args:
+        db_connector: коннектор к БД
+        interval_days: ширина секции в сутках; по умолчанию PARTITION_INTERVAL_DAYS
+        precreate: сколько секций держать впрок; по умолчанию PARTITION_PRECREATE
+        retention_days: срок хранения в сутках, 0 — бессрочно;
+            по умолчанию PARTITION_RETENTION_DAYS
+        drop_expired: удалять отсоединённые секции; по умолчанию PARTITION_DROP_EXPIRED
+    """
+
+    def __init__(
+        self,
+        db_connector: PGEngineConnector = connector,
+        interval_days: int | None = None,
+        precreate: int | None = None,
+        retention_days: int | None = None,
+        drop_expired: bool | None = None,
+    ):
+        self.connector = db_connector
+        self.interval = timedelta(days=interval_days or SETTINGS.PARTITION_INTERVAL_DAYS)
+        self.precreate = precreate if precreate is not None else SETTINGS.PARTITION_PRECREATE
+        self.retention_days = (
+            retention_days if retention_days is not None else SETTINGS.PARTITION_RETENTION_DAYS
+        )
+        self.drop_expired = (
+            drop_expired if drop_expired is not None else SETTINGS.PARTITION_DROP_EXPIRED
+        )
+
+        self.schema = LogEntryModel.__table__.schema
+        self.target = f'{self.schema}.{LogEntryModel.__tablename__}'
+
+    def cutoff(self, now: datetime) -> datetime | None:
+        """Граница хранения: секции, кончающиеся не позже неё, устарели."""
+        if self.retention_days <= 0:
+            return None
+        return now - timedelta(days=self.retention_days)
+
+    def missing_ranges(
+        self, partitions: list[Partition], now: datetime
+    ) -> list[tuple[datetime, datetime]]:
+        """Диапазоны секций, которые нужно создать к моменту now.
+
+        Секции идут подряд от конца самой поздней существующей (или от
+        начала текущего интервала, если секций по времени нет), пока не
+        покрыт интервал now + precreate. Уже устаревшие не создаются.
+        """
+        ranged = [partition for partition in partitions if not partition.is_default]
+        if any(partition.upper is None for partition in ranged):
+            return []
+
+        if ranged:
+            lower = max(partition.upper for partition in ranged)
+        else:
+            lower = EPOCH + (now - EPOCH) // self.interval * self.interval
+
+        horizon = now + self.interval * self.precreate
+        cutoff = self.cutoff(now)
+        ranges = []
+        while lower <= horizon:
+            upper = lower + self.interval
+            if cutoff is None or upper > cutoff:
+                ranges.append((lower, upper))
+            lower = upper
+        return ranges
+
+    def expired(self, partitions: list[Partition], now: datetime) -> list[Partition]:
+        """Секции, все строки которых старше срока хранения."""
+        cutoff = self.cutoff(now)
+        if cutoff is None:
+            return []
+        return [
+            partition
+            for partition in partitions
+            if partition.upper is not None and partition.upper <= cutoff
+        ]
+
+    async def partitions(self, connection: Connection) -> list[Partition]:
+        """Секции таблицы логов по возрастанию нижней границы."""
+        rows = await connection.fetch(LIST_PARTITIONS_SQL, self.target)
+        partitions = [parse_partition(name, bound) for name, bound in rows]
+        return sorted(
+            partitions,
+            key=lambda partition: (
+                partition.is_default,
+                partition.lower is not None,
+                partition.lower or EPOCH,
+            ),
+        )
+
+    async def maintain(self, now: datetime | None = None) -> MaintenanceResult:
+        """Создаёт недостающие и отсоединяет устаревшие секции.
+
+        Если обслуживание уже идёт в другом процессе, ничего не делает.
+
+        Returns:
+            MaintenanceResult: созданные, отсоединённые и удалённые секции
+                и число строк, перенесённых из секции default
+        """
+        now = now or datetime.now(UTC)
+        result = MaintenanceResult()
+        engine = self.connector.get_pg_engine(sql_alchemy_uri=self.connector.sql_alchemy_uri)
+        async with engine.connect() as conn:
+            raw_connection = await conn.get_raw_connection()
+            connection = raw_connection.driver_connection
+            if not await connection.fetchval(TRY_LOCK_SQL, MAINTENANCE_LOCK_ID):
+                logger.info('Обслуживание секций уже выполняется другим процессом')
+                return result
+
+            try:
+                partitions = await self.partitions(connection)
+                default = next((p.name for p in partitions if p.is_default), None)
+                for lower, upper in self.missing_ranges(partitions, now):
+                    name = partition_name(lower)
+                    result.moved += await self._create(connection, name, lower, upper, default)
+                    result.created.append(name)
+
+                for partition in self.expired(partitions, now):
+                    await self._detach(connection, partition.name)
+                    result.detached.append(partition.name)
+                    if self.drop_expired:
+                        result.dropped.append(partition.name)
+            finally:
+                await connection.execute(UNLOCK_SQL, MAINTENANCE_LOCK_ID)
+
+        if result.created or result.detached:
+            logger.info(
+                f'Секции log_entry_model: создано {len(result.created)}, '
+                f'перенесено из default {result.moved} строк, '
+                f'отсоединено {len(result.detached)}, удалено {len(result.dropped)}'
+            )
+        return result
+
+    async def _create(
+        self,
+        connection: Connection,
+        name: str,
+        lower: datetime,
+        upper: datetime,
+        default: str | None,
+    ) -> int:
+        """Создаёт секцию [lower, upper) и переносит в неё строки из default.
+
+        default блокируется до переноса и до конца транзакции: строки
+        диапазона, вставленные в неё после переноса, не дали бы ATTACH
+        пройти.
+
+        Returns:
+            int: сколько строк перенесено из секции default
+        """
+        partition = f'{self.schema}.{name}'
+        moved = 0
+        async with connection.transaction():
+            await connection.execute(
+                f'CREATE TABLE {partition} '
+                f'(LIKE {self.target} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)'
+            )
+            if default is not None:
+                await connection.execute(
+                    f'LOCK TABLE {self.schema}.{default} IN SHARE ROW EXCLUSIVE MODE'
+                )
+                status = await connection.execute(
+                    f'WITH moved AS (DELETE FROM {self.schema}.{default} '
+                    'WHERE timestamp >= $1 AND timestamp < $2 RETURNING *) '
+                    f'INSERT INTO {partition} SELECT * FROM moved',
+                    lower,
+                    upper,
+                )
+                moved = int(status.rsplit(' ', 1)[-1])
+            await connection.execute(
+                f'ALTER TABLE {self.target} ATTACH PARTITION {partition} '
+                f"FOR VALUES FROM ('{lower.isoformat()}') TO ('{upper.isoformat()}')"
+            )
+        return moved
+
+    async def _detach(self, connection: Connection, name: str) -> None:
+        """Отсоединяет секцию и, если задано drop_expired, удаляет её."""
+        async with connection.transaction():
+            await connection.execute(
+                f'ALTER TABLE {self.target} DETACH PARTITION {self.schema}.{name}'
+            )
+            if self.drop_expired:
+                await connection.execute(f'DROP TABLE {self.schema}.{name}')
+
+
+async def run_partition_maintenance(
+    manager: PartitionManager | None = None, interval_seconds: float | None = None
+) -> None:
+    """Обслуживает секции раз в interval_seconds, пока задачу не отменят.
+
+    Ошибка одного прохода логируется и не останавливает следующие.
+    """
+    manager = manager or PartitionManager()
+    interval_seconds = interval_seconds or SETTINGS.PARTITION_MAINTENANCE_INTERVAL_SECONDS
+    while True:
+        try:
+            await manager.maintain()
+        except Exception:
+            logger.exception('Ошибка обслуживания секций log_entry_model')
+        await asyncio.sleep(interval_seconds)
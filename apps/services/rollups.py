@@ -0,0 +1,716 @@
+"""Сводки запросов и байт по минутам и часам для аналитики.
+
+Статус коды, трафик и временные ряды за окно в сутки не пересчитывают
+миллионы строк лога, а складывают готовые сводки:
+- LogRollupMinuteModel — (минута UTC, сервер, статус) -> запросы и байты.
+  Пополняется при записи логов upsert'ом в той же транзакции, что и
+  сами строки: LogBatchWriter и импорт одним запросом на пакет, запись
+  через ORM — событием модели (apps/api/v1/models/rollup_models.py);
+- LogRollupHourModel — то же по часам. Её сворачивает из минутных
+  compact_rollups(): фоновая задача API раз в
+  ROLLUP_COMPACTION_INTERVAL_SECONDS пересчитывает завершившиеся часы, в
+  которых минуты менялись (compacted = false);
+- LogSketchMinuteModel и LogSketchHourModel — скетчи по (минуте или
+  часу, серверу) для unique_ips, топов IP и URL и перцентилей
+  (apps/services/sketches.py): HyperLogLog адресов, сводки Space-Saving
+  самых частых адресов и URI и DDSketch size и request_time. Пишутся и
+  сворачиваются так же, как сводки: add_to_sketches() при записи,
+  compact_rollups() раз в интервал.
+
+plan_rollups() делит окно аналитики на части: целые часы, уже свёрнутые
+в часовые сводки, — из них, остальные целые минуты — из минутных, и
+только неполные минуты по краям окна — из сырых строк. rollup_rows()
+собирает из частей один подзапрос, estimate_unique_ips(),
+estimate_top() и estimate_quantiles() объединяют скетчи частей и сырые
+строки краёв, closed_sketches() отдаёт скетчи закрытого окна по минутам
+и часам сводок для кеша аналитики.
+"""
+
+import asyncio
+
+from collections.abc import Sequence
+from dataclasses import dataclass
+from dataclasses import replace
+from datetime import UTC
+from datetime import datetime
+from datetime import timedelta
+from typing import TypeVar
+
+from asyncpg import Connection
+from loguru import logger
+from sqlalchemy import ColumnElement
+from sqlalchemy import Select
+from sqlalchemy import Subquery
+from sqlalchemy import and_
+from sqlalchemy import func
+from sqlalchemy import or_
+from sqlalchemy import select
+from sqlalchemy import union_all
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased
+
+from apps.api.v1.models.dimension_models import UriModel
+from apps.api.v1.models.log_entry_model import LogEntryModel
+from apps.api.v1.models.rollup_models import LogRollupHourModel
+from apps.api.v1.models.rollup_models import LogRollupMinuteModel
+from apps.api.v1.models.rollup_models import LogSketchHourModel
+from apps.api.v1.models.rollup_models import LogSketchMinuteModel
+from apps.db.session import PGEngineConnector
+from apps.db.session import connector
+from apps.services.ddsketch import DDSketch
+from apps.services.hyperloglog import HyperLogLog
+from apps.services.log_rows import ColumnBatch
+from apps.services.sketches import SKETCH_COLUMNS
+from apps.services.sketches import BucketSketches
+from apps.services.sketches import SketchKey
+from apps.services.sketches import bucket_sketches
+from apps.services.space_saving import SpaceSaving
+from apps.settings import SETTINGS
+
+S = TypeVar('S', HyperLogLog, SpaceSaving, DDSketch)
+
+EPOCH = datetime(1970, 1, 1, tzinfo=UTC)
+MINUTE = timedelta(minutes=1)
+HOUR = timedelta(hours=1)
+
+MINUTE_TABLE = f'{LogRollupMinuteModel.__table__.schema}.{LogRollupMinuteModel.__tablename__}'
+HOUR_TABLE = f'{LogRollupHourModel.__table__.schema}.{LogRollupHourModel.__tablename__}'
+# Ключи сводок пишутся по возрастанию (bucket, server_id, status) — в
+# порядке первичного ключа, — так параллельные писатели и свёртка
+# блокируют строки в одном порядке и не ловят deadlock.
+ADD_MINUTES_CONFLICT_SQL = (
+    'ON CONFLICT (bucket, server_id, status) DO UPDATE SET '
+    'requests = rollup.requests + excluded.requests, '
+    'bytes = rollup.bytes + excluded.bytes, compacted = false'
+)
+ADD_MINUTES_SQL = (
+    f'INSERT INTO {MINUTE_TABLE} AS rollup (bucket, server_id, status, requests, bytes) '
+    'SELECT * FROM unnest($1::timestamptz[], $2::int[], $3::int[], $4::bigint[], $5::bigint[]) '
+    f'{ADD_MINUTES_CONFLICT_SQL}'
+)
+PENDING_HOURS_SQL = (
+    'WITH pending AS ('
+    f'SELECT bucket, server_id, status FROM {MINUTE_TABLE} '
+    'WHERE NOT compacted AND bucket < $1 ORDER BY 1, 2, 3 FOR UPDATE), '
+    f'marked AS (UPDATE {MINUTE_TABLE} AS rollup SET compacted = true FROM pending '
+    'WHERE (rollup.bucket, rollup.server_id, rollup.status) '
+    '= (pending.bucket, pending.server_id, pending.status) RETURNING rollup.bucket) '
+    "SELECT DISTINCT date_trunc('hour', bucket, 'UTC') AS hour FROM marked ORDER BY hour"
+)
+COMPACT_HOURS_SQL = (
+    f'INSERT INTO {HOUR_TABLE} AS rollup (bucket, server_id, status, requests, bytes) '
+    'SELECT hours.hour, minute.server_id, minute.status, sum(minute.requests), sum(minute.bytes) '
+    f'FROM unnest($1::timestamptz[]) AS hours (hour) JOIN {MINUTE_TABLE} AS minute '
+    "ON minute.bucket >= hours.hour AND minute.bucket < hours.hour + interval '1 hour' "
+    'GROUP BY 1, 2, 3 ORDER BY 1, 2, 3 '
+    'ON CONFLICT (bucket, server_id, status) DO UPDATE SET '
+    'requests = excluded.requests, bytes = excluded.bytes'
+)
+
+SKETCH_MINUTE_TABLE = (
+    f'{LogSketchMinuteModel.__table__.schema}.{LogSketchMinuteModel.__tablename__}'
+)
+SKETCH_HOUR_TABLE = f'{LogSketchHourModel.__table__.schema}.{LogSketchHourModel.__tablename__}'
+LOG_TABLE = f'{LogEntryModel.__table__.schema}.{LogEntryModel.__tablename__}'
+URI_TABLE = f'{UriModel.__table__.schema}.{UriModel.__tablename__}'
+# Минутные скетчи свёртки за одну транзакцию: сутки одного сервера.
+SKETCH_COMPACTION_BATCH = 1440
+
+
+def _lock_sketches_sql(table: str, on_conflict: str) -> str:
+    """Upsert пустых скетчей по ключам ($1, $2): новые строки создаются, все блокируются.
+
+    Строки блокируются по возрастанию (bucket, server_id) до конца транзакции.
+    """
+    empty = ', '.join(["''::bytea"] * len(SKETCH_COLUMNS))
+    return (
+        f'INSERT INTO {table} AS sketch (bucket, server_id, {", ".join(SKETCH_COLUMNS)}) '
+        f'SELECT bucket, server_id, {empty} '
+        'FROM unnest($1::timestamptz[], $2::int[]) AS keys (bucket, server_id) ORDER BY 1, 2 '
+        f'ON CONFLICT (bucket, server_id) DO UPDATE SET {on_conflict}'
+    )
+
+
+def _store_sketches_sql(table: str) -> str:
+    """UPDATE скетчей по ключам ($1, $2) значениями колонок SKETCH_COLUMNS ($3, ...)."""
+    arrays = ', '.join(f'${index}::bytea[]' for index in range(3, len(SKETCH_COLUMNS) + 3))
+    return (
+        f'UPDATE {table} AS sketch SET '
+        f'{", ".join(f"{column} = new.{column}" for column in SKETCH_COLUMNS)} '
+        f'FROM unnest($1::timestamptz[], $2::int[], {arrays}) '
+        f'AS new (bucket, server_id, {", ".join(SKETCH_COLUMNS)}) '
+        'WHERE (sketch.bucket, sketch.server_id) = (new.bucket, new.server_id)'
+    )
+
+
+LOCK_MINUTE_SKETCHES_SQL = _lock_sketches_sql(SKETCH_MINUTE_TABLE, 'compacted = false')
+FETCH_MINUTE_SKETCHES_SQL = (
+    f'{LOCK_MINUTE_SKETCHES_SQL} RETURNING bucket, server_id, {", ".join(SKETCH_COLUMNS)}'
+)
+LOCK_HOUR_SKETCHES_SQL = _lock_sketches_sql(SKETCH_HOUR_TABLE, 'unique_ips = sketch.unique_ips')
+STORE_MINUTE_SKETCHES_SQL = _store_sketches_sql(SKETCH_MINUTE_TABLE)
+STORE_HOUR_SKETCHES_SQL = _store_sketches_sql(SKETCH_HOUR_TABLE)
+PENDING_SKETCH_HOURS_SQL = (
+    'WITH pending AS ('
+    f'SELECT bucket, server_id FROM {SKETCH_MINUTE_TABLE} '
+    'WHERE NOT compacted AND bucket < $1 ORDER BY 1, 2 LIMIT $2 FOR UPDATE), '
+    f'marked AS (UPDATE {SKETCH_MINUTE_TABLE} AS sketch SET compacted = true FROM pending '
+    'WHERE (sketch.bucket, sketch.server_id) = (pending.bucket, pending.server_id) '
+    'RETURNING sketch.bucket, sketch.server_id) '
+    "SELECT DISTINCT date_trunc('hour', bucket, 'UTC') AS hour, server_id FROM marked ORDER BY 1, 2"
+)
+HOUR_MINUTE_SKETCHES_SQL = (
+    f'SELECT hours.hour, hours.server_id, {", ".join(f"minute.{c}" for c in SKETCH_COLUMNS)} '
+    'FROM unnest($1::timestamptz[], $2::int[]) AS hours (hour, server_id) '
+    f'JOIN {SKETCH_MINUTE_TABLE} AS minute ON minute.server_id = hours.server_id '
+    "AND minute.bucket >= hours.hour AND minute.bucket < hours.hour + interval '1 hour'"
+)
+# Строки читаются одним диапазоном времени от первой до последней минуты
+# ключей и отбираются хеш-полусоединением по (минута, сервер): соединение
+# по диапазону на каждый ключ перебирает все строки сервера для каждого
+# ключа.
+RAW_SKETCH_ROWS_SQL = (
+    'WITH keys AS (SELECT * FROM unnest($1::timestamptz[], $2::int[]) AS keys (bucket, server_id)) '
+    "SELECT date_trunc('minute', entry.timestamp, 'UTC'), entry.server_id, entry.remote_addr, "
+    'uri.value, count(*), entry.size, entry.request_time '
+    f'FROM {LOG_TABLE} AS entry LEFT JOIN {URI_TABLE} AS uri ON uri.id = entry.uri_id '
+    'WHERE entry.timestamp >= (SELECT min(bucket) FROM keys) '
+    "AND entry.timestamp < (SELECT max(bucket) FROM keys) + interval '1 minute' "
+    "AND (date_trunc('minute', entry.timestamp, 'UTC'), entry.server_id) "
+    'IN (SELECT bucket, server_id FROM keys) '
+    'GROUP BY 1, 2, 3, 4, 6, 7'
+)
+
+
+def with_rollups(insert_sql: str) -> str:
+    """INSERT в таблицу логов, который заодно пополняет минутные сводки.
+
+    Args:
+        insert_sql: INSERT INTO log_entry_model ... без RETURNING
+
+    Returns:
+        str: запрос, возвращающий одно значение — число добавленных строк
+    """
+    return (
+        f'WITH inserted AS ({insert_sql} RETURNING timestamp, server_id, status, size), '
+        f'rolled AS (INSERT INTO {MINUTE_TABLE} AS rollup '
+        '(bucket, server_id, status, requests, bytes) '
+        "SELECT date_trunc('minute', timestamp, 'UTC'), server_id, status, count(*), sum(size) "
+        f'FROM inserted GROUP BY 1, 2, 3 ORDER BY 1, 2, 3 {ADD_MINUTES_CONFLICT_SQL}) '
+        'SELECT count(*) FROM inserted'
+    )
+
+
+def minute_rollups(parts: Sequence[ColumnBatch]) -> list[tuple[datetime, int, int, int, int]]:
+    """Минутные сводки пачек: (минута, сервер, статус, запросы, байты) по возрастанию ключа."""
+    totals: dict[tuple[datetime, int, int], list[int]] = {}
+    for part in parts:
+        for timestamp, server_id, status, size in zip(
+            part.column('timestamp'),
+            part.column('server_id'),
+            part.column('status'),
+            part.column('size'),
+            strict=True,
+        ):
+            key = (timestamp.replace(second=0, microsecond=0), server_id, status)
+            total = totals.get(key)
+            if total is None:
+                totals[key] = [1, size or 0]
+            else:
+                total[0] += 1
+                total[1] += size or 0
+    return [(*key, requests, size) for key, (requests, size) in sorted(totals.items())]
+
+
+async def add_to_rollups(connection: Connection, parts: Sequence[ColumnBatch]) -> None:
+    """Пополняет минутные сводки строками пачек, записанных прямым COPY."""
+    rollups = minute_rollups(parts)
+    if rollups:
+        await connection.execute(ADD_MINUTES_SQL, *zip(*rollups, strict=True))
+
+
+def batch_sketches(parts: Sequence[ColumnBatch]) -> dict[SketchKey, BucketSketches]:
+    """Скетчи пачек по (минута, сервер); колонка uri — значения, а не id справочника."""
+    return bucket_sketches(
+        (timestamp.replace(second=0, microsecond=0), server_id, remote_addr, uri, 1, size, seconds)
+        for part in parts
+        for timestamp, server_id, remote_addr, uri, size, seconds in zip(
+            part.column('timestamp'),
+            part.column('server_id'),
+            part.column('remote_addr'),
+            part.column('uri'),
+            part.column('size'),
+            part.column('request_time'),
+            strict=True,
+        )
+    )
+
+
+def _sketch_keys(keys: list[SketchKey]) -> tuple[list[datetime], list[int]]:
+    """Параметры $1, $2 запросов скетчей: начала интервалов и серверы."""
+    return [bucket for bucket, _ in keys], [server_id for _, server_id in keys]
+
+
+async def _store_sketches(
+    connection: Connection, store_sql: str, sketches: dict[SketchKey, BucketSketches]
+) -> None:
+    """Записывает скетчи в уже заблокированные строки."""
+    keys = sorted(sketches)
+    columns = zip(*(sketches[key].to_bytes() for key in keys), strict=True)
+    await connection.execute(store_sql, *_sketch_keys(keys), *columns)
+
+
+async def add_to_sketches(
+    connection: Connection,
+    sketches: dict[SketchKey, BucketSketches],
+    duplicates: bool = False,
+) -> None:
+    """Добавляет скетчи записанных строк к сохранённым минутным скетчам.
+
+    Строки скетчей блокируются до конца транзакции вызывающего, поэтому
+    параллельные писатели не теряют строки друг друга; sketches
+    объединяются на месте. Сводки топов, в отличие от HyperLogLog, не
+    терпят повторов: если часть строк уже была в таблице (duplicates),
+    скетчи их минут пересчитываются по строкам таблицы.
+
+    Args:
+        connection: соединение asyncpg в транзакции записи строк
+        sketches: скетчи записанных строк по (минута, сервер)
+        duplicates: часть строк пропущена как уже записанная
+    """
+    if not sketches:
+        return
+    if duplicates:
+        await rebuild_sketches(connection, list(sketches))
+        return
+
+    keys = sorted(sketches)
+    for row in await connection.fetch(FETCH_MINUTE_SKETCHES_SQL, *_sketch_keys(keys)):
+        sketches[row['bucket'], row['server_id']].update(
+            BucketSketches.from_bytes(*(row[column] for column in SKETCH_COLUMNS))
+        )
+    await _store_sketches(connection, STORE_MINUTE_SKETCHES_SQL, sketches)
+
+
+async def rebuild_sketches(connection: Connection, keys: list[SketchKey]) -> None:
+    """Пересчитывает минутные скетчи ключей (минута, сервер) по строкам таблицы логов.
+
+    Строки скетчей блокируются до чтения логов: писатель, добавивший
+    строки в эти минуты позже, дождётся блокировки и добавит их к
+    пересчитанному скетчу.
+    """
+    keys = sorted(set(keys))
+    await connection.execute(LOCK_MINUTE_SKETCHES_SQL, *_sketch_keys(keys))
+    sketches = {key: BucketSketches() for key in keys}
+    rows = await connection.fetch(RAW_SKETCH_ROWS_SQL, *_sketch_keys(keys))
+    sketches.update(
+        bucket_sketches(
+            (bucket, server_id, remote_addr, uri, requests, size, seconds)
+            for bucket, server_id, remote_addr, uri, requests, size, seconds in rows
+        )
+    )
+    await _store_sketches(connection, STORE_MINUTE_SKETCHES_SQL, sketches)
+
+
+async def compact_sketches(connection: Connection, cutoff: datetime) -> set[datetime]:
+    """Собирает часовые скетчи завершившихся до cutoff часов с изменёнными минутами.
+
+    Часовой скетч каждый раз собирается заново из всех минут часа:
+    сводки топов нельзя дополнять уже учтёнными минутами. Минуты
+    разбираются пачками в отдельных транзакциях — слияние идёт в Python,
+    и одна транзакция не держит блокировки всех накопившихся минут.
+
+    Returns:
+        set[datetime]: начала собранных часов
+    """
+    hours: set[datetime] = set()
+    while True:
+        async with connection.transaction():
+            pending = await connection.fetch(
+                PENDING_SKETCH_HOURS_SQL, cutoff, SKETCH_COMPACTION_BATCH
+            )
+            keys = [(row['hour'], row['server_id']) for row in pending]
+            if not keys:
+                return hours
+            # Блокировка часов до чтения минут: параллельная свёртка того
+            # же часа дождётся её и прочитает минуты заново.
+            await connection.execute(LOCK_HOUR_SKETCHES_SQL, *_sketch_keys(keys))
+            sketches = {key: BucketSketches() for key in keys}
+            for row in await connection.fetch(HOUR_MINUTE_SKETCHES_SQL, *_sketch_keys(keys)):
+                sketches[row['hour'], row['server_id']].update(
+                    BucketSketches.from_bytes(*(row[column] for column in SKETCH_COLUMNS))
+                )
+            await _store_sketches(connection, STORE_HOUR_SKETCHES_SQL, sketches)
+        hours.update(hour for hour, _ in keys)
+
+
+def floor_to(moment: datetime, step: timedelta) -> datetime:
+    """Начало интервала step (от начала эпохи), в котором лежит moment."""
+    return EPOCH + (moment - EPOCH) // step * step
+
+
+def ceil_to(moment: datetime, step: timedelta) -> datetime:
+    """Первая граница интервалов step не раньше moment."""
+    floor = floor_to(moment, step)
+    return floor if floor == moment else floor + step
+
+
+@dataclass(frozen=True)
+class RollupPlan:
+    """Части окна аналитики [since, ∞) или [since, now) и источник каждой.
+
+    raw — диапазоны сырых строк (верхняя граница последнего — None, если
+    окно не закрыто справа),
+    minutes — диапазоны минутных сводок, hours — диапазон часовых
+    сводок или None.
+    """
+
+    raw: tuple[tuple[datetime, datetime | None], ...]
+    minutes: tuple[tuple[datetime, datetime], ...] = ()
+    hours: tuple[datetime, datetime] | None = None
+
+
+def plan_rollups(
+    since: datetime, now: datetime, bucket_seconds: int | None = None, closed: bool = False
+) -> RollupPlan:
+    """Делит окно аналитики на сырые строки, минутные и часовые сводки.
+
+    Сырые строки читаются только для неполных минут: от since до первой
+    целой минуты и от начала текущей минуты. Часовые сводки берутся,
+    если в окно помещается хотя бы один целый час и интервал ряда
+    bucket_seconds (None — без ряда) кратен часу; иначе сводки минутные.
+    Если интервал не кратен минуте, всё окно читается из сырых строк.
+    closed — окно [since, now) вместо [since, ∞): строки с now и позже
+    не читаются, а если now — начало минуты, окно целиком из сводок.
+    """
+    if closed:
+        plan = plan_rollups(since, now, bucket_seconds)
+        lower, _ = plan.raw[-1]
+        return replace(plan, raw=(*plan.raw[:-1], (lower, now)))
+
+    if bucket_seconds is not None and bucket_seconds % 60:
+        return RollupPlan(raw=((since, None),))
+
+    first_minute, last_minute = ceil_to(since, MINUTE), floor_to(now, MINUTE)
+    if first_minute >= last_minute:
+        return RollupPlan(raw=((since, None),))
+
+    raw = ((since, first_minute),) if since < first_minute else ()
+    raw += ((last_minute, None),)
+
+    first_hour, last_hour = ceil_to(first_minute, HOUR), floor_to(last_minute, HOUR)
+    if (bucket_seconds is not None and bucket_seconds % 3600) or first_hour >= last_hour:
+        return RollupPlan(raw=raw, minutes=((first_minute, last_minute),))
+
+    minutes = tuple(
+        (lower, upper)
+        for lower, upper in ((first_minute, first_hour), (last_hour, last_minute))
+        if lower < upper
+    )
+    return RollupPlan(raw=raw, minutes=minutes, hours=(first_hour, last_hour))
+
+
+def _raw_windows(plan: RollupPlan) -> list[ColumnElement[bool]]:
+    """Условия на timestamp сырых строк для диапазонов plan.raw."""
+    windows = []
+    for lower, upper in plan.raw:
+        window = LogEntryModel.timestamp >= lower
+        if upper is not None:
+            window = and_(window, LogEntryModel.timestamp < upper)
+        windows.append(window)
+    return windows
+
+
+def _summary_parts(plan: RollupPlan, minute, hour, *columns: str) -> list[Select]:
+    """Запросы columns из минутных и часовых таблиц для частей плана.
+
+    Часы, в которых минуты ещё не свёрнуты, читаются из минутной таблицы.
+
+    Args:
+        plan: части окна
+        minute: минутная модель со столбцами bucket и compacted
+        hour: часовая модель
+        columns: имена столбцов, общие для обеих моделей
+    """
+    parts = [
+        select(*(getattr(minute, column) for column in columns)).where(
+            minute.bucket >= lower, minute.bucket < upper
+        )
+        for lower, upper in plan.minutes
+    ]
+    if plan.hours is not None:
+        lower, upper = plan.hours
+        pending = aliased(minute)
+        pending_hours = select(func.date_trunc('hour', pending.bucket, 'UTC')).where(
+            ~pending.compacted, pending.bucket >= lower, pending.bucket < upper
+        )
+        parts.append(
+            select(*(getattr(hour, column) for column in columns)).where(
+                hour.bucket >= lower, hour.bucket < upper, hour.bucket.not_in(pending_hours)
+            )
+        )
+        parts.append(
+            select(*(getattr(minute, column) for column in columns)).where(
+                minute.bucket >= lower,
+                minute.bucket < upper,
+                func.date_trunc('hour', minute.bucket, 'UTC').in_(pending_hours),
+            )
+        )
+    return parts
+
+
+def rollup_rows(
+    since: datetime, now: datetime, bucket_seconds: int | None = None, closed: bool = False
+) -> Subquery:
+    """Подзапрос (bucket, status, requests, bytes) по окну из частей plan_rollups.
+
+    Окно — [since, ∞) или, если closed, [since, now). bucket — начало
+    минуты или часа UTC; часы, в которых минуты ещё не свёрнуты,
+    читаются из минутных сводок.
+    """
+    plan = plan_rollups(since, now, bucket_seconds, closed)
+    entry_minute = func.date_trunc('minute', LogEntryModel.timestamp, 'UTC')
+    parts = [
+        select(
+            entry_minute.label('bucket'),
+            LogEntryModel.status,
+            func.count().label('requests'),
+            func.sum(LogEntryModel.size).label('bytes'),
+        )
+        .where(window)
+        .group_by(entry_minute, LogEntryModel.status)
+        for window in _raw_windows(plan)
+    ]
+    parts += _summary_parts(
+        plan, LogRollupMinuteModel, LogRollupHourModel, 'bucket', 'status', 'requests', 'bytes'
+    )
+    return union_all(*parts).subquery('rollup')
+
+
+def unique_ips_sketch_queries(since: datetime, now: datetime) -> tuple[list[Select], Select]:
+    """Запросы для оценки числа уникальных IP за окно [since, ∞).
+
+    Returns:
+        tuple[list[Select], Select]: запросы скетчей (unique_ips) целых
+            минут и часов окна и запрос различных адресов сырых строк
+            неполных минут по краям
+    """
+    plan = plan_rollups(since, now)
+    sketch_parts = _summary_parts(plan, LogSketchMinuteModel, LogSketchHourModel, 'unique_ips')
+    edge_ips = select(LogEntryModel.remote_addr).distinct().where(or_(*_raw_windows(plan)))
+    return sketch_parts, edge_ips
+
+
+async def unique_ips_sketch(db: AsyncSession, since: datetime, now: datetime) -> HyperLogLog:
+    """Скетч HyperLogLog адресов за окно [since, ∞)."""
+    sketch_parts, edge_ips = unique_ips_sketch_queries(since, now)
+    sketch = HyperLogLog()
+    for query in sketch_parts:
+        for (data,) in await db.execute(query):
+            sketch.update(HyperLogLog.from_bytes(data))
+    for (remote_addr,) in await db.execute(edge_ips):
+        sketch.add(remote_addr)
+    return sketch
+
+
+async def estimate_unique_ips(db: AsyncSession, since: datetime, now: datetime) -> int:
+    """Оценка числа уникальных IP за окно [since, ∞) по скетчам HyperLogLog.
+
+    Стандартная ошибка оценки около 0.8% (apps/services/hyperloglog.py).
+    """
+    return (await unique_ips_sketch(db, since, now)).count()
+
+
+# Значения сводок топов в строках таблицы логов — для неполных минут краёв.
+TOP_VALUES = {'top_ips': LogEntryModel.remote_addr, 'top_uris': UriModel.value}
+
+
+def top_sketch_queries(since: datetime, now: datetime, column: str) -> tuple[list[Select], Select]:
+    """Запросы для оценки топа за окно [since, ∞).
+
+    Args:
+        since: начало окна
+        now: текущий момент
+        column: top_ips или top_uris
+
+    Returns:
+        tuple[list[Select], Select]: запросы сводок column целых минут и
+            часов окна и запрос (значение, запросы, байты) сырых строк
+            неполных минут по краям
+    """
+    plan = plan_rollups(since, now)
+    sketch_parts = _summary_parts(plan, LogSketchMinuteModel, LogSketchHourModel, column)
+    value = TOP_VALUES[column]
+    edge_counts = select(
+        value, func.count(), func.coalesce(func.sum(LogEntryModel.size), 0)
+    ).select_from(LogEntryModel)
+    if column == 'top_uris':
+        edge_counts = edge_counts.join(UriModel, UriModel.id == LogEntryModel.uri_id)
+    return sketch_parts, edge_counts.where(or_(*_raw_windows(plan))).group_by(value)
+
+
+async def top_summary(db: AsyncSession, since: datetime, now: datetime, column: str) -> SpaceSaving:
+    """Сводка Space-Saving адресов или URI за окно [since, ∞).
+
+    Args:
+        db: сессия
+        since: начало окна
+        now: текущий момент
+        column: top_ips или top_uris
+    """
+    sketch_parts, edge_counts = top_sketch_queries(since, now, column)
+    summary = SpaceSaving()
+    for query in sketch_parts:
+        for (data,) in await db.execute(query):
+            summary.update(SpaceSaving.from_bytes(data))
+    edges = {value: (requests, size) for value, requests, size in await db.execute(edge_counts)}
+    summary.update(SpaceSaving.from_counts(edges))
+    return summary
+
+
+async def estimate_top(
+    db: AsyncSession, since: datetime, now: datetime, column: str, limit: int
+) -> list[tuple[str, int, int, int]]:
+    """Самые частые адреса или URI за окно [since, ∞) по сводкам Space-Saving.
+
+    Args:
+        db: сессия
+        since: начало окна
+        now: текущий момент
+        column: top_ips или top_uris
+        limit: размер топа, не больше CAPACITY (apps/services/space_saving.py)
+
+    Returns:
+        list[tuple[str, int, int, int]]: (значение, запросы, ошибка, байты)
+            по убыванию запросов; запросы завышены не больше чем на ошибку
+    """
+    return (await top_summary(db, since, now, column)).top(limit)
+
+
+# Значения скетчей перцентилей в строках таблицы логов — для неполных минут краёв.
+QUANTILE_VALUES = {'sizes': LogEntryModel.size, 'request_times': LogEntryModel.request_time}
+
+
+def quantile_sketch_queries(
+    since: datetime, now: datetime, column: str
+) -> tuple[list[Select], Select]:
+    """Запросы для оценки перцентилей за окно [since, ∞).
+
+    Args:
+        since: начало окна
+        now: текущий момент
+        column: sizes или request_times
+
+    Returns:
+        tuple[list[Select], Select]: запросы скетчей column целых минут и
+            часов окна и запрос (значение, запросы) сырых строк неполных
+            минут по краям
+    """
+    plan = plan_rollups(since, now)
+    sketch_parts = _summary_parts(plan, LogSketchMinuteModel, LogSketchHourModel, column)
+    value = QUANTILE_VALUES[column]
+    edge_counts = (
+        select(value, func.count())
+        .where(or_(*_raw_windows(plan)), value.is_not(None))
+        .group_by(value)
+    )
+    return sketch_parts, edge_counts
+
+
+async def estimate_quantiles(
+    db: AsyncSession, since: datetime, now: datetime, column: str
+) -> DDSketch:
+    """Скетч DDSketch size или request_time за окно [since, ∞).
+
+    Время ответа не зависит от числа строк окна: читается не больше
+    одного скетча на сервер и минуту неполных часов или час, и сырые
+    строки неполных минут по краям.
+
+    Args:
+        db: сессия
+        since: начало окна
+        now: текущий момент
+        column: sizes или request_times
+
+    Returns:
+        DDSketch: квантили с относительной ошибкой RELATIVE_ACCURACY
+            (apps/services/ddsketch.py)
+    """
+    sketch_parts, edge_counts = quantile_sketch_queries(since, now, column)
+    sketch = DDSketch()
+    for query in sketch_parts:
+        for (data,) in await db.execute(query):
+            sketch.update(DDSketch.from_bytes(data))
+    edges = {value: requests for value, requests in await db.execute(edge_counts)}
+    sketch.update(DDSketch.from_counts(edges))
+    return sketch
+
+
+async def closed_sketches(
+    db: AsyncSession, since: datetime, until: datetime, column: str, sketch_type: type[S]
+) -> list[tuple[datetime, S]]:
+    """Скетчи column закрытого окна [since, until) по строкам сводок.
+
+    Границы окна — начала минут, поэтому сырых строк по краям нет, и
+    окно целиком читается из минутных и часовых скетчей.
+
+    Args:
+        db: сессия
+        since: начало окна
+        until: конец окна
+        column: колонка SKETCH_COLUMNS
+        sketch_type: тип скетча колонки
+
+    Returns:
+        list[tuple[datetime, S]]: (начало минуты или часа сводки, скетч
+            одного сервера)
+    """
+    plan = plan_rollups(since, until, closed=True)
+    sketches = []
+    for query in _summary_parts(plan, LogSketchMinuteModel, LogSketchHourModel, 'bucket', column):
+        sketches += [
+            (bucket, sketch_type.from_bytes(data)) for bucket, data in await db.execute(query)
+        ]
+    return sketches
+
+
+async def compact_rollups(
+    db_connector: PGEngineConnector = connector, now: datetime | None = None
+) -> list[datetime]:
+    """Сворачивает в часовые сводки и скетчи завершившиеся к now часы с изменёнными минутами.
+
+    Returns:
+        list[datetime]: начала пересчитанных часов
+    """
+    now = now or datetime.now(UTC)
+    cutoff = floor_to(now, HOUR)
+    engine = db_connector.get_pg_engine(sql_alchemy_uri=db_connector.sql_alchemy_uri)
+    async with engine.connect() as conn:
+        raw_connection = await conn.get_raw_connection()
+        connection = raw_connection.driver_connection
+        async with connection.transaction():
+            rows = await connection.fetch(PENDING_HOURS_SQL, cutoff)
+            hours = [row['hour'] for row in rows]
+            if hours:
+                await connection.execute(COMPACT_HOURS_SQL, hours)
+
+        sketch_hours = await compact_sketches(connection, cutoff)
+
+    hours = sorted(sketch_hours.union(hours))
+    if hours:
+        logger.info(f'Свёрнуто в часовые сводки часов: {len(hours)}')
+    return hours
+
+
+async def run_rollup_compaction(interval_seconds: float | None = None) -> None:
+    """Сворачивает сводки раз в interval_seconds, пока задачу не отменят.
+
+    Ошибка одного прохода логируется и не останавливает следующие.
+    """
+    interval_seconds = interval_seconds or SETTINGS.ROLLUP_COMPACTION_INTERVAL_SECONDS
+    while True:
+        try:
+            await compact_rollups()
+        except Exception:
+            logger.exception('Ошибка свёртки сводок аналитики')
+        await asyncio.sleep(interval_seconds)
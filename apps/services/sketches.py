@@ -0,0 +1,124 @@
+"""Скетчи одного интервала одного сервера: уникальные IP, топы IP и URI, перцентили.
+
+Хранятся в log_sketch_minute_model и log_sketch_hour_model
+(apps/api/v1/models/rollup_models.py) колонками SKETCH_COLUMNS; запись,
+свёртка и чтение — в apps/services/rollups.py.
+"""
+
+from collections.abc import Iterable
+from datetime import datetime
+
+from apps.services.ddsketch import DDSketch
+from apps.services.hyperloglog import HyperLogLog
+from apps.services.space_saving import SpaceSaving
+
+SKETCH_COLUMNS = ('unique_ips', 'top_ips', 'top_uris', 'sizes', 'request_times')
+
+SketchKey = tuple[datetime, int]
+
+
+class BucketSketches:
+    """HyperLogLog адресов, сводки Space-Saving адресов и URI, DDSketch size и request_time.
+
+    Args:
+        unique_ips: скетч различных адресов
+        top_ips: самые частые адреса с запросами и байтами
+        top_uris: самые частые URI с запросами и байтами
+        sizes: квантили размера ответа
+        request_times: квантили времени обработки запроса
+    """
+
+    __slots__ = SKETCH_COLUMNS
+
+    def __init__(
+        self,
+        unique_ips: HyperLogLog | None = None,
+        top_ips: SpaceSaving | None = None,
+        top_uris: SpaceSaving | None = None,
+        sizes: DDSketch | None = None,
+        request_times: DDSketch | None = None,
+    ):
+        self.unique_ips = unique_ips or HyperLogLog()
+        self.top_ips = top_ips or SpaceSaving()
+        self.top_uris = top_uris or SpaceSaving()
+        self.sizes = sizes or DDSketch()
+        self.request_times = request_times or DDSketch()
+
+    @classmethod
+    def from_bytes(
+        cls,
+        unique_ips: bytes,
+        top_ips: bytes,
+        top_uris: bytes,
+        sizes: bytes,
+        request_times: bytes,
+    ) -> 'BucketSketches':
+        """Скетчи из колонок SKETCH_COLUMNS."""
+        return cls(
+            HyperLogLog.from_bytes(unique_ips),
+            SpaceSaving.from_bytes(top_ips),
+            SpaceSaving.from_bytes(top_uris),
+            DDSketch.from_bytes(sizes),
+            DDSketch.from_bytes(request_times),
+        )
+
+    def to_bytes(self) -> tuple[bytes, ...]:
+        """Значения колонок SKETCH_COLUMNS."""
+        return tuple(getattr(self, column).to_bytes() for column in SKETCH_COLUMNS)
+
+    def update(self, other: 'BucketSketches') -> None:
+        """Объединяет с другими скетчами на месте."""
+        self.unique_ips.update(other.unique_ips)
+        self.top_ips.update(other.top_ips)
+        self.top_uris.update(other.top_uris)
+        self.sizes.update(other.sizes)
+        self.request_times.update(other.request_times)
+
+
+def bucket_sketches(
+    rows: Iterable[tuple[datetime, int, str, str | None, int, int | None, float | None]],
+) -> dict[SketchKey, BucketSketches]:
+    """Скетчи по (bucket, server_id) из строк лога, сгруппированных по значениям.
+
+    Строка — (bucket, server_id, адрес, URI, запросы, size, request_time):
+    строки уже отнесены к интервалу bucket, запросы — число строк лога с
+    этими значениями, size и request_time — значения одного запроса
+    (None — не записано).
+    """
+    counts: dict[SketchKey, tuple[dict, dict, dict, dict]] = {}
+    for bucket, server_id, remote_addr, uri, requests, size, request_time in rows:
+        key = (bucket, server_id)
+        bucket_counts = counts.get(key)
+        if bucket_counts is None:
+            bucket_counts = counts[key] = ({}, {}, {}, {})
+        ips, uris, sizes, request_times = bucket_counts
+        if size is None:
+            size = 0
+        else:
+            sizes[size] = sizes.get(size, 0) + requests
+        if request_time is not None:
+            request_times[request_time] = request_times.get(request_time, 0) + requests
+        counter = ips.get(remote_addr)
+        if counter is None:
+            ips[remote_addr] = [requests, requests * size]
+        else:
+            counter[0] += requests
+            counter[1] += requests * size
+        if uri is None:
+            continue
+        counter = uris.get(uri)
+        if counter is None:
+            uris[uri] = [requests, requests * size]
+        else:
+            counter[0] += requests
+            counter[1] += requests * size
+    return {
+        key: BucketSketches(
+            HyperLogLog.from_values(ips),
+            SpaceSaving.from_counts(ips),
+            SpaceSaving.from_counts(uris),
+            DDSketch.from_counts(sizes),
+            DDSketch.from_counts(request_times),
+        )
+        for key, (ips, uris, sizes, request_times) in counts.items()
+    }
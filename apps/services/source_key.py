@@ -0,0 +1,66 @@
+"""Ключ источника строки лога для идемпотентной записи.
+
+Строка, прочитанная повторно (после падения монитора между записью и
+чекпоинтом, повторного импорта или повтора запроса сборщиком), получает
+тот же ключ, что и в первый раз, и уникальный индекс (server_id,
+source_key) не пускает её в таблицу второй раз. Ключ — 16 байт BLAKE2b
+от идентичности источника и смещения начала строки в нём.
+
+Идентичность файла — хеш его первой строки (как fingerprint чекпоинта),
+а не путь и не inode: после ротации access.log становится access.log.1,
+а затем access.log.1.gz, и импорт сжатой копии даёт те же ключи, что и
+чтение живого файла, потому что смещения считаются в распакованных
+байтах.
+"""
+
+import hashlib
+import uuid
+
+from apps.settings import SETTINGS
+
+
+def source_key(identity: str, offset: int) -> uuid.UUID:
+    """Ключ строки, начинающейся со смещения offset источника identity."""
+    digest = hashlib.blake2b(f'{identity}:{offset}'.encode(), digest_size=16).digest()
+    return uuid.UUID(bytes=digest)
+
+
+def file_identity(fingerprint: str, device: int | None, inode: int | None) -> str | None:
+    """Идентичность файла для ключей или None, если ключи выключены.
+
+    Без fingerprint (первая строка файла длиннее FINGERPRINT_BYTES)
+    идентичностью служат устройство и inode: так повтор чтения того же
+    файла всё ещё узнаётся, но импорт его сжатой копии — уже нет.
+    """
+    if not SETTINGS.DEDUP_SOURCE_KEYS:
+        return None
+    if fingerprint:
+        return fingerprint
+    if device is None or inode is None:
+        return None
+    return f'{device}:{inode}'
+
+
+def split_lines(data: bytes, offset: int) -> tuple[list[str], list[int]]:
+    """Непустые строки блока целых строк и точные смещения их начал.
+
+    Смещения считаются в байтах блока, поэтому не зависят от того, где
+    начался блок, и не сбиваются на пустых строках и битом UTF-8.
+
+    Args:
+        data: блок, заканчивающийся переводом строки (или концом данных)
+        offset: смещение начала блока в источнике
+    """
+    # В ASCII длина строки в символах равна длине в байтах: блок
+    # декодируется одним вызовом, а не построчно.
+    pieces: list[str] | list[bytes] = (
+        data.decode('ascii').split('\n') if data.isascii() else data.split(b'\n')
+    )
+    lines = []
+    offsets = []
+    for piece in pieces:
+        if piece.strip():
+            lines.append(piece if isinstance(piece, str) else piece.decode('utf-8', 'replace'))
+            offsets.append(offset)
+        offset += len(piece) + 1
+    return lines, offsets
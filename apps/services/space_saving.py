@@ -0,0 +1,111 @@
+"""Space-Saving: самые частые значения потока в сводке фиксированного размера.
+
+Сводка хранит не больше CAPACITY счётчиков значение -> (запросы,
+ошибка, байты). Запросы значения в сводке завышены не больше чем на его
+ошибку: точное число лежит в [запросы - ошибка, запросы], а байты
+посчитаны по (запросы - ошибка) запросам, так что их среднее точное.
+Значение, не попавшее в сводку, встречалось не чаще min_count() раз.
+
+Сводки объединяются по Agarwal et al., «Mergeable Summaries» (PODS
+2012): значению, которого нет в одной из сводок, добавляется её
+min_count() и к запросам, и к ошибке, затем остаются CAPACITY самых
+частых. Ошибка любого значения после объединений не превышает
+N / CAPACITY, где N — число запросов всех объединённых сводок, поэтому
+сводки по минутам складываются в сводку любого окна. В отличие от
+HyperLogLog объединение не идемпотентно: одну сводку нельзя добавить
+дважды.
+"""
+
+import heapq
+import zlib
+
+from collections.abc import Iterable
+from collections.abc import Mapping
+
+import orjson
+
+CAPACITY = 256
+FORMAT_VERSION = 1
+HEADER = bytes((FORMAT_VERSION, CAPACITY >> 8, CAPACITY & 255))
+
+
+def _most_frequent(counters: Iterable[tuple[str, list[int]]]) -> dict[str, list[int]]:
+    """CAPACITY счётчиков с наибольшим числом запросов."""
+    return dict(heapq.nlargest(CAPACITY, counters, key=lambda item: item[1][0]))
+
+
+class SpaceSaving:
+    """Сводка Space-Saving на CAPACITY счётчиков.
+
+    Args:
+        counters: значение -> [запросы, ошибка, байты]
+    """
+
+    __slots__ = ('counters',)
+
+    def __init__(self, counters: dict[str, list[int]] | None = None):
+        self.counters = counters or {}
+
+    @classmethod
+    def from_counts(cls, counts: Mapping[str, Iterable[int]]) -> 'SpaceSaving':
+        """Сводка точных счётчиков значение -> (запросы, байты)."""
+        counters = {value: [requests, 0, size] for value, (requests, size) in counts.items()}
+        if len(counters) > CAPACITY:
+            counters = _most_frequent(counters.items())
+        return cls(counters)
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> 'SpaceSaving':
+        """Сводка из to_bytes(); пустые данные — пустая сводка.
+
+        Raises:
+            ValueError: данные другого формата или другого размера
+        """
+        if not data:
+            return cls()
+        if data[:3] != HEADER:
+            raise ValueError('Неизвестный формат сводки Space-Saving')
+        return cls(
+            {
+                value: [requests, error, size]
+                for value, requests, error, size in orjson.loads(zlib.decompress(data[3:]))
+            }
+        )
+
+    def to_bytes(self) -> bytes:
+        """Сводка для хранения в bytea: версия, размер и сжатые счётчики."""
+        packed = orjson.dumps([[value, *counter] for value, counter in self.counters.items()])
+        return HEADER + zlib.compress(packed, 1)
+
+    def min_count(self) -> int:
+        """Сколько раз самое большее встречалось значение, которого нет в сводке."""
+        if len(self.counters) < CAPACITY:
+            return 0
+        return min(counter[0] for counter in self.counters.values())
+
+    def update(self, other: 'SpaceSaving') -> None:
+        """Объединяет с другой сводкой на месте."""
+        own_floor, other_floor = self.min_count(), other.min_count()
+        theirs = other.counters
+        merged = {}
+        for value, (requests, error, size) in self.counters.items():
+            counter = theirs.get(value)
+            if counter is None:
+                merged[value] = [requests + other_floor, error + other_floor, size]
+            else:
+                merged[value] = [requests + counter[0], error + counter[1], size + counter[2]]
+        for value, (requests, error, size) in theirs.items():
+            if value not in merged:
+                merged[value] = [requests + own_floor, error + own_floor, size]
+        if len(merged) > CAPACITY:
+            merged = _most_frequent(merged.items())
+        self.counters = merged
+
+    def top(self, limit: int) -> list[tuple[str, int, int, int]]:
+        """Limit самых частых значений: (значение, запросы, ошибка, байты) по убыванию запросов."""
+        return [
+            (value, requests, error, size)
+            for value, (requests, error, size) in sorted(
+                self.counters.items(), key=lambda item: item[1][0], reverse=True
+            )[:limit]
+        ]
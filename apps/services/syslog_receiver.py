@@ -0,0 +1,519 @@
+"""Приём логов nginx по syslog (UDP и TCP) без общего тома с сервером.
+
+nginx умеет сам отправлять access log: ``access_log
+syslog:server=10.0.0.5:5140,tag=shop combined;``. Приёмник снимает
+конверт RFC 3164 или RFC 5424, по имени хоста или тегу определяет
+server_id и отдаёт строки тем же стадиям разбора и записи, что и у
+монитора файлов (LogPipeline).
+
+У UDP нет обратного давления, поэтому обработчик датаграммы делает
+минимум работы: снимает конверт и кладёт строку в пачку сервера. Если
+разбор или запись не успевают и готовых пачек набралось
+SYSLOG_BACKLOG_BATCHES, чтение сокетов приостанавливается и датаграммы
+копятся в буфере ядра (SYSLOG_RCVBUF_MB). Строки теряются, только если
+переполнится и он, — такие потери ядро считает, и приёмник показывает
+их в stats() и метриках. При остановке неполные пачки и пачки из
+очередей конвейера дописываются в БД.
+"""
+
+import asyncio
+import os
+import socket
+
+from collections import deque
+from collections.abc import Callable
+from pathlib import Path
+from typing import Any
+from typing import NamedTuple
+
+from loguru import logger
+
+from apps.services.log_pipeline import LINE_BATCH_SIZE
+from apps.services.log_pipeline import LineBatch
+from apps.services.log_pipeline import LogPipeline
+from apps.services.log_pipeline import LogSource
+from apps.services.log_pipeline import default_dead_letter
+from apps.services.log_pipeline import resolve_log_format
+from apps.services.log_pipeline import run_pipeline
+from apps.services.nginx_log_parser import NginxLogParser
+from apps.services.parse_pool import parse_rows
+from apps.settings import SETTINGS
+from apps.utils.metrics import Counter
+from apps.utils.metrics import Gauge
+
+UDP = 'udp'
+TCP = 'tcp'
+RFC3164_TIMESTAMP_LENGTH = len('Dec 25 10:30:15')
+PROC_NET_UDP = ('/proc/net/udp', '/proc/net/udp6')
+MAX_DATAGRAMS_PER_WAKEUP = 1000
+MAX_DATAGRAM_BYTES = 65535
+
+Address = tuple[str, int]
+
+SYSLOG_MESSAGES = Counter(
+    'nginx_analyzer_syslog_messages_total',
+    'Сообщения syslog по транспорту',
+    ('transport',),
+)
+SYSLOG_DISCARDED = Counter(
+    'nginx_analyzer_syslog_discarded_total',
+    'Сообщения syslog, отброшенные приёмником',
+    ('reason',),
+)
+SYSLOG_KERNEL_DROPS = Gauge(
+    'nginx_analyzer_syslog_kernel_drops',
+    'Датаграммы, отброшенные ядром из-за переполнения буфера сокета',
+)
+
+
+class SyslogMessage(NamedTuple):
+    """Сообщение syslog без конверта."""
+
+    hostname: str
+    tag: str
+    message: str
+
+
+def _nil(value: str) -> str:
+    return '' if value == '-' else value
+
+
+def _strip_structured_data(value: str) -> str:
+    """Сообщение RFC 5424 после STRUCTURED-DATA: ``-`` или элементы ``[...]``."""
+    if value.startswith('-'):
+        return value[2:]
+
+    index = 0
+    while index < len(value) and value[index] == '[':
+        index += 1
+        while index < len(value) and value[index] != ']':
+            index += 2 if value[index] == '\\' else 1
+        index += 1
+    return value[index + 1 :]
+
+
+def parse_syslog(data: bytes) -> SyslogMessage:
+    """Снимает с сообщения конверт RFC 5424 или RFC 3164.
+
+    nginx шлёт RFC 3164: ``<190>Dec 25 10:30:15 web01 shop: строка``;
+    без имени хоста (параметр nohostname) — ``<190>Dec 25 10:30:15 shop:
+    строка``. У тега отбрасывается ``[pid]``.
+
+    Raises:
+        ValueError: данные не похожи на сообщение syslog
+    """
+    text = data.decode('utf-8', errors='replace').rstrip('\r\n\x00')
+    pri_end = text.find('>', 1, 5)
+    if not text.startswith('<') or pri_end == -1:
+        raise ValueError('нет поля PRI')
+    rest = text[pri_end + 1 :]
+
+    if rest.startswith('1 '):
+        parts = rest.split(' ', 6)
+        if len(parts) < 7:
+            raise ValueError('неполный заголовок RFC 5424')
+        hostname, app_name, structured = parts[2], parts[3], parts[6]
+        message = _strip_structured_data(structured).removeprefix('\ufeff')
+        return SyslogMessage(_nil(hostname), _nil(app_name), message)
+
+    if len(rest) <= RFC3164_TIMESTAMP_LENGTH or rest[RFC3164_TIMESTAMP_LENGTH] != ' ':
+        raise ValueError('нет времени RFC 3164')
+    first, _, remainder = rest[RFC3164_TIMESTAMP_LENGTH + 1 :].partition(' ')
+
+    if first.endswith(':'):
+        return SyslogMessage('', first[:-1].partition('[')[0], remainder)
+
+    tag, separator, message = remainder.partition(': ')
+    if not separator or ' ' in tag:
+        return SyslogMessage(first, '', remainder)
+    return SyslogMessage(first, tag.partition('[')[0], message)
+
+
+class SyslogRoutes:
+    """Какому серверу принадлежит сообщение: по имени хоста, затем по тегу.
+
+    Args:
+        routes: имя хоста или тег → server_id
+        default_server_id: сервер для сообщений без маршрута; без него
+            такие сообщения отбрасываются и учитываются как unrouted
+    """
+
+    def __init__(self, routes: dict[str, int] | None = None, default_server_id: int | None = None):
+        self.routes = routes or {}
+        self.default_server_id = default_server_id
+
+    @property
+    def server_ids(self) -> set[int]:
+        """Все серверы, в которые могут попасть сообщения."""
+        server_ids = set(self.routes.values())
+        if self.default_server_id is not None:
+            server_ids.add(self.default_server_id)
+        return server_ids
+
+    def resolve(self, hostname: str, tag: str) -> int | None:
+        """server_id сообщения или None, если маршрута нет."""
+        server_id = self.routes.get(hostname)
+        if server_id is None:
+            server_id = self.routes.get(tag, self.default_server_id)
+        return server_id
+
+
+def parse_route_option(value: str) -> tuple[str, int]:
+    """Маршрут из значения опции ``--route имя:server_id``.
+
+    Raises:
+        ValueError: нет двоеточия или ID сервера не целое число
+    """
+    name, separator, server_id = value.rpartition(':')
+    if not separator or not name:
+        raise ValueError(f'Ожидается имя:server_id, получено: {value}')
+
+    try:
+        return name, int(server_id)
+    except ValueError:
+        raise ValueError(f'ID сервера должен быть целым числом: {value}') from None
+
+
+def parse_address(value: str) -> Address:
+    """Адрес из значения ``хост:порт`` или просто ``порт``.
+
+    Raises:
+        ValueError: порт не целое число
+    """
+    host, _, port = value.rpartition(':')
+    try:
+        return host or SETTINGS.SYSLOG_HOST, int(port)
+    except ValueError:
+        raise ValueError(f'Ожидается хост:порт, получено: {value}') from None
+
+
+def kernel_drops(sockets: list[socket.socket]) -> int | None:
+    """Датаграммы, отброшенные ядром для этих сокетов, из /proc/net/udp.
+
+    Returns:
+        сумма счётчиков drops или None, если /proc недоступен (не Linux)
+    """
+    inodes = {os.fstat(sock.fileno()).st_ino for sock in sockets}
+    drops = None
+    for table in PROC_NET_UDP:
+        try:
+            lines = Path(table).read_text().splitlines()[1:]
+        except OSError:
+            continue
+
+        for line in lines:
+            fields = line.split()
+            if len(fields) >= 13 and int(fields[9]) in inodes:
+                drops = (drops or 0) + int(fields[12])
+    return drops
+
+
+class DatagramReader:
+    """Читает датаграммы из неблокирующего UDP-сокета пачками.
+
+    asyncio.DatagramProtocol получает по одной датаграмме на оборот event
+    loop: на десятках тысяч сообщений в секунду оборот цикла стоит дороже
+    самого сообщения, и буфер сокета переполняется. Здесь за одно
+    пробуждение читается до MAX_DATAGRAMS_PER_WAKEUP датаграмм.
+    """
+
+    def __init__(self, address: Address, receive: Callable[[bytes], None]):
+        host, port = address
+        self.sock = socket.socket(
+            socket.AF_INET6 if ':' in host else socket.AF_INET, socket.SOCK_DGRAM
+        )
+        self.sock.setsockopt(
+            socket.SOL_SOCKET, socket.SO_RCVBUF, SETTINGS.SYSLOG_RCVBUF_MB * 1024 * 1024
+        )
+        self.sock.setblocking(False)
+        self.sock.bind((host, port))
+        self.receive = receive
+        self._loop = asyncio.get_running_loop()
+        self._received = SYSLOG_MESSAGES.labels(UDP)
+
+    @property
+    def address(self) -> Address:
+        """Адрес, на котором слушает сокет (с настоящим портом, если задан 0)."""
+        return self.sock.getsockname()[:2]
+
+    def resume(self) -> None:
+        """Начинает или продолжает чтение сокета."""
+        self._loop.add_reader(self.sock.fileno(), self._read)
+
+    def pause(self) -> None:
+        """Приостанавливает чтение: датаграммы копятся в буфере ядра."""
+        self._loop.remove_reader(self.sock.fileno())
+
+    def close(self) -> None:
+        """Прекращает чтение и закрывает сокет."""
+        self.pause()
+        self.sock.close()
+
+    def _read(self) -> None:
+        recv = self.sock.recv
+        receive = self.receive
+        count = 0
+        for _ in range(MAX_DATAGRAMS_PER_WAKEUP):
+            try:
+                data = recv(MAX_DATAGRAM_BYTES)
+            except BlockingIOError:
+                break
+            except OSError as e:
+                logger.warning(f'Ошибка сокета syslog: {e}')
+                break
+            receive(data)
+            count += 1
+        self._received.inc(count)
+
+
+class SyslogPipeline(LogPipeline):
+    """Конвейер, у которого стадия чтения — приёмники syslog вместо файлов.
+
+    Строки копятся в пачке своего сервера; пачка уходит на разбор, когда
+    набралось LINE_BATCH_SIZE строк или раз в flush_interval писателей.
+    Разбор, запись, счётчики отвергнутых строк и dead-letter — общие с
+    LogPipeline. Чекпоинтов нет: у потока syslog нет позиции, с которой
+    можно продолжить.
+
+    Args:
+        routes: сопоставление хостов и тегов серверам
+        log_formats: формат строк каждого сервера из routes.server_ids
+        udp: адреса для приёма датаграмм
+        tcp: адреса для приёма по TCP (RFC 6587: с длиной или по строкам)
+        **kwargs: параметры LogPipeline
+    """
+
+    def __init__(
+        self,
+        routes: SyslogRoutes,
+        log_formats: dict[int, str | None] | None = None,
+        udp: list[Address] | None = None,
+        tcp: list[Address] | None = None,
+        **kwargs: Any,
+    ):
+        super().__init__(**kwargs)
+        log_formats = log_formats or {}
+        self.routes = routes
+        self.udp = udp or []
+        self.tcp = tcp or []
+        self.backlog = SETTINGS.SYSLOG_BACKLOG_BATCHES
+        self.seal_interval = self.writers[0].flush_interval
+        self.unrouted = 0
+        self.malformed = 0
+
+        self.syslog_sources: dict[int, LogSource] = {}
+        self._buffers: dict[int, list[str]] = {}
+        for server_id in sorted(routes.server_ids):
+            parser = NginxLogParser(
+                f'syslog:{server_id}', server_id, log_format=log_formats.get(server_id)
+            )
+            self.syslog_sources[server_id] = self.sources[parser.log_file_path] = LogSource(parser)
+            self._buffers[server_id] = []
+
+        self.udp_readers: list[DatagramReader] = []
+        self.tcp_servers: list[asyncio.Server] = []
+        self._ready: deque[LineBatch] = deque()
+        self._has_ready = asyncio.Event()
+        self._can_read = asyncio.Event()
+        self._can_read.set()
+        self._discarded_unrouted = SYSLOG_DISCARDED.labels('unrouted')
+        self._discarded_malformed = SYSLOG_DISCARDED.labels('malformed')
+
+    def stats(self) -> dict[str, Any]:
+        """Статистика LogPipeline и счётчики приёмника."""
+        return {
+            **super().stats(),
+            'syslog': {
+                'ready_batches': len(self._ready),
+                'paused': not self._can_read.is_set(),
+                'unrouted': self.unrouted,
+                'malformed': self.malformed,
+                'kernel_drops': self.kernel_drops(),
+            },
+        }
+
+    def collect_metrics(self) -> None:
+        """Обновляет gauge конвейера и потери датаграмм в ядре."""
+        super().collect_metrics()
+        drops = self.kernel_drops()
+        if drops is not None:
+            SYSLOG_KERNEL_DROPS.set(drops)
+
+    def kernel_drops(self) -> int | None:
+        """Датаграммы, которые ядро отбросило на сокетах приёмника."""
+        sockets = [reader.sock for reader in self.udp_readers]
+        return kernel_drops(sockets) if sockets else None
+
+    def receive(self, data: bytes) -> None:
+        """Принимает одно сообщение: снимает конверт и кладёт строку в пачку сервера."""
+        try:
+            hostname, tag, message = parse_syslog(data)
+        except ValueError:
+            self.malformed += 1
+            self._discarded_malformed.inc()
+            return
+
+        server_id = self.routes.resolve(hostname, tag)
+        if server_id is None:
+            self.unrouted += 1
+            self._discarded_unrouted.inc()
+            return
+
+        buffer = self._buffers[server_id]
+        buffer.append(message)
+        if len(buffer) >= LINE_BATCH_SIZE:
+            self._seal(server_id)
+
+    def _seal(self, server_id: int) -> None:
+        """Отправляет накопленную пачку сервера на разбор."""
+        lines = self._buffers[server_id]
+        self._buffers[server_id] = []
+        source = self.syslog_sources[server_id]
+        self._ready.append((source, source.tracker.register(None), None, None, lines))
+        self._has_ready.set()
+
+        if len(self._ready) >= self.backlog and self._can_read.is_set():
+            logger.warning('Разбор не успевает за syslog, приём приостановлен')
+            self._can_read.clear()
+            for reader in self.udp_readers:
+                reader.pause()
+
+    def _resume_reading(self) -> None:
+        self._can_read.set()
+        for reader in self.udp_readers:
+            reader.resume()
+
+    async def _read_sources(self) -> None:
+        """Стадия чтения: слушает UDP и TCP, пока задачу не отменят."""
+        try:
+            for address in self.udp:
+                reader = DatagramReader(address, self.receive)
+                reader.resume()
+                self.udp_readers.append(reader)
+                logger.info('Приём syslog по UDP на {}:{}', *reader.address)
+
+            for host, port in self.tcp:
+                self.tcp_servers.append(await asyncio.start_server(self._handle_tcp, host, port))
+                logger.info(f'Приём syslog по TCP на {host}:{port}')
+
+            async with asyncio.TaskGroup() as task_group:
+                task_group.create_task(self._seal_periodically())
+                task_group.create_task(self._feed())
+        finally:
+            for server_id, buffer in list(self._buffers.items()):
+                if buffer:
+                    self._seal(server_id)
+            for reader in self.udp_readers:
+                reader.close()
+            for server in self.tcp_servers:
+                server.close()
+            await self._drain()
+
+    async def _drain(self) -> None:
+        """Пишет в БД пачки, которые остались в очередях при остановке.
+
+        Остановка отменяет все стадии сразу, а у syslog, в отличие от
+        файлов, нет чекпоинта, с которого можно дочитать потерянное.
+        Поэтому разобранные пачки из record_queue и неразобранные из
+        line_queue и готовых пачек приёмника разбираются здесь же и
+        пишутся первым писателем.
+        """
+        writer = self.writers[0]
+        while not self.record_queue.empty():
+            if (record := self.record_queue.get_nowait()) is not None:
+                marker, rows = record
+                await writer.add_rows(rows)
+                writer.mark(marker)
+
+        batches = []
+        while not self.line_queue.empty():
+            if (item := self.line_queue.get_nowait()) is not None:
+                batches.append(item)
+        batches.extend(self._ready)
+        self._ready.clear()
+        for source, seq, identity, offsets, lines in batches:
+            rows, rejects = parse_rows(source.parser, lines, identity, offsets)
+            self._account(source, offsets, lines, rows, rejects)
+            await writer.add_rows(rows)
+            writer.mark((source, seq))
+        await writer.flush()
+
+    async def _feed(self) -> None:
+        """Передаёт готовые пачки в очередь разбора, ожидая, если она полна."""
+        while True:
+            await self._has_ready.wait()
+            while self._ready:
+                await self.line_queue.put(self._ready.popleft())
+                if not self._can_read.is_set() and len(self._ready) <= self.backlog // 2:
+                    self._resume_reading()
+            self._has_ready.clear()
+
+    async def _seal_periodically(self) -> None:
+        """Раз в seal_interval отправляет на разбор неполные пачки."""
+        while True:
+            await asyncio.sleep(self.seal_interval)
+            for server_id, buffer in list(self._buffers.items()):
+                if buffer:
+                    self._seal(server_id)
+
+    async def _handle_tcp(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """Читает сообщения одного TCP-соединения.
+
+        Сообщение с длиной (``123 <190>...``) читается ровно по длине,
+        остальные — до перевода строки.
+        """
+        received = SYSLOG_MESSAGES.labels(TCP)
+        try:
+            while True:
+                await self._can_read.wait()
+                head = await reader.readuntil(b' ')
+                if head[:-1].isdigit():
+                    data = await reader.readexactly(int(head[:-1]))
+                else:
+                    data = head + await reader.readuntil(b'\n')
+                received.inc()
+                self.receive(data)
+        except asyncio.IncompleteReadError:
+            pass
+        except (asyncio.LimitOverrunError, ConnectionError) as e:
+            logger.warning(f'Соединение syslog закрыто: {e}')
+        finally:
+            writer.close()
+
+
+async def start_syslog_receiver(
+    routes: SyslogRoutes,
+    udp: list[Address] | None = None,
+    tcp: list[Address] | None = None,
+    batch_size: int | None = None,
+    flush_interval: float | None = None,
+    writers: int | None = None,
+    queue_size: int | None = None,
+    parse_workers: int | None = None,
+    metrics_port: int | None = None,
+) -> None:
+    """Запускает приём логов по syslog.
+
+    Формат строк каждого сервера берётся из его log_format в БД, если не
+    задан — combined. Без udp и tcp слушает UDP на
+    SYSLOG_HOST:SYSLOG_PORT.
+    """
+    if not udp and not tcp:
+        udp = [(SETTINGS.SYSLOG_HOST, SETTINGS.SYSLOG_PORT)]
+
+    log_formats = {
+        server_id: await resolve_log_format(server_id, None) for server_id in routes.server_ids
+    }
+    pipeline = SyslogPipeline(
+        routes,
+        log_formats,
+        udp=udp,
+        tcp=tcp,
+        dead_letter=default_dead_letter(),
+        writers=writers,
+        queue_size=queue_size,
+        batch_size=batch_size,
+        flush_interval=flush_interval,
+        parse_workers=parse_workers,
+    )
+    await run_pipeline(pipeline, metrics_port)
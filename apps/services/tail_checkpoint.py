@@ -0,0 +1,136 @@
+import hashlib
+import json
+import os
+
+from collections.abc import Mapping
+from dataclasses import asdict
+from dataclasses import dataclass
+from pathlib import Path
+
+from loguru import logger
+
+FINGERPRINT_BYTES = 1024
+
+
+@dataclass(frozen=True)
+class TailCheckpoint:
+    """Позиция чтения файла: идентичность файла и смещение в байтах.
+
+    fingerprint — хеш первой строки файла, защищает от повторного
+    использования inode после удаления старого файла.
+    """
+
+    device: int
+    inode: int
+    offset: int
+    fingerprint: str
+
+
+def first_line_fingerprint(path: Path) -> str:
+    """Хеш первой полной строки файла; пустая строка, если её ещё нет."""
+    try:
+        with open(path, 'rb') as f:
+            head = f.read(FINGERPRINT_BYTES)
+    except OSError:
+        return ''
+
+    return head_fingerprint(head)
+
+
+def head_fingerprint(head: bytes) -> str:
+    """Хеш первой полной строки из начала файла, уже прочитанного в память."""
+    newline = head.find(b'\n', 0, FINGERPRINT_BYTES)
+    if newline == -1:
+        return ''
+
+    return hashlib.sha1(head[: newline + 1], usedforsecurity=False).hexdigest()
+
+
+class TailCheckpointStore:
+    """Хранилище чекпоинтов в JSON-файле, ключ — абсолютный путь к логу.
+
+    Файл перезаписывается атомарно через временный файл и os.replace,
+    поэтому падение процесса посреди записи не портит чекпоинты.
+    """
+
+    def __init__(self, path: str | Path):
+        self.path = Path(path)
+        self._checkpoints: dict[str, TailCheckpoint] = self._read()
+
+    def _read(self) -> dict[str, TailCheckpoint]:
+        if not self.path.exists():
+            return {}
+
+        try:
+            raw = json.loads(self.path.read_text())
+            return {key: TailCheckpoint(**value) for key, value in raw.items()}
+        except (ValueError, TypeError):
+            logger.exception(f'Файл чекпоинтов {self.path} повреждён, начинаем без него')
+            return {}
+
+    def load(self, log_file_path: str | Path) -> TailCheckpoint | None:
+        """Чекпоинт файла логов или None, если файл ещё не читался."""
+        return self._checkpoints.get(str(Path(log_file_path).absolute()))
+
+    def save(self, log_file_path: str | Path, checkpoint: TailCheckpoint) -> None:
+        """Сохраняет чекпоинт файла логов на диск."""
+        self.save_many({Path(log_file_path): checkpoint})
+
+    def save_many(self, checkpoints: Mapping[Path, TailCheckpoint]) -> None:
+        """Сохраняет чекпоинты нескольких файлов одной перезаписью файла."""
+        changed = False
+        for log_file_path, checkpoint in checkpoints.items():
+            key = str(log_file_path.absolute())
+            if self._checkpoints.get(key) != checkpoint:
+                self._checkpoints[key] = checkpoint
+                changed = True
+
+        if not changed:
+            return
+
+        payload = {key: asdict(value) for key, value in self._checkpoints.items()}
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_name(f'{self.path.name}.tmp')
+        tmp_path.write_text(json.dumps(payload, indent=2))
+        os.replace(tmp_path, self.path)
+
+
+class CheckpointTracker:
+    """Отслеживает, до какого места файла строки надёжно записаны в БД.
+
+    Читатель регистрирует каждую пачку строк по порядку, писатели отмечают
+    пачки записанными в произвольном порядке. Надёжным считается чекпоинт
+    последней пачки, до которой включительно записаны все предыдущие, —
+    с него безопасно продолжать после перезапуска (at-least-once).
+    """
+
+    def __init__(self):
+        self.durable: TailCheckpoint | None = None
+        self._next_seq = 0
+        self._acked_seq = -1
+        self._pending: dict[int, TailCheckpoint | None] = {}
+        self._done: set[int] = set()
+
+    def register(self, checkpoint: TailCheckpoint | None) -> int:
+        """Регистрирует пачку и возвращает её порядковый номер."""
+        seq = self._next_seq
+        self._next_seq += 1
+        self._pending[seq] = checkpoint
+        return seq
+
+    def complete(self, seqs: list[int]) -> None:
+        """Отмечает пачки записанными и сдвигает надёжный чекпоинт."""
+        self._done.update(seqs)
+
+        while self._acked_seq + 1 in self._done:
+            self._acked_seq += 1
+            self._done.discard(self._acked_seq)
+            checkpoint = self._pending.pop(self._acked_seq)
+            if checkpoint is not None:
+                self.durable = checkpoint
+
+    @property
+    def in_flight(self) -> int:
+        """Количество пачек, ещё не записанных в БД."""
+        return len(self._pending)
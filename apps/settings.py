@@ -77,5 +77,42 @@ class Settings(BaseSettings):
     ALCHEMY_POLL_SIZE: int = 10
     ALCHEMY_OVERFLOW_POOL_SIZE: int = 20
 
+    MONITOR_BATCH_SIZE: int = 5000
+    MONITOR_FLUSH_INTERVAL_MS: int = 200
+    MONITOR_WRITERS: int = 2
+    MONITOR_QUEUE_SIZE: int = 64
+    MONITOR_STATS_INTERVAL_SECONDS: int = 30
+    MONITOR_USE_INOTIFY: bool = True
+    MONITOR_CHECKPOINT_PATH: str = 'var/monitor_checkpoints.json'
+    MONITOR_CHECKPOINT_INTERVAL_SECONDS: float = 1
+    MONITOR_DISCOVERY_INTERVAL_SECONDS: float = 10
+    MONITOR_PARSE_WORKERS: int = 0
+    MONITOR_DEAD_LETTER_PATH: str = 'var/dead_letter.jsonl'
+    MONITOR_DEAD_LETTER_MAX_MB: int = 100
+    MONITOR_DEAD_LETTER_BACKUPS: int = 5
+    MONITOR_METRICS_HOST: str = '127.0.0.1'
+    MONITOR_METRICS_PORT: int = 0
+    PARSE_WARNING_INTERVAL_SECONDS: float = 10
+    DEDUP_SOURCE_KEYS: bool = True
+    DIMENSION_CACHE_SIZE: int = 100_000
+
+    PARTITION_INTERVAL_DAYS: int = 1
+    PARTITION_PRECREATE: int = 7
+    PARTITION_RETENTION_DAYS: int = 0
+    PARTITION_DROP_EXPIRED: bool = True
+    PARTITION_MAINTENANCE_INTERVAL_SECONDS: int = 3600
+    ROLLUP_COMPACTION_INTERVAL_SECONDS: int = 60
+    ANALYTICS_CACHE_MAX_MB: int = 64
+    ANALYTICS_CACHE_SETTLE_SECONDS: int = 10
+
+    SYSLOG_HOST: str = '127.0.0.1'
+    SYSLOG_PORT: int = 5140
+    SYSLOG_RCVBUF_MB: int = 8
+    SYSLOG_BACKLOG_BATCHES: int = 64
+
+    IMPORT_WORKERS: int = 0
+    IMPORT_CHUNK_MB: int = 16
+    IMPORT_PROGRESS_INTERVAL_SECONDS: int = 5
+
 
 SETTINGS = Settings()
@@ -0,0 +1,391 @@
+"""Метрики в текстовом формате Prometheus без внешних зависимостей.
+
+Реестр живёт в памяти процесса: счётчики, gauge и гистограммы
+обновляются на горячем пути простым сложением, а текст собирается только
+при запросе /metrics. Значения, которые дешевле посчитать при сборе, чем
+поддерживать (глубина очередей, отставание файлов, занятость пула
+соединений), заполняются хуками перед выводом.
+
+    LINES = Counter('nginx_lines_total', 'Прочитано строк', ('server_id',))
+    LINES.labels('1').inc(1000)
+
+API отдаёт метрики по маршруту /metrics, монитор — через лёгкий
+HTTP-слушатель start_metrics_server.
+"""
+
+import asyncio
+import bisect
+import contextlib
+import math
+import time
+
+from collections.abc import Callable
+from collections.abc import Iterator
+from typing import Any
+
+from fastapi import APIRouter
+from loguru import logger
+from starlette.responses import Response
+from starlette.status import HTTP_200_OK
+from starlette.types import ASGIApp
+from starlette.types import Message
+from starlette.types import Receive
+from starlette.types import Scope
+from starlette.types import Send
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+UNMATCHED_ROUTE = 'unmatched'
+# Время на строку запроса и все заголовки слушателя метрик вместе.
+REQUEST_TIMEOUT_SECONDS = 5
+
+Sample = tuple[str, dict[str, str], float]
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape_label(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(labels: dict[str, str]) -> str:
+    if not labels:
+        return ''
+    pairs = ','.join(f'{name}="{_escape_label(value)}"' for name, value in labels.items())
+    return f'{{{pairs}}}'
+
+
+class CollectorRegistry:
+    """Реестр метрик процесса и хуков, обновляющих их перед выводом."""
+
+    def __init__(self):
+        self._metrics: dict[str, Metric] = {}
+        self._hooks: list[Callable[[], None]] = []
+
+    def register(self, metric: 'Metric') -> None:
+        """Добавляет метрику; имя должно быть уникальным."""
+        if metric.name in self._metrics:
+            raise ValueError(f'Метрика {metric.name} уже зарегистрирована')
+        self._metrics[metric.name] = metric
+
+    def add_hook(self, hook: Callable[[], None]) -> None:
+        """Добавляет функцию, которая вызывается перед каждым выводом метрик."""
+        self._hooks.append(hook)
+
+    def remove_hook(self, hook: Callable[[], None]) -> None:
+        """Убирает хук, добавленный add_hook."""
+        with contextlib.suppress(ValueError):
+            self._hooks.remove(hook)
+
+    def render(self) -> str:
+        """Все метрики в текстовом формате Prometheus 0.0.4."""
+        for hook in list(self._hooks):
+            try:
+                hook()
+            except Exception:
+                logger.exception('Ошибка хука метрик')
+
+        lines = []
+        for metric in self._metrics.values():
+            lines.append(f'# HELP {metric.name} {metric.documentation}')
+            lines.append(f'# TYPE {metric.name} {metric.type_name}')
+            lines.extend(
+                f'{metric.name}{suffix}{_format_labels(labels)} {_format_value(value)}'
+                for suffix, labels, value in metric.samples()
+            )
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = CollectorRegistry()
+
+
+class Metric:
+    """Метрика с необязательными метками.
+
+    Без меток значение меняется на самой метрике, с метками — на дочерней
+    метрике из labels(). Дочерние метрики кешируются, поэтому на горячем
+    пути labels() стоит один поиск в словаре.
+    """
+
+    type_name = ''
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: tuple[str, ...] = (),
+        registry: CollectorRegistry | None = REGISTRY,
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._children: dict[tuple[str, ...], Any] = {}
+        if registry is not None:
+            registry.register(self)
+
+    def labels(self, *values: Any) -> Any:
+        """Дочерняя метрика для значений меток в порядке labelnames."""
+        key = tuple(str(value) for value in values)
+        child = self._children.get(key)
+        if child is None:
+            if len(key) != len(self.labelnames):
+                raise ValueError(f'{self.name}: ожидаются метки {self.labelnames}')
+            child = self._children[key] = self._new_child()
+        return child
+
+    def clear(self) -> None:
+        """Удаляет все дочерние метрики, например исчезнувшие файлы."""
+        self._children.clear()
+
+    def samples(self) -> Iterator[Sample]:
+        """Строки вывода: суффикс имени, метки и значение."""
+        if not self.labelnames:
+            yield from self._child_samples(self._unlabelled(), {})
+            return
+
+        for key, child in list(self._children.items()):
+            yield from self._child_samples(child, dict(zip(self.labelnames, key, strict=True)))
+
+    def _unlabelled(self) -> Any:
+        return self.labels()
+
+    def _new_child(self) -> Any:
+        raise NotImplementedError
+
+    def _child_samples(self, child: Any, labels: dict[str, str]) -> Iterator[Sample]:
+        raise NotImplementedError
+
+
+class _Value:
+    __slots__ = ('value',)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount: float = 1) -> None:
+        self.value += amount
+
+    def dec(self, amount: float = 1) -> None:
+        self.value -= amount
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+
+class Counter(Metric):
+    """Монотонно растущий счётчик."""
+
+    type_name = 'counter'
+
+    def inc(self, amount: float = 1) -> None:
+        """Увеличивает счётчик без меток."""
+        self._unlabelled().inc(amount)
+
+    def _new_child(self) -> _Value:
+        return _Value()
+
+    def _child_samples(self, child: _Value, labels: dict[str, str]) -> Iterator[Sample]:
+        yield '', labels, child.value
+
+
+class Gauge(Metric):
+    """Значение, которое может расти и убывать."""
+
+    type_name = 'gauge'
+
+    def set(self, value: float) -> None:
+        """Устанавливает значение gauge без меток."""
+        self._unlabelled().set(value)
+
+    def _new_child(self) -> _Value:
+        return _Value()
+
+    def _child_samples(self, child: _Value, labels: dict[str, str]) -> Iterator[Sample]:
+        yield '', labels, child.value
+
+
+class _HistogramValue:
+    __slots__ = ('buckets', 'count', 'counts', 'sum')
+
+    def __init__(self, buckets: tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        index = bisect.bisect_left(self.buckets, value)
+        if index < len(self.counts):
+            self.counts[index] += 1
+        self.count += 1
+        self.sum += value
+
+
+class Histogram(Metric):
+    """Распределение значений по корзинам, например задержек в секундах."""
+
+    type_name = 'histogram'
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+        registry: CollectorRegistry | None = REGISTRY,
+    ):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames, registry)
+
+    def observe(self, value: float) -> None:
+        """Добавляет наблюдение в гистограмму без меток."""
+        self._unlabelled().observe(value)
+
+    def _new_child(self) -> _HistogramValue:
+        return _HistogramValue(self.buckets)
+
+    def _child_samples(self, child: _HistogramValue, labels: dict[str, str]) -> Iterator[Sample]:
+        cumulative = 0
+        for bound, count in zip(child.buckets, child.counts, strict=True):
+            cumulative += count
+            yield '_bucket', {**labels, 'le': _format_value(bound)}, cumulative
+        yield '_bucket', {**labels, 'le': '+Inf'}, child.count
+        yield '_count', labels, child.count
+        yield '_sum', labels, child.sum
+
+
+HTTP_REQUESTS = Counter(
+    'nginx_analyzer_http_requests_total',
+    'Запросы к API по маршруту и коду ответа',
+    ('method', 'route', 'status'),
+)
+HTTP_REQUEST_SECONDS = Histogram(
+    'nginx_analyzer_http_request_duration_seconds',
+    'Время обработки запроса к API',
+    ('method', 'route'),
+)
+DB_POOL_CONNECTIONS = Gauge(
+    'nginx_analyzer_db_pool_connections',
+    'Соединения пула SQLAlchemy по состоянию',
+    ('database', 'state'),
+)
+
+
+def _collect_db_pools() -> None:
+    """Занятость пулов соединений всех движков процесса.
+
+    Размер и занятость есть только у пулов с очередью (QueuePool и
+    асинхронный AsyncAdaptedQueuePool), пулы других типов пропускаются.
+    """
+    from sqlalchemy.pool import QueuePool
+
+    from apps.db.session import PGEngineConnector
+
+    DB_POOL_CONNECTIONS.clear()
+    for engine in PGEngineConnector.engine_dict.values():
+        pool = engine.pool
+        if not isinstance(pool, QueuePool):
+            continue
+        database = f'{engine.url.host}/{engine.url.database}'
+        for state, value in (
+            ('size', pool.size()),
+            ('checked_out', pool.checkedout()),
+            ('checked_in', pool.checkedin()),
+            ('overflow', pool.overflow()),
+        ):
+            DB_POOL_CONNECTIONS.labels(database, state).set(value)
+
+
+REGISTRY.add_hook(_collect_db_pools)
+
+
+class MetricsMiddleware:
+    """ASGI-middleware: число и длительность запросов по шаблону маршрута.
+
+    Метка route — шаблон пути (/api/servers/{server_id}), а не сам путь,
+    иначе число рядов метрики росло бы с каждым новым ID. Запросы без
+    маршрута FastAPI (статика, 404) попадают в route="unmatched".
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        """Пропускает запрос дальше и учитывает его маршрут, код и время."""
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+
+        async def send_with_status(message: Message) -> None:
+            nonlocal status
+            if message['type'] == 'http.response.start':
+                status = message['status']
+            await send(message)
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            route = scope.get('route')
+            path = getattr(route, 'path', None) or UNMATCHED_ROUTE
+            method = scope['method']
+            HTTP_REQUEST_SECONDS.labels(method, path).observe(time.perf_counter() - started)
+            HTTP_REQUESTS.labels(method, path, status).inc()
+
+
+metrics_router = APIRouter()
+
+
+@metrics_router.get('/metrics', status_code=HTTP_200_OK, include_in_schema=False)
+async def get_metrics() -> Response:
+    """Метрики процесса в текстовом формате Prometheus."""
+    return Response(content=REGISTRY.render(), media_type=CONTENT_TYPE)
+
+
+async def _read_request_line(reader: asyncio.StreamReader) -> bytes:
+    """Читает строку запроса и пропускает заголовки до пустой строки или EOF."""
+    request_line = await reader.readline()
+    while True:
+        header = await reader.readline()
+        if header in (b'\r\n', b'\n', b''):
+            return request_line
+
+
+async def _serve_metrics(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+    """Отвечает на один HTTP-запрос: GET /metrics или 404."""
+    try:
+        request_line = await asyncio.wait_for(
+            _read_request_line(reader), timeout=REQUEST_TIMEOUT_SECONDS
+        )
+
+        parts = request_line.decode('latin-1').split()
+        if len(parts) >= 2 and parts[0] == 'GET' and parts[1].split('?')[0] == '/metrics':
+            status, content_type, body = '200 OK', CONTENT_TYPE, REGISTRY.render().encode()
+        else:
+            status, content_type, body = '404 Not Found', 'text/plain', b'Not Found\n'
+
+        writer.write(
+            f'HTTP/1.1 {status}\r\nContent-Type: {content_type}\r\n'
+            f'Content-Length: {len(body)}\r\nConnection: close\r\n\r\n'.encode()
+            + body
+        )
+        await writer.drain()
+    except (TimeoutError, ConnectionError):
+        pass
+    finally:
+        writer.close()
+
+
+async def start_metrics_server(host: str, port: int) -> asyncio.Server:
+    """Запускает HTTP-слушатель, отдающий /metrics, для процессов без FastAPI."""
+    server = await asyncio.start_server(_serve_metrics, host, port)
+    logger.info(f'Метрики доступны на http://{host}:{port}/metrics')
+    return server
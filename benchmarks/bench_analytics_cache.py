@@ -0,0 +1,144 @@
+"""Бенчмарк кеша аналитики: обработчики дашборда без кеша и с закрытой частью из кеша.
+
+В таблицу логов под отдельным сервером генерируются строки за DAYS
+суток, по ним строятся минутные сводки и скетчи и сворачиваются в
+часовые. Для окон 24 часа и DAYS суток каждый эндпоинт дашборда
+вызывается как обработчик: без кеша (кеш очищается перед вызовом) и с
+кешем — так, как его видит вкладка, обновляющаяся в той же минуте.
+Выводится медиана времени обоих вызовов и размер кеша с корзинами и
+закрытыми частями всех эндпоинтов обоих окон. Сервер, его строки и URI удаляются после
+замера.
+
+Запуск: python -m benchmarks.bench_analytics_cache [строк]
+"""
+
+import asyncio
+import statistics
+import sys
+import time
+
+from collections.abc import Awaitable
+from collections.abc import Callable
+from datetime import UTC
+from datetime import datetime
+from datetime import timedelta
+
+from loguru import logger
+
+from apps.api.v1.handlers import analytics_handler
+from apps.db.session import connector
+from apps.services.analytics_cache import ANALYTICS_CACHE
+from apps.services.rollups import compact_rollups
+from apps.services.rollups import rebuild_sketches
+
+ROWS = 2_000_000
+DAYS = 7
+REPEATS = 5
+BENCH_SERVER_ID = 900006
+SCHEMA = 'nginx_parser_schema'
+
+SETUP_SQL = (
+    f'INSERT INTO {SCHEMA}.server_model (id, name, ip_address) '
+    "VALUES ($1, 'bench-analytics-cache', '127.0.0.1') ON CONFLICT DO NOTHING"
+)
+URI_SQL = f"INSERT INTO {SCHEMA}.uri_model (value) VALUES ('/bench-analytics-cache') RETURNING id"
+FILL_SQL = (
+    f'INSERT INTO {SCHEMA}.log_entry_model (server_id, timestamp, remote_addr, method, uri_id, '
+    'http_version, status, size, request_time) '
+    f"SELECT $1, now() - i * interval '{DAYS} days' / $2, '10.0.' || i % 250 || '.1', 'GET', $3, "
+    "'HTTP/1.1', CASE WHEN i % 50 = 0 THEN 500 WHEN i % 31 = 0 THEN 404 ELSE 200 END, "
+    'i % 100000, (i % 997) / 100.0 FROM generate_series(1, $2::int) AS i'
+)
+ROLLUP_SQL = (
+    f'INSERT INTO {SCHEMA}.log_rollup_minute_model (bucket, server_id, status, requests, bytes) '
+    "SELECT date_trunc('minute', timestamp, 'UTC'), server_id, status, count(*), sum(size) "
+    f'FROM {SCHEMA}.log_entry_model WHERE server_id = $1 GROUP BY 1, 2, 3'
+)
+DAY_KEYS_SQL = (
+    f"SELECT DISTINCT date_trunc('minute', timestamp, 'UTC'), server_id "
+    f'FROM {SCHEMA}.log_entry_model WHERE server_id = $1 AND timestamp >= $2 AND timestamp < $3'
+)
+
+
+def endpoints(session, hours: int) -> dict[str, Callable[[], Awaitable]]:
+    """Вызовы обработчиков, которые дашборд обновляет раз в 30 секунд."""
+    return {
+        'status-codes': lambda: analytics_handler.get_status_code_stats(hours, None, session),
+        'traffic': lambda: analytics_handler.get_traffic_stats(hours, False, None, session),
+        'top-ips': lambda: analytics_handler.get_top_ips(10, hours, False, None, session),
+        'top-urls': lambda: analytics_handler.get_top_urls(10, hours, False, None, session),
+        'errors': lambda: analytics_handler.get_error_stats(hours, None, session),
+        'time-series': lambda: analytics_handler.get_time_series_data(hours, 5, None, session),
+        'percentiles': lambda: analytics_handler.get_percentiles(hours, False, None, session),
+    }
+
+
+async def median_seconds(run: Callable[[], Awaitable], clear: bool) -> float:
+    """Медиана времени вызова за REPEATS запусков после прогрева."""
+    await run()
+    timings = []
+    for _ in range(REPEATS):
+        if clear:
+            ANALYTICS_CACHE.clear()
+        started = time.perf_counter()
+        await run()
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings)
+
+
+async def main(rows: int) -> None:
+    """Заполняет таблицу, строит сводки и скетчи и сравнивает вызовы без кеша и с кешем."""
+    engine = connector.get_pg_engine(sql_alchemy_uri=connector.sql_alchemy_uri)
+    async with engine.connect() as conn:
+        raw_connection = await conn.get_raw_connection()
+        connection = raw_connection.driver_connection
+        uri_id = None
+        try:
+            await connection.execute(SETUP_SQL, BENCH_SERVER_ID)
+            uri_id = await connection.fetchval(URI_SQL)
+            started = time.perf_counter()
+            await connection.execute(FILL_SQL, BENCH_SERVER_ID, rows, uri_id)
+            await connection.execute(ROLLUP_SQL, BENCH_SERVER_ID)
+            day = datetime.now(UTC) - timedelta(days=DAYS + 1)
+            while day < datetime.now(UTC):
+                async with connection.transaction():
+                    keys = await connection.fetch(
+                        DAY_KEYS_SQL, BENCH_SERVER_ID, day, day + timedelta(days=1)
+                    )
+                    if keys:
+                        await rebuild_sketches(
+                            connection, [(bucket, server_id) for bucket, server_id in keys]
+                        )
+                day += timedelta(days=1)
+            await compact_rollups()
+            await connection.execute(f'VACUUM ANALYZE {SCHEMA}.log_entry_model')
+            logger.info(f'{rows:,} строк, сводки и скетчи за {time.perf_counter() - started:.0f} с')
+
+            async with connector.get_session_maker()() as session:
+                for hours in (24, DAYS * 24):
+                    for name, run in endpoints(session, hours).items():
+                        cold = await median_seconds(run, clear=True)
+                        warm = await median_seconds(run, clear=False)
+                        logger.info(
+                            f'{hours:4} ч  {name:<13} без кеша {cold * 1000:8,.1f} мс  '
+                            f'с кешем {warm * 1000:6,.1f} мс'
+                        )
+                ANALYTICS_CACHE.clear()
+                for hours in (24, DAYS * 24):
+                    for run in endpoints(session, hours).values():
+                        await run()
+            stats = ANALYTICS_CACHE.stats()
+            logger.info(
+                f'Кеш обоих окон: {stats["entries"]} записей, {stats["bytes"] / 1024:,.0f} КБ'
+            )
+        finally:
+            await connection.execute(
+                f'DELETE FROM {SCHEMA}.server_model WHERE id = $1', BENCH_SERVER_ID
+            )
+            await connection.execute(f'DELETE FROM {SCHEMA}.uri_model WHERE id = $1', uri_id)
+
+
+if __name__ == '__main__':
+    logger.remove()
+    logger.add(sys.stderr, level='INFO')
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else ROWS))
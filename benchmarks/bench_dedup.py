@@ -0,0 +1,86 @@
+"""Бенчмарк записи с проверкой повторов против прямого COPY.
+
+Одни и те же строки пишутся через LogBatchWriter тремя способами: без
+source_key (прямой COPY), с новыми ключами (COPY во временную таблицу и
+INSERT ... ON CONFLICT DO NOTHING) и с уже записанными ключами — так
+выглядит повторное чтение после падения или повторный импорт. Строки
+разобраны заранее, чтобы мерить только запись.
+
+Пишет в базу из настроек (SQLALCHEMY_DATABASE_URI) от имени отдельного
+сервера BENCH_SERVER_ID и удаляет его записи после замера.
+
+Запуск: python -m benchmarks.bench_dedup
+"""
+
+import asyncio
+import sys
+import time
+
+from loguru import logger
+from sqlalchemy import text
+
+from apps.db.session import connector
+from apps.services.log_batch_writer import LogBatchWriter
+from apps.services.log_rows import SOURCE_KEY_COLUMN
+from apps.services.nginx_log_parser import NginxLogParser
+from apps.services.parse_pool import parse_rows
+from apps.services.source_key import source_key
+from benchmarks.bench_parser import make_lines
+
+ROWS = 200_000
+BATCH_SIZE = 5000
+BENCH_SERVER_ID = 900_001
+
+
+async def write(rows: list[tuple]) -> tuple[float, LogBatchWriter]:
+    """Пишет строки пакетами BATCH_SIZE и возвращает время записи."""
+    writer = LogBatchWriter(batch_size=BATCH_SIZE, flush_interval=60)
+    started = time.perf_counter()
+    async with writer:
+        for start in range(0, len(rows), BATCH_SIZE):
+            await writer.add_rows(rows[start : start + BATCH_SIZE])
+    return time.perf_counter() - started, writer
+
+
+async def execute(statement: str) -> None:
+    """Выполняет служебный запрос в отдельной транзакции."""
+    async with connector.get_pg_session_cm() as db:
+        await db.execute(text(statement), {'server_id': BENCH_SERVER_ID})
+        await db.commit()
+
+
+async def main() -> None:
+    """Сравнивает прямой COPY, запись новых строк с ключами и повтор."""
+    logger.remove()
+    logger.add(sys.stderr, level='INFO')
+    parser = NginxLogParser('-', BENCH_SERVER_ID)
+    parsed, _ = parse_rows(parser, make_lines(ROWS))
+    plain = list(parsed)
+    keyed = [
+        (*row[:SOURCE_KEY_COLUMN], source_key('bench', index)) for index, row in enumerate(plain)
+    ]
+
+    await execute(
+        'INSERT INTO nginx_parser_schema.server_model (id, name, ip_address) '
+        "VALUES (:server_id, 'bench-dedup', '127.0.0.1') ON CONFLICT DO NOTHING"
+    )
+    try:
+        for title, rows in (
+            ('COPY без ключей', plain),
+            ('COPY + merge, новые', keyed),
+            ('COPY + merge, повтор', keyed),
+        ):
+            seconds, writer = await write(rows)
+            logger.info(
+                f'{title:<22} {len(rows) / seconds:>10,.0f} строк/с '
+                f'(записано {writer.written_rows:,}, повторов {writer.duplicate_rows:,})'
+            )
+    finally:
+        await execute(
+            'DELETE FROM nginx_parser_schema.log_entry_model WHERE server_id = :server_id'
+        )
+        await execute('DELETE FROM nginx_parser_schema.server_model WHERE id = :server_id')
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,148 @@
+"""Бенчмарк справочников: размер таблицы и топ URL до и после нормализации.
+
+В отдельной схеме BENCH_SCHEMA строятся две копии таблицы логов с
+одинаковыми строками: прежняя, где URI, referrer и user agent лежат в
+каждой строке, и текущая, где вместо них id справочников. Строки
+генерируются на стороне базы (generate_series), популярность URI — со
+смещением к началу справочника, как у реального трафика. Для каждой
+копии выводятся размер с индексами и медиана времени запроса топа URL
+в том виде, в каком его делает /api/analytics/top-urls. Схема удаляется
+после замера.
+
+Запуск: python -m benchmarks.bench_dimensions [строк]
+"""
+
+import asyncio
+import statistics
+import sys
+import time
+
+from loguru import logger
+
+from apps.db.session import connector
+
+ROWS = 2_000_000
+URIS = 200_000
+REFERRERS = 5_000
+USER_AGENTS = 2_000
+REPEATS = 5
+TOP_LIMIT = 10
+BENCH_SCHEMA = 'bench_dimensions'
+SOURCE = 'nginx_parser_schema.log_entry_model'
+
+COMMON_COLUMNS = (
+    'id, server_id, timestamp, remote_addr, method, http_version, status, size, '
+    'request_time, upstream_response_time, host, request_id, extra, source_key'
+)
+
+SETUP_SQL = (
+    f'DROP SCHEMA IF EXISTS {BENCH_SCHEMA} CASCADE',
+    f'CREATE SCHEMA {BENCH_SCHEMA}',
+    f'CREATE TABLE {BENCH_SCHEMA}.uri_model AS SELECT i AS id, '
+    "'/api/v1/catalog/items/' || i || '/reviews?sort=newest&page=' || i % 20 AS value "
+    f'FROM generate_series(1, {URIS}) AS i',
+    f'CREATE TABLE {BENCH_SCHEMA}.referrer_model AS SELECT i AS id, '
+    "'https://www.example.com/search?q=nginx+log+analyzer&utm_source=news&id=' || i AS value "
+    f'FROM generate_series(1, {REFERRERS}) AS i',
+    f'CREATE TABLE {BENCH_SCHEMA}.user_agent_model AS SELECT i AS id, '
+    "'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) "
+    "Chrome/' || i || '.0.0.0 Safari/537.36' AS value "
+    f'FROM generate_series(1, {USER_AGENTS}) AS i',
+    f'ALTER TABLE {BENCH_SCHEMA}.uri_model ADD PRIMARY KEY (id)',
+    f'CREATE TABLE {BENCH_SCHEMA}.normalized (LIKE {SOURCE} INCLUDING INDEXES)',
+    f'CREATE TABLE {BENCH_SCHEMA}.inline (LIKE {SOURCE} INCLUDING INDEXES)',
+    f'ALTER TABLE {BENCH_SCHEMA}.inline DROP COLUMN uri_id, DROP COLUMN referrer_id, '
+    'DROP COLUMN user_agent_id, ADD COLUMN uri varchar(2048), '
+    'ADD COLUMN referrer varchar(2048), ADD COLUMN user_agent varchar(1024)',
+)
+
+FILL_NORMALIZED_SQL = (
+    f'INSERT INTO {BENCH_SCHEMA}.normalized ({COMMON_COLUMNS}, uri_id, referrer_id, user_agent_id) '
+    "SELECT i, 1, now() - (i % 80000) * interval '1 second', "
+    "'10.' || i % 200 || '.' || i / 200 % 256 || '.' || i % 251, "
+    "'GET', 'HTTP/1.1', 200, i % 100000, NULL, NULL, NULL, NULL, NULL, NULL, "
+    f'1 + floor(power(random(), 4) * {URIS})::int, '
+    f'CASE WHEN i % 3 = 0 THEN NULL ELSE 1 + floor(power(random(), 2) * {REFERRERS})::int END, '
+    f'1 + floor(power(random(), 3) * {USER_AGENTS})::int '
+    'FROM generate_series(1, $1::int) AS i'
+)
+FILL_INLINE_SQL = (
+    f'INSERT INTO {BENCH_SCHEMA}.inline ({COMMON_COLUMNS}, uri, referrer, user_agent) '
+    f'SELECT {", ".join(f"entry.{c}" for c in COMMON_COLUMNS.split(", "))}, '
+    'uri.value, referrer.value, user_agent.value '
+    f'FROM {BENCH_SCHEMA}.normalized AS entry '
+    f'JOIN {BENCH_SCHEMA}.uri_model AS uri ON uri.id = entry.uri_id '
+    f'LEFT JOIN {BENCH_SCHEMA}.referrer_model AS referrer ON referrer.id = entry.referrer_id '
+    f'JOIN {BENCH_SCHEMA}.user_agent_model AS user_agent ON user_agent.id = entry.user_agent_id'
+)
+
+TOP_INLINE_SQL = (
+    'SELECT uri, count(id) AS requests, avg(size) AS avg_size '
+    f'FROM {BENCH_SCHEMA}.inline '
+    "WHERE timestamp >= now() - interval '24 hours' "
+    f'GROUP BY uri ORDER BY count(id) DESC LIMIT {TOP_LIMIT}'
+)
+TOP_NORMALIZED_SQL = (
+    'SELECT uri.value AS uri, top.requests, top.avg_size FROM ('
+    'SELECT uri_id, count(id) AS requests, avg(size) AS avg_size '
+    f'FROM {BENCH_SCHEMA}.normalized '
+    "WHERE timestamp >= now() - interval '24 hours' "
+    f'GROUP BY uri_id ORDER BY count(id) DESC LIMIT {TOP_LIMIT}'
+    f') AS top JOIN {BENCH_SCHEMA}.uri_model AS uri ON uri.id = top.uri_id '
+    'ORDER BY top.requests DESC'
+)
+
+
+async def median_seconds(connection, query: str) -> float:
+    """Медиана времени запроса за REPEATS запусков после прогрева."""
+    await connection.fetch(query)
+    timings = []
+    for _ in range(REPEATS):
+        started = time.perf_counter()
+        await connection.fetch(query)
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings)
+
+
+async def main(rows: int) -> None:
+    """Строит обе копии таблицы и сравнивает размер и топ URL."""
+    engine = connector.get_pg_engine(sql_alchemy_uri=connector.sql_alchemy_uri)
+    async with engine.connect() as conn:
+        raw_connection = await conn.get_raw_connection()
+        connection = raw_connection.driver_connection
+        try:
+            for statement in SETUP_SQL:
+                await connection.execute(statement)
+            started = time.perf_counter()
+            await connection.execute(FILL_NORMALIZED_SQL, rows)
+            await connection.execute(FILL_INLINE_SQL)
+            await connection.execute(f'VACUUM ANALYZE {BENCH_SCHEMA}.normalized')
+            await connection.execute(f'VACUUM ANALYZE {BENCH_SCHEMA}.inline')
+            logger.info(f'{rows:,} строк сгенерировано за {time.perf_counter() - started:.0f} с')
+
+            for title, table, query in (
+                ('значения в строке', 'inline', TOP_INLINE_SQL),
+                ('id справочников', 'normalized', TOP_NORMALIZED_SQL),
+            ):
+                size = await connection.fetchval(
+                    f"SELECT pg_total_relation_size('{BENCH_SCHEMA}.{table}')"
+                )
+                if table == 'normalized':
+                    size += await connection.fetchval(
+                        'SELECT sum(pg_total_relation_size(oid)) FROM pg_class '
+                        f"WHERE relnamespace = '{BENCH_SCHEMA}'::regnamespace "
+                        "AND relkind = 'r' AND relname LIKE '%\\_model'"
+                    )
+                seconds = await median_seconds(connection, query)
+                logger.info(
+                    f'{title:<18} {size / 2**20:8,.0f} МБ ({size / rows:5.0f} байт/строку)  '
+                    f'топ URL {seconds * 1000:8,.0f} мс'
+                )
+        finally:
+            await connection.execute(f'DROP SCHEMA IF EXISTS {BENCH_SCHEMA} CASCADE')
+
+
+if __name__ == '__main__':
+    logger.remove()
+    logger.add(sys.stderr, level='INFO')
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else ROWS))
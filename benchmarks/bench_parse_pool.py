@@ -0,0 +1,94 @@
+"""Бенчмарк стадии разбора монитора: event loop против пула на 1/2/4/8 процессов.
+
+Пачки по LINE_BATCH_SIZE строк отправляются в ParsePool и забираются по
+порядку с тем же окном, что и в LogPipeline. Ускорение ограничено числом
+ядер: на машине с одним ядром пул только добавляет расходы на передачу
+пачек между процессами. Поэтому отдельно выводится процессорное время
+самого event loop: строки, делённые на него, — потолок пропускной
+способности, когда ядер для пула хватает.
+
+Запуск: python -m benchmarks.bench_parse_pool
+"""
+
+import asyncio
+import os
+import time
+
+from collections import deque
+from collections.abc import Awaitable
+
+from loguru import logger
+
+from apps.services.log_pipeline import LINE_BATCH_SIZE
+from apps.services.nginx_log_parser import NginxLogParser
+from apps.services.parse_pool import ParsePool
+from apps.services.parse_pool import parse_rows
+from benchmarks.bench_parser import make_lines
+
+LINES = 400_000
+WORKERS = (1, 2, 4, 8)
+
+
+def batches(lines: list[str]) -> list[list[str]]:
+    """Строки, нарезанные на пачки, как их режет стадия чтения."""
+    step = LINE_BATCH_SIZE
+    return [lines[start : start + step] for start in range(0, len(lines), step)]
+
+
+async def parse_inline(parser: NginxLogParser, line_batches: list[list[str]]) -> int:
+    """Разбор прямо в event loop, как при MONITOR_PARSE_WORKERS=0."""
+    rows = 0
+    for lines in line_batches:
+        rows += len(parse_rows(parser, lines)[0])
+        await asyncio.sleep(0)
+    return rows
+
+
+async def parse_in_pool(parser: NginxLogParser, line_batches: list[list[str]], workers: int) -> int:
+    """Разбор в пуле с ограниченным окном и выдачей результатов по порядку."""
+    pool = ParsePool(workers)
+    # Процессы пула запускаются лениво: прогреваем их, чтобы не мерить старт.
+    await asyncio.gather(*(pool.submit(parser, line_batches[0]) for _ in range(workers)))
+
+    rows = 0
+    pending: deque[asyncio.Future] = deque()
+    try:
+        for lines in line_batches:
+            if len(pending) >= pool.window:
+                rows += len((await pending.popleft())[0])
+            pending.append(pool.submit(parser, lines))
+        while pending:
+            rows += len((await pending.popleft())[0])
+    finally:
+        pool.close()
+    return rows
+
+
+async def measure(name: str, parse: Awaitable[int], baseline: float | None = None) -> float:
+    """Время разбора и процессорное время event loop; выводит строк в секунду."""
+    started, cpu_started = time.perf_counter(), time.process_time()
+    rows = await parse
+    seconds = time.perf_counter() - started
+    loop_cpu = time.process_time() - cpu_started
+
+    logger.info(
+        f'{name:<12} {seconds:7.2f} с  {rows / seconds:12,.0f} строк/с  '
+        f'x{(baseline or seconds) / seconds:.2f}  '
+        f'loop {loop_cpu:5.2f} с CPU, потолок {rows / loop_cpu:12,.0f} строк/с'
+    )
+    return seconds
+
+
+async def main() -> None:
+    """Сравнивает разбор в event loop и в пуле на WORKERS процессах."""
+    parser = NginxLogParser('-', server_id=1)
+    line_batches = batches(make_lines(LINES))
+    logger.info(f'Строк: {LINES}, пачка: {LINE_BATCH_SIZE}, ядер: {os.cpu_count()}')
+
+    baseline = await measure('event loop', parse_inline(parser, line_batches))
+    for workers in WORKERS:
+        await measure(f'{workers} процесс.', parse_in_pool(parser, line_batches, workers), baseline)
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
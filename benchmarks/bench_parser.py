@@ -0,0 +1,104 @@
+"""Микробенчмарк разбора строк combined-формата на одном ядре.
+
+Запуск: python -m benchmarks.bench_parser
+"""
+
+import random
+import timeit
+
+from loguru import logger
+
+from apps.services.log_tokenizer import COMBINED_PATTERN
+from apps.services.log_tokenizer import split_combined
+from apps.services.nginx_log_parser import NginxLogParser
+
+LINES = 100_000
+REPEATS = 5
+
+METHODS = ('GET', 'GET', 'GET', 'POST', 'PUT', 'DELETE')
+URIS = ('/', '/api/users', '/api/orders/42', '/static/css/style.css', '/search?q=nginx&page=2')
+STATUSES = ('200', '200', '200', '301', '304', '404', '500')
+AGENTS = (
+    '-',
+    'curl/8.5.0',
+    'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko)',
+    'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 Chrome/120.0 Safari/537.36',
+)
+
+
+def make_lines(lines: int = LINES) -> list[str]:
+    """Строки combined-формата с реалистичным разбросом полей."""
+    rng = random.Random(0)
+    return [
+        f'10.0.{rng.randrange(256)}.{rng.randrange(256)} - - '
+        f'[25/Dec/2024:10:{index // 6000 % 60:02d}:{index // 100 % 60:02d} +0300] '
+        f'"{rng.choice(METHODS)} {rng.choice(URIS)} HTTP/1.1" {rng.choice(STATUSES)} '
+        f'{rng.randrange(100_000)} "https://example.com/" "{rng.choice(AGENTS)}"'
+        for index in range(lines)
+    ]
+
+
+def measure(name: str, func, lines: list[str]) -> float:
+    """Лучшее из REPEATS время разбора всех строк; выводит строк в секунду."""
+    best = min(timeit.repeat(lambda: [func(line) for line in lines], number=1, repeat=REPEATS))
+    logger.info(f'{name:<28} {best * 1000:8.1f} мс  {len(lines) / best:12,.0f} строк/с')
+    return best
+
+
+def regex_groupdict(line: str) -> dict | None:
+    """Прежний путь: регулярное выражение и groupdict."""
+    match = COMBINED_PATTERN.match(line)
+    return match.groupdict() if match else None
+
+
+def split_by_quotes(line: str) -> tuple | None:
+    """Разбор по кавычкам и пробелам на str.split/partition, для сравнения.
+
+    Проверяет только структуру строки; точное соответствие регулярному
+    выражению (пробельные символы, цифры) потребовало бы ещё проверок на поле.
+    """
+    parts = line.split('"', 6)
+    if len(parts) != 7 or parts[4] != ' ':
+        return None
+
+    head, request, codes, referrer, _, user_agent, _ = parts
+    remote_addr, _, rest = head.partition(' ')
+    if rest[:5] != '- - [' or rest[-2:] != '] ':
+        return None
+    timestamp = rest[5:-2]
+
+    method, _, rest = request.partition(' ')
+    uri, _, http_version = rest.partition(' ')
+    code_parts = codes.split(' ')
+    if len(code_parts) != 4:
+        return None
+
+    return (
+        remote_addr,
+        timestamp,
+        method,
+        uri,
+        http_version,
+        code_parts[1],
+        code_parts[2],
+        referrer,
+        user_agent,
+    )
+
+
+def main() -> None:
+    """Сравнивает groupdict, позиционные группы и разбор через str.split."""
+    lines = make_lines()
+    parser = NginxLogParser('access.log')
+    logger.info(f'{len(lines)} строк, одно ядро')
+
+    baseline = measure('regex + groupdict', regex_groupdict, lines)
+    fast = measure('split_combined (groups)', split_combined, lines)
+    measure('str.split/partition', split_by_quotes, lines)
+    measure('NginxLogParser.parse_line', parser.parse_line, lines)
+
+    logger.info(f'ускорение разбиения на поля: x{baseline / fast:.1f}')
+
+
+if __name__ == '__main__':
+    main()
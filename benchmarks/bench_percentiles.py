@@ -0,0 +1,135 @@
+"""Бенчмарк перцентилей size и request_time: percentile_disc по строкам и оценка по DDSketch.
+
+В таблицу логов под отдельным сервером генерируются строки за DAYS
+суток с размером ответа от 1 байта до 1 МБ и временем запроса от 1 мс
+до 10 с, распределёнными равномерно по логарифму. Минутные скетчи
+пересчитываются по строкам (rebuild_sketches) и сворачиваются в
+часовые. Для окон 24 часа и DAYS суток выводится медиана времени точных
+перцентилей и оценки и наибольшая относительная ошибка p50, p95 и p99.
+Сервер, его строки и URI удаляются после замера.
+
+Запуск: python -m benchmarks.bench_percentiles [строк]
+"""
+
+import asyncio
+import statistics
+import sys
+import time
+
+from collections.abc import Awaitable
+from collections.abc import Callable
+from datetime import UTC
+from datetime import datetime
+from datetime import timedelta
+from functools import partial
+from typing import TypeVar
+
+from loguru import logger
+
+from apps.api.v1.handlers.analytics_handler import PERCENTILE_METRICS
+from apps.api.v1.handlers.analytics_handler import PERCENTILES
+from apps.api.v1.handlers.analytics_handler import percentiles_query
+from apps.db.session import connector
+from apps.services.rollups import compact_rollups
+from apps.services.rollups import estimate_quantiles
+from apps.services.rollups import rebuild_sketches
+
+T = TypeVar('T')
+
+ROWS = 2_000_000
+DAYS = 7
+REPEATS = 5
+BENCH_SERVER_ID = 900005
+SCHEMA = 'nginx_parser_schema'
+
+SETUP_SQL = (
+    f'INSERT INTO {SCHEMA}.server_model (id, name, ip_address) '
+    "VALUES ($1, 'bench-percentiles', '127.0.0.1') ON CONFLICT DO NOTHING"
+)
+URI_SQL = f"INSERT INTO {SCHEMA}.uri_model (value) VALUES ('/bench-percentiles') RETURNING id"
+FILL_SQL = (
+    f'INSERT INTO {SCHEMA}.log_entry_model (server_id, timestamp, remote_addr, method, uri_id, '
+    'http_version, status, size, request_time) '
+    f"SELECT $1, now() - i * interval '{DAYS} days' / $2, '10.0.0.1', 'GET', $3, 'HTTP/1.1', 200, "
+    'floor(power(10, (i::bigint * 7919 % 10007) / 10007.0 * 6))::int, '
+    'round(power(10, (i::bigint * 6151 % 9973) / 9973.0 * 4 - 3)::numeric, 3) '
+    'FROM generate_series(1, $2::int) AS i'
+)
+DAY_KEYS_SQL = (
+    f"SELECT DISTINCT date_trunc('minute', timestamp, 'UTC'), server_id "
+    f'FROM {SCHEMA}.log_entry_model WHERE server_id = $1 AND timestamp >= $2 AND timestamp < $3'
+)
+
+
+async def median_seconds(run: Callable[[], Awaitable[T]]) -> tuple[float, T]:
+    """Медиана времени вызова за REPEATS запусков после прогрева и его результат."""
+    result = await run()
+    timings = []
+    for _ in range(REPEATS):
+        started = time.perf_counter()
+        await run()
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings), result
+
+
+async def main(rows: int) -> None:
+    """Заполняет таблицу, строит скетчи и сравнивает точные перцентили с оценкой."""
+    engine = connector.get_pg_engine(sql_alchemy_uri=connector.sql_alchemy_uri)
+    async with engine.connect() as conn:
+        raw_connection = await conn.get_raw_connection()
+        connection = raw_connection.driver_connection
+        uri_id = None
+        try:
+            await connection.execute(SETUP_SQL, BENCH_SERVER_ID)
+            uri_id = await connection.fetchval(URI_SQL)
+            started = time.perf_counter()
+            await connection.execute(FILL_SQL, BENCH_SERVER_ID, rows, uri_id)
+            await connection.execute(f'VACUUM ANALYZE {SCHEMA}.log_entry_model')
+            logger.info(f'{rows:,} строк сгенерировано за {time.perf_counter() - started:.0f} с')
+
+            started = time.perf_counter()
+            day = datetime.now(UTC) - timedelta(days=DAYS + 1)
+            while day < datetime.now(UTC):
+                async with connection.transaction():
+                    keys = await connection.fetch(
+                        DAY_KEYS_SQL, BENCH_SERVER_ID, day, day + timedelta(days=1)
+                    )
+                    if keys:
+                        await rebuild_sketches(
+                            connection, [(bucket, server_id) for bucket, server_id in keys]
+                        )
+                day += timedelta(days=1)
+            await compact_rollups()
+            logger.info(f'Скетчи построены за {time.perf_counter() - started:.0f} с')
+
+            async with connector.get_session_maker()() as session:
+                for hours in (24, DAYS * 24):
+                    now = datetime.now(UTC)
+                    since = now - timedelta(hours=hours)
+                    for metric, column in PERCENTILE_METRICS.items():
+                        exact_seconds, result = await median_seconds(
+                            partial(session.execute, percentiles_query(since, metric))
+                        )
+                        _, *exact = result.one()
+                        sketch_seconds, sketch = await median_seconds(
+                            partial(estimate_quantiles, session, since, now, column)
+                        )
+                        worst = max(
+                            abs(sketch.quantile(percentile) - value) / value
+                            for percentile, value in zip(PERCENTILES, exact, strict=True)
+                        )
+                        logger.info(
+                            f'{hours:4} ч  {metric:<12} точно {exact_seconds * 1000:8,.1f} мс  '
+                            f'скетчи {sketch_seconds * 1000:6,.1f} мс  ошибка до {worst:.2%}'
+                        )
+        finally:
+            await connection.execute(
+                f'DELETE FROM {SCHEMA}.server_model WHERE id = $1', BENCH_SERVER_ID
+            )
+            await connection.execute(f'DELETE FROM {SCHEMA}.uri_model WHERE id = $1', uri_id)
+
+
+if __name__ == '__main__':
+    logger.remove()
+    logger.add(sys.stderr, level='INFO')
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else ROWS))
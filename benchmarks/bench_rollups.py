@@ -0,0 +1,126 @@
+"""Бенчмарк сводок аналитики: статус коды и временные ряды по сырым строкам и по сводкам.
+
+В таблицу логов под отдельным сервером генерируются строки за DAYS
+суток (generate_series), минутные сводки строятся по ним тем же
+запросом, что и в миграции, и сворачиваются в часовые. Для окон 24 часа
+и DAYS суток выводится медиана времени прежних запросов по сырым
+строкам и текущих (analytics_handler.py) — по сводкам с сырыми краями.
+Сервер и его строки удаляются после замера.
+
+Запуск: python -m benchmarks.bench_rollups [строк]
+"""
+
+import asyncio
+import statistics
+import sys
+import time
+
+from datetime import UTC
+from datetime import datetime
+from datetime import timedelta
+
+from loguru import logger
+from sqlalchemy.dialects import postgresql
+
+from apps.api.v1.handlers.analytics_handler import status_codes_query
+from apps.api.v1.handlers.analytics_handler import time_series_query
+from apps.db.session import connector
+from apps.services.rollups import compact_rollups
+
+ROWS = 2_000_000
+DAYS = 7
+REPEATS = 5
+BENCH_SERVER_ID = 900002
+SCHEMA = 'nginx_parser_schema'
+
+SETUP_SQL = (
+    f'INSERT INTO {SCHEMA}.server_model (id, name, ip_address) '
+    "VALUES ($1, 'bench-rollups', '127.0.0.1') ON CONFLICT DO NOTHING"
+)
+FILL_SQL = (
+    f'INSERT INTO {SCHEMA}.log_entry_model (server_id, timestamp, remote_addr, method, uri_id, '
+    'http_version, status, size) '
+    f"SELECT $1, now() - i * interval '{DAYS} days' / $2, '10.0.' || i % 250 || '.1', 'GET', "
+    "1, 'HTTP/1.1', CASE WHEN i % 50 = 0 THEN 500 WHEN i % 31 = 0 THEN 404 ELSE 200 END, "
+    'i % 100000 FROM generate_series(1, $2::int) AS i'
+)
+ROLLUP_SQL = (
+    f'INSERT INTO {SCHEMA}.log_rollup_minute_model (bucket, server_id, status, requests, bytes) '
+    "SELECT date_trunc('minute', timestamp, 'UTC'), server_id, status, count(*), sum(size) "
+    f'FROM {SCHEMA}.log_entry_model WHERE server_id = $1 GROUP BY 1, 2, 3'
+)
+RAW_STATUS_CODES_SQL = (
+    f'SELECT status, count(*) FROM {SCHEMA}.log_entry_model '
+    'WHERE timestamp >= $1 GROUP BY status ORDER BY count(*) DESC'
+)
+RAW_TIME_SERIES_SQL = (
+    'SELECT to_timestamp(floor(extract(epoch FROM timestamp) / $2) * $2) AS bucket, '
+    f'count(*), sum(size) FROM {SCHEMA}.log_entry_model '
+    'WHERE timestamp >= $1 GROUP BY 1 ORDER BY 1'
+)
+
+
+async def median_seconds(connection, query: str, *args) -> float:
+    """Медиана времени запроса за REPEATS запусков после прогрева."""
+    await connection.fetch(query, *args)
+    timings = []
+    for _ in range(REPEATS):
+        started = time.perf_counter()
+        await connection.fetch(query, *args)
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings)
+
+
+def literal_sql(query) -> str:
+    """SQL запроса SQLAlchemy с подставленными значениями."""
+    return str(query.compile(dialect=postgresql.dialect(), compile_kwargs={'literal_binds': True}))
+
+
+async def main(rows: int) -> None:
+    """Заполняет таблицу, строит сводки и сравнивает время запросов."""
+    engine = connector.get_pg_engine(sql_alchemy_uri=connector.sql_alchemy_uri)
+    async with engine.connect() as conn:
+        raw_connection = await conn.get_raw_connection()
+        connection = raw_connection.driver_connection
+        try:
+            await connection.execute(SETUP_SQL, BENCH_SERVER_ID)
+            started = time.perf_counter()
+            await connection.execute(FILL_SQL, BENCH_SERVER_ID, rows)
+            await connection.execute(ROLLUP_SQL, BENCH_SERVER_ID)
+            await connection.execute(f'VACUUM ANALYZE {SCHEMA}.log_entry_model')
+            logger.info(f'{rows:,} строк сгенерировано за {time.perf_counter() - started:.0f} с')
+            await compact_rollups()
+            await connection.execute(f'ANALYZE {SCHEMA}.log_rollup_minute_model')
+            await connection.execute(f'ANALYZE {SCHEMA}.log_rollup_hour_model')
+
+            for hours in (24, DAYS * 24):
+                now = datetime.now(UTC)
+                since = now - timedelta(hours=hours)
+                for title, bucket_seconds in (
+                    ('статус коды', None),
+                    ('ряд по 5 мин', 300),
+                    ('ряд по часу', 3600),
+                ):
+                    if bucket_seconds is None:
+                        raw = await median_seconds(connection, RAW_STATUS_CODES_SQL, since)
+                        query = status_codes_query(since, now)
+                    else:
+                        raw = await median_seconds(
+                            connection, RAW_TIME_SERIES_SQL, since, bucket_seconds
+                        )
+                        query = time_series_query(since, now, bucket_seconds)
+                    rolled = await median_seconds(connection, literal_sql(query))
+                    logger.info(
+                        f'{hours:4} ч  {title:<13} строки {raw * 1000:8,.1f} мс  '
+                        f'сводки {rolled * 1000:8,.1f} мс'
+                    )
+        finally:
+            await connection.execute(
+                f'DELETE FROM {SCHEMA}.server_model WHERE id = $1', BENCH_SERVER_ID
+            )
+
+
+if __name__ == '__main__':
+    logger.remove()
+    logger.add(sys.stderr, level='INFO')
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else ROWS))
@@ -0,0 +1,87 @@
+"""Бенчмарк представления разобранной пачки: словари и кортежи против ColumnBatch.
+
+Прежний путь — словарь на строку, затем кортеж record_to_row, строки
+без кеша. Новый — parse_rows: LogRow без словаря, строки из кеша
+парсера, пачка по колонкам. Для каждого пути на пачку в LINE_BATCH_SIZE
+строк выводятся:
+
+- блоки памяти, выделенные на строку и оставшиеся после разбора
+  (sys.getallocatedblocks);
+- байты, которые занимает готовая пачка (tracemalloc);
+- байты pickle — столько пачка весит при передаче из процесса пула.
+
+Скорость разбора — в bench_parse_pool: прежний путь здесь собирается из
+нового и по времени его не повторяет.
+
+Запуск: python -m benchmarks.bench_rows
+"""
+
+import gc
+import pickle
+import sys
+import tracemalloc
+
+from collections.abc import Callable
+from typing import Any
+
+from loguru import logger
+
+from apps.services.log_pipeline import LINE_BATCH_SIZE
+from apps.services.log_rows import record_to_row
+from apps.services.nginx_log_parser import NginxLogParser
+from apps.services.parse_pool import parse_rows
+from benchmarks.bench_parser import make_lines
+
+BATCHES = 20
+
+
+def parse_dicts(parser: NginxLogParser, lines: list[str]) -> list[tuple]:
+    """Прежний путь: словарь на строку и кортеж для COPY."""
+    return [tuple(record_to_row(parser.parse_record(line))) for line in lines]
+
+
+def parse_columns(parser: NginxLogParser, lines: list[str]) -> Any:
+    """Новый путь: parse_rows."""
+    return parse_rows(parser, lines)[0]
+
+
+def measure(name: str, parse: Callable[[list[str]], Any], batches: list[list[str]]) -> None:
+    """Выводит память и размер pickle для одного пути."""
+    parse(batches[0])
+    gc.collect()
+
+    blocks_before = sys.getallocatedblocks()
+    tracemalloc.start()
+    kept = [parse(lines) for lines in batches]
+    retained, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    gc.collect()
+    blocks = sys.getallocatedblocks() - blocks_before
+
+    lines_total = sum(map(len, batches))
+    pickled = sum(len(pickle.dumps(batch)) for batch in kept) / len(kept)
+
+    logger.info(
+        f'{name:<16} блоков/строку {blocks / lines_total:6.1f}  '
+        f'байт/пачку {retained / len(batches):10,.0f}  '
+        f'pickle/пачку {pickled:10,.0f}'
+    )
+
+
+def main() -> None:
+    """Сравнивает прежнее и новое представление пачки."""
+    lines = make_lines(LINE_BATCH_SIZE * BATCHES)
+    batches = [
+        lines[start : start + LINE_BATCH_SIZE] for start in range(0, len(lines), LINE_BATCH_SIZE)
+    ]
+
+    legacy = NginxLogParser('-', 1)
+    legacy.strings = str
+    measure('dict + tuple', lambda batch: parse_dicts(legacy, batch), batches)
+
+    parser = NginxLogParser('-', 1)
+    measure('ColumnBatch', lambda batch: parse_columns(parser, batch), batches)
+
+
+if __name__ == '__main__':
+    main()
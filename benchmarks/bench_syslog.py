@@ -0,0 +1,91 @@
+"""Бенчмарк приёма syslog по UDP: снятие конверта, пачки и разбор строк.
+
+Отдельный процесс шлёт на 127.0.0.1 сообщения в формате nginx с
+заданной частотой, приёмник SyslogPipeline снимает конверт и разбирает
+строки; записанные строки отбрасываются, чтобы мерить приём, а не БД.
+Выводится, сколько сообщений разобрано, сколько отбросило ядро и какую
+долю времени процессор занят event loop. Отправитель работает на той же
+машине и на одном ядре отнимает у приёмника часть процессора.
+
+Запуск: python -m benchmarks.bench_syslog
+"""
+
+import asyncio
+import multiprocessing
+import socket
+import time
+
+from loguru import logger
+
+from apps.services.syslog_receiver import SyslogPipeline
+from apps.services.syslog_receiver import SyslogRoutes
+from benchmarks.bench_parser import make_lines
+
+MESSAGES = 500_000
+RATES = (50_000, 100_000)
+BURST = 500
+DRAIN_SECONDS = 1
+
+
+def send(port: int, rate: int, count: int) -> None:
+    """Шлёт count сообщений пачками по BURST, выдерживая rate в секунду."""
+    messages = [
+        f'<190>Dec 25 10:30:15 web01 nginx: {line}'.encode()
+        for line in make_lines(min(count, 10_000))
+    ]
+    started = time.perf_counter()
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+        for sent in range(0, count, BURST):
+            for index in range(sent, min(sent + BURST, count)):
+                sock.sendto(messages[index % len(messages)], ('127.0.0.1', port))
+            delay = started + (sent + BURST) / rate - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+
+
+async def drain(pipeline: SyslogPipeline) -> None:
+    """Забирает разобранные пачки вместо писателей в БД."""
+    while True:
+        (source, seq), _ = await pipeline.record_queue.get()
+        source.tracker.complete([seq])
+
+
+async def measure(rate: int) -> None:
+    """Принимает MESSAGES сообщений с частотой rate и выводит результат."""
+    pipeline = SyslogPipeline(SyslogRoutes(default_server_id=1), udp=[('127.0.0.1', 0)])
+    tasks = [
+        asyncio.create_task(pipeline._read_sources()),
+        asyncio.create_task(pipeline._parse()),
+        asyncio.create_task(drain(pipeline)),
+    ]
+    await asyncio.sleep(0.1)
+    port = pipeline.udp_readers[0].address[1]
+
+    sender = multiprocessing.Process(target=send, args=(port, rate, MESSAGES))
+    started, cpu_started = time.perf_counter(), time.process_time()
+    sender.start()
+    await asyncio.to_thread(sender.join)
+    await asyncio.sleep(DRAIN_SECONDS)
+    seconds = time.perf_counter() - started
+    loop_cpu = time.process_time() - cpu_started
+
+    parsed = pipeline.failures.parsed
+    logger.info(
+        f'{rate:>8,} сообщ./с: разобрано {parsed:,} из {MESSAGES:,} '
+        f'({parsed / seconds:,.0f}/с), ядро отбросило {pipeline.kernel_drops()}, '
+        f'loop {loop_cpu / seconds:.0%} CPU'
+    )
+
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+
+async def main() -> None:
+    """Прогоняет приём на каждой частоте из RATES."""
+    for rate in RATES:
+        await measure(rate)
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,56 @@
+"""Микробенчмарк разбора $time_local.
+
+Запуск: python -m benchmarks.bench_timestamp
+"""
+
+import timeit
+
+from datetime import datetime
+from datetime import timedelta
+from datetime import timezone
+
+from loguru import logger
+
+from apps.services import nginx_timestamp
+from apps.services.nginx_timestamp import parse_nginx_timestamp
+
+LINES = 200_000
+LINES_PER_SECOND = 500
+REPEATS = 5
+
+
+def make_timestamps(lines: int = LINES, lines_per_second: int = LINES_PER_SECOND) -> list[str]:
+    """Строки времени, как в реальном логе: много строк с одной и той же секундой."""
+    start = datetime(2024, 12, 25, 10, 30, 15, tzinfo=timezone(timedelta(hours=3)))
+    return [
+        (start + timedelta(seconds=index // lines_per_second)).strftime('%d/%b/%Y:%H:%M:%S %z')
+        for index in range(lines)
+    ]
+
+
+def measure(name: str, func, timestamps: list[str]) -> float:
+    """Лучшее из REPEATS время разбора всех строк; выводит строк в секунду."""
+    best = min(timeit.repeat(lambda: [func(raw) for raw in timestamps], number=1, repeat=REPEATS))
+    logger.info(f'{name:<28} {best * 1000:8.1f} мс  {len(timestamps) / best:12,.0f} строк/с')
+    return best
+
+
+def main() -> None:
+    """Сравнивает strptime, разбор по позициям и разбор с кешем."""
+    timestamps = make_timestamps()
+    logger.info(f'{len(timestamps)} строк, {LINES_PER_SECOND} строк на секунду лога')
+
+    baseline = measure(
+        'datetime.strptime',
+        lambda raw: datetime.strptime(raw, '%d/%b/%Y:%H:%M:%S %z'),
+        timestamps,
+    )
+    fixed = measure('разбор по позициям', nginx_timestamp._parse_fixed, timestamps)
+    parse_nginx_timestamp.cache_clear()
+    cached = measure('разбор с кешем', parse_nginx_timestamp, timestamps)
+
+    logger.info(f'ускорение без кеша: x{baseline / fixed:.1f}, с кешем: x{baseline / cached:.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,150 @@
+"""Бенчмарк топов IP и URL: точный GROUP BY по строкам и оценка по сводкам Space-Saving.
+
+В таблицу логов под отдельным сервером генерируются строки за DAYS
+суток с неравномерными адресами и URI (частота значения примерно
+обратно пропорциональна его рангу, как у реального трафика). Минутные
+скетчи пересчитываются по строкам (rebuild_sketches) и сворачиваются в
+часовые. Для окон 24 часа и DAYS суток выводится медиана времени
+точного топа 10 и оценки, совпадение состава топа и наибольшая ошибка
+числа запросов. Сервер, его строки и URI удаляются после замера.
+
+Запуск: python -m benchmarks.bench_top [строк]
+"""
+
+import asyncio
+import statistics
+import sys
+import time
+
+from collections.abc import Awaitable
+from collections.abc import Callable
+from datetime import UTC
+from datetime import datetime
+from datetime import timedelta
+from functools import partial
+from typing import TypeVar
+
+from loguru import logger
+
+from apps.api.v1.handlers.analytics_handler import top_ips_query
+from apps.api.v1.handlers.analytics_handler import top_urls_query
+from apps.db.session import connector
+from apps.services.rollups import compact_rollups
+from apps.services.rollups import estimate_top
+from apps.services.rollups import rebuild_sketches
+
+T = TypeVar('T')
+
+ROWS = 2_000_000
+DAYS = 7
+URIS = 5_000
+LIMIT = 10
+REPEATS = 5
+BENCH_SERVER_ID = 900004
+SCHEMA = 'nginx_parser_schema'
+
+SETUP_SQL = (
+    f'INSERT INTO {SCHEMA}.server_model (id, name, ip_address) '
+    "VALUES ($1, 'bench-top', '127.0.0.1') ON CONFLICT DO NOTHING"
+)
+URIS_SQL = (
+    f"INSERT INTO {SCHEMA}.uri_model (value) SELECT '/bench-top/' || i "
+    'FROM generate_series(1, $1::int) AS i RETURNING id'
+)
+# Ранг значения — floor(n ^ u) при равномерном u: частоты убывают
+# примерно как 1 / ранг.
+FILL_SQL = (
+    f'INSERT INTO {SCHEMA}.log_entry_model (server_id, timestamp, remote_addr, method, uri_id, '
+    'http_version, status, size) '
+    f"SELECT $1, now() - i * interval '{DAYS} days' / $2, "
+    "'10.' || ip % 200 || '.' || ip % 251, 'GET', ($3::int[])[uri], 'HTTP/1.1', 200, i % 100000 "
+    'FROM generate_series(1, $2::int) AS i, '
+    'LATERAL (SELECT floor(power(50200, (i::bigint * 7919 % 10007) / 10007.0))::int AS ip, '
+    'floor(power(array_length($3::int[], 1), (i::bigint * 6151 % 9973) / 9973.0))::int AS uri) '
+    'AS ranks'
+)
+DAY_KEYS_SQL = (
+    f"SELECT DISTINCT date_trunc('minute', timestamp, 'UTC'), server_id "
+    f'FROM {SCHEMA}.log_entry_model WHERE server_id = $1 AND timestamp >= $2 AND timestamp < $3'
+)
+
+
+async def median_seconds(run: Callable[[], Awaitable[T]]) -> tuple[float, T]:
+    """Медиана времени вызова за REPEATS запусков после прогрева и его результат."""
+    result = await run()
+    timings = []
+    for _ in range(REPEATS):
+        started = time.perf_counter()
+        await run()
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings), result
+
+
+async def main(rows: int) -> None:
+    """Заполняет таблицу, строит скетчи и сравнивает точные топы с оценкой."""
+    engine = connector.get_pg_engine(sql_alchemy_uri=connector.sql_alchemy_uri)
+    async with engine.connect() as conn:
+        raw_connection = await conn.get_raw_connection()
+        connection = raw_connection.driver_connection
+        uri_ids = []
+        try:
+            await connection.execute(SETUP_SQL, BENCH_SERVER_ID)
+            uri_ids = [row['id'] for row in await connection.fetch(URIS_SQL, URIS)]
+            started = time.perf_counter()
+            await connection.execute(FILL_SQL, BENCH_SERVER_ID, rows, uri_ids)
+            await connection.execute(f'VACUUM ANALYZE {SCHEMA}.log_entry_model')
+            logger.info(f'{rows:,} строк сгенерировано за {time.perf_counter() - started:.0f} с')
+
+            started = time.perf_counter()
+            day = datetime.now(UTC) - timedelta(days=DAYS + 1)
+            while day < datetime.now(UTC):
+                async with connection.transaction():
+                    keys = await connection.fetch(
+                        DAY_KEYS_SQL, BENCH_SERVER_ID, day, day + timedelta(days=1)
+                    )
+                    if keys:
+                        await rebuild_sketches(
+                            connection, [(bucket, server_id) for bucket, server_id in keys]
+                        )
+                day += timedelta(days=1)
+            await compact_rollups()
+            logger.info(f'Скетчи построены за {time.perf_counter() - started:.0f} с')
+
+            async with connector.get_session_maker()() as session:
+                for hours in (24, DAYS * 24):
+                    now = datetime.now(UTC)
+                    since = now - timedelta(hours=hours)
+                    for title, query, column in (
+                        ('топ IP', top_ips_query(since, LIMIT), 'top_ips'),
+                        ('топ URL', top_urls_query(since, LIMIT), 'top_uris'),
+                    ):
+                        exact_seconds, result = await median_seconds(
+                            partial(session.execute, query)
+                        )
+                        exact = {row[0]: row[1] for row in result}
+                        sketch_seconds, top = await median_seconds(
+                            partial(estimate_top, session, since, now, column, LIMIT)
+                        )
+                        matched = len(exact.keys() & {value for value, *_ in top})
+                        worst = max(
+                            abs(requests - exact.get(value, 0)) / requests
+                            for value, requests, _, _ in top
+                        )
+                        logger.info(
+                            f'{hours:4} ч  {title:<8} точно {exact_seconds * 1000:8,.1f} мс  '
+                            f'сводки {sketch_seconds * 1000:6,.1f} мс  '
+                            f'совпало {matched}/{LIMIT}, ошибка до {worst:.2%}'
+                        )
+        finally:
+            await connection.execute(
+                f'DELETE FROM {SCHEMA}.server_model WHERE id = $1', BENCH_SERVER_ID
+            )
+            await connection.execute(
+                f'DELETE FROM {SCHEMA}.uri_model WHERE id = any($1::int[])', uri_ids
+            )
+
+
+if __name__ == '__main__':
+    logger.remove()
+    logger.add(sys.stderr, level='INFO')
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else ROWS))
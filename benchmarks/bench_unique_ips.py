@@ -0,0 +1,122 @@
+"""Бенчмарк unique_ips: точный count(DISTINCT) по строкам и оценка по скетчам HyperLogLog.
+
+В таблицу логов под отдельным сервером генерируются строки за DAYS
+суток с ADDRESSES различными адресами, минутные скетчи пересчитываются
+по ним так же, как после повторной записи (rebuild_sketches в
+apps/services/rollups.py), и сворачиваются в часовые. Для окон 24 часа и DAYS суток выводится
+медиана времени точного подсчёта и оценки, а также ошибка оценки.
+Сервер и его строки удаляются после замера.
+
+Запуск: python -m benchmarks.bench_unique_ips [строк]
+"""
+
+import asyncio
+import statistics
+import sys
+import time
+
+from collections.abc import Awaitable
+from collections.abc import Callable
+from datetime import UTC
+from datetime import datetime
+from datetime import timedelta
+from functools import partial
+from typing import TypeVar
+
+from loguru import logger
+
+from apps.api.v1.handlers.analytics_handler import unique_ips_query
+from apps.db.session import connector
+from apps.services.rollups import compact_rollups
+from apps.services.rollups import estimate_unique_ips
+from apps.services.rollups import rebuild_sketches
+
+T = TypeVar('T')
+
+ROWS = 2_000_000
+DAYS = 7
+ADDRESSES = 200 * 251
+REPEATS = 5
+BENCH_SERVER_ID = 900003
+SCHEMA = 'nginx_parser_schema'
+
+SETUP_SQL = (
+    f'INSERT INTO {SCHEMA}.server_model (id, name, ip_address) '
+    "VALUES ($1, 'bench-unique-ips', '127.0.0.1') ON CONFLICT DO NOTHING"
+)
+FILL_SQL = (
+    f'INSERT INTO {SCHEMA}.log_entry_model (server_id, timestamp, remote_addr, method, uri_id, '
+    'http_version, status, size) '
+    f"SELECT $1, now() - i * interval '{DAYS} days' / $2, '10.' || i % 200 || '.' || i % 251, "
+    "'GET', 1, 'HTTP/1.1', 200, i % 100000 FROM generate_series(1, $2::int) AS i"
+)
+DAY_KEYS_SQL = (
+    f"SELECT DISTINCT date_trunc('minute', timestamp, 'UTC'), server_id "
+    f'FROM {SCHEMA}.log_entry_model WHERE server_id = $1 AND timestamp >= $2 AND timestamp < $3'
+)
+
+
+async def median_seconds(run: Callable[[], Awaitable[T]]) -> tuple[float, T]:
+    """Медиана времени вызова за REPEATS запусков после прогрева и его результат."""
+    result = await run()
+    timings = []
+    for _ in range(REPEATS):
+        started = time.perf_counter()
+        await run()
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings), result
+
+
+async def main(rows: int) -> None:
+    """Заполняет таблицу, строит скетчи и сравнивает точный подсчёт с оценкой."""
+    engine = connector.get_pg_engine(sql_alchemy_uri=connector.sql_alchemy_uri)
+    async with engine.connect() as conn:
+        raw_connection = await conn.get_raw_connection()
+        connection = raw_connection.driver_connection
+        try:
+            await connection.execute(SETUP_SQL, BENCH_SERVER_ID)
+            started = time.perf_counter()
+            await connection.execute(FILL_SQL, BENCH_SERVER_ID, rows)
+            await connection.execute(f'VACUUM ANALYZE {SCHEMA}.log_entry_model')
+            logger.info(f'{rows:,} строк сгенерировано за {time.perf_counter() - started:.0f} с')
+
+            started = time.perf_counter()
+            day = datetime.now(UTC) - timedelta(days=DAYS + 1)
+            while day < datetime.now(UTC):
+                async with connection.transaction():
+                    keys = await connection.fetch(
+                        DAY_KEYS_SQL, BENCH_SERVER_ID, day, day + timedelta(days=1)
+                    )
+                    if keys:
+                        await rebuild_sketches(
+                            connection, [(bucket, server_id) for bucket, server_id in keys]
+                        )
+                day += timedelta(days=1)
+            await compact_rollups()
+            logger.info(f'Скетчи построены за {time.perf_counter() - started:.0f} с')
+
+            async with connector.get_session_maker()() as session:
+                for hours in (24, DAYS * 24):
+                    now = datetime.now(UTC)
+                    since = now - timedelta(hours=hours)
+                    exact_seconds, exact = await median_seconds(
+                        partial(session.scalar, unique_ips_query(since))
+                    )
+                    sketch_seconds, estimate = await median_seconds(
+                        partial(estimate_unique_ips, session, since, now)
+                    )
+                    logger.info(
+                        f'{hours:4} ч  точно {exact:,} за {exact_seconds * 1000:8,.1f} мс  '
+                        f'оценка {estimate:,} за {sketch_seconds * 1000:6,.1f} мс  '
+                        f'ошибка {(estimate - exact) / exact:+.2%}'
+                    )
+        finally:
+            await connection.execute(
+                f'DELETE FROM {SCHEMA}.server_model WHERE id = $1', BENCH_SERVER_ID
+            )
+
+
+if __name__ == '__main__':
+    logger.remove()
+    logger.add(sys.stderr, level='INFO')
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else ROWS))
@@ -15,6 +15,7 @@ from sqlalchemy.ext.asyncio import async_engine_from_config
 
 from apps.db.enabled_migration_models import BaseDBModel
 from apps.db.enabled_migration_schemas import enabled_pg_schemas
+from apps.services.partitions import is_partition_name
 from apps.utils.enums.env_enum import EnvEnum
 
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -82,7 +83,8 @@ def include_name(name, type_, parent_names):
     if type_ == 'schema':
         return name in enabled_pg_schemas
 
-    return True
+    # Секции log_entry_model создаёт обслуживание, а не миграции.
+    return not (type_ == 'table' and is_partition_name(name))
 
 
 def process_revision_directives(context, revision, directives):
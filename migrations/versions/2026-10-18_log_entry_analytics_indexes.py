@@ -0,0 +1,116 @@
+"""log entry analytics indexes
+
+Revision ID: 5e7a1c3f8d42
+Revises: 2c8f4a6e9b15
+Create Date: 2026-10-18 23:41:09.315827
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '5e7a1c3f8d42'
+down_revision = '2c8f4a6e9b15'
+
+import sqlalchemy as sa
+
+from alembic import context
+from alembic import op
+
+SCHEMA = 'nginx_parser_schema'
+TABLE = 'log_entry_model'
+# имя, колонки, INCLUDE, WHERE — как в LogEntryModel.__table_args__
+INDEXES = (
+    ('ix_log_entry_model_server_id_timestamp', 'server_id, timestamp', None, None),
+    (
+        'ix_log_entry_model_timestamp_covering',
+        'timestamp',
+        'status, size, remote_addr, uri_id',
+        None,
+    ),
+    (
+        'ix_log_entry_model_timestamp_errors',
+        'timestamp',
+        'status, uri_id, user_agent_id, remote_addr',
+        'status >= 400',
+    ),
+)
+LIST_PARTITIONS_SQL = (
+    'SELECT child.relname FROM pg_inherits '
+    'JOIN pg_class AS child ON child.oid = pg_inherits.inhrelid '
+    'WHERE pg_inherits.inhparent = :table ::regclass ORDER BY child.relname'
+)
+
+
+def upgrade():
+    schema_upgrades()
+    if context.get_x_argument(as_dictionary=True).get('data', None):
+        data_upgrades()
+
+
+def downgrade():
+    if context.get_x_argument(as_dictionary=True).get('data', None):
+        data_downgrades()
+    schema_downgrades()
+
+
+def index_definition(columns: str, include: str | None, where: str | None) -> str:
+    """Колонки, INCLUDE и WHERE индекса в синтаксисе CREATE INDEX."""
+    definition = f'({columns})'
+    if include:
+        definition += f' INCLUDE ({include})'
+    if where:
+        definition += f' WHERE {where}'
+    return definition
+
+
+def schema_upgrades():
+    """schema upgrade migrations go here.
+
+    CREATE INDEX CONCURRENTLY на секционированной таблице невозможен,
+    поэтому индекс создаётся на самой таблице (ON ONLY, пока невалидный),
+    строится CONCURRENTLY на каждой секции и присоединяется к нему; когда
+    присоединены все секции, индекс таблицы становится валидным. Запись в
+    таблицу всё это время не блокируется. В оффлайн режиме (--sql)
+    секции неизвестны, и индексы создаются обычным CREATE INDEX.
+    """
+    if context.is_offline_mode():
+        for name, columns, include, where in INDEXES:
+            definition = index_definition(columns, include, where)
+            op.execute(f'CREATE INDEX {name} ON {SCHEMA}.{TABLE} {definition}')
+        return
+
+    partitions = (
+        op.get_bind()
+        .execute(sa.text(LIST_PARTITIONS_SQL), {'table': f'{SCHEMA}.{TABLE}'})
+        .scalars()
+        .all()
+    )
+    with op.get_context().autocommit_block():
+        for name, columns, include, where in INDEXES:
+            definition = index_definition(columns, include, where)
+            op.execute(f'CREATE INDEX IF NOT EXISTS {name} ON ONLY {SCHEMA}.{TABLE} {definition}')
+            for partition in partitions:
+                partition_index = f'{partition}_{name.removeprefix(f"ix_{TABLE}_")}'
+                op.execute(
+                    f'CREATE INDEX CONCURRENTLY IF NOT EXISTS {partition_index} '
+                    f'ON {SCHEMA}.{partition} {definition}'
+                )
+                op.execute(
+                    f'ALTER INDEX {SCHEMA}.{name} ATTACH PARTITION {SCHEMA}.{partition_index}'
+                )
+
+
+def schema_downgrades():
+    """schema downgrade migrations go here."""
+    for name, _, _, _ in reversed(INDEXES):
+        # Индексы секций удаляются вместе с индексом таблицы.
+        op.drop_index(name, table_name=TABLE, schema=SCHEMA)
+
+
+def data_upgrades():
+    """Add any optional data upgrade migrations here!"""
+    pass
+
+
+def data_downgrades():
+    """Add any optional data downgrade migrations here!"""
+    pass
@@ -0,0 +1,103 @@
+"""log entry dimensions
+
+Revision ID: 9d1e6b3a5c27
+Revises: 4b9f2c7e1d03
+Create Date: 2026-10-18 18:20:41.118305
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '9d1e6b3a5c27'
+down_revision = '4b9f2c7e1d03'
+
+import sqlalchemy as sa
+
+from alembic import context
+from alembic import op
+
+SCHEMA = 'nginx_parser_schema'
+# колонка log_entry_model, справочник, длина значения
+DIMENSIONS = (
+    ('uri', 'uri_model', 2048),
+    ('referrer', 'referrer_model', 2048),
+    ('user_agent', 'user_agent_model', 1024),
+)
+
+
+def upgrade():
+    schema_upgrades()
+    if context.get_x_argument(as_dictionary=True).get('data', None):
+        data_upgrades()
+
+
+def downgrade():
+    if context.get_x_argument(as_dictionary=True).get('data', None):
+        data_downgrades()
+    schema_downgrades()
+
+
+def schema_upgrades():
+    """schema upgrade migrations go here."""
+    for column, table, length in DIMENSIONS:
+        op.create_table(
+            table,
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('value', sa.String(length=length), nullable=False),
+            sa.Column(
+                'value_hash',
+                sa.Uuid(),
+                sa.Computed('md5(value)::uuid', persisted=True),
+                nullable=False,
+            ),
+            sa.PrimaryKeyConstraint('id'),
+            schema=SCHEMA,
+        )
+        op.create_index(f'ix_{table}_value_hash', table, ['value_hash'], unique=True, schema=SCHEMA)
+        op.add_column(
+            'log_entry_model',
+            sa.Column(f'{column}_id', sa.Integer(), nullable=True),
+            schema=SCHEMA,
+        )
+
+        # Существующие строки переносятся в справочник до удаления колонки.
+        op.execute(
+            f'INSERT INTO {SCHEMA}.{table} (value) '
+            f'SELECT DISTINCT {column} FROM {SCHEMA}.log_entry_model WHERE {column} IS NOT NULL'
+        )
+        op.execute(
+            f'UPDATE {SCHEMA}.log_entry_model AS entry SET {column}_id = dimension.id '
+            f'FROM {SCHEMA}.{table} AS dimension '
+            f'WHERE dimension.value_hash = md5(entry.{column})::uuid'
+        )
+        if column == 'uri':
+            op.alter_column('log_entry_model', 'uri_id', nullable=False, schema=SCHEMA)
+        op.drop_column('log_entry_model', column, schema=SCHEMA)
+
+
+def schema_downgrades():
+    """schema downgrade migrations go here."""
+    for column, table, length in reversed(DIMENSIONS):
+        op.add_column(
+            'log_entry_model',
+            sa.Column(column, sa.String(length=length), nullable=True),
+            schema=SCHEMA,
+        )
+        op.execute(
+            f'UPDATE {SCHEMA}.log_entry_model AS entry SET {column} = dimension.value '
+            f'FROM {SCHEMA}.{table} AS dimension WHERE dimension.id = entry.{column}_id'
+        )
+        if column == 'uri':
+            op.alter_column('log_entry_model', 'uri', nullable=False, schema=SCHEMA)
+        op.drop_column('log_entry_model', f'{column}_id', schema=SCHEMA)
+        op.drop_index(f'ix_{table}_value_hash', table_name=table, schema=SCHEMA)
+        op.drop_table(table, schema=SCHEMA)
+
+
+def data_upgrades():
+    """Add any optional data upgrade migrations here!"""
+    pass
+
+
+def data_downgrades():
+    """Add any optional data downgrade migrations here!"""
+    pass
@@ -0,0 +1,134 @@
+"""log entry partitions
+
+Revision ID: 2c8f4a6e9b15
+Revises: 9d1e6b3a5c27
+Create Date: 2026-10-18 21:02:37.640192
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '2c8f4a6e9b15'
+down_revision = '9d1e6b3a5c27'
+
+import sqlalchemy as sa
+
+from alembic import context
+from alembic import op
+from sqlalchemy.dialects import postgresql
+
+SCHEMA = 'nginx_parser_schema'
+TABLE = 'log_entry_model'
+COLUMNS = (
+    'id, server_id, timestamp, remote_addr, method, uri_id, http_version, status, size, '
+    'referrer_id, user_agent_id, request_time, upstream_response_time, host, request_id, '
+    'extra, source_key'
+)
+
+
+def upgrade():
+    schema_upgrades()
+    if context.get_x_argument(as_dictionary=True).get('data', None):
+        data_upgrades()
+
+
+def downgrade():
+    if context.get_x_argument(as_dictionary=True).get('data', None):
+        data_downgrades()
+    schema_downgrades()
+
+
+def rename_current(suffix: str):
+    """Переименовывает таблицу логов и её индексы, освобождая имена."""
+    op.rename_table(TABLE, f'{TABLE}_{suffix}', schema=SCHEMA)
+    op.execute(f'ALTER INDEX {SCHEMA}.{TABLE}_pkey RENAME TO {TABLE}_{suffix}_pkey')
+    op.execute(
+        f'ALTER INDEX {SCHEMA}.ix_{TABLE}_server_id_source_key '
+        f'RENAME TO ix_{TABLE}_{suffix}_server_id_source_key'
+    )
+
+
+def create_table(primary_key: tuple[str, ...], **kwargs):
+    """Таблица логов с id на существующей последовательности."""
+    op.create_table(
+        TABLE,
+        sa.Column(
+            'id',
+            sa.Integer(),
+            server_default=sa.text(f"nextval('{SCHEMA}.{TABLE}_id_seq'::regclass)"),
+            nullable=False,
+        ),
+        sa.Column('server_id', sa.Integer(), nullable=False),
+        sa.Column('timestamp', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('remote_addr', sa.String(length=45), nullable=False),
+        sa.Column('method', sa.String(length=10), nullable=False),
+        sa.Column('uri_id', sa.Integer(), nullable=False),
+        sa.Column('http_version', sa.String(length=10), nullable=False),
+        sa.Column('status', sa.Integer(), nullable=False),
+        sa.Column('size', sa.Integer(), nullable=False),
+        sa.Column('referrer_id', sa.Integer(), nullable=True),
+        sa.Column('user_agent_id', sa.Integer(), nullable=True),
+        sa.Column('request_time', sa.Float(), nullable=True),
+        sa.Column('upstream_response_time', sa.Float(), nullable=True),
+        sa.Column('host', sa.String(length=255), nullable=True),
+        sa.Column('request_id', sa.String(length=128), nullable=True),
+        sa.Column('extra', postgresql.JSONB(astext_type=sa.Text()), nullable=True),
+        sa.Column('source_key', sa.Uuid(), nullable=True),
+        sa.ForeignKeyConstraint(['server_id'], [f'{SCHEMA}.server_model.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint(*primary_key),
+        schema=SCHEMA,
+        **kwargs,
+    )
+    op.create_index(
+        f'ix_{TABLE}_server_id_source_key',
+        TABLE,
+        ['server_id', 'source_key', *primary_key[1:]],
+        unique=True,
+        schema=SCHEMA,
+    )
+    op.execute(f'ALTER SEQUENCE {SCHEMA}.{TABLE}_id_seq OWNED BY {SCHEMA}.{TABLE}.id')
+
+
+def schema_upgrades():
+    """schema upgrade migrations go here."""
+    rename_current('unpartitioned')
+    create_table(('id', 'timestamp'), postgresql_partition_by='RANGE (timestamp)')
+
+    # Вся история до дня миграции — одна секция archive: она удаляется
+    # целиком, когда самые свежие её строки старше срока хранения. Дальше
+    # секции по дням создаёт обслуживание (apps/services/partitions.py),
+    # а строки, для которых секции ещё нет, ждут его в секции default.
+    op.execute(
+        'DO $$ BEGIN EXECUTE format('
+        f"'CREATE TABLE {SCHEMA}.{TABLE}_archive PARTITION OF {SCHEMA}.{TABLE} "
+        "FOR VALUES FROM (MINVALUE) TO (%L)', date_trunc('day', now(), 'UTC')); END $$"
+    )
+    op.execute(f'CREATE TABLE {SCHEMA}.{TABLE}_default PARTITION OF {SCHEMA}.{TABLE} DEFAULT')
+
+    op.execute(
+        f'INSERT INTO {SCHEMA}.{TABLE} ({COLUMNS}) '
+        f'SELECT {COLUMNS} FROM {SCHEMA}.{TABLE}_unpartitioned'
+    )
+    op.drop_table(f'{TABLE}_unpartitioned', schema=SCHEMA)
+
+
+def schema_downgrades():
+    """schema downgrade migrations go here."""
+    rename_current('partitioned')
+    create_table(('id',))
+
+    op.execute(
+        f'INSERT INTO {SCHEMA}.{TABLE} ({COLUMNS}) '
+        f'SELECT {COLUMNS} FROM {SCHEMA}.{TABLE}_partitioned'
+    )
+    # Секции удаляются вместе с родительской таблицей.
+    op.drop_table(f'{TABLE}_partitioned', schema=SCHEMA)
+
+
+def data_upgrades():
+    """Add any optional data upgrade migrations here!"""
+    pass
+
+
+def data_downgrades():
+    """Add any optional data downgrade migrations here!"""
+    pass
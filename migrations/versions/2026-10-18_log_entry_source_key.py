@@ -0,0 +1,64 @@
+"""log entry source key
+
+Revision ID: 4b9f2c7e1d03
+Revises: 7c3e5a9d2b41
+Create Date: 2026-10-18 14:05:12.532907
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '4b9f2c7e1d03'
+down_revision = '7c3e5a9d2b41'
+
+import sqlalchemy as sa
+
+from alembic import context
+from alembic import op
+
+
+def upgrade():
+    schema_upgrades()
+    if context.get_x_argument(as_dictionary=True).get('data', None):
+        data_upgrades()
+
+
+def downgrade():
+    if context.get_x_argument(as_dictionary=True).get('data', None):
+        data_downgrades()
+    schema_downgrades()
+
+
+def schema_upgrades():
+    """schema upgrade migrations go here."""
+    op.add_column(
+        'log_entry_model',
+        sa.Column('source_key', sa.Uuid(), nullable=True),
+        schema='nginx_parser_schema',
+    )
+    op.create_index(
+        'ix_log_entry_model_server_id_source_key',
+        'log_entry_model',
+        ['server_id', 'source_key'],
+        unique=True,
+        schema='nginx_parser_schema',
+    )
+
+
+def schema_downgrades():
+    """schema downgrade migrations go here."""
+    op.drop_index(
+        'ix_log_entry_model_server_id_source_key',
+        table_name='log_entry_model',
+        schema='nginx_parser_schema',
+    )
+    op.drop_column('log_entry_model', 'source_key', schema='nginx_parser_schema')
+
+
+def data_upgrades():
+    """Add any optional data upgrade migrations here!"""
+    pass
+
+
+def data_downgrades():
+    """Add any optional data downgrade migrations here!"""
+    pass
@@ -0,0 +1,83 @@
+"""log format columns
+
+Revision ID: 7c3e5a9d2b41
+Revises: 1f8da8a15a86
+Create Date: 2026-10-18 10:12:40.118254
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '7c3e5a9d2b41'
+down_revision = '1f8da8a15a86'
+
+import sqlalchemy as sa
+
+from alembic import context
+from alembic import op
+from sqlalchemy.dialects import postgresql
+
+
+def upgrade():
+    schema_upgrades()
+    if context.get_x_argument(as_dictionary=True).get('data', None):
+        data_upgrades()
+
+
+def downgrade():
+    if context.get_x_argument(as_dictionary=True).get('data', None):
+        data_downgrades()
+    schema_downgrades()
+
+
+def schema_upgrades():
+    """schema upgrade migrations go here."""
+    op.add_column(
+        'log_entry_model',
+        sa.Column('request_time', sa.Float(), nullable=True),
+        schema='nginx_parser_schema',
+    )
+    op.add_column(
+        'log_entry_model',
+        sa.Column('upstream_response_time', sa.Float(), nullable=True),
+        schema='nginx_parser_schema',
+    )
+    op.add_column(
+        'log_entry_model',
+        sa.Column('host', sa.String(length=255), nullable=True),
+        schema='nginx_parser_schema',
+    )
+    op.add_column(
+        'log_entry_model',
+        sa.Column('request_id', sa.String(length=128), nullable=True),
+        schema='nginx_parser_schema',
+    )
+    op.add_column(
+        'log_entry_model',
+        sa.Column('extra', postgresql.JSONB(astext_type=sa.Text()), nullable=True),
+        schema='nginx_parser_schema',
+    )
+    op.add_column(
+        'server_model',
+        sa.Column('log_format', sa.Text(), nullable=True),
+        schema='nginx_parser_schema',
+    )
+
+
+def schema_downgrades():
+    """schema downgrade migrations go here."""
+    op.drop_column('server_model', 'log_format', schema='nginx_parser_schema')
+    op.drop_column('log_entry_model', 'extra', schema='nginx_parser_schema')
+    op.drop_column('log_entry_model', 'request_id', schema='nginx_parser_schema')
+    op.drop_column('log_entry_model', 'host', schema='nginx_parser_schema')
+    op.drop_column('log_entry_model', 'upstream_response_time', schema='nginx_parser_schema')
+    op.drop_column('log_entry_model', 'request_time', schema='nginx_parser_schema')
+
+
+def data_upgrades():
+    """Add any optional data upgrade migrations here!"""
+    pass
+
+
+def data_downgrades():
+    """Add any optional data downgrade migrations here!"""
+    pass
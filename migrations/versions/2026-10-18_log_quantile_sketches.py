@@ -0,0 +1,141 @@
+"""log quantile sketches
+
+Revision ID: 6b2d8f4a1c59
+Revises: 3f8a6c1e9d27
+Create Date: 2026-10-19 03:12:44.108263
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '6b2d8f4a1c59'
+down_revision = '3f8a6c1e9d27'
+
+import math
+import zlib
+
+from datetime import timedelta
+
+import orjson
+import sqlalchemy as sa
+
+from alembic import context
+from alembic import op
+
+SCHEMA = 'nginx_parser_schema'
+TABLES = ('log_sketch_minute_model', 'log_sketch_hour_model')
+COLUMNS = ('sizes', 'request_times')
+BACKFILL_STEP = timedelta(days=1)
+
+# Формат скетча DDSketch версии 1 (apps/services/ddsketch.py),
+# зафиксированный в миграции: она не зависит от дальнейших изменений модуля.
+RELATIVE_ACCURACY = 0.01
+LOG_GAMMA = math.log((1 + RELATIVE_ACCURACY) / (1 - RELATIVE_ACCURACY))
+MAX_BINS = 2048
+HEADER = bytes((1, round(RELATIVE_ACCURACY * 1000), MAX_BINS >> 8, MAX_BINS & 255))
+
+
+def upgrade():
+    schema_upgrades()
+    if context.get_x_argument(as_dictionary=True).get('data', None):
+        data_upgrades()
+
+
+def downgrade():
+    if context.get_x_argument(as_dictionary=True).get('data', None):
+        data_downgrades()
+    schema_downgrades()
+
+
+def quantile_sketch(counts: dict[float, int]) -> bytes:
+    """Скетч DDSketch значений значение -> сколько раз встретилось в формате версии 1."""
+    zeros = 0
+    bins: dict[int, int] = {}
+    for value, count in counts.items():
+        if value > 0:
+            index = math.ceil(math.log(value) / LOG_GAMMA)
+            bins[index] = bins.get(index, 0) + count
+        else:
+            zeros += count
+    if len(bins) > MAX_BINS:
+        # Младшие корзины сливаются в первую оставшуюся.
+        indexes = sorted(bins)
+        dropped = indexes[: len(indexes) - MAX_BINS]
+        bins[indexes[len(dropped)]] += sum(bins.pop(index) for index in dropped)
+    packed = orjson.dumps([zeros, list(bins), list(bins.values())])
+    return HEADER + zlib.compress(packed, 1)
+
+
+def schema_upgrades():
+    """schema upgrade migrations go here."""
+    for table in TABLES:
+        for column in COLUMNS:
+            op.add_column(
+                table,
+                sa.Column(column, sa.LargeBinary(), server_default=sa.text("''"), nullable=False),
+                schema=SCHEMA,
+            )
+
+    # Строки минутных скетчей уже есть для всех минут с логами: в них
+    # дописываются перцентили, и минуты помечаются несвёрнутыми — часовые
+    # пересоберёт свёртка.
+    connection = op.get_bind()
+    first, last = connection.execute(
+        sa.text(f'SELECT min(timestamp), max(timestamp) FROM {SCHEMA}.log_entry_model')
+    ).one()
+    store = sa.text(
+        f'UPDATE {SCHEMA}.log_sketch_minute_model '
+        'SET sizes = :sizes, request_times = :request_times, compacted = false '
+        'WHERE bucket = :bucket AND server_id = :server_id'
+    )
+    lower = first
+    while lower is not None and lower <= last:
+        upper = lower + BACKFILL_STEP
+        rows = connection.execute(
+            sa.text(
+                "SELECT date_trunc('minute', timestamp, 'UTC'), server_id, size, request_time, "
+                f'count(*) FROM {SCHEMA}.log_entry_model '
+                'WHERE timestamp >= :lower AND timestamp < :upper GROUP BY 1, 2, 3, 4'
+            ),
+            {'lower': lower, 'upper': upper},
+        )
+        counts = {}
+        for bucket, server_id, size, request_time, requests in rows:
+            sizes, request_times = counts.setdefault((bucket, server_id), ({}, {}))
+            for value, values in ((size, sizes), (request_time, request_times)):
+                if value is not None:
+                    values[value] = values.get(value, 0) + requests
+        if counts:
+            connection.execute(
+                store,
+                [
+                    {
+                        'bucket': bucket,
+                        'server_id': server_id,
+                        'sizes': quantile_sketch(sizes),
+                        'request_times': quantile_sketch(request_times),
+                    }
+                    for (bucket, server_id), (sizes, request_times) in counts.items()
+                ],
+            )
+        lower = upper
+
+    for table in TABLES:
+        for column in COLUMNS:
+            op.alter_column(table, column, server_default=None, schema=SCHEMA)
+
+
+def schema_downgrades():
+    """schema downgrade migrations go here."""
+    for table in TABLES:
+        for column in COLUMNS:
+            op.drop_column(table, column, schema=SCHEMA)
+
+
+def data_upgrades():
+    """Add any optional data upgrade migrations here!"""
+    pass
+
+
+def data_downgrades():
+    """Add any optional data downgrade migrations here!"""
+    pass
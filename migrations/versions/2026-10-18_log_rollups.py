@@ -0,0 +1,93 @@
+"""log rollups
+
+Revision ID: 7b3d9f1e2a64
+Revises: 5e7a1c3f8d42
+Create Date: 2026-10-18 23:58:12.604318
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '7b3d9f1e2a64'
+down_revision = '5e7a1c3f8d42'
+
+import sqlalchemy as sa
+
+from alembic import context
+from alembic import op
+
+SCHEMA = 'nginx_parser_schema'
+
+
+def upgrade():
+    schema_upgrades()
+    if context.get_x_argument(as_dictionary=True).get('data', None):
+        data_upgrades()
+
+
+def downgrade():
+    if context.get_x_argument(as_dictionary=True).get('data', None):
+        data_downgrades()
+    schema_downgrades()
+
+
+def rollup_columns() -> list[sa.Column]:
+    """Колонки сводки: интервал, сервер, статус, запросы и байты."""
+    return [
+        sa.Column('bucket', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('server_id', sa.Integer(), nullable=False),
+        sa.Column('status', sa.Integer(), nullable=False),
+        sa.Column('requests', sa.BigInteger(), nullable=False),
+        sa.Column('bytes', sa.BigInteger(), nullable=False),
+        sa.ForeignKeyConstraint(['server_id'], [f'{SCHEMA}.server_model.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('bucket', 'server_id', 'status'),
+    ]
+
+
+def schema_upgrades():
+    """schema upgrade migrations go here."""
+    op.create_table(
+        'log_rollup_minute_model',
+        *rollup_columns(),
+        sa.Column('compacted', sa.Boolean(), server_default=sa.text('false'), nullable=False),
+        schema=SCHEMA,
+    )
+    op.create_index(
+        'ix_log_rollup_minute_model_pending',
+        'log_rollup_minute_model',
+        ['bucket'],
+        unique=False,
+        schema=SCHEMA,
+        postgresql_where=sa.text('NOT compacted'),
+    )
+    op.create_table('log_rollup_hour_model', *rollup_columns(), schema=SCHEMA)
+
+    # Сводки по уже записанным строкам. Все минуты помечены несвёрнутыми:
+    # часовые сводки из них соберёт первый проход свёртки.
+    op.execute(
+        f'INSERT INTO {SCHEMA}.log_rollup_minute_model '
+        '(bucket, server_id, status, requests, bytes) '
+        "SELECT date_trunc('minute', timestamp, 'UTC'), server_id, status, count(*), sum(size) "
+        f'FROM {SCHEMA}.log_entry_model GROUP BY 1, 2, 3'
+    )
+
+
+def schema_downgrades():
+    """schema downgrade migrations go here."""
+    op.drop_table('log_rollup_hour_model', schema=SCHEMA)
+    op.drop_index(
+        'ix_log_rollup_minute_model_pending',
+        table_name='log_rollup_minute_model',
+        schema=SCHEMA,
+        postgresql_where=sa.text('NOT compacted'),
+    )
+    op.drop_table('log_rollup_minute_model', schema=SCHEMA)
+
+
+def data_upgrades():
+    """Add any optional data upgrade migrations here!"""
+    pass
+
+
+def data_downgrades():
+    """Add any optional data downgrade migrations here!"""
+    pass
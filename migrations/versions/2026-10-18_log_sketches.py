@@ -0,0 +1,149 @@
+"""log sketches
+
+Revision ID: 9c4e2a7d5b13
+Revises: 7b3d9f1e2a64
+Create Date: 2026-10-18 23:59:31.118204
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '9c4e2a7d5b13'
+down_revision = '7b3d9f1e2a64'
+
+import zlib
+
+from collections.abc import Iterable
+from datetime import timedelta
+from hashlib import blake2b
+
+import sqlalchemy as sa
+
+from alembic import context
+from alembic import op
+
+SCHEMA = 'nginx_parser_schema'
+BACKFILL_STEP = timedelta(days=1)
+
+# Формат скетча HyperLogLog версии 1 (apps/services/hyperloglog.py),
+# зафиксированный в миграции: она не зависит от дальнейших изменений модуля.
+PRECISION = 14
+REGISTERS = 1 << PRECISION
+RANK_BITS = 64 - PRECISION
+RANK_MASK = (1 << RANK_BITS) - 1
+FORMAT_VERSION = 1
+
+
+def upgrade():
+    schema_upgrades()
+    if context.get_x_argument(as_dictionary=True).get('data', None):
+        data_upgrades()
+
+
+def downgrade():
+    if context.get_x_argument(as_dictionary=True).get('data', None):
+        data_downgrades()
+    schema_downgrades()
+
+
+def unique_ips_sketch(values: Iterable[str]) -> bytes:
+    """Скетч HyperLogLog адресов в формате версии 1."""
+    registers = bytearray(REGISTERS)
+    for value in values:
+        hashed = int.from_bytes(blake2b(value.encode(), digest_size=8).digest())
+        index = hashed >> RANK_BITS
+        rank = RANK_BITS - (hashed & RANK_MASK).bit_length() + 1
+        if rank > registers[index]:
+            registers[index] = rank
+    layers = []
+    for rank in range(1, max(registers) + 1):
+        # Слой rank — маска регистров со значением не меньше rank: байт
+        # регистра становится '1' или '0', строка разбирается int(..., 2).
+        table = bytes(ord('1') if value >= rank else ord('0') for value in range(256))
+        layers.append(int(registers.translate(table), 2))
+    packed = b''.join(layer.to_bytes(REGISTERS // 8) for layer in layers)
+    return bytes((FORMAT_VERSION, PRECISION)) + zlib.compress(packed, 1)
+
+
+def sketch_columns() -> list[sa.Column]:
+    """Колонки скетча: интервал, сервер и скетч адресов."""
+    return [
+        sa.Column('bucket', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('server_id', sa.Integer(), nullable=False),
+        sa.Column('unique_ips', sa.LargeBinary(), nullable=False),
+        sa.ForeignKeyConstraint(['server_id'], [f'{SCHEMA}.server_model.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('bucket', 'server_id'),
+    ]
+
+
+def schema_upgrades():
+    """schema upgrade migrations go here."""
+    minutes = op.create_table(
+        'log_sketch_minute_model',
+        *sketch_columns(),
+        sa.Column('compacted', sa.Boolean(), server_default=sa.text('false'), nullable=False),
+        schema=SCHEMA,
+    )
+    op.create_index(
+        'ix_log_sketch_minute_model_pending',
+        'log_sketch_minute_model',
+        ['bucket'],
+        unique=False,
+        schema=SCHEMA,
+        postgresql_where=sa.text('NOT compacted'),
+    )
+    op.create_table('log_sketch_hour_model', *sketch_columns(), schema=SCHEMA)
+
+    # Скетчи по уже записанным строкам, по суткам. Как и сводки, все
+    # минуты помечены несвёрнутыми: часовые скетчи соберёт свёртка.
+    connection = op.get_bind()
+    first, last = connection.execute(
+        sa.text(f'SELECT min(timestamp), max(timestamp) FROM {SCHEMA}.log_entry_model')
+    ).one()
+    lower = first
+    while lower is not None and lower <= last:
+        upper = lower + BACKFILL_STEP
+        addresses: dict[tuple, set[str]] = {}
+        rows = connection.execute(
+            sa.text(
+                "SELECT DISTINCT date_trunc('minute', timestamp, 'UTC'), server_id, remote_addr "
+                f'FROM {SCHEMA}.log_entry_model WHERE timestamp >= :lower AND timestamp < :upper'
+            ),
+            {'lower': lower, 'upper': upper},
+        )
+        for bucket, server_id, remote_addr in rows:
+            addresses.setdefault((bucket, server_id), set()).add(remote_addr)
+        if addresses:
+            op.bulk_insert(
+                minutes,
+                [
+                    {
+                        'bucket': bucket,
+                        'server_id': server_id,
+                        'unique_ips': unique_ips_sketch(values),
+                    }
+                    for (bucket, server_id), values in addresses.items()
+                ],
+            )
+        lower = upper
+
+
+def schema_downgrades():
+    """schema downgrade migrations go here."""
+    op.drop_table('log_sketch_hour_model', schema=SCHEMA)
+    op.drop_index(
+        'ix_log_sketch_minute_model_pending',
+        table_name='log_sketch_minute_model',
+        schema=SCHEMA,
+        postgresql_where=sa.text('NOT compacted'),
+    )
+    op.drop_table('log_sketch_minute_model', schema=SCHEMA)
+
+
+def data_upgrades():
+    """Add any optional data upgrade migrations here!"""
+    pass
+
+
+def data_downgrades():
+    """Add any optional data downgrade migrations here!"""
+    pass
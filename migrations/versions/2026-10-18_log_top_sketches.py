@@ -0,0 +1,134 @@
+"""log top sketches
+
+Revision ID: 3f8a6c1e9d27
+Revises: 9c4e2a7d5b13
+Create Date: 2026-10-19 00:41:07.530912
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '3f8a6c1e9d27'
+down_revision = '9c4e2a7d5b13'
+
+import heapq
+import zlib
+
+from datetime import timedelta
+
+import orjson
+import sqlalchemy as sa
+
+from alembic import context
+from alembic import op
+
+SCHEMA = 'nginx_parser_schema'
+TABLES = ('log_sketch_minute_model', 'log_sketch_hour_model')
+COLUMNS = ('top_ips', 'top_uris')
+BACKFILL_STEP = timedelta(days=1)
+
+# Формат сводки Space-Saving версии 1 (apps/services/space_saving.py),
+# зафиксированный в миграции: она не зависит от дальнейших изменений модуля.
+CAPACITY = 256
+HEADER = bytes((1, CAPACITY >> 8, CAPACITY & 255))
+
+
+def upgrade():
+    schema_upgrades()
+    if context.get_x_argument(as_dictionary=True).get('data', None):
+        data_upgrades()
+
+
+def downgrade():
+    if context.get_x_argument(as_dictionary=True).get('data', None):
+        data_downgrades()
+    schema_downgrades()
+
+
+def top_sketch(counts: dict[str, list[int]]) -> bytes:
+    """Сводка Space-Saving точных счётчиков значение -> [запросы, байты] в формате версии 1."""
+    counters = {value: [requests, 0, size] for value, (requests, size) in counts.items()}
+    if len(counters) > CAPACITY:
+        counters = dict(heapq.nlargest(CAPACITY, counters.items(), key=lambda item: item[1][0]))
+    packed = orjson.dumps([[value, *counter] for value, counter in counters.items()])
+    return HEADER + zlib.compress(packed, 1)
+
+
+def schema_upgrades():
+    """schema upgrade migrations go here."""
+    for table in TABLES:
+        for column in COLUMNS:
+            op.add_column(
+                table,
+                sa.Column(column, sa.LargeBinary(), server_default=sa.text("''"), nullable=False),
+                schema=SCHEMA,
+            )
+
+    # Строки минутных скетчей уже есть для всех минут с логами: в них
+    # дописываются топы по суткам, и минуты помечаются несвёрнутыми —
+    # часовые пересоберёт свёртка.
+    connection = op.get_bind()
+    first, last = connection.execute(
+        sa.text(f'SELECT min(timestamp), max(timestamp) FROM {SCHEMA}.log_entry_model')
+    ).one()
+    store = sa.text(
+        f'UPDATE {SCHEMA}.log_sketch_minute_model '
+        'SET top_ips = :top_ips, top_uris = :top_uris, compacted = false '
+        'WHERE bucket = :bucket AND server_id = :server_id'
+    )
+    lower = first
+    while lower is not None and lower <= last:
+        upper = lower + BACKFILL_STEP
+        rows = connection.execute(
+            sa.text(
+                "SELECT date_trunc('minute', entry.timestamp, 'UTC'), entry.server_id, "
+                'entry.remote_addr, uri.value, count(*), coalesce(sum(entry.size), 0) '
+                f'FROM {SCHEMA}.log_entry_model AS entry '
+                f'LEFT JOIN {SCHEMA}.uri_model AS uri ON uri.id = entry.uri_id '
+                'WHERE entry.timestamp >= :lower AND entry.timestamp < :upper '
+                'GROUP BY 1, 2, 3, 4'
+            ),
+            {'lower': lower, 'upper': upper},
+        )
+        counts = {}
+        for bucket, server_id, remote_addr, uri, requests, size in rows:
+            ips, uris = counts.setdefault((bucket, server_id), ({}, {}))
+            for value, values in ((remote_addr, ips), (uri, uris)):
+                if value is not None:
+                    counter = values.setdefault(value, [0, 0])
+                    counter[0] += requests
+                    counter[1] += size
+        if counts:
+            connection.execute(
+                store,
+                [
+                    {
+                        'bucket': bucket,
+                        'server_id': server_id,
+                        'top_ips': top_sketch(ips),
+                        'top_uris': top_sketch(uris),
+                    }
+                    for (bucket, server_id), (ips, uris) in counts.items()
+                ],
+            )
+        lower = upper
+
+    for table in TABLES:
+        for column in COLUMNS:
+            op.alter_column(table, column, server_default=None, schema=SCHEMA)
+
+
+def schema_downgrades():
+    """schema downgrade migrations go here."""
+    for table in TABLES:
+        for column in COLUMNS:
+            op.drop_column(table, column, schema=SCHEMA)
+
+
+def data_upgrades():
+    """Add any optional data upgrade migrations here!"""
+    pass
+
+
+def data_downgrades():
+    """Add any optional data downgrade migrations here!"""
+    pass
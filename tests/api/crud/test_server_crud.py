@@ -0,0 +1,49 @@
+import pytest
+
+from starlette.exceptions import HTTPException
+
+from apps.api.v1.cruds.server_crud import server_crud_obj
+from apps.api.v1.schemas.server_schema import ServerCreateSchema
+from apps.api.v1.schemas.server_schema import ServerUpdateSchema
+from apps.auth.schemas.user_schema import UserSchema
+from tests.consts import STUB_EMAIL
+
+USER = UserSchema(user_email=STUB_EMAIL, user_roles=[])
+
+
+class TestServerCrud:
+    """Тестируем создание и изменение серверов.
+
+    Запуск:
+        pytest tests/api/crud/test_server_crud.py -s
+    """
+
+    async def test_create_and_update_log_format(self, session):
+        created = await server_crud_obj.create_server(
+            db=session,
+            user=USER,
+            server=ServerCreateSchema(name='api-nginx', ip_address='10.0.0.1', log_format='main'),
+        )
+
+        assert await server_crud_obj.get_log_format(session, created.id) == 'main'
+
+        updated = await server_crud_obj.update_server(
+            db=session,
+            user=USER,
+            server_id=created.id,
+            server=ServerUpdateSchema(log_format=None),
+        )
+
+        assert (updated.name, updated.log_format) == ('api-nginx', None)
+        assert await server_crud_obj.get_log_format(session, created.id) is None
+
+    async def test_update_missing_server(self, session):
+        with pytest.raises(HTTPException) as error:
+            await server_crud_obj.update_server(
+                db=session,
+                user=USER,
+                server_id=404,
+                server=ServerUpdateSchema(log_format='main'),
+            )
+
+        assert error.value.status_code == 404
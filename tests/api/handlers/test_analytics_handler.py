@@ -1,3 +1,4 @@
+from datetime import UTC
 from datetime import datetime
 from datetime import timedelta
 
@@ -5,6 +6,8 @@ import pytest
 
 from apps.api.v1.models.log_entry_model import LogEntryModel
 from apps.api.v1.models.server_model import ServerModel
+from apps.services.analytics_cache import ANALYTICS_CACHE
+from apps.services.dimensions import resolve_dimensions
 from tests.consts import BASE_API_URL
 from tests.sql_init_data.base_data_tree import base_parser_tree
 
@@ -148,6 +151,7 @@ class TestAnalyticsHandler:
             '/analytics/traffic',
             '/analytics/errors',
             '/analytics/time-series',
+            '/analytics/percentiles',
         ]
 
         for endpoint in endpoints:
@@ -170,7 +174,7 @@ class TestAnalyticsWithCustomData:
         await session.commit()
 
         log_entries = [
-            LogEntryModel(
+            dict(
                 server_id=1,
                 timestamp=now - timedelta(minutes=5),
                 remote_addr='192.168.1.100',
@@ -182,7 +186,7 @@ class TestAnalyticsWithCustomData:
                 referrer='https://example.com',
                 user_agent='Mozilla/5.0',
             ),
-            LogEntryModel(
+            dict(
                 server_id=1,
                 timestamp=now - timedelta(minutes=4),
                 remote_addr='192.168.1.101',
@@ -194,7 +198,7 @@ class TestAnalyticsWithCustomData:
                 referrer='https://example.com/login',
                 user_agent='Mozilla/5.0',
             ),
-            LogEntryModel(
+            dict(
                 server_id=1,
                 timestamp=now - timedelta(minutes=3),
                 remote_addr='192.168.1.102',
@@ -206,7 +210,7 @@ class TestAnalyticsWithCustomData:
                 referrer='https://example.com/products',
                 user_agent='Mozilla/5.0',
             ),
-            LogEntryModel(
+            dict(
                 server_id=1,
                 timestamp=now - timedelta(minutes=2),
                 remote_addr='192.168.1.103',
@@ -221,7 +225,7 @@ class TestAnalyticsWithCustomData:
         ]
 
         for entry in log_entries:
-            session.add(entry)
+            session.add(LogEntryModel(**await resolve_dimensions(session, entry)))
         await session.commit()
 
         response = await auth_client.get(f'{BASE_API_URL}/analytics/traffic?hours=1')
@@ -229,6 +233,13 @@ class TestAnalyticsWithCustomData:
         data = response.json()
         assert data['total_requests'] == 4
         assert data['unique_ips'] == 4
+        assert data['unique_ips_exact'] is False
+
+        response = await auth_client.get(f'{BASE_API_URL}/analytics/traffic?hours=1&exact=true')
+        assert response.status_code == 200
+        data = response.json()
+        assert data['unique_ips'] == 4
+        assert data['unique_ips_exact'] is True
 
         response = await auth_client.get(f'{BASE_API_URL}/analytics/status-codes?hours=1')
         assert response.status_code == 200
@@ -253,3 +264,76 @@ class TestAnalyticsWithCustomData:
         assert response.status_code == 200
         data = response.json()
         assert len(data) == 4  # 4 уникальных URL
+
+        for endpoint in ('top-ips', 'top-urls'):
+            url = f'{BASE_API_URL}/analytics/{endpoint}?limit=10&hours=1'
+            estimated = (await auth_client.get(url)).json()
+            exact = (await auth_client.get(f'{url}&exact=true')).json()
+            assert sorted(estimated, key=str) == sorted(exact, key=str)
+
+        response = await auth_client.get(f'{BASE_API_URL}/analytics/percentiles?hours=1')
+        assert response.status_code == 200
+        estimated = {item['metric']: item for item in response.json()}
+        response = await auth_client.get(f'{BASE_API_URL}/analytics/percentiles?hours=1&exact=true')
+        assert response.status_code == 200
+        exact = {item['metric']: item for item in response.json()}
+        assert estimated['size']['count'] == exact['size']['count'] == 4
+        assert estimated['size']['p50'] == pytest.approx(exact['size']['p50'], rel=0.01)
+        assert estimated['size']['p99'] == pytest.approx(exact['size']['p99'], rel=0.01)
+        assert (exact['size']['p50'], exact['size']['p99']) == (567, 1234)
+        assert exact['size']['exact'] is True
+        assert estimated['request_time'] == {
+            'metric': 'request_time',
+            'count': 0,
+            'p50': None,
+            'p95': None,
+            'p99': None,
+            'exact': False,
+        }
+
+
+@pytest.mark.handlers
+class TestAnalyticsCache:
+    """Тесты кеша закрытой части окна аналитики."""
+
+    async def test_closed_part_cached_and_head_recomputed(self, auth_client, session):
+        now = datetime.now(UTC)
+        session.add(ServerModel(id=1, name='cache-server', ip_address='192.168.1.1'))
+        await session.commit()
+
+        async def add_entry(timestamp: datetime, status: int) -> None:
+            entry = dict(
+                server_id=1,
+                timestamp=timestamp,
+                remote_addr='192.168.1.100',
+                method='GET',
+                uri='/api/users',
+                http_version='HTTP/1.1',
+                status=status,
+                size=100,
+            )
+            session.add(LogEntryModel(**await resolve_dimensions(session, entry)))
+            await session.commit()
+
+        async def status_codes() -> dict[int, int]:
+            response = await auth_client.get(f'{BASE_API_URL}/analytics/status-codes?hours=1')
+            assert response.status_code == 200
+            return {item['status']: item['count'] for item in response.json()}
+
+        await add_entry(now - timedelta(minutes=30), 200)
+
+        assert await status_codes() == {200: 1}
+        hits, misses = ANALYTICS_CACHE.hits, ANALYTICS_CACHE.misses
+        assert await status_codes() == {200: 1}
+        # Корзины закрытой части берутся из кеша, в базу идёт только открытая.
+        assert ANALYTICS_CACHE.misses == misses
+        assert ANALYTICS_CACHE.hits > hits
+
+        await add_entry(datetime.now(UTC), 500)
+        await add_entry(now - timedelta(minutes=20), 200)
+
+        # Строка в открытой части видна сразу, дописанная в закрытую
+        # корзину — только когда корзину вытеснят из кеша.
+        assert await status_codes() == {200: 1, 500: 1}
+        ANALYTICS_CACHE.clear()
+        assert await status_codes() == {200: 2, 500: 1}
@@ -0,0 +1,110 @@
+import re
+
+from datetime import UTC
+from datetime import datetime
+from datetime import timedelta
+
+import pytest
+
+from sqlalchemy import Select
+from sqlalchemy import text
+from sqlalchemy.dialects import postgresql
+
+from apps.api.v1.handlers.analytics_handler import errors_query
+from apps.api.v1.handlers.analytics_handler import status_codes_query
+from apps.api.v1.handlers.analytics_handler import time_series_query
+from apps.api.v1.handlers.analytics_handler import top_ips_query
+from apps.api.v1.handlers.analytics_handler import top_urls_query
+from apps.api.v1.handlers.analytics_handler import traffic_query
+from apps.api.v1.handlers.analytics_handler import unique_ips_query
+from apps.services.partitions import PartitionManager
+from tests.conftest import get_test_connector
+
+SCHEMA = 'nginx_parser_schema'
+ROWS = 2_000_000
+DAYS = 8
+URIS = 5_000
+NOW = datetime.now(UTC)
+# Окно дашборда: за час строк мало, и план должен идти по индексу.
+# За сутки секции вчерашнего дня читаются почти целиком, и seq scan
+# уже отсечённых секций — правильный план.
+SINCE = NOW - timedelta(hours=1)
+
+LOAD_SQL = (
+    f"INSERT INTO {SCHEMA}.server_model (id, name, ip_address) VALUES (1, 'plans', '10.9.0.1')",
+    f'INSERT INTO {SCHEMA}.uri_model (value) '
+    f"SELECT '/plans/' || i FROM generate_series(1, {URIS}) AS i",
+    f'INSERT INTO {SCHEMA}.user_agent_model (value) '
+    "SELECT 'agent/' || i FROM generate_series(1, 50) AS i",
+    f'INSERT INTO {SCHEMA}.log_entry_model (server_id, timestamp, remote_addr, method, uri_id, '
+    'http_version, status, size, user_agent_id) '
+    f"SELECT 1, CAST(:now AS timestamptz) - i * interval '{DAYS} days' / {ROWS}, "
+    "'10.' || i % 200 || '.' || i % 251, "
+    f"'GET', 1 + (i::bigint * 7919 % {URIS})::int, 'HTTP/1.1', "
+    'CASE WHEN i % 50 = 0 THEN 500 WHEN i % 31 = 0 THEN 404 ELSE 200 END, i % 100000, 1 + i % 50 '
+    f'FROM generate_series(1, {ROWS}) AS i',
+)
+# Индексы секций привязаны к индексам таблицы через pg_inherits.
+PARTITION_INDEXES_SQL = (
+    'SELECT child.relname, parent.relname FROM pg_inherits '
+    'JOIN pg_class AS child ON child.oid = pg_inherits.inhrelid '
+    'JOIN pg_class AS parent ON parent.oid = pg_inherits.inhparent '
+    "WHERE child.relkind = 'i'"
+)
+INDEX_SCAN_RE = re.compile(r'(Index Only Scan|Index Scan)( Backward)? using (\S+)')
+
+
+@pytest.mark.slow
+@pytest.mark.handlers
+class TestAnalyticsPlans:
+    """Планы запросов аналитики на нескольких миллионах строк."""
+
+    @pytest.fixture(scope='class')
+    async def synthetic_logs(self, engine, session):
+        await PartitionManager(
+            db_connector=get_test_connector(), interval_days=1, precreate=DAYS + 1
+        ).maintain(NOW - timedelta(days=DAYS))
+        for statement in LOAD_SQL:
+            await session.execute(text(statement), {'now': NOW})
+        await session.commit()
+
+        async with engine.connect() as conn:
+            conn = await conn.execution_options(isolation_level='AUTOCOMMIT')
+            await conn.execute(text(f'VACUUM ANALYZE {SCHEMA}.log_entry_model'))
+            await conn.execute(text(f'ANALYZE {SCHEMA}.uri_model'))
+            result = await conn.execute(text(PARTITION_INDEXES_SQL))
+            return dict(result.all())
+
+    async def scans(self, session, partition_indexes: dict[str, str], query: Select) -> list:
+        """Сканирования индексов в плане: (узел, направление, индекс таблицы)."""
+        sql = query.compile(dialect=postgresql.dialect(), compile_kwargs={'literal_binds': True})
+        plan = await session.execute(text(f'EXPLAIN {sql}'))
+        lines = [row[0] for row in plan]
+        return [
+            (node, bool(backward), partition_indexes.get(index, index))
+            for node, backward, index in INDEX_SCAN_RE.findall('\n'.join(lines))
+        ]
+
+    @pytest.mark.parametrize(
+        'query',
+        [
+            status_codes_query(SINCE, NOW),
+            top_ips_query(SINCE, 10),
+            top_urls_query(SINCE, 10),
+            traffic_query(SINCE, NOW),
+            unique_ips_query(SINCE),
+            time_series_query(SINCE, NOW, 300),
+        ],
+        ids=['status-codes', 'top-ips', 'top-urls', 'traffic', 'unique-ips', 'time-series'],
+    )
+    async def test_aggregates_use_covering_index(self, session, synthetic_logs, query):
+        scans = await self.scans(session, synthetic_logs, query)
+
+        assert ('Index Only Scan', False, 'ix_log_entry_model_timestamp_covering') in scans
+
+    async def test_errors_walk_partial_index_backward(self, session, synthetic_logs):
+        scans = await self.scans(session, synthetic_logs, errors_query(SINCE))
+
+        log_scans = [scan for scan in scans if scan[2].startswith('ix_log_entry_model')]
+        assert log_scans
+        assert set(log_scans) == {('Index Only Scan', True, 'ix_log_entry_model_timestamp_errors')}
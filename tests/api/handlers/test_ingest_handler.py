@@ -0,0 +1,192 @@
+import gzip
+
+from unittest.mock import patch
+
+import orjson
+import pytest
+
+from sqlalchemy import text
+from starlette.status import HTTP_200_OK
+from starlette.status import HTTP_400_BAD_REQUEST
+from starlette.status import HTTP_401_UNAUTHORIZED
+from starlette.status import HTTP_404_NOT_FOUND
+from starlette.status import HTTP_415_UNSUPPORTED_MEDIA_TYPE
+
+from apps.api.v1.models.server_model import ServerModel
+from apps.services.nginx_log_parser import MAX_LINE_BYTES
+from apps.services.parse_failures import DB_REJECTED
+from tests.consts import BASE_API_URL
+
+LOG_LINE = (
+    '192.168.1.{index} - - [25/Dec/2024:10:30:15 +0300] "GET /api/items/{index} HTTP/1.1" '
+    '200 {index} "-" "curl/8.4.0"'
+)
+
+
+def make_body(count: int) -> bytes:
+    return ''.join(f'{LOG_LINE.format(index=index % 250)}\n' for index in range(count)).encode()
+
+
+async def chunked(data: bytes, size: int = 7_000):
+    for start in range(0, len(data), size):
+        yield data[start : start + size]
+
+
+@pytest.mark.handlers
+class TestIngestLogs:
+    """Набор тестов для POST /api/ingest/{server_id}.
+
+    Запуск:
+        pytest tests/api/handlers/test_ingest_handler.py::TestIngestLogs -s
+
+    """
+
+    @pytest.fixture(autouse=True)
+    async def clean_tables(self, session, tmp_path):
+        await session.execute(
+            text(
+                'TRUNCATE nginx_parser_schema.log_entry_model, nginx_parser_schema.server_model CASCADE'
+            )
+        )
+        session.add(ServerModel(id=501, name='ingest-web', ip_address='10.5.0.1'))
+        await session.commit()
+
+        with patch('apps.services.log_pipeline.SETTINGS.MONITOR_DEAD_LETTER_PATH', None):
+            yield
+
+    async def count_rows(self, session) -> int:
+        result = await session.execute(
+            text('SELECT COUNT(*) FROM nginx_parser_schema.log_entry_model WHERE server_id = 501')
+        )
+        return result.scalar_one()
+
+    async def test_raw_lines_are_streamed(self, auth_client, session):
+        body = make_body(2_500) + b'garbage\n\n' + LOG_LINE.format(index=7).encode()
+
+        response = await auth_client.post(f'{BASE_API_URL}/ingest/501', content=chunked(body))
+
+        assert response.status_code == HTTP_200_OK
+        assert response.json() == {
+            'accepted': 2_501,
+            'rejected': 1,
+            'failed': 0,
+            'duplicates': 0,
+            'failures': [],
+        }
+        assert await self.count_rows(session) == 2_501
+
+    async def test_ndjson_body(self, auth_client, session):
+        body = b''.join(
+            orjson.dumps({field: LOG_LINE.format(index=index)}) + b'\n'
+            for index, field in enumerate(('line', 'message', 'log'))
+        )
+        body += b'{"other": 1}\n[1, 2]\nnot json\n'
+
+        response = await auth_client.post(
+            f'{BASE_API_URL}/ingest/501',
+            content=body,
+            headers={'Content-Type': 'application/x-ndjson; charset=utf-8'},
+        )
+
+        assert response.json() == {
+            'accepted': 3,
+            'rejected': 3,
+            'failed': 0,
+            'duplicates': 0,
+            'failures': [],
+        }
+        assert await self.count_rows(session) == 3
+
+    async def test_gzip_body(self, auth_client, session):
+        body = gzip.compress(make_body(1_000)) + gzip.compress(make_body(500))
+
+        response = await auth_client.post(
+            f'{BASE_API_URL}/ingest/501',
+            content=chunked(body, 1_000),
+            headers={'Content-Encoding': 'gzip'},
+        )
+
+        assert response.json() == {
+            'accepted': 1_500,
+            'rejected': 0,
+            'failed': 0,
+            'duplicates': 0,
+            'failures': [],
+        }
+        assert await self.count_rows(session) == 1_500
+
+    async def test_oversized_line_is_skipped(self, auth_client, session, tmp_path):
+        dead_letter = tmp_path / 'dead.jsonl'
+        body = make_body(2) + b'x' * (MAX_LINE_BYTES * 2) + b'\n' + make_body(3)
+
+        with patch('apps.services.log_pipeline.SETTINGS.MONITOR_DEAD_LETTER_PATH', dead_letter):
+            response = await auth_client.post(
+                f'{BASE_API_URL}/ingest/501', content=chunked(body, 100_000)
+            )
+
+        assert response.json() == {
+            'accepted': 5,
+            'rejected': 1,
+            'failed': 0,
+            'duplicates': 0,
+            'failures': [],
+        }
+        assert orjson.loads(dead_letter.read_bytes())['file'] == 'ingest:501'
+
+    async def test_rows_rejected_by_database_are_reported(self, auth_client, session, tmp_path):
+        dead_letter = tmp_path / 'dead.jsonl'
+        overflow = LOG_LINE.format(index=3).replace('200 3', '200 3000000000')
+        body = make_body(3) + f'{overflow}\n'.encode() + make_body(2)
+
+        with patch('apps.services.log_pipeline.SETTINGS.MONITOR_DEAD_LETTER_PATH', dead_letter):
+            response = await auth_client.post(f'{BASE_API_URL}/ingest/501', content=body)
+
+        result = response.json()
+        assert (result['accepted'], result['rejected'], result['failed']) == (5, 0, 1)
+        assert [failure['row']['size'] for failure in result['failures']] == [3_000_000_000]
+        assert result['failures'][0]['error']
+        assert orjson.loads(dead_letter.read_bytes())['reason'] == DB_REJECTED
+        assert await self.count_rows(session) == 5
+
+    async def test_retry_with_source_is_not_duplicated(self, auth_client, session):
+        body = make_body(300)
+        url = f'{BASE_API_URL}/ingest/501?source=web01:/var/log/nginx/access.log'
+
+        first = await auth_client.post(url, content=chunked(body[:20_000]))
+        retry = await auth_client.post(url, content=chunked(body))
+        tail = await auth_client.post(f'{url}&offset={len(body)}', content=make_body(5))
+
+        assert first.json()['accepted'] + retry.json()['accepted'] == 300
+        assert retry.json()['duplicates'] == first.json()['accepted']
+        assert tail.json() == {
+            'accepted': 5,
+            'rejected': 0,
+            'failed': 0,
+            'duplicates': 0,
+            'failures': [],
+        }
+        assert await self.count_rows(session) == 305
+
+    @pytest.mark.parametrize(
+        ('headers', 'status_code'),
+        [
+            ({'Content-Encoding': 'br'}, HTTP_415_UNSUPPORTED_MEDIA_TYPE),
+            ({'Content-Encoding': 'gzip'}, HTTP_400_BAD_REQUEST),
+        ],
+    )
+    async def test_bad_encoding(self, auth_client, headers, status_code):
+        response = await auth_client.post(
+            f'{BASE_API_URL}/ingest/501', content=make_body(1), headers=headers
+        )
+
+        assert response.status_code == status_code
+
+    async def test_unknown_server(self, auth_client):
+        response = await auth_client.post(f'{BASE_API_URL}/ingest/999', content=make_body(1))
+
+        assert response.status_code == HTTP_404_NOT_FOUND
+
+    async def test_requires_auth(self, client):
+        response = await client.post(f'{BASE_API_URL}/ingest/501', content=make_body(1))
+
+        assert response.status_code == HTTP_401_UNAUTHORIZED
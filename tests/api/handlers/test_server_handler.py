@@ -1,6 +1,9 @@
 import pytest
 
 from starlette.status import HTTP_200_OK
+from starlette.status import HTTP_201_CREATED
+from starlette.status import HTTP_404_NOT_FOUND
+from starlette.status import HTTP_422_UNPROCESSABLE_ENTITY
 
 from tests.consts import BASE_API_URL
 from tests.sql_init_data.base_data_tree import base_parser_tree
@@ -54,3 +57,98 @@ class TestGetServerById:
             f'{BASE_API_URL}/servers/2',
         )
         assert response.status_code == HTTP_200_OK
+
+
+@pytest.mark.handlers
+class TestCreateServer:
+    """Набор тестов для TestCreateServer.
+
+    Запуск:
+        pytest tests/api/handlers/test_server_handler.py::TestCreateServer -s
+
+    """
+
+    async def test_create_server_with_log_format(
+        self,
+        auth_client,
+        db_init,
+    ):
+        response = await auth_client.post(
+            f'{BASE_API_URL}/servers',
+            json={'name': 'api-nginx', 'ip_address': '10.0.0.1', 'log_format': 'main'},
+        )
+
+        assert response.status_code == HTTP_201_CREATED
+        assert response.json() == {
+            'id': 1,
+            'name': 'api-nginx',
+            'description': None,
+            'ip_address': '10.0.0.1',
+            'log_format': 'main',
+        }
+
+
+@pytest.mark.handlers
+@pytest.mark.parametrize(
+    'db_init_pre_build',
+    [base_parser_tree],
+    indirect=True,
+)
+class TestServerLogFormat:
+    """Набор тестов для log_format в ручках серверов.
+
+    Запуск:
+        pytest tests/api/handlers/test_server_handler.py::TestServerLogFormat -s
+
+    """
+
+    async def test_update_log_format(
+        self,
+        auth_client,
+        db_init_pre_build,
+    ):
+        log_format = '$remote_addr [$time_local] "$request" $status $body_bytes_sent $request_time'
+
+        response = await auth_client.patch(
+            f'{BASE_API_URL}/servers/2',
+            json={'log_format': log_format},
+        )
+        server = await auth_client.get(f'{BASE_API_URL}/servers/2')
+
+        assert response.status_code == HTTP_200_OK
+        assert response.json()['name'] == 'dev-nginx'
+        assert server.json()['log_format'] == log_format
+
+    @pytest.mark.parametrize(
+        'log_format',
+        ['$remote_addr $status', '$remote_addr$remote_user [$time_local] "$request" $status'],
+    )
+    async def test_invalid_log_format_rejected(
+        self,
+        auth_client,
+        db_init_pre_build,
+        log_format,
+    ):
+        created = await auth_client.post(
+            f'{BASE_API_URL}/servers',
+            json={'name': 'broken-nginx', 'ip_address': '10.0.0.2', 'log_format': log_format},
+        )
+        updated = await auth_client.patch(
+            f'{BASE_API_URL}/servers/2',
+            json={'log_format': log_format},
+        )
+
+        assert created.status_code == HTTP_422_UNPROCESSABLE_ENTITY
+        assert updated.status_code == HTTP_422_UNPROCESSABLE_ENTITY
+
+    async def test_update_missing_server(
+        self,
+        auth_client,
+        db_init_pre_build,
+    ):
+        response = await auth_client.patch(
+            f'{BASE_API_URL}/servers/404',
+            json={'log_format': 'main'},
+        )
+
+        assert response.status_code == HTTP_404_NOT_FOUND
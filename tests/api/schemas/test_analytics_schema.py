@@ -4,6 +4,7 @@ from datetime import datetime
 import pytest
 
 from apps.api.v1.schemas.analytics_schema import ErrorStats
+from apps.api.v1.schemas.analytics_schema import PercentileStats
 from apps.api.v1.schemas.analytics_schema import StatusCodeStats
 from apps.api.v1.schemas.analytics_schema import TimeSeriesData
 from apps.api.v1.schemas.analytics_schema import TopIPsStats
@@ -75,6 +76,16 @@ class TestAnalyticsSchemas:
         assert isinstance(stats.unique_ips, int)
         assert isinstance(stats.period_hours, int)
 
+    def test_percentile_stats_schema(self):
+        """Тест схемы PercentileStats."""
+        stats = PercentileStats(metric='size', count=3, p50=512.0, p95=1024.0, p99=2048.0)
+
+        assert stats.metric == 'size'
+        assert stats.count == 3
+        assert stats.p99 == 2048.0
+        assert stats.exact is False
+        assert PercentileStats(metric='request_time', count=0).p50 is None
+
     def test_error_stats_schema(self):
         """Тест схемы ErrorStats."""
         timestamp = datetime.now(UTC)
@@ -160,12 +171,18 @@ class TestAnalyticsSchemas:
         time_series = TimeSeriesData(timestamp=timestamp, requests=100, bytes=51200)
 
         assert status_stats.model_dump() == {'status': 200, 'count': 100}
-        assert top_ips.model_dump() == {'ip': '192.168.1.100', 'requests': 50, 'avg_size': 1024}
+        assert top_ips.model_dump() == {
+            'ip': '192.168.1.100',
+            'requests': 50,
+            'avg_size': 1024,
+            'requests_error': 0,
+        }
         assert traffic.model_dump() == {
             'total_requests': 1000,
             'total_bytes': 1024000,
             'avg_request_size': 1024,
             'unique_ips': 50,
+            'unique_ips_exact': False,
             'period_hours': 24,
         }
         assert error.model_dump() == {
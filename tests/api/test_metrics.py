@@ -0,0 +1,147 @@
+import asyncio
+
+import pytest
+
+from starlette.status import HTTP_200_OK
+
+from apps.utils import metrics
+from apps.utils.metrics import CollectorRegistry
+from apps.utils.metrics import Counter
+from apps.utils.metrics import Gauge
+from apps.utils.metrics import Histogram
+from apps.utils.metrics import start_metrics_server
+from tests.consts import BASE_API_URL
+from tests.consts import BASE_URL
+
+
+class TestCollectorRegistry:
+    """Тестирование реестра метрик и текстового формата.
+
+    Запуск:
+        pytest tests/api/test_metrics.py -s
+    """
+
+    def test_counter_and_gauge_render_with_labels(self):
+        registry = CollectorRegistry()
+        requests = Counter('requests_total', 'Запросы', ('path',), registry=registry)
+        in_flight = Gauge('in_flight', 'В работе', registry=registry)
+
+        requests.labels('/a"b\\c\n').inc()
+        requests.labels('/a"b\\c\n').inc(2)
+        in_flight.set(1.5)
+
+        assert registry.render() == (
+            '# HELP requests_total Запросы\n'
+            '# TYPE requests_total counter\n'
+            'requests_total{path="/a\\"b\\\\c\\n"} 3\n'
+            '# HELP in_flight В работе\n'
+            '# TYPE in_flight gauge\n'
+            'in_flight 1.5\n'
+        )
+
+    def test_histogram_buckets_are_cumulative(self):
+        registry = CollectorRegistry()
+        latency = Histogram('latency_seconds', 'Задержка', buckets=(0.1, 1), registry=registry)
+
+        for value in (0.05, 0.1, 0.5, 3):
+            latency.observe(value)
+
+        lines = registry.render().splitlines()[2:]
+        assert lines == [
+            'latency_seconds_bucket{le="0.1"} 2',
+            'latency_seconds_bucket{le="1"} 3',
+            'latency_seconds_bucket{le="+Inf"} 4',
+            'latency_seconds_count 4',
+            'latency_seconds_sum 3.65',
+        ]
+
+    def test_hooks_run_before_render(self):
+        registry = CollectorRegistry()
+        queue = Gauge('queue_depth', 'Очередь', registry=registry)
+        registry.add_hook(lambda: queue.set(7))
+
+        assert 'queue_depth 7' in registry.render()
+
+    def test_duplicate_and_wrong_labels_are_rejected(self):
+        registry = CollectorRegistry()
+        requests = Counter('requests_total', 'Запросы', ('path',), registry=registry)
+
+        with pytest.raises(ValueError):
+            Counter('requests_total', 'Запросы', registry=registry)
+        with pytest.raises(ValueError):
+            requests.labels('/a', 'GET')
+
+
+class TestMetricsEndpoint:
+    """Тестирование /metrics и метрик запросов к API."""
+
+    async def test_metrics_endpoint_reports_route_templates(self, auth_client):
+        await auth_client.get(f'{BASE_API_URL}/analytics/status-codes?hours=24')
+
+        response = await auth_client.get(f'{BASE_URL}/metrics')
+
+        assert response.status_code == HTTP_200_OK
+        assert response.headers['content-type'].startswith('text/plain; version=0.0.4')
+        assert (
+            'nginx_analyzer_http_requests_total{method="GET",'
+            'route="/api/analytics/status-codes",status="200"}'
+        ) in response.text
+        assert (
+            'nginx_analyzer_http_request_duration_seconds_count{method="GET",'
+            'route="/api/analytics/status-codes"}'
+        ) in response.text
+        assert 'nginx_analyzer_db_pool_connections{' in response.text
+
+    async def test_unknown_paths_share_one_label(self, client):
+        await client.get(f'{BASE_URL}/no-such-page/12345')
+
+        response = await client.get(f'{BASE_URL}/metrics')
+
+        assert 'route="unmatched",status="404"' in response.text
+        assert '/no-such-page/12345' not in response.text
+
+
+class TestMetricsServer:
+    """Тестирование HTTP-слушателя метрик монитора."""
+
+    @staticmethod
+    async def fetch(port: int, path: str) -> bytes:
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        writer.write(f'GET {path} HTTP/1.1\r\nHost: localhost\r\n\r\n'.encode())
+        await writer.drain()
+        response = await reader.read()
+        writer.close()
+        return response
+
+    async def test_serves_metrics_and_404(self):
+        server = await start_metrics_server('127.0.0.1', 0)
+        port = server.sockets[0].getsockname()[1]
+        try:
+            metrics = await self.fetch(port, '/metrics')
+            missing = await self.fetch(port, '/')
+        finally:
+            server.close()
+
+        assert metrics.startswith(b'HTTP/1.1 200 OK\r\n')
+        assert b'# TYPE nginx_analyzer_http_requests_total counter' in metrics
+        assert missing.startswith(b'HTTP/1.1 404 Not Found\r\n')
+
+    async def test_closes_slow_request_after_overall_timeout(self, monkeypatch):
+        monkeypatch.setattr(metrics, 'REQUEST_TIMEOUT_SECONDS', 0.3)
+        server = await start_metrics_server('127.0.0.1', 0)
+        port = server.sockets[0].getsockname()[1]
+        try:
+            reader, writer = await asyncio.open_connection('127.0.0.1', port)
+            writer.write(b'GET /metrics HTTP/1.1\r\n')
+            # Каждый заголовок успевает в таймаут, но все вместе — нет.
+            for number in range(10):
+                await asyncio.sleep(0.1)
+                if reader.at_eof():
+                    break
+                writer.write(f'X-Header-{number}: 1\r\n'.encode())
+            response = await asyncio.wait_for(reader.read(), timeout=1)
+            writer.close()
+        finally:
+            server.close()
+
+        assert response == b''
@@ -1,9 +1,26 @@
+import importlib.util
+
+from pathlib import Path
+
 import pytest
 
 from pytest_alembic import create_alembic_fixture
 from pytest_alembic import tests
 
+from apps.services.ddsketch import DDSketch
+from apps.services.hyperloglog import HyperLogLog
+from apps.services.space_saving import SpaceSaving
+
 history = create_alembic_fixture({'file': 'alembic.ini'})
+VERSIONS = Path(__file__).parents[2] / 'migrations' / 'versions'
+
+
+def load_migration(name: str):
+    """Модуль миграции migrations/versions/<name>.py."""
+    spec = importlib.util.spec_from_file_location(name, VERSIONS / f'{name}.py')
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
 
 
 @pytest.mark.usefixtures('migrations_clean_up')
@@ -30,3 +47,28 @@ class TestMigrations:
     def test_up_down_consistency(self, history):
         """Тест консинсетности миграций."""
         tests.test_up_down_consistency(history)
+
+
+class TestMigrationSketches:
+    """Скетчи, зафиксированные в миграциях, совпадают с текущим форматом сервисов."""
+
+    def test_unique_ips_sketch(self):
+        migration = load_migration('2026-10-18_log_sketches')
+        addresses = [f'10.0.{index % 250}.{index % 7}' for index in range(5000)]
+
+        assert migration.unique_ips_sketch(addresses) == (
+            HyperLogLog.from_values(addresses).to_bytes()
+        )
+
+    def test_top_sketch(self):
+        migration = load_migration('2026-10-18_log_top_sketches')
+        counts = {f'/page/{index}': [index % 97 + 1, index * 10] for index in range(1000)}
+
+        assert migration.top_sketch(counts) == SpaceSaving.from_counts(counts).to_bytes()
+
+    def test_quantile_sketch(self):
+        migration = load_migration('2026-10-18_log_quantile_sketches')
+        # Значения через 3% попадают в разные корзины, и их больше MAX_BINS.
+        counts = {0: 3} | {1.03**index: index % 5 + 1 for index in range(3000)}
+
+        assert migration.quantile_sketch(counts) == DDSketch.from_counts(counts).to_bytes()
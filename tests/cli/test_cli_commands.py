@@ -7,7 +7,14 @@ from unittest.mock import patch
 import pytest
 
 from apps.cli_commands import main
+from apps.cli_commands import start_import
 from apps.cli_commands import start_monitoring
+from apps.cli_commands import start_multi_monitoring
+from apps.cli_commands import start_partition_maintenance
+from apps.cli_commands import start_syslog
+from apps.services.monitor_targets import MonitorTarget
+from apps.services.partitions import MaintenanceResult
+from apps.services.syslog_receiver import SyslogRoutes
 
 LOG_SAMPLE = (
     '192.168.1.100 - - [25/Dec/2024:10:30:15 +0300] "GET /api/users HTTP/1.1" '
@@ -36,7 +43,37 @@ class TestStartMonitoring:
         ) as mock_monitor:
             await start_monitoring(str(sample_log_file), server_id=1)
 
-        mock_monitor.assert_awaited_once_with(str(sample_log_file), 1)
+        mock_monitor.assert_awaited_once_with(
+            str(sample_log_file),
+            1,
+            batch_size=None,
+            flush_interval=None,
+            writers=None,
+            queue_size=None,
+            log_format=None,
+            parse_workers=None,
+            metrics_port=None,
+        )
+
+    async def test_flush_interval_is_converted_to_seconds(self, sample_log_file):
+        with patch(
+            'apps.cli_commands.start_log_monitoring', new_callable=AsyncMock
+        ) as mock_monitor:
+            await start_monitoring(
+                str(sample_log_file), server_id=2, batch_size=100, flush_interval_ms=250
+            )
+
+        mock_monitor.assert_awaited_once_with(
+            str(sample_log_file),
+            2,
+            batch_size=100,
+            flush_interval=0.25,
+            writers=None,
+            queue_size=None,
+            log_format=None,
+            parse_workers=None,
+            metrics_port=None,
+        )
 
     async def test_keyboard_interrupt_is_not_an_error(self, sample_log_file):
         with patch(
@@ -60,6 +97,144 @@ class TestStartMonitoring:
         assert exc_info.value.code == 1
 
 
+@pytest.mark.cli
+class TestStartMultiMonitoring:
+    """Тесты корутины мониторинга нескольких файлов."""
+
+    async def test_delegates_to_monitoring_service(self):
+        targets = [MonitorTarget('/var/log/nginx/*.log', 2)]
+        with patch(
+            'apps.cli_commands.start_multi_log_monitoring', new_callable=AsyncMock
+        ) as mock_monitor:
+            await start_multi_monitoring(targets, flush_interval_ms=100, writers=3)
+
+        mock_monitor.assert_awaited_once_with(
+            targets,
+            batch_size=None,
+            flush_interval=0.1,
+            writers=3,
+            queue_size=None,
+            parse_workers=None,
+            metrics_port=None,
+        )
+
+    async def test_unexpected_failure_exits_with_code_1(self):
+        with (
+            patch(
+                'apps.cli_commands.start_multi_log_monitoring',
+                new_callable=AsyncMock,
+                side_effect=OSError('connection refused'),
+            ),
+            pytest.raises(SystemExit) as exc_info,
+        ):
+            await start_multi_monitoring([MonitorTarget('/var/log/nginx/api.log', 1)])
+
+        assert exc_info.value.code == 1
+
+
+@pytest.mark.cli
+class TestStartSyslog:
+    """Тесты корутины приёма syslog."""
+
+    async def test_delegates_to_receiver(self):
+        routes = SyslogRoutes({'web01': 2})
+        with patch(
+            'apps.cli_commands.start_syslog_receiver', new_callable=AsyncMock
+        ) as mock_receiver:
+            await start_syslog(routes, [('0.0.0.0', 514)], [], flush_interval_ms=100)
+
+        mock_receiver.assert_awaited_once_with(
+            routes,
+            udp=[('0.0.0.0', 514)],
+            tcp=[],
+            batch_size=None,
+            flush_interval=0.1,
+            writers=None,
+            queue_size=None,
+            parse_workers=None,
+            metrics_port=None,
+        )
+
+    async def test_unexpected_failure_exits_with_code_1(self):
+        with (
+            patch(
+                'apps.cli_commands.start_syslog_receiver',
+                new_callable=AsyncMock,
+                side_effect=OSError('address already in use'),
+            ),
+            pytest.raises(SystemExit) as exc_info,
+        ):
+            await start_syslog(SyslogRoutes(default_server_id=1), [], [])
+
+        assert exc_info.value.code == 1
+
+
+@pytest.mark.cli
+class TestStartPartitionMaintenance:
+    """Тесты корутины обслуживания секций."""
+
+    async def test_runs_one_maintenance_pass(self):
+        with patch('apps.cli_commands.PartitionManager') as mock_manager:
+            mock_manager.return_value.maintain = AsyncMock(
+                return_value=MaintenanceResult(created=['p1'])
+            )
+            await start_partition_maintenance(retention_days=30)
+
+        mock_manager.assert_called_once_with(retention_days=30, precreate=None)
+        mock_manager.return_value.maintain.assert_awaited_once()
+
+    async def test_failure_exits_with_code_1(self):
+        with (
+            patch('apps.cli_commands.PartitionManager') as mock_manager,
+            pytest.raises(SystemExit) as exc_info,
+        ):
+            mock_manager.return_value.maintain = AsyncMock(side_effect=OSError('db is down'))
+            await start_partition_maintenance()
+
+        assert exc_info.value.code == 1
+
+
+@pytest.mark.cli
+class TestStartImport:
+    """Тесты корутины импорта."""
+
+    async def test_runs_importer_with_server_log_format(self, sample_log_file):
+        with (
+            patch(
+                'apps.cli_commands.resolve_log_format',
+                new_callable=AsyncMock,
+                return_value='main',
+            ) as mock_resolve,
+            patch('apps.cli_commands.LogImporter') as mock_importer,
+        ):
+            mock_importer.return_value.run = AsyncMock()
+            await start_import([str(sample_log_file)], server_id=3, workers=2)
+
+        mock_resolve.assert_awaited_once_with(3, None)
+        mock_importer.assert_called_once_with(
+            [str(sample_log_file)],
+            3,
+            log_format='main',
+            workers=2,
+            writers=None,
+            dead_letter=False,
+        )
+        mock_importer.return_value.run.assert_awaited_once()
+
+    async def test_failure_exits_with_code_1(self, sample_log_file):
+        with (
+            patch(
+                'apps.cli_commands.resolve_log_format',
+                new_callable=AsyncMock,
+                side_effect=OSError('connection refused'),
+            ),
+            pytest.raises(SystemExit) as exc_info,
+        ):
+            await start_import([str(sample_log_file)])
+
+        assert exc_info.value.code == 1
+
+
 @pytest.mark.cli
 class TestMainCommand:
     """Тесты разбора аргументов и веток main()."""
@@ -73,7 +248,268 @@ class TestMainCommand:
             main()
 
         mock_run.assert_called_once()
-        mock_start.assert_called_once_with(str(sample_log_file), 1)
+        mock_start.assert_called_once_with(
+            str(sample_log_file),
+            1,
+            batch_size=None,
+            flush_interval_ms=None,
+            writers=None,
+            queue_size=None,
+            log_format=None,
+            parse_workers=None,
+            metrics_port=None,
+        )
+
+    def test_monitor_passes_batching_options(self, sample_log_file):
+        with (
+            patch(
+                'sys.argv',
+                [
+                    'cli_commands.py',
+                    'monitor',
+                    str(sample_log_file),
+                    '--batch-size',
+                    '500',
+                    '--flush-interval-ms',
+                    '50',
+                    '--writers',
+                    '4',
+                    '--queue-size',
+                    '8',
+                ],
+            ),
+            patch('apps.cli_commands.start_monitoring') as mock_start,
+            patch('apps.cli_commands.asyncio.run'),
+        ):
+            main()
+
+        mock_start.assert_called_once_with(
+            str(sample_log_file),
+            1,
+            batch_size=500,
+            flush_interval_ms=50,
+            writers=4,
+            queue_size=8,
+            log_format=None,
+            parse_workers=None,
+            metrics_port=None,
+        )
+
+    def test_monitor_passes_parse_workers(self, sample_log_file):
+        with (
+            patch(
+                'sys.argv',
+                ['cli_commands.py', 'monitor', str(sample_log_file), '--parse-workers', '4'],
+            ),
+            patch('apps.cli_commands.start_monitoring') as mock_start,
+            patch('apps.cli_commands.asyncio.run'),
+        ):
+            main()
+
+        assert mock_start.call_args.kwargs['parse_workers'] == 4
+
+    def test_monitor_passes_metrics_port(self, sample_log_file):
+        with (
+            patch(
+                'sys.argv',
+                ['cli_commands.py', 'monitor', str(sample_log_file), '--metrics-port', '9113'],
+            ),
+            patch('apps.cli_commands.start_monitoring') as mock_start,
+            patch('apps.cli_commands.asyncio.run'),
+        ):
+            main()
+
+        assert mock_start.call_args.kwargs['metrics_port'] == 9113
+
+    def test_monitor_passes_log_format(self, sample_log_file):
+        with (
+            patch(
+                'sys.argv',
+                ['cli_commands.py', 'monitor', str(sample_log_file), '--log-format', 'main'],
+            ),
+            patch('apps.cli_commands.start_monitoring') as mock_start,
+            patch('apps.cli_commands.asyncio.run'),
+        ):
+            main()
+
+        assert mock_start.call_args.kwargs['log_format'] == 'main'
+
+    def test_monitor_rejects_invalid_log_format(self, sample_log_file):
+        with (
+            patch(
+                'sys.argv',
+                ['cli_commands.py', 'monitor', str(sample_log_file), '--log-format', '$status'],
+            ),
+            patch('apps.cli_commands.asyncio.run') as mock_run,
+            pytest.raises(SystemExit) as exc_info,
+        ):
+            main()
+
+        assert exc_info.value.code == 1
+        mock_run.assert_not_called()
+
+    def test_import_passes_files_and_options(self, sample_log_file):
+        with (
+            patch(
+                'sys.argv',
+                [
+                    'cli_commands.py',
+                    'import',
+                    str(sample_log_file),
+                    str(sample_log_file),
+                    '--server-id',
+                    '4',
+                    '--workers',
+                    '8',
+                ],
+            ),
+            patch('apps.cli_commands.start_import') as mock_start,
+            patch('apps.cli_commands.asyncio.run') as mock_run,
+        ):
+            main()
+
+        mock_run.assert_called_once()
+        mock_start.assert_called_once_with(
+            [str(sample_log_file), str(sample_log_file)],
+            4,
+            log_format=None,
+            workers=8,
+            writers=None,
+            dead_letter=False,
+        )
+
+    def test_import_exits_when_file_is_missing(self, sample_log_file):
+        with (
+            patch(
+                'sys.argv',
+                ['cli_commands.py', 'import', str(sample_log_file), '/nonexistent/file.log.gz'],
+            ),
+            patch('apps.cli_commands.asyncio.run') as mock_run,
+            pytest.raises(SystemExit) as exc_info,
+        ):
+            main()
+
+        assert exc_info.value.code == 1
+        mock_run.assert_not_called()
+
+    def test_monitor_collects_files_config_and_pattern(self, tmp_path):
+        config = tmp_path / 'monitor.toml'
+        config.write_text('[[files]]\npath = "/var/log/nginx/shop.log"\nserver_id = 4\n')
+
+        with (
+            patch(
+                'sys.argv',
+                [
+                    'cli_commands.py',
+                    'monitor',
+                    '/var/log/nginx/*.access.log',
+                    '--server-id',
+                    '2',
+                    '--config',
+                    str(config),
+                    '--file',
+                    '/var/log/nginx/api.log:3',
+                    '--writers',
+                    '4',
+                ],
+            ),
+            patch('apps.cli_commands.start_multi_monitoring') as mock_start,
+            patch('apps.cli_commands.asyncio.run') as mock_run,
+        ):
+            main()
+
+        mock_run.assert_called_once()
+        mock_start.assert_called_once_with(
+            [
+                MonitorTarget('/var/log/nginx/shop.log', 4),
+                MonitorTarget('/var/log/nginx/api.log', 3),
+                MonitorTarget('/var/log/nginx/*.access.log', 2),
+            ],
+            batch_size=None,
+            flush_interval_ms=None,
+            writers=4,
+            queue_size=None,
+            parse_workers=None,
+            metrics_port=None,
+        )
+
+    @pytest.mark.parametrize(
+        'argv',
+        [
+            ['monitor'],
+            ['monitor', '--file', '/var/log/nginx/api.log'],
+            ['monitor', '--config', '/nonexistent/monitor.toml'],
+        ],
+    )
+    def test_monitor_rejects_invalid_targets(self, argv):
+        with (
+            patch('sys.argv', ['cli_commands.py', *argv]),
+            patch('apps.cli_commands.asyncio.run') as mock_run,
+            pytest.raises(SystemExit) as exc_info,
+        ):
+            main()
+
+        assert exc_info.value.code == 1
+        mock_run.assert_not_called()
+
+    def test_partitions_passes_options(self):
+        with (
+            patch(
+                'sys.argv',
+                ['cli_commands.py', 'partitions', '--retention-days', '90', '--precreate', '3'],
+            ),
+            patch('apps.cli_commands.start_partition_maintenance') as mock_start,
+            patch('apps.cli_commands.asyncio.run') as mock_run,
+        ):
+            main()
+
+        mock_run.assert_called_once()
+        mock_start.assert_called_once_with(retention_days=90, precreate=3)
+
+    def test_syslog_passes_routes_and_addresses(self):
+        with (
+            patch(
+                'sys.argv',
+                [
+                    'cli_commands.py',
+                    'syslog',
+                    '--udp',
+                    '0.0.0.0:514',
+                    '--tcp',
+                    '6514',
+                    '--route',
+                    'web01:2',
+                    '--route',
+                    'shop:3',
+                    '--server-id',
+                    '1',
+                ],
+            ),
+            patch('apps.cli_commands.start_syslog') as mock_start,
+            patch('apps.cli_commands.asyncio.run') as mock_run,
+        ):
+            main()
+
+        mock_run.assert_called_once()
+        routes, udp, tcp = mock_start.call_args.args
+        assert routes.routes == {'web01': 2, 'shop': 3}
+        assert routes.default_server_id == 1
+        assert udp == [('0.0.0.0', 514)]
+        assert tcp == [('127.0.0.1', 6514)]
+
+    @pytest.mark.parametrize(
+        'argv', [['syslog'], ['syslog', '--route', 'web01'], ['syslog', '--udp', 'host:port']]
+    )
+    def test_syslog_rejects_invalid_options(self, argv):
+        with (
+            patch('sys.argv', ['cli_commands.py', *argv]),
+            patch('apps.cli_commands.asyncio.run') as mock_run,
+            pytest.raises(SystemExit) as exc_info,
+        ):
+            main()
+
+        assert exc_info.value.code == 1
+        mock_run.assert_not_called()
 
     def test_monitor_exits_when_file_is_missing(self):
         with (
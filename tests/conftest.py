@@ -19,6 +19,7 @@ from sqlalchemy.ext.asyncio import async_sessionmaker
 from apps.db.base_db_class import BaseDBModel
 from apps.db.enabled_migration_schemas import enabled_pg_schemas
 from apps.db.session import PGEngineConnector
+from apps.services.analytics_cache import ANALYTICS_CACHE
 from apps.settings import SETTINGS
 from apps.utils.enums.env_enum import EnvEnum
 from tests.consts import BASE_AUTH_URL
@@ -58,6 +59,9 @@ def _setup_conftest() -> Generator[Any, Any, None]:
         level='ERROR',
     )
     logger.level('DEBUG', color='<yellow>')
+    # Корзины и закрытые части окон аналитики не переживают тест: данные
+    # БД между тестами меняются, а корзины и head в пределах минуты те же.
+    ANALYTICS_CACHE.clear()
 
     yield
 
@@ -0,0 +1,22 @@
+import asyncio
+import contextlib
+
+from collections.abc import Awaitable
+from collections.abc import Callable
+
+
+async def wait_for(predicate: Callable[[], Awaitable[bool]], attempts: int = 200) -> None:
+    """Ждёт, пока predicate() не вернёт True, проверяя раз в 50 мс."""
+    for _ in range(attempts):
+        if await predicate():
+            return
+        await asyncio.sleep(0.05)
+
+    raise AssertionError('Условие не выполнилось за отведённое время')
+
+
+async def stop(task: asyncio.Task) -> None:
+    """Отменяет задачу и дожидается её завершения."""
+    task.cancel()
+    with contextlib.suppress(asyncio.CancelledError):
+        await task
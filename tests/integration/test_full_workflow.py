@@ -11,6 +11,7 @@ from sqlalchemy import text
 
 from apps.api.v1.models.log_entry_model import LogEntryModel
 from apps.api.v1.models.server_model import ServerModel
+from apps.services.dimensions import resolve_dimensions
 from apps.services.nginx_log_parser import NginxLogParser
 from tests.consts import BASE_API_URL
 
@@ -48,7 +49,9 @@ class TestFullWorkflow:
     async def clean_tables(self, session):
         """Каждый тест класса начинает с пустых таблиц: фикстура схемы живёт на класс."""
         await session.execute(
-            text('TRUNCATE nginx_parser_schema.log_entry_model, nginx_parser_schema.server_model')
+            text(
+                'TRUNCATE nginx_parser_schema.log_entry_model, nginx_parser_schema.server_model CASCADE'
+            )
         )
         await session.commit()
 
@@ -76,7 +79,7 @@ class TestFullWorkflow:
         assert len(parsed_entries) == 5
 
         for entry_data in parsed_entries:
-            log_entry = LogEntryModel(**entry_data)
+            log_entry = LogEntryModel(**await resolve_dimensions(session, entry_data))
             session.add(log_entry)
         await session.commit()
 
@@ -86,8 +89,10 @@ class TestFullWorkflow:
         assert count == 5
 
         stmt = text(
-            'SELECT status, remote_addr, uri '
-            'FROM nginx_parser_schema.log_entry_model ORDER BY timestamp'
+            'SELECT entry.status, entry.remote_addr, uri.value '
+            'FROM nginx_parser_schema.log_entry_model AS entry '
+            'JOIN nginx_parser_schema.uri_model AS uri ON uri.id = entry.uri_id '
+            'ORDER BY entry.timestamp'
         )
         result = await session.execute(stmt)
         entries = result.fetchall()
@@ -115,7 +120,7 @@ class TestFullWorkflow:
         await session.commit()
 
         log_entries = [
-            LogEntryModel(
+            dict(
                 server_id=101,
                 timestamp=now - timedelta(minutes=10),
                 remote_addr='192.168.1.100',
@@ -127,7 +132,7 @@ class TestFullWorkflow:
                 referrer='https://example.com',
                 user_agent='Mozilla/5.0',
             ),
-            LogEntryModel(
+            dict(
                 server_id=101,
                 timestamp=now - timedelta(minutes=9),
                 remote_addr='192.168.1.100',  # Тот же IP
@@ -139,7 +144,7 @@ class TestFullWorkflow:
                 referrer='https://example.com',
                 user_agent='Mozilla/5.0',
             ),
-            LogEntryModel(
+            dict(
                 server_id=101,
                 timestamp=now - timedelta(minutes=8),
                 remote_addr='192.168.1.101',
@@ -151,7 +156,7 @@ class TestFullWorkflow:
                 referrer='https://example.com/login',
                 user_agent='Mozilla/5.0',
             ),
-            LogEntryModel(
+            dict(
                 server_id=101,
                 timestamp=now - timedelta(minutes=7),
                 remote_addr='192.168.1.102',
@@ -163,7 +168,7 @@ class TestFullWorkflow:
                 referrer='https://example.com/products',
                 user_agent='Mozilla/5.0',
             ),
-            LogEntryModel(
+            dict(
                 server_id=101,
                 timestamp=now - timedelta(minutes=6),
                 remote_addr='192.168.1.103',
@@ -178,7 +183,7 @@ class TestFullWorkflow:
         ]
 
         for entry in log_entries:
-            session.add(entry)
+            session.add(LogEntryModel(**await resolve_dimensions(session, entry)))
         await session.commit()
 
         response = await auth_client.get(f'{BASE_API_URL}/analytics/traffic?hours=1')
@@ -303,7 +308,7 @@ class TestFullWorkflow:
 
         for i in range(100):  # 100 записей
             log_entries.append(
-                LogEntryModel(
+                dict(
                     server_id=101,
                     timestamp=now - timedelta(minutes=i),
                     remote_addr=f'192.168.1.{i % 10}',  # 10 уникальных IP
@@ -318,7 +323,7 @@ class TestFullWorkflow:
             )
 
         for entry in log_entries:
-            session.add(entry)
+            session.add(LogEntryModel(**await resolve_dimensions(session, entry)))
         await session.commit()
 
         stmt = text(
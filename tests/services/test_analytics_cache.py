@@ -0,0 +1,121 @@
+import pickle
+
+from collections import Counter
+from datetime import UTC
+from datetime import datetime
+from datetime import timedelta
+from itertools import pairwise
+
+import pytest
+
+from apps.services.analytics_cache import ResponseCache
+from apps.services.analytics_cache import closed_buckets
+from apps.services.analytics_cache import split_window
+from apps.settings import SETTINGS
+
+
+def entry_size(value) -> int:
+    return len(pickle.dumps(value, pickle.HIGHEST_PROTOCOL))
+
+
+@pytest.mark.services
+class TestResponseCache:
+    """Тесты кеша частичных результатов аналитики."""
+
+    def test_evicts_least_recently_used_by_bytes(self):
+        value = 'x' * 100
+        cache = ResponseCache(max_bytes=entry_size(value) * 2)
+        cache.put('a', value)
+        cache.put('b', value)
+        cache.get('a')
+
+        cache.put('c', value)
+
+        assert (cache.get('a'), cache.get('b'), cache.get('c')) == (value, None, value)
+        assert cache.bytes == entry_size(value) * 2
+
+    def test_oversized_value_not_stored(self):
+        cache = ResponseCache(max_bytes=64)
+        cache.put('a', 'x' * 10)
+
+        cache.put('a', 'x' * 100)
+
+        assert cache.get('a') is None
+        assert (len(cache), cache.bytes) == (0, 0)
+        assert ResponseCache(max_bytes=0).stats()['entries'] == 0
+
+    async def test_cached_counts_hits_and_returns_copies(self):
+        cache = ResponseCache(max_bytes=1024)
+        calls = []
+
+        async def compute() -> Counter:
+            calls.append(1)
+            return Counter({200: 5})
+
+        first = await cache.cached('status-codes', (24,), compute)
+        first.update({200: 1})
+        second = await cache.cached('status-codes', (24,), compute)
+        await cache.cached('status-codes', (1,), compute)
+
+        assert second == Counter({200: 5})
+        assert len(calls) == 2
+        assert cache.stats() | {'bytes': 0} == {
+            'entries': 2,
+            'bytes': 0,
+            'max_bytes': 1024,
+            'hits': 1,
+            'misses': 2,
+            'hit_ratio': pytest.approx(1 / 3),
+        }
+
+    def test_split_window_aligned_to_settled_minute(self, monkeypatch):
+        monkeypatch.setattr(SETTINGS, 'ANALYTICS_CACHE_SETTLE_SECONDS', 10)
+        minute = datetime(2024, 12, 25, 10, 30, tzinfo=UTC)
+
+        assert split_window(minute + timedelta(seconds=15), 24) == (
+            minute - timedelta(hours=24),
+            minute,
+        )
+        assert split_window(minute + timedelta(seconds=5), 1)[1] == minute - timedelta(minutes=1)
+
+    def test_closed_buckets_hours_and_edge_minutes(self):
+        head = datetime(2024, 12, 25, 10, 30, tzinfo=UTC)
+        since = head - timedelta(hours=3)
+
+        buckets = closed_buckets(since, head)
+
+        assert [upper - lower for lower, upper in buckets] == (
+            [timedelta(minutes=1)] * 30 + [timedelta(hours=1)] * 2 + [timedelta(minutes=1)] * 30
+        )
+        assert buckets[0][0] == since
+        assert buckets[-1][1] == head
+        assert all(prev[1] == nxt[0] for prev, nxt in pairwise(buckets))
+        assert closed_buckets(head - timedelta(hours=1), head) == [
+            (head - timedelta(minutes=60 - index), head - timedelta(minutes=59 - index))
+            for index in range(60)
+        ]
+
+    async def test_missing_buckets_computed_in_one_call(self):
+        cache = ResponseCache(max_bytes=1024 * 1024)
+        calls = []
+
+        async def compute(lower: datetime, upper: datetime) -> list[tuple[datetime, int]]:
+            calls.append((lower, upper))
+            minute = lower
+            rows = []
+            while minute < upper:
+                rows.append((minute, 1))
+                minute += timedelta(minutes=1)
+            return rows
+
+        head = datetime(2024, 12, 25, 10, 30, tzinfo=UTC)
+        since = head - timedelta(hours=24)
+        first = await cache.cached_buckets('status-codes', (), closed_buckets(since, head), compute)
+        moved = head + timedelta(minutes=1)
+        second = await cache.cached_buckets(
+            'status-codes', (), closed_buckets(moved - timedelta(hours=24), moved), compute
+        )
+
+        assert len(first) == len(second) == 24 * 60
+        assert calls == [(since, head), (head, moved)]
+        assert cache.misses == len(closed_buckets(since, head)) + 1
@@ -0,0 +1,79 @@
+import math
+import random
+
+import pytest
+
+from apps.services.ddsketch import MAX_BINS
+from apps.services.ddsketch import RELATIVE_ACCURACY
+from apps.services.ddsketch import DDSketch
+
+
+def lognormal_counts(seed: int, values: int = 20_000) -> dict[float, int]:
+    generator = random.Random(seed)
+    counts: dict[float, int] = {}
+    for _ in range(values):
+        value = round(generator.lognormvariate(6, 2))
+        counts[value] = counts.get(value, 0) + 1
+    return counts
+
+
+def exact_quantile(counts: dict[float, int], q: float) -> float:
+    values = sorted(value for value, count in counts.items() for _ in range(count))
+    return values[max(math.ceil(q * len(values)), 1) - 1]
+
+
+@pytest.mark.services
+class TestDDSketch:
+    """Тесты скетча квантилей DDSketch."""
+
+    def test_quantiles_within_relative_accuracy(self):
+        counts = lognormal_counts(1)
+
+        sketch = DDSketch.from_counts(counts)
+
+        assert sketch.count() == sum(counts.values())
+        for q in (0, 0.5, 0.9, 0.95, 0.99, 1):
+            exact = exact_quantile(counts, q)
+            assert abs(sketch.quantile(q) - exact) <= RELATIVE_ACCURACY * exact
+
+    def test_merged_sketch_equals_sketch_of_all_values(self):
+        parts = [lognormal_counts(seed) for seed in range(4)]
+        merged = DDSketch()
+        total: dict[float, int] = {}
+        for counts in parts:
+            merged.update(DDSketch.from_counts(counts))
+            for value, count in counts.items():
+                total[value] = total.get(value, 0) + count
+
+        whole = DDSketch.from_counts(total)
+
+        assert (merged.zeros, merged.bins) == (whole.zeros, whole.bins)
+
+    def test_zeros_and_empty_sketch(self):
+        sketch = DDSketch.from_counts({0: 3, 0.25: 1})
+
+        assert sketch.quantile(0.5) == 0.0
+        assert sketch.quantile(1) == pytest.approx(0.25, rel=RELATIVE_ACCURACY)
+        assert DDSketch().quantile(0.5) is None
+
+    def test_collapse_keeps_high_quantiles(self):
+        counts = {1.05**exponent: 1 for exponent in range(-MAX_BINS, MAX_BINS)}
+
+        sketch = DDSketch.from_counts(counts)
+
+        assert len(sketch.bins) == MAX_BINS
+        assert sketch.count() == len(counts)
+        exact = exact_quantile(counts, 0.99)
+        assert abs(sketch.quantile(0.99) - exact) <= RELATIVE_ACCURACY * exact
+
+    def test_bytes_round_trip(self):
+        sketch = DDSketch.from_counts({0: 2, **lognormal_counts(2)})
+
+        restored = DDSketch.from_bytes(sketch.to_bytes())
+
+        assert (restored.zeros, restored.bins) == (sketch.zeros, sketch.bins)
+        assert DDSketch.from_bytes(b'').count() == 0
+
+    def test_unknown_format_rejected(self):
+        with pytest.raises(ValueError):
+            DDSketch.from_bytes(b'\x02' + DDSketch().to_bytes()[1:])
@@ -0,0 +1,137 @@
+import asyncio
+
+from datetime import UTC
+from datetime import datetime
+
+import pytest
+
+from sqlalchemy import text
+
+from apps.api.v1.models.server_model import ServerModel
+from apps.services.dimensions import DimensionResolver
+from apps.services.dimensions import LruCache
+from apps.services.dimensions import resolve_dimensions
+from apps.services.log_batch_writer import LogBatchWriter
+from apps.services.log_rows import COLUMN_INDEX
+from apps.services.log_rows import ColumnBatch
+from apps.services.log_rows import record_to_row
+from tests.conftest import get_test_connector
+
+
+def make_row(uri: str, user_agent: str | None = 'curl/8.4.0') -> tuple:
+    return record_to_row(
+        {
+            'server_id': 401,
+            'timestamp': datetime(2024, 12, 25, 10, 30, tzinfo=UTC),
+            'remote_addr': '10.4.0.1',
+            'method': 'GET',
+            'uri': uri,
+            'http_version': 'HTTP/1.1',
+            'status': 200,
+            'size': 1,
+            'referrer': None,
+            'user_agent': user_agent,
+        }
+    )
+
+
+async def resolve(resolver: DimensionResolver, *batches: ColumnBatch) -> list[ColumnBatch]:
+    """Разрешает id на отдельном соединении тестовой БД."""
+    connector = get_test_connector()
+    engine = connector.get_pg_engine(sql_alchemy_uri=connector.sql_alchemy_uri)
+    async with engine.connect() as conn:
+        raw_connection = await conn.get_raw_connection()
+        return await resolver.resolve(raw_connection.driver_connection, batches)
+
+
+@pytest.mark.services
+class TestDimensions:
+    """Тесты справочников URI, referrer и user agent."""
+
+    @pytest.fixture(autouse=True)
+    async def clean_tables(self, session):
+        await session.execute(
+            text(
+                'TRUNCATE nginx_parser_schema.log_entry_model, nginx_parser_schema.server_model, '
+                'nginx_parser_schema.uri_model, nginx_parser_schema.referrer_model, '
+                'nginx_parser_schema.user_agent_model CASCADE'
+            )
+        )
+        session.add(ServerModel(id=401, name='dimension-server', ip_address='10.4.0.1'))
+        await session.commit()
+
+    async def count(self, session, table: str) -> int:
+        result = await session.execute(text(f'SELECT COUNT(*) FROM nginx_parser_schema.{table}'))
+        return result.scalar()
+
+    def test_lru_cache_evicts_least_recently_used(self):
+        cache = LruCache(max_size=2)
+        cache.put('a', 1)
+        cache.put('b', 2)
+
+        assert cache.get('a') == 1
+        cache.put('c', 3)
+
+        assert cache.get('b') is None
+        assert (cache.get('a'), cache.get('c'), len(cache)) == (1, 3, 2)
+
+    async def test_resolver_replaces_values_with_ids(self, session):
+        resolver = DimensionResolver()
+        first = ColumnBatch.from_rows([make_row('/a'), make_row('/b', None)])
+        second = ColumnBatch.from_rows([make_row('/a')])
+
+        stored_first, stored_second = await resolve(resolver, first, second)
+
+        uri_ids = stored_first.columns[COLUMN_INDEX['uri']]
+        agent_ids = stored_first.columns[COLUMN_INDEX['user_agent']]
+        assert uri_ids[0] != uri_ids[1]
+        assert stored_second.columns[COLUMN_INDEX['uri']] == [uri_ids[0]]
+        assert agent_ids[1] is None
+        assert stored_first.columns[COLUMN_INDEX['referrer']] == [None, None]
+        assert await self.count(session, 'uri_model') == 2
+        assert await self.count(session, 'user_agent_model') == 1
+        assert resolver.stats()['uri'] == {'hits': 0, 'misses': 2, 'cached': 2}
+
+    async def test_cached_values_do_not_hit_database(self, session):
+        resolver = DimensionResolver()
+        batch = ColumnBatch.from_rows([make_row('/a')])
+        (first,) = await resolve(resolver, batch)
+
+        (second,) = await resolve(resolver, batch)
+
+        assert list(first) == list(second)
+        assert resolver.stats()['uri'] == {'hits': 1, 'misses': 1, 'cached': 1}
+
+    async def test_cold_caches_agree_on_ids(self, session):
+        batch = ColumnBatch.from_rows([make_row(f'/item/{index}') for index in range(50)])
+
+        results = await asyncio.gather(
+            resolve(DimensionResolver(), batch), resolve(DimensionResolver(), batch)
+        )
+
+        (first,), (second,) = results
+        assert list(first) == list(second)
+        assert await self.count(session, 'uri_model') == 50
+
+    async def test_writer_stores_each_value_once(self, session):
+        async with LogBatchWriter(
+            batch_size=1000, flush_interval=60, db_connector=get_test_connector()
+        ) as writer:
+            await writer.add_rows([make_row(f'/item/{index % 3}') for index in range(30)])
+
+        assert writer.written_rows == 30
+        assert await self.count(session, 'uri_model') == 3
+        assert await self.count(session, 'user_agent_model') == 1
+
+    async def test_resolve_dimensions_for_orm_records(self, session):
+        record = {'uri': '/orm', 'referrer': None, 'user_agent': 'curl/8.4.0', 'status': 200}
+
+        first = await resolve_dimensions(session, record)
+        second = await resolve_dimensions(session, record)
+        await session.commit()
+
+        assert first == second
+        assert first['referrer_id'] is None
+        assert first['status'] == 200
+        assert 'uri' not in first
+        assert await self.count(session, 'uri_model') == 1
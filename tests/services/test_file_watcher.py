@@ -0,0 +1,170 @@
+import asyncio
+import sys
+import time
+
+from unittest.mock import patch
+
+import pytest
+
+from apps.services.file_watcher import EVENT_HEADER
+from apps.services.file_watcher import IN_Q_OVERFLOW
+from apps.services.file_watcher import InotifyFileWatcher
+from apps.services.file_watcher import PollingFileWatcher
+from apps.services.file_watcher import create_file_watcher
+from apps.services.nginx_log_parser import NginxLogParser
+
+LOG_LINE = (
+    '192.168.1.100 - - [25/Dec/2024:10:30:15 +0300] "GET /api/users HTTP/1.1" '
+    '200 1234 "-" "curl/8.4.0"\n'
+)
+
+linux_only = pytest.mark.skipif(
+    not sys.platform.startswith('linux'), reason='inotify есть только в Linux'
+)
+
+
+@pytest.mark.services
+class TestCreateFileWatcher:
+    """Выбор реализации наблюдателя."""
+
+    @linux_only
+    async def test_inotify_on_linux(self, tmp_path):
+        log_file = tmp_path / 'access.log'
+        log_file.touch()
+
+        watcher = create_file_watcher(log_file)
+        try:
+            assert isinstance(watcher, InotifyFileWatcher)
+        finally:
+            watcher.close()
+
+    async def test_polling_when_inotify_disabled(self, tmp_path):
+        log_file = tmp_path / 'access.log'
+        log_file.touch()
+
+        with patch('apps.services.file_watcher.SETTINGS.MONITOR_USE_INOTIFY', False):
+            watcher = create_file_watcher(log_file)
+
+        assert isinstance(watcher, PollingFileWatcher)
+
+    async def test_polling_when_inotify_fails(self, tmp_path):
+        log_file = tmp_path / 'access.log'
+        log_file.touch()
+
+        with (
+            patch('apps.services.file_watcher.sys.platform', 'linux'),
+            patch(
+                'apps.services.file_watcher.InotifyFileWatcher',
+                side_effect=OSError('inotify_init1 failed'),
+            ),
+        ):
+            watcher = create_file_watcher(log_file)
+
+        assert isinstance(watcher, PollingFileWatcher)
+
+
+@linux_only
+@pytest.mark.services
+class TestInotifyFileWatcher:
+    """Тесты наблюдателя на inotify."""
+
+    async def test_wakes_up_on_append(self, tmp_path):
+        log_file = tmp_path / 'access.log'
+        log_file.touch()
+        watcher = InotifyFileWatcher(log_file)
+
+        try:
+            waiter = asyncio.create_task(watcher.wait())
+            await asyncio.sleep(0.05)
+            assert not waiter.done()
+
+            started = time.monotonic()
+            with open(log_file, 'a') as f:
+                f.write(LOG_LINE)
+
+            await asyncio.wait_for(waiter, timeout=1)
+            assert time.monotonic() - started < 0.5
+        finally:
+            watcher.close()
+
+    async def test_ignores_other_files_in_directory(self, tmp_path):
+        log_file = tmp_path / 'access.log'
+        log_file.touch()
+        watcher = InotifyFileWatcher(log_file)
+
+        try:
+            (tmp_path / 'error.log').write_text('error\n')
+
+            with pytest.raises(TimeoutError):
+                await asyncio.wait_for(watcher.wait(), timeout=0.2)
+        finally:
+            watcher.close()
+
+    async def test_follows_file_after_rename_rotation(self, tmp_path):
+        log_file = tmp_path / 'access.log'
+        log_file.touch()
+        watcher = InotifyFileWatcher(log_file)
+
+        try:
+            log_file.rename(tmp_path / 'access.log.1')
+            log_file.touch()
+            await asyncio.wait_for(watcher.wait(), timeout=1)
+
+            with open(log_file, 'a') as f:
+                f.write(LOG_LINE)
+
+            await asyncio.wait_for(watcher.wait(), timeout=1)
+        finally:
+            watcher.close()
+
+    async def test_removes_watches_of_rotated_files(self, tmp_path):
+        log_file = tmp_path / 'access.log'
+        log_file.touch()
+        watcher = InotifyFileWatcher(log_file)
+
+        try:
+            for index in range(1, 4):
+                log_file.rename(tmp_path / f'access.log.{index}')
+                log_file.touch()
+                await asyncio.wait_for(watcher.wait(), timeout=1)
+            assert len(watcher._file_wds) == 2
+
+            with open(log_file, 'a') as f:
+                f.write(LOG_LINE)
+            await asyncio.wait_for(watcher.wait(), timeout=1)
+
+            assert len(watcher._file_wds) == 1
+        finally:
+            watcher.close()
+
+    async def test_queue_overflow_wakes_up(self, tmp_path):
+        log_file = tmp_path / 'access.log'
+        log_file.touch()
+        watcher = InotifyFileWatcher(log_file)
+
+        try:
+            overflow = EVENT_HEADER.pack(-1, IN_Q_OVERFLOW, 0, 0)
+            with patch('apps.services.file_watcher.os.read', return_value=overflow):
+                watcher._on_readable()
+
+            await asyncio.wait_for(watcher.wait(), timeout=1)
+        finally:
+            watcher.close()
+
+    async def test_tail_picks_up_line_without_poll_delay(self, tmp_path):
+        log_file = tmp_path / 'access.log'
+        log_file.touch()
+        parser = NginxLogParser(str(log_file))
+        tail = parser.tail_log_file()
+
+        try:
+            next_batch = asyncio.create_task(anext(tail))
+            await asyncio.sleep(0.05)
+
+            with open(log_file, 'a') as f:
+                f.write(LOG_LINE)
+
+            lines = await asyncio.wait_for(next_batch, timeout=0.5)
+            assert lines == [LOG_LINE.strip()]
+        finally:
+            await tail.aclose()
@@ -0,0 +1,53 @@
+import pytest
+
+from apps.services.hyperloglog import HyperLogLog
+
+
+def addresses(start: int, stop: int) -> list[str]:
+    return [f'10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}' for i in range(start, stop)]
+
+
+@pytest.mark.services
+class TestHyperLogLog:
+    """Тесты скетча HyperLogLog."""
+
+    def test_empty_sketch_counts_zero(self):
+        assert HyperLogLog().count() == 0
+        assert HyperLogLog.from_bytes(b'').count() == 0
+
+    def test_small_counts_are_exact(self):
+        sketch = HyperLogLog.from_values(['10.0.0.1', '10.0.0.2', '10.0.0.1', '10.0.0.3'])
+
+        assert sketch.count() == 3
+
+    @pytest.mark.parametrize('distinct', [1_000, 50_000])
+    def test_estimate_within_two_percent(self, distinct):
+        sketch = HyperLogLog.from_values(addresses(0, distinct))
+
+        assert abs(sketch.count() - distinct) <= distinct * 0.02
+
+    def test_add_matches_from_values(self):
+        values = addresses(0, 2_000)
+        sketch = HyperLogLog()
+        for value in values:
+            sketch.add(value)
+
+        assert sketch.layers == HyperLogLog.from_values(values).layers
+
+    def test_merge_equals_sketch_of_union(self):
+        merged = HyperLogLog.from_values(addresses(0, 3_000))
+        merged.update(HyperLogLog.from_values(addresses(2_000, 5_000)))
+
+        assert merged.layers == HyperLogLog.from_values(addresses(0, 5_000)).layers
+
+    def test_bytes_round_trip(self):
+        sketch = HyperLogLog.from_values(addresses(0, 10_000))
+
+        restored = HyperLogLog.from_bytes(sketch.to_bytes())
+
+        assert restored.layers == sketch.layers
+        assert restored.count() == sketch.count()
+
+    def test_unknown_format_rejected(self):
+        with pytest.raises(ValueError):
+            HyperLogLog.from_bytes(b'\x02\x0e' + HyperLogLog().to_bytes()[2:])
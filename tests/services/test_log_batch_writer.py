@@ -0,0 +1,229 @@
+import asyncio
+
+from datetime import UTC
+from datetime import datetime
+from unittest.mock import patch
+
+import orjson
+import pytest
+
+from sqlalchemy import text
+
+from apps.api.v1.models.server_model import ServerModel
+from apps.services.log_batch_writer import LogBatchWriter
+from apps.services.log_rows import record_to_row
+from apps.services.parse_failures import DB_REJECTED
+from apps.services.parse_failures import DeadLetterFile
+from apps.services.source_key import source_key
+from tests.conftest import get_test_connector
+
+
+def make_log_data(index: int) -> dict:
+    return {
+        'server_id': 201,
+        'timestamp': datetime(2024, 12, 25, 10, 30, index % 60, tzinfo=UTC),
+        'remote_addr': f'10.1.0.{index % 250}',
+        'method': 'GET',
+        'uri': f'/api/items/{index}',
+        'http_version': 'HTTP/1.1',
+        'status': 200,
+        'size': index,
+        'referrer': None,
+        'user_agent': 'curl/8.4.0',
+    }
+
+
+@pytest.mark.services
+class TestLogBatchWriter:
+    """Тесты пакетной записи логов."""
+
+    @pytest.fixture(autouse=True)
+    async def clean_tables(self, session):
+        await session.execute(
+            text(
+                'TRUNCATE nginx_parser_schema.log_entry_model, nginx_parser_schema.server_model CASCADE'
+            )
+        )
+        session.add(ServerModel(id=201, name='batch-server', ip_address='10.1.0.1'))
+        await session.commit()
+
+    async def count_rows(self, session) -> int:
+        result = await session.execute(
+            text('SELECT COUNT(*) FROM nginx_parser_schema.log_entry_model')
+        )
+        return result.scalar()
+
+    async def test_flushes_when_batch_is_full(self, session):
+        writer = LogBatchWriter(batch_size=3, flush_interval=60, db_connector=get_test_connector())
+
+        for index in range(4):
+            await writer.add(make_log_data(index))
+
+        assert writer.written_rows == 3
+        assert writer.pending_rows == 1
+        assert await self.count_rows(session) == 3
+
+    async def test_add_rows_accepts_prepared_rows(self, session):
+        writer = LogBatchWriter(batch_size=5, flush_interval=60, db_connector=get_test_connector())
+
+        await writer.add_rows([record_to_row(make_log_data(index)) for index in range(3)])
+        assert writer.pending_rows == 3
+
+        await writer.add_rows([record_to_row(make_log_data(index)) for index in range(3, 6)])
+
+        assert writer.written_rows == 6
+        assert await self.count_rows(session) == 6
+
+    async def test_writes_log_format_columns(self, session):
+        log_data = make_log_data(1) | {
+            'request_time': 0.25,
+            'upstream_response_time': 0.2,
+            'host': 'example.com',
+            'request_id': 'abc123',
+            'extra': {'upstream_cache_status': 'HIT'},
+        }
+
+        async with LogBatchWriter(db_connector=get_test_connector()) as writer:
+            await writer.add(log_data)
+            await writer.add(make_log_data(2))
+
+        result = await session.execute(
+            text(
+                'SELECT request_time, upstream_response_time, host, request_id, extra '
+                'FROM nginx_parser_schema.log_entry_model ORDER BY size'
+            )
+        )
+        assert result.all() == [
+            (0.25, 0.2, 'example.com', 'abc123', {'upstream_cache_status': 'HIT'}),
+            (None, None, None, None, None),
+        ]
+
+    async def test_flushes_by_age(self, session):
+        async with LogBatchWriter(
+            batch_size=1000, flush_interval=0.05, db_connector=get_test_connector()
+        ) as writer:
+            await writer.add(make_log_data(1))
+            await asyncio.sleep(0.3)
+
+            assert writer.pending_rows == 0
+            assert writer.written_rows == 1
+
+        assert await self.count_rows(session) == 1
+
+    async def test_flushes_rest_on_exit(self, session):
+        async with LogBatchWriter(
+            batch_size=1000, flush_interval=60, db_connector=get_test_connector()
+        ) as writer:
+            for index in range(10):
+                await writer.add(make_log_data(index))
+
+        assert writer.written_rows == 10
+        assert await self.count_rows(session) == 10
+
+        result = await session.execute(
+            text(
+                'SELECT uri.value, entry.size FROM nginx_parser_schema.log_entry_model AS entry '
+                'JOIN nginx_parser_schema.uri_model AS uri ON uri.id = entry.uri_id '
+                'ORDER BY entry.size LIMIT 1'
+            )
+        )
+        assert tuple(result.fetchone()) == ('/api/items/0', 0)
+
+    async def test_failed_batch_is_counted_and_dropped(self, session):
+        writer = LogBatchWriter(
+            batch_size=1000, flush_interval=60, db_connector=get_test_connector()
+        )
+        broken = make_log_data(1) | {'server_id': 999}
+
+        await writer.add(broken)
+        written = await writer.flush()
+
+        assert written == 0
+        assert writer.failed_rows == 1
+        assert writer.pending_rows == 0
+        assert await self.count_rows(session) == 0
+
+    async def test_rejected_rows_are_isolated_from_batch(self, session, tmp_path):
+        dead_letter = DeadLetterFile(tmp_path / 'dead_letter.jsonl')
+        writer = LogBatchWriter(
+            batch_size=1000,
+            flush_interval=60,
+            db_connector=get_test_connector(),
+            dead_letter=dead_letter,
+        )
+        for index in range(100):
+            await writer.add(make_log_data(index))
+        await writer.add(make_log_data(100) | {'http_version': 'HTTP/1.1 extra'})
+        await writer.add(make_log_data(101) | {'uri': '/' + 'a' * 3000})
+
+        written = await writer.flush()
+
+        assert written == 100
+        assert (writer.written_rows, writer.failed_rows) == (100, 2)
+        assert await self.count_rows(session) == 100
+        entries = [orjson.loads(line) for line in dead_letter.path.read_bytes().splitlines()]
+        assert [entry['reason'] for entry in entries] == [DB_REJECTED, DB_REJECTED]
+        assert entries[0]['line'] is None
+        assert entries[0]['row']['http_version'] == 'HTTP/1.1 extra'
+        assert entries[1]['row']['size'] == 101
+
+    async def test_markers_are_reported_after_flush(self, session):
+        flushed_markers = []
+        writer = LogBatchWriter(
+            batch_size=1000,
+            flush_interval=60,
+            db_connector=get_test_connector(),
+            on_flush=flushed_markers.extend,
+        )
+
+        writer.mark('empty')
+        assert flushed_markers == ['empty']
+
+        await writer.add(make_log_data(1))
+        writer.mark('first')
+        assert flushed_markers == ['empty']
+
+        await writer.flush()
+        assert flushed_markers == ['empty', 'first']
+
+    async def test_rows_with_source_key_are_written_once(self, session):
+        def keyed(index: int) -> dict:
+            return {**make_log_data(index), 'source_key': source_key('access.log', index)}
+
+        async with LogBatchWriter(batch_size=4, db_connector=get_test_connector()) as writer:
+            for index in range(6):
+                await writer.add(keyed(index))
+            for index in (*range(3, 9), 5):
+                await writer.add(keyed(index))
+            await writer.add(make_log_data(100))
+            await writer.add(make_log_data(100))
+
+        assert writer.written_rows == 11
+        assert writer.duplicate_rows == 4
+        assert await self.count_rows(session) == 11
+
+    async def test_unavailable_database_is_retried(self, session):
+        writer = LogBatchWriter(
+            batch_size=1000, flush_interval=60, db_connector=get_test_connector()
+        )
+        copy_records = writer._copy_records
+        attempts = 0
+
+        async def flaky_copy(batch):
+            nonlocal attempts
+            attempts += 1
+            if attempts < 3:
+                raise ConnectionRefusedError('db is down')
+            return await copy_records(batch)
+
+        await writer.add(make_log_data(1))
+        with (
+            patch.object(writer, '_copy_records', flaky_copy),
+            patch('apps.services.log_batch_writer.RETRY_BACKOFF_SECONDS', (0,)),
+        ):
+            written = await writer.flush()
+
+        assert attempts == 3
+        assert written == 1
+        assert writer.failed_rows == 0
+        assert await self.count_rows(session) == 1
@@ -0,0 +1,137 @@
+from datetime import UTC
+from datetime import datetime
+
+import pytest
+
+from apps.services.log_format import COMBINED_FORMAT
+from apps.services.log_format import compile_log_format
+from apps.services.log_format import unwrap_log_format
+from apps.services.nginx_log_parser import NginxLogParser
+
+COMBINED_LINE = (
+    '192.168.1.100 - - [25/Dec/2024:10:30:15 +0300] "GET /api/users HTTP/1.1" '
+    '200 1234 "https://example.com" "Mozilla/5.0"'
+)
+TIMED_FORMAT = (
+    '$remote_addr - $remote_user [$time_local] "$request" $status $body_bytes_sent '
+    '"$http_referer" "$http_user_agent" rt=$request_time urt="$upstream_response_time" '
+    'host=$host rid=$request_id cache=$upstream_cache_status'
+)
+TIMED_LINE = (
+    '10.0.0.1 - alice [25/Dec/2024:10:30:15 +0300] "POST /api/orders HTTP/2.0" 201 17 '
+    '"-" "curl/8.5.0" rt=0.125 urt="0.050, 0.020 : 0.010" host=shop.example.com '
+    'rid=5f2b7c0e9d cache=HIT'
+)
+
+
+@pytest.mark.services
+class TestCompileLogFormat:
+    """Тесты компиляции log_format в парсер."""
+
+    async def test_combined_matches_default_parser(self):
+        default = await NginxLogParser('access.log').parse_log_line(COMBINED_LINE)
+
+        record = compile_log_format('combined').parse(COMBINED_LINE)
+
+        assert record | {'server_id': 1} == default | {'extra': None}
+
+    def test_known_variables_are_typed_and_rest_go_to_extra(self):
+        record = compile_log_format(TIMED_FORMAT).parse(TIMED_LINE)
+
+        assert record == {
+            'remote_addr': '10.0.0.1',
+            'timestamp': datetime(2024, 12, 25, 7, 30, 15, tzinfo=UTC),
+            'method': 'POST',
+            'uri': '/api/orders',
+            'http_version': 'HTTP/2.0',
+            'status': 201,
+            'size': 17,
+            'referrer': None,
+            'user_agent': 'curl/8.5.0',
+            'request_time': 0.125,
+            'upstream_response_time': pytest.approx(0.08),
+            'host': 'shop.example.com',
+            'request_id': '5f2b7c0e9d',
+            'extra': {'remote_user': 'alice', 'upstream_cache_status': 'HIT'},
+        }
+
+    def test_dash_values_are_empty(self):
+        line = (
+            '10.0.0.1 - - [25/Dec/2024:10:30:15 +0300] "GET / HTTP/1.1" 502 0 "-" "-" '
+            'rt=0.001 urt="-" host=- rid=- cache=-'
+        )
+
+        record = compile_log_format(TIMED_FORMAT).parse(line)
+
+        assert record['upstream_response_time'] is None
+        assert record['host'] is None
+        assert record['request_id'] is None
+        assert record['extra'] is None
+
+    def test_alternative_time_and_request_variables(self):
+        log_format = (
+            '$time_iso8601|$msec|$remote_addr|$request_method|$request_uri|'
+            '$server_protocol|$status|$body_bytes_sent'
+        )
+        line = '2024-12-25T10:30:15+03:00|1735111815.123|::1|GET|/health|HTTP/1.1|200|2'
+
+        record = compile_log_format(log_format).parse(line)
+
+        assert record['timestamp'] == datetime(2024, 12, 25, 7, 30, 15, 123000, tzinfo=UTC)
+        assert (record['method'], record['uri'], record['http_version']) == (
+            'GET',
+            '/health',
+            'HTTP/1.1',
+        )
+
+    def test_line_of_other_format_is_rejected(self):
+        assert compile_log_format(TIMED_FORMAT).parse(COMBINED_LINE) is None
+        assert compile_log_format('main').parse('not a log line') is None
+
+    def test_invalid_value_raises_value_error(self):
+        line = COMBINED_LINE.replace('25/Dec/2024', '25/Foo/2024')
+
+        with pytest.raises(ValueError):
+            compile_log_format('combined').parse(line)
+
+    def test_parsers_are_cached_by_format(self):
+        assert compile_log_format(TIMED_FORMAT) is compile_log_format(TIMED_FORMAT)
+        assert compile_log_format('combined').log_format == COMBINED_FORMAT
+
+    @pytest.mark.parametrize(
+        'log_format',
+        [
+            '$remote_addr $status',
+            '$remote_addr [$time_local] "$request" $status$body_bytes_sent',
+        ],
+    )
+    def test_unusable_formats_are_rejected(self, log_format):
+        with pytest.raises(ValueError):
+            compile_log_format(log_format)
+
+    def test_directive_from_nginx_conf_is_unwrapped(self):
+        directive = (
+            'log_format  timed  \'$remote_addr - $remote_user [$time_local] "$request" \'\n'
+            '                   \'$status $body_bytes_sent "$http_referer" "$http_user_agent"\';'
+        )
+
+        assert unwrap_log_format(directive) == COMBINED_FORMAT
+        assert unwrap_log_format(COMBINED_FORMAT) == COMBINED_FORMAT
+
+
+@pytest.mark.services
+class TestParserWithLogFormat:
+    """NginxLogParser с заданным log_format."""
+
+    def test_adds_server_id(self):
+        parser = NginxLogParser('access.log', server_id=7, log_format=TIMED_FORMAT)
+
+        record = parser.parse_line(TIMED_LINE + '\n')
+
+        assert record['server_id'] == 7
+        assert record['request_time'] == 0.125
+
+    def test_bad_value_is_skipped(self):
+        parser = NginxLogParser('access.log', log_format='combined')
+
+        assert parser.parse_line(COMBINED_LINE.replace('"GET /api/users', '"GET')) is None
@@ -0,0 +1,226 @@
+import gzip
+
+from datetime import UTC
+from datetime import datetime
+from itertools import pairwise
+
+import pytest
+
+from sqlalchemy import text
+
+from apps.api.v1.models.server_model import ServerModel
+from apps.services import log_import
+from apps.services.hyperloglog import HyperLogLog
+from apps.services.log_import import LogImporter
+from apps.services.log_import import encode_copy_row
+from apps.services.log_import import iter_compressed_blocks
+from apps.services.log_import import split_file
+from apps.services.log_rows import EXTRA_COLUMN
+from apps.services.log_rows import SOURCE_KEY_COLUMN
+from apps.services.parse_failures import DB_REJECTED
+from apps.services.parse_failures import DeadLetterFile
+from apps.services.sketches import bucket_sketches
+from tests.conftest import get_test_connector
+
+LINE = (
+    '10.2.0.{index} - - [25/Dec/2024:10:30:15 +0300] "GET /import/{index} HTTP/1.1" '
+    '200 {index} "-" "curl/8.5.0"\n'
+)
+
+
+def make_log(lines: int, start: int = 0) -> str:
+    content = ''.join(LINE.format(index=index) for index in range(start, start + lines))
+    return content.replace(LINE.format(index=start + 3), 'broken line\n')
+
+
+@pytest.mark.services
+class TestChunking:
+    """Разбиение файлов на куски по границам строк."""
+
+    def test_split_file_is_newline_aligned(self, tmp_path):
+        log_file = tmp_path / 'access.log'
+        log_file.write_text(make_log(100))
+        data = log_file.read_bytes()
+
+        ranges = split_file(log_file, 1000)
+
+        assert len(ranges) > 1
+        assert ranges[0][0] == 0
+        assert ranges[-1][1] == len(data)
+        assert all(prev[1] == current[0] for prev, current in pairwise(ranges))
+        assert all(data[end - 1 : end] == b'\n' for _, end in ranges)
+
+    def test_compressed_blocks_restore_file(self, tmp_path):
+        log_file = tmp_path / 'access.log.2.gz'
+        content = make_log(500).encode()
+        with gzip.open(log_file, 'wb') as f:
+            f.write(content)
+
+        blocks = list(iter_compressed_blocks(log_file, 4096))
+
+        assert b''.join(block for _, block in blocks) == content
+        assert all(block.endswith(b'\n') for _, block in blocks)
+        assert sum(size for size, _ in blocks) == log_file.stat().st_size
+
+    def test_copy_row_escapes_special_characters(self):
+        record = {
+            'server_id': 1,
+            'timestamp': datetime(2024, 1, 1, tzinfo=UTC),
+            'uri': '/a\tb\\c\nd',
+            'referrer': None,
+            'extra': {'note': 'x\ty'},
+        }
+
+        fields = encode_copy_row(record).split('\t')
+
+        assert '/a\\tb\\\\c\\nd' in fields
+        assert fields.count('\\N') >= 2
+        assert fields[EXTRA_COLUMN] == '{"note":"x\\\\ty"}'
+        assert fields[SOURCE_KEY_COLUMN] == '\\N'
+
+
+@pytest.mark.services
+class TestLogImporter:
+    """Импорт файлов в БД через пул процессов."""
+
+    @pytest.fixture(autouse=True)
+    async def clean_tables(self, session):
+        await session.execute(
+            text(
+                'TRUNCATE nginx_parser_schema.log_entry_model, nginx_parser_schema.server_model CASCADE'
+            )
+        )
+        session.add(ServerModel(id=301, name='import-server', ip_address='10.2.0.1'))
+        await session.commit()
+
+    async def test_imports_plain_and_gzip_files(self, session, tmp_path):
+        plain = tmp_path / 'access.log.1'
+        plain.write_text(make_log(300))
+        compressed = tmp_path / 'access.log.2.gz'
+        with gzip.open(compressed, 'wt') as f:
+            f.write(make_log(200, start=1000))
+
+        importer = LogImporter(
+            [plain, compressed],
+            server_id=301,
+            workers=2,
+            chunk_bytes=2048,
+            db_connector=get_test_connector(),
+        )
+        await importer.run()
+
+        result = await session.execute(
+            text(
+                'SELECT COUNT(*), COUNT(DISTINCT uri_id), MIN(server_id) '
+                'FROM nginx_parser_schema.log_entry_model'
+            )
+        )
+        assert result.one() == (498, 498, 301)
+        assert importer.written_rows == 498
+        assert importer.rejected_rows == 2
+        assert importer.done_bytes == importer.total_bytes
+
+    async def test_reimport_and_compressed_copy_are_not_duplicated(self, session, tmp_path):
+        plain = tmp_path / 'access.log.1'
+        plain.write_text(make_log(300))
+        compressed = tmp_path / 'access.log.1.gz'
+        with gzip.open(compressed, 'wb') as f:
+            f.write(plain.read_bytes())
+
+        def importer(paths) -> LogImporter:
+            return LogImporter(
+                paths, server_id=301, workers=2, chunk_bytes=2048, db_connector=get_test_connector()
+            )
+
+        first = importer([plain])
+        await first.run()
+        again = importer([plain, compressed])
+        await again.run()
+
+        result = await session.execute(
+            text('SELECT COUNT(*) FROM nginx_parser_schema.log_entry_model')
+        )
+        assert result.scalar() == 299
+        assert first.written_rows == 299
+        assert again.written_rows == 0
+        assert again.duplicate_rows == 598
+
+    async def test_imports_lines_from_dead_letter_file(self, session, tmp_path):
+        dead_letter = tmp_path / 'dead_letter.jsonl'
+        DeadLetterFile(dead_letter).write(
+            [
+                {
+                    'file': 'access.log',
+                    'offset': 0,
+                    'server_id': 301,
+                    'reason': 'no_match',
+                    'line': line,
+                }
+                for line in make_log(10).splitlines()
+            ]
+            + [{'server_id': 301, 'reason': DB_REJECTED, 'line': None, 'row': {'size': 1}}]
+        )
+        with open(dead_letter, 'a') as f:
+            f.write('{"broken json\n')
+
+        importer = LogImporter(
+            [dead_letter],
+            server_id=301,
+            workers=1,
+            chunk_bytes=512,
+            db_connector=get_test_connector(),
+            dead_letter=True,
+        )
+        await importer.run()
+
+        result = await session.execute(
+            text('SELECT COUNT(*) FROM nginx_parser_schema.log_entry_model')
+        )
+        assert result.scalar() == 9
+        assert importer.rejected_rows == 1
+        assert importer.done_bytes == importer.total_bytes
+
+    async def test_rejected_rows_do_not_lose_chunk(self, session):
+        minute = datetime(2024, 12, 25, 7, 30, tzinfo=UTC)
+        records = [
+            {
+                'server_id': 301,
+                'timestamp': minute,
+                'remote_addr': f'10.2.1.{index}',
+                'method': 'X' * 20 if index == 7 else 'GET',
+                'uri': f'/chunk/{index}',
+                'http_version': 'HTTP/1.1',
+                'status': 200,
+                'size': index,
+            }
+            for index in range(20)
+        ]
+        payload = ''.join(encode_copy_row(record) + '\n' for record in records).encode()
+        sketches = bucket_sketches(
+            (minute, 301, record['remote_addr'], record['uri'], 1, record['size'], None)
+            for record in records
+        )
+
+        importer = LogImporter([], server_id=301, db_connector=get_test_connector())
+        await importer._copy_with_retry(payload, len(records), False, sketches)
+
+        result = await session.execute(
+            text('SELECT COUNT(*) FROM nginx_parser_schema.log_entry_model')
+        )
+        assert result.scalar() == 19
+        assert (importer.written_rows, importer.failed_rows, importer.duplicate_rows) == (19, 1, 0)
+        result = await session.execute(
+            text(
+                'SELECT unique_ips FROM nginx_parser_schema.log_sketch_minute_model '
+                'WHERE server_id = 301'
+            )
+        )
+        assert HyperLogLog.from_bytes(result.scalar_one()).count() == 19
+
+    async def test_zst_requires_zstandard(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(log_import, 'zstandard', None)
+        archive = tmp_path / 'access.log.3.zst'
+        archive.write_bytes(b'')
+
+        with pytest.raises(RuntimeError):
+            LogImporter([archive], db_connector=get_test_connector())
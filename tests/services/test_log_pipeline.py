@@ -0,0 +1,357 @@
+import asyncio
+import json
+
+from dataclasses import replace
+from datetime import UTC
+from datetime import datetime
+from datetime import timedelta
+from unittest.mock import patch
+
+import pytest
+
+from sqlalchemy import text
+
+from apps.api.v1.models.server_model import ServerModel
+from apps.services.log_pipeline import LogPipeline
+from apps.services.log_pipeline import LogSource
+from apps.services.monitor_targets import MonitorTarget
+from apps.services.nginx_log_parser import NginxLogParser
+from apps.services.parse_failures import DeadLetterFile
+from apps.services.tail_checkpoint import TailCheckpointStore
+from apps.settings import SETTINGS
+from apps.utils.metrics import REGISTRY
+from tests.conftest import get_test_connector
+from tests.helpers import stop
+from tests.helpers import wait_for
+
+LOG_LINE = (
+    '192.168.1.{index} - - [25/Dec/2024:10:30:15 +0300] "GET /api/items/{index} HTTP/1.1" '
+    '200 {index} "-" "curl/8.4.0"\n'
+)
+
+
+def append_lines(path, count: int, start: int = 0) -> None:
+    with open(path, 'a') as f:
+        f.writelines(LOG_LINE.format(index=index) for index in range(start, start + count))
+
+
+@pytest.mark.services
+class TestLogPipeline:
+    """Тесты конвейера чтение → разбор → запись."""
+
+    @pytest.fixture(autouse=True)
+    async def clean_tables(self, session):
+        await session.execute(
+            text(
+                'TRUNCATE nginx_parser_schema.log_entry_model, nginx_parser_schema.server_model CASCADE'
+            )
+        )
+        session.add(ServerModel(id=301, name='pipeline-server', ip_address='10.3.0.1'))
+        await session.commit()
+
+    async def test_appended_lines_reach_database(self, tmp_path, session):
+        log_file = tmp_path / 'access.log'
+        log_file.touch()
+
+        pipeline = LogPipeline(
+            NginxLogParser(str(log_file), server_id=301),
+            writers=2,
+            batch_size=10,
+            flush_interval=0.05,
+            db_connector=get_test_connector(),
+        )
+        task = asyncio.create_task(pipeline.run())
+        await asyncio.sleep(0.2)
+
+        append_lines(log_file, 25)
+
+        async def all_rows_written() -> bool:
+            result = await session.execute(
+                text('SELECT COUNT(*) FROM nginx_parser_schema.log_entry_model')
+            )
+            return result.scalar() == 25
+
+        await wait_for(all_rows_written)
+        await stop(task)
+
+        assert pipeline.stats()['written_rows'] == 25
+
+    async def test_restart_resumes_from_checkpoint(self, tmp_path, session):
+        log_file = tmp_path / 'access.log'
+        log_file.touch()
+        store_path = tmp_path / 'checkpoints.json'
+
+        async def rows_written(expected: int) -> None:
+            async def predicate() -> bool:
+                result = await session.execute(
+                    text('SELECT COUNT(*) FROM nginx_parser_schema.log_entry_model')
+                )
+                return result.scalar() == expected
+
+            await wait_for(predicate)
+
+        def start() -> asyncio.Task:
+            pipeline = LogPipeline(
+                NginxLogParser(str(log_file), server_id=301),
+                flush_interval=0.05,
+                db_connector=get_test_connector(),
+                checkpoint_store=TailCheckpointStore(store_path),
+            )
+            return asyncio.create_task(pipeline.run())
+
+        task = start()
+        await asyncio.sleep(0.2)
+        append_lines(log_file, 10)
+        await rows_written(10)
+        await stop(task)
+
+        append_lines(log_file, 5)
+
+        task = start()
+        await rows_written(15)
+        await asyncio.sleep(0.2)
+        await stop(task)
+
+        assert TailCheckpointStore(store_path).load(log_file).offset == log_file.stat().st_size
+
+    async def test_lines_read_again_after_crash_are_not_duplicated(self, tmp_path, session):
+        log_file = tmp_path / 'access.log'
+        log_file.touch()
+        store = TailCheckpointStore(tmp_path / 'checkpoints.json')
+
+        def start() -> tuple[LogPipeline, asyncio.Task]:
+            pipeline = LogPipeline(
+                NginxLogParser(str(log_file), server_id=301),
+                flush_interval=0.05,
+                db_connector=get_test_connector(),
+                checkpoint_store=store,
+            )
+            return pipeline, asyncio.create_task(pipeline.run())
+
+        async def rows_written(pipeline: LogPipeline, expected: int) -> None:
+            async def predicate() -> bool:
+                stats = pipeline.stats()
+                return stats['written_rows'] + stats['duplicate_rows'] == expected
+
+            await wait_for(predicate)
+
+        pipeline, task = start()
+        await asyncio.sleep(0.2)
+        append_lines(log_file, 10)
+        await rows_written(pipeline, 10)
+        await stop(task)
+
+        # Падение до сохранения чекпоинта: файл читается заново с начала.
+        store.save(log_file, replace(store.load(log_file), offset=0))
+        append_lines(log_file, 5, start=10)
+
+        pipeline, task = start()
+        await rows_written(pipeline, 15)
+        await stop(task)
+
+        result = await session.execute(
+            text('SELECT COUNT(*) FROM nginx_parser_schema.log_entry_model')
+        )
+        assert result.scalar() == 15
+        assert pipeline.stats()['duplicate_rows'] == 10
+
+    async def test_slow_writers_block_reader(self, tmp_path):
+        log_file = tmp_path / 'access.log'
+        log_file.touch()
+        release = asyncio.Event()
+
+        async def blocked_add_rows(self, rows):
+            await release.wait()
+
+        pipeline = LogPipeline(
+            NginxLogParser(str(log_file), server_id=301),
+            writers=1,
+            queue_size=2,
+            db_connector=get_test_connector(),
+        )
+
+        with (
+            patch('apps.services.log_pipeline.LINE_BATCH_SIZE', 1),
+            patch('apps.services.log_batch_writer.LogBatchWriter.add_rows', blocked_add_rows),
+        ):
+            task = asyncio.create_task(pipeline.run())
+            await asyncio.sleep(0.2)
+            append_lines(log_file, 20)
+
+            async def queues_are_full() -> bool:
+                stats = pipeline.stats()
+                return stats['line_queue'] == 2 and stats['record_queue'] == 2
+
+            await wait_for(queues_are_full)
+            await stop(task)
+
+    async def test_pipeline_stops_when_file_is_missing(self):
+        pipeline = LogPipeline(
+            NginxLogParser('/nonexistent/file.log', server_id=301),
+            db_connector=get_test_connector(),
+        )
+
+        await asyncio.wait_for(pipeline.run(), timeout=5)
+
+        assert pipeline.stats()['written_rows'] == 0
+
+    async def test_targets_share_writers_and_pick_up_new_files(self, tmp_path, session):
+        session.add(ServerModel(id=302, name='pipeline-server-2', ip_address='10.3.0.2'))
+        await session.commit()
+
+        api_log = tmp_path / 'api.access.log'
+        web_log = tmp_path / 'web.access.log'
+        api_log.touch()
+        web_log.touch()
+
+        pipeline = LogPipeline(
+            targets=[
+                MonitorTarget(str(tmp_path / 'api.*.log'), 301),
+                MonitorTarget(str(tmp_path / '*.access.log'), 302),
+            ],
+            writers=1,
+            flush_interval=0.05,
+            db_connector=get_test_connector(),
+        )
+        assert set(pipeline.sources) == {api_log, web_log}
+
+        async def rows_by_server() -> dict[int, int]:
+            result = await session.execute(
+                text(
+                    'SELECT server_id, COUNT(*) FROM nginx_parser_schema.log_entry_model '
+                    'GROUP BY server_id'
+                )
+            )
+            return dict(result.all())
+
+        with patch.object(SETTINGS, 'MONITOR_DISCOVERY_INTERVAL_SECONDS', 0.1):
+            task = asyncio.create_task(pipeline.run())
+            await asyncio.sleep(0.2)
+
+            append_lines(api_log, 3)
+            append_lines(web_log, 4, start=10)
+            new_log = tmp_path / 'shop.access.log'
+            append_lines(new_log, 5, start=20)
+
+            async def all_rows_written() -> bool:
+                return await rows_by_server() == {301: 3, 302: 9}
+
+            await wait_for(all_rows_written)
+            files = pipeline.stats()['files']
+            await stop(task)
+
+        assert files[str(new_log)] == {
+            'server_id': 302,
+            'unread_bytes': 0,
+            'in_flight_batches': 0,
+            'lag_seconds': 0.0,
+        }
+        assert len(pipeline.writers) == 1
+
+    async def test_parse_pool_preserves_line_order(self, tmp_path, session):
+        log_file = tmp_path / 'access.log'
+        log_file.touch()
+
+        pipeline = LogPipeline(
+            NginxLogParser(str(log_file), server_id=301),
+            writers=1,
+            flush_interval=0.05,
+            db_connector=get_test_connector(),
+            parse_workers=2,
+        )
+
+        with patch('apps.services.log_pipeline.LINE_BATCH_SIZE', 7):
+            task = asyncio.create_task(pipeline.run())
+            await asyncio.sleep(0.2)
+            append_lines(log_file, 200)
+
+            async def all_rows_written() -> bool:
+                return pipeline.stats()['written_rows'] == 200
+
+            await wait_for(all_rows_written)
+            await stop(task)
+
+        result = await session.execute(
+            text('SELECT size FROM nginx_parser_schema.log_entry_model ORDER BY id')
+        )
+        assert result.scalars().all() == list(range(200))
+
+    async def test_rejected_lines_go_to_dead_letter(self, tmp_path):
+        log_file = tmp_path / 'access.log'
+        log_file.touch()
+        dead_letter = DeadLetterFile(tmp_path / 'dead_letter.jsonl')
+
+        pipeline = LogPipeline(
+            NginxLogParser(str(log_file), server_id=301),
+            flush_interval=0.05,
+            db_connector=get_test_connector(),
+            dead_letter=dead_letter,
+        )
+
+        with patch('apps.services.log_pipeline.LINE_BATCH_SIZE', 3):
+            task = asyncio.create_task(pipeline.run())
+            await asyncio.sleep(0.2)
+            append_lines(log_file, 4)
+            with open(log_file, 'a') as f:
+                f.write('GET /wp-login.php бот\n')
+                f.write(LOG_LINE.format(index=9).replace('25/Dec', '25/Foo'))
+            append_lines(log_file, 1)
+
+            async def all_lines_parsed() -> bool:
+                return pipeline.stats()['written_rows'] == 5
+
+            await wait_for(all_lines_parsed)
+            stats = pipeline.stats()
+            await stop(task)
+
+        assert stats['parsed_lines'] == 5
+        assert stats['rejected_lines'] == {'no_match': 1, 'bad_value': 1}
+        assert stats['failure_ratio'] == pytest.approx(2 / 7)
+
+        data = log_file.read_bytes()
+        entries = [json.loads(line) for line in dead_letter.path.read_text().splitlines()]
+        assert [entry['reason'] for entry in entries] == ['no_match', 'bad_value']
+        for entry in entries:
+            line = entry['line'].encode()
+            assert data[entry['offset'] : entry['offset'] + len(line)] == line
+            assert entry['server_id'] == 301
+
+    async def test_metrics_expose_lines_and_tail_lag(self, tmp_path):
+        log_file = tmp_path / 'access.log'
+        log_file.touch()
+
+        pipeline = LogPipeline(
+            NginxLogParser(str(log_file), server_id=301),
+            flush_interval=0.05,
+            db_connector=get_test_connector(),
+        )
+        task = asyncio.create_task(pipeline.run())
+        await asyncio.sleep(0.2)
+        append_lines(log_file, 3)
+
+        async def all_rows_written() -> bool:
+            return pipeline.stats()['written_rows'] == 3
+
+        await wait_for(all_rows_written)
+        metrics = REGISTRY.render()
+        await stop(task)
+
+        assert 'nginx_analyzer_monitor_lines_total{server_id="301",outcome="parsed"}' in metrics
+        assert (
+            f'nginx_analyzer_monitor_tail_lag_bytes{{file="{log_file}",server_id="301"}} 0'
+            in metrics
+        )
+        assert 'nginx_analyzer_monitor_queue_depth{queue="line"} 0' in metrics
+        assert 'nginx_analyzer_batch_write_seconds_count' in metrics
+
+    def test_lag_seconds_is_age_of_newest_record_while_behind(self, tmp_path):
+        log_file = tmp_path / 'access.log'
+        log_file.touch()
+        source = LogSource(NginxLogParser(str(log_file), server_id=301))
+        source.newest_timestamp = datetime.now(UTC) - timedelta(seconds=90)
+
+        assert source.lag()['lag_seconds'] == 0
+
+        source.tracker.register(None)
+
+        assert source.lag()['lag_seconds'] == pytest.approx(90, abs=5)
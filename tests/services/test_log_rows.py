@@ -0,0 +1,150 @@
+import pickle
+
+from array import array
+
+import pytest
+
+from sqlalchemy import String
+
+from apps.api.v1.models.log_entry_model import LogEntryModel
+from apps.services.dimensions import DIMENSION_MODELS
+from apps.services.log_rows import COLUMN_LIMITS
+from apps.services.log_rows import DIMENSION_COLUMNS
+from apps.services.log_rows import LOG_ENTRY_COLUMNS
+from apps.services.log_rows import ColumnBatch
+from apps.services.log_rows import LogRow
+from apps.services.log_rows import StringCache
+from apps.services.log_rows import has_source_keys
+from apps.services.log_rows import record_to_row
+from apps.services.nginx_log_parser import NginxLogParser
+from apps.services.parse_failures import BAD_VALUE
+from apps.services.parse_pool import parse_rows
+from apps.services.source_key import source_key
+
+LINE = (
+    '10.0.0.{index} - - [25/Dec/2024:10:30:15 +0300] "GET /api/users HTTP/1.1" '
+    '200 {index} "-" "curl/8.4.0"'
+)
+
+
+@pytest.mark.services
+class TestLogRows:
+    """Тесты компактного представления разобранных строк."""
+
+    def test_parse_row_matches_parse_record(self):
+        parser = NginxLogParser('-', server_id=3)
+        line = LINE.format(index=5)
+
+        row = parser.parse_row(line, source_key('file', 0))
+
+        assert isinstance(row, LogRow)
+        assert row == record_to_row({**parser.parse_record(line), 'source_key': row.source_key})
+        assert row.source_key == source_key('file', 0)
+
+    def test_parse_row_with_log_format_keeps_extra(self):
+        parser = NginxLogParser(
+            '-',
+            server_id=3,
+            log_format='$remote_addr [$time_local] "$request" $status $body_bytes_sent $remote_user',
+        )
+
+        row = parser.parse_row(
+            '10.0.0.1 [25/Dec/2024:10:30:15 +0300] "GET / HTTP/1.1" 200 10 alice'
+        )
+
+        assert (row.method, row.status, row.size) == ('GET', 200, 10)
+        assert row.extra == '{"remote_user":"alice"}'
+
+    def test_repeated_strings_are_shared(self):
+        parser = NginxLogParser('-', server_id=1)
+
+        first, second = (parser.parse_row(LINE.format(index=index)) for index in (1, 2))
+
+        assert first.uri is second.uri
+        assert first.user_agent is second.user_agent
+        assert first.http_version is second.http_version
+
+    def test_string_cache_is_bounded(self):
+        cache = StringCache(max_size=2)
+        first = cache(''.join(['a', 'b']))
+
+        cache('c')
+        cache('d')
+
+        assert cache('ab') is not first
+        assert len(cache._strings) <= 2
+
+    def test_column_batch_round_trip(self):
+        parser = NginxLogParser('-', server_id=1)
+        rows, _ = parse_rows(parser, [LINE.format(index=index) for index in range(3)])
+
+        assert len(rows) == 3
+        assert isinstance(rows.column('status'), array)
+        assert list(rows.column('size')) == [0, 1, 2]
+        assert rows.row(2) == parser.parse_row(LINE.format(index=2))
+        assert all(len(row) == len(LOG_ENTRY_COLUMNS) for row in rows)
+        assert pickle.loads(pickle.dumps(rows)) == rows
+
+    def test_column_batch_keeps_non_integer_columns(self):
+        row = record_to_row({'server_id': 1, 'status': None, 'size': 2**70})
+
+        batch = ColumnBatch.from_rows([row])
+
+        assert list(batch) == [tuple(row)]
+        assert batch.column('status') == (None,)
+
+    def test_empty_column_batch(self):
+        batch = ColumnBatch.from_rows([])
+
+        assert not batch
+        assert list(batch) == []
+        assert not has_source_keys([batch])
+
+    def test_has_source_keys(self):
+        parser = NginxLogParser('-', server_id=1)
+        plain, _ = parse_rows(parser, [LINE.format(index=1)])
+        keyed, _ = parse_rows(parser, [LINE.format(index=1)], 'file', [0])
+
+        assert not has_source_keys([plain, [tuple(plain.row(0))]])
+        assert has_source_keys([plain, keyed])
+        assert has_source_keys([[tuple(keyed.row(0))]])
+
+    def test_oversized_values_are_rejected_at_parse_time(self):
+        combined = NginxLogParser('-', server_id=1)
+        formatted = NginxLogParser(
+            '-',
+            server_id=1,
+            log_format='$remote_addr [$time_local] "$request" $status $body_bytes_sent $host',
+        )
+        prefix = '10.0.0.1 [25/Dec/2024:10:30:15 +0300] "GET / HTTP/1.1" 200 10'
+        lines = [
+            LINE.format(index=1),
+            LINE.format(index=2).replace('HTTP/1.1', 'HTTP/1.1-extended'),
+            LINE.format(index=3).replace('/api/users', '/' + 'a' * 2048),
+        ]
+
+        rows, rejects = parse_rows(combined, lines)
+        _, format_rejects = parse_rows(formatted, [f'{prefix} {"h" * 256}', f'{prefix} h'])
+
+        assert len(rows) == 1
+        assert [(index, reason) for index, reason, _ in rejects] == [(1, BAD_VALUE), (2, BAD_VALUE)]
+        assert [detail for _, _, detail in rejects] == [
+            'http_version длиннее 10 символов',
+            'uri длиннее 2048 символов',
+        ]
+        assert [(index, reason) for index, reason, _ in format_rejects] == [(0, BAD_VALUE)]
+
+    def test_column_limits_match_tables(self):
+        columns = {
+            **LogEntryModel.__table__.columns,
+            **{
+                column: DIMENSION_MODELS[column].__table__.columns['value']
+                for column in DIMENSION_COLUMNS
+            },
+        }
+
+        assert {
+            name: column.type.length
+            for name, column in columns.items()
+            if isinstance(column.type, String) and name in LOG_ENTRY_COLUMNS
+        } == COLUMN_LIMITS
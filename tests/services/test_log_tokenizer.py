@@ -0,0 +1,55 @@
+import pytest
+
+from apps.services.log_tokenizer import COMBINED_PATTERN
+from apps.services.log_tokenizer import split_combined
+
+COMMON_LINES = [
+    '192.168.1.100 - - [25/Dec/2024:10:30:15 +0300] "GET /api/users HTTP/1.1" 200 1234 "https://example.com" "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"',
+    '192.168.1.101 - - [25/Dec/2024:10:30:16 +0300] "POST /api/login HTTP/1.1" 401 567 "https://example.com/login" "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36"',
+    '192.168.1.102 - - [25/Dec/2024:10:30:17 +0300] "GET /static/css/style.css HTTP/1.1" 200 2345 "https://example.com" "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36"',
+    '192.168.1.100 - - [25/Dec/2024:10:30:15 +0300] "POST /api/login HTTP/1.1" 401 567 "-" "-"',
+    '127.0.0.1 - - [25/Dec/2024:10:30:15 +0300] "GET / HTTP/1.1" 200 1234 "https://example.com" "curl/7.68.0"',
+    '192.168.1.100 - - [25/Dec/2024:10:30:15 -0500] "GET /api/users HTTP/1.1" 200 1234 "-" "-"',
+    '2001:db8::1 - - [25/Dec/2024:10:30:15 +0000] "GET /search?q=a+b&p=2 HTTP/2.0" 304 0 "" ""',
+    '10.0.0.1 - - [25/Dec/2024:10:30:15 +0300] "GET /ru/%D0%BF%D1%83%D1%82%D1%8C HTTP/1.1" 200 1 "-" "Бот/1.0"',
+    '10.0.0.1 - - [25/Dec/2024:10:30:15 +0300] "GET /a HTTP/1.1" 200 1 "-" "-" "trailing extra field"',
+]
+
+INVALID_LINES = [
+    'invalid log line',
+    '',
+    '192.168.1.100',
+    '192.168.1.100 - - [25/Dec/2024:10:30:15 +0300]',
+    '192.168.1.100 - - [] "GET / HTTP/1.1" 200 1 "-" "-"',
+    '192.168.1.100 - - [25/Dec/2024:10:30:15 +0300] "-" 400 0 "-" "-"',
+    '192.168.1.100 - - [25/Dec/2024:10:30:15 +0300] "GET  / HTTP/1.1" 200 1 "-" "-"',
+    '192.168.1.100 - - [25/Dec/2024:10:30:15 +0300] "GET / HTTP/1.1" 20 1 "-" "-"',
+    '192.168.1.100 - - [25/Dec/2024:10:30:15 +0300] "GET / HTTP/1.1" 2000 1 "-" "-"',
+    '192.168.1.100 - - [25/Dec/2024:10:30:15 +0300] "GET / HTTP/1.1" 200 - "-" "-"',
+    '192.168.1.100 - - [25/Dec/2024:10:30:15 +0300] "GET / HTTP/1.1" 200 1 "-" "unterminated',
+    '192.168.1.100 - user [25/Dec/2024:10:30:15 +0300] "GET / HTTP/1.1" 200 1 "-" "-"',
+    '192.168.1.100\t- - [25/Dec/2024:10:30:15 +0300] "GET / HTTP/1.1" 200 1 "-" "-"',
+    '192.168.1.100 - - [25/Dec/2024:10:30:15 +0300] "GET\t/ HTTP/1.1" 200 1 "-" "-"',
+    '192.168.1.100 - - [25/Dec/2024:10:30:15 +0300] "GET /a b HTTP/1.1" 200 1 "-" "-"',
+    '192.168.1.100 - - [25/Dec/2024:10:30:15 +0300] "GET / HTTP/1.1" 200 ²3 "-" "-"',
+    '192.168.1.100 - - [25/Dec/2024:10:30:15 +0300] "GET / HTTP/1.1 "quoted"" 200 1 "-" "-"',
+    '192.168.1.100 - - [25/Dec/2024:10:30:15 +0300] "GET / HTTP/1.1" 200 1 "a"b" "-"',
+    '192.168.1.100 - - [25/Dec/2024:10:30:15] +0300] "GET / HTTP/1.1" 200 1 "-" "-"',
+]
+
+
+@pytest.mark.services
+class TestSplitCombined:
+    """Позиционный разбор должен давать те же поля, что и groupdict."""
+
+    @pytest.mark.parametrize('line', COMMON_LINES)
+    def test_fields_follow_group_order(self, line):
+        expected = COMBINED_PATTERN.match(line).groupdict()
+
+        fields = split_combined(line)
+
+        assert fields == tuple(expected[name] for name in COMBINED_PATTERN.groupindex)
+
+    @pytest.mark.parametrize('line', INVALID_LINES)
+    def test_invalid_lines_are_rejected(self, line):
+        assert split_combined(line) is None
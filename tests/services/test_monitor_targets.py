@@ -0,0 +1,69 @@
+import pytest
+
+from apps.services.monitor_targets import MonitorTarget
+from apps.services.monitor_targets import expand_targets
+from apps.services.monitor_targets import load_monitor_config
+from apps.services.monitor_targets import parse_file_option
+
+
+@pytest.mark.services
+class TestMonitorTargets:
+    """Тесты разбора и раскрытия целей мониторинга."""
+
+    def test_parse_file_option(self):
+        assert parse_file_option('/var/log/nginx/*.log:3', 'main') == MonitorTarget(
+            '/var/log/nginx/*.log', 3, 'main'
+        )
+
+    @pytest.mark.parametrize('value', ['/var/log/nginx/access.log', ':3', 'access.log:api'])
+    def test_parse_file_option_rejects_invalid_values(self, value):
+        with pytest.raises(ValueError):
+            parse_file_option(value)
+
+    def test_load_monitor_config(self, tmp_path):
+        config = tmp_path / 'monitor.toml'
+        config.write_text(
+            '[[files]]\n'
+            'path = "/var/log/nginx/api.log"\n'
+            'server_id = 1\n'
+            '\n'
+            '[[files]]\n'
+            'path = "/var/log/nginx/*.access.log"\n'
+            'server_id = 2\n'
+            'log_format = "main"\n'
+        )
+
+        assert load_monitor_config(config) == [
+            MonitorTarget('/var/log/nginx/api.log', 1),
+            MonitorTarget('/var/log/nginx/*.access.log', 2, 'main'),
+        ]
+
+    @pytest.mark.parametrize(
+        'content',
+        ['[[files]]\npath = "a.log"\n', '[[files]]\npath = "a.log"\nserver_id = "x"\n', '', '[['],
+    )
+    def test_load_monitor_config_rejects_invalid_files(self, tmp_path, content):
+        config = tmp_path / 'monitor.toml'
+        config.write_text(content)
+
+        with pytest.raises(ValueError):
+            load_monitor_config(config)
+
+    def test_expand_targets(self, tmp_path):
+        for name in ('api.access.log', 'web.access.log', 'old.access.log.gz'):
+            (tmp_path / name).touch()
+        (tmp_path / 'dir.access.log').mkdir()
+
+        files = expand_targets(
+            [
+                MonitorTarget(str(tmp_path / 'api.access.log'), 1),
+                MonitorTarget(str(tmp_path / '*.access.log*'), 2),
+                MonitorTarget(str(tmp_path / 'missing.log'), 3),
+            ]
+        )
+
+        assert {path.name: target.server_id for path, target in files.items()} == {
+            'api.access.log': 1,
+            'web.access.log': 2,
+            'missing.log': 3,
+        }
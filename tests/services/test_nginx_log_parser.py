@@ -3,6 +3,7 @@ import tempfile
 
 from datetime import datetime
 from pathlib import Path
+from unittest.mock import patch
 
 import pytest
 
@@ -167,3 +168,80 @@ invalid log line
         assert results[0]['status'] == 200
         assert results[1]['status'] == 401
         assert results[2]['status'] == 200
+
+
+class TestReadNewLines:
+    """Тесты чтения файла кусками с переносом незавершённой строки."""
+
+    LINE = (
+        '192.168.1.100 - - [25/Dec/2024:10:30:15 +0300] "GET /api/users HTTP/1.1" 200 1234 "-" "-"'
+    )
+
+    async def read_all(self, parser) -> list[str]:
+        lines = []
+        async for batch in parser.read_new_lines():
+            lines.extend(batch)
+        return lines
+
+    async def test_reads_backlog_in_bounded_chunks(self, tmp_path):
+        log_file = tmp_path / 'access.log'
+        log_file.write_text(f'{self.LINE}\n' * 50)
+        parser = NginxLogParser(str(log_file))
+
+        batches = []
+        with patch('apps.services.nginx_log_parser.READ_CHUNK_SIZE', 256):
+            async for batch in parser.read_new_lines():
+                batches.append(batch)
+
+        assert sum(len(batch) for batch in batches) == 50
+        assert max(len(batch) for batch in batches) <= 256 // len(self.LINE) + 1
+        assert parser.position == log_file.stat().st_size
+
+    async def test_incomplete_line_is_not_consumed(self, tmp_path):
+        log_file = tmp_path / 'access.log'
+        head, tail = self.LINE[:40], self.LINE[40:]
+        log_file.write_text(f'{self.LINE}\n{head}')
+        parser = NginxLogParser(str(log_file))
+
+        assert await self.read_all(parser) == [self.LINE]
+        assert parser.position == len(self.LINE) + 1
+
+        with open(log_file, 'a') as f:
+            f.write(f'{tail}\n')
+
+        assert await self.read_all(parser) == [self.LINE]
+        assert parser.position == log_file.stat().st_size
+
+    async def test_line_split_across_chunks(self, tmp_path):
+        log_file = tmp_path / 'access.log'
+        log_file.write_text(f'{self.LINE}\n{self.LINE}\n')
+        parser = NginxLogParser(str(log_file))
+
+        with patch('apps.services.nginx_log_parser.READ_CHUNK_SIZE', 7):
+            lines = await self.read_all(parser)
+
+        assert lines == [self.LINE, self.LINE]
+
+    async def test_overlong_line_is_skipped(self, tmp_path):
+        log_file = tmp_path / 'access.log'
+        log_file.write_text('x' * 300 + f'\n{self.LINE}\n')
+        parser = NginxLogParser(str(log_file))
+
+        with (
+            patch('apps.services.nginx_log_parser.READ_CHUNK_SIZE', 32),
+            patch('apps.services.nginx_log_parser.MAX_LINE_BYTES', 128),
+        ):
+            lines = await self.read_all(parser)
+
+        assert lines == [self.LINE]
+        assert parser.position == log_file.stat().st_size
+
+    async def test_invalid_utf8_is_replaced(self, tmp_path):
+        log_file = tmp_path / 'access.log'
+        log_file.write_bytes(self.LINE.replace('curl', '').encode() + b'\xff\n')
+        parser = NginxLogParser(str(log_file))
+
+        lines = await self.read_all(parser)
+
+        assert len(lines) == 1
+        assert lines[0].endswith('�')
@@ -0,0 +1,72 @@
+from datetime import datetime
+
+import pytest
+
+from apps.services.nginx_timestamp import parse_nginx_timestamp
+
+NGINX_TIME_FORMAT = '%d/%b/%Y:%H:%M:%S %z'
+
+
+@pytest.mark.services
+class TestParseNginxTimestamp:
+    """Быстрый разбор $time_local должен совпадать с strptime."""
+
+    @pytest.mark.parametrize(
+        'raw',
+        [
+            '25/Dec/2024:10:30:15 +0300',
+            '01/Jan/2024:00:00:00 +0000',
+            '01/Jan/2024:00:00:00 -0000',
+            '31/Mar/2024:01:59:59 +0000',
+            '31/Mar/2024:03:00:00 +0100',
+            '27/Oct/2024:02:30:00 +0200',
+            '27/Oct/2024:02:30:00 +0100',
+            '10/Mar/2024:01:59:59 -0500',
+            '10/Mar/2024:03:00:00 -0400',
+            '29/Feb/2024:23:59:59 +0530',
+            '15/Jul/2024:12:00:00 +0545',
+            '15/Jul/2024:12:00:00 -0930',
+            '15/Jul/2024:12:00:00 +1400',
+            '15/Jul/2024:12:00:00 -1200',
+        ],
+    )
+    def test_matches_strptime(self, raw):
+        expected = datetime.strptime(raw, NGINX_TIME_FORMAT)
+
+        result = parse_nginx_timestamp(raw)
+
+        assert result == expected
+        assert result.utcoffset() == expected.utcoffset()
+        assert result.tzinfo == expected.tzinfo
+        assert result.isoformat() == expected.isoformat()
+
+    def test_non_padded_day_falls_back_to_strptime(self):
+        raw = '5/Dec/2024:10:30:15 +0300'
+
+        assert parse_nginx_timestamp(raw) == datetime.strptime(raw, NGINX_TIME_FORMAT)
+
+    @pytest.mark.parametrize(
+        'raw',
+        [
+            'invalid timestamp',
+            '25/Foo/2024:10:30:15 +0300',
+            '30/Feb/2024:10:30:15 +0300',
+            '25/Dec/2024:25:30:15 +0300',
+            '25/Dec/2024:10:30:15 +0399',
+            '25/Dec/2024:10:30:15 03000',
+            '',
+        ],
+    )
+    def test_invalid_values_raise_value_error(self, raw):
+        with pytest.raises(ValueError):
+            datetime.strptime(raw, NGINX_TIME_FORMAT)
+        with pytest.raises(ValueError):
+            parse_nginx_timestamp(raw)
+
+    def test_repeated_second_is_served_from_cache(self):
+        raw = '24/Dec/2024:23:59:59 +0300'
+        parse_nginx_timestamp(raw)
+        hits = parse_nginx_timestamp.cache_info().hits
+
+        assert parse_nginx_timestamp(raw) is parse_nginx_timestamp(raw)
+        assert parse_nginx_timestamp.cache_info().hits == hits + 2
@@ -0,0 +1,100 @@
+import json
+
+from pathlib import Path
+from unittest.mock import patch
+
+import pytest
+
+from apps.services.parse_failures import BAD_VALUE
+from apps.services.parse_failures import NO_MATCH
+from apps.services.parse_failures import DeadLetterFile
+from apps.services.parse_failures import ParseFailures
+from apps.services.parse_failures import SampledWarning
+
+
+def read_entries(path: Path) -> list[dict]:
+    return [json.loads(line) for line in path.read_text().splitlines()]
+
+
+@pytest.mark.services
+class TestSampledWarning:
+    """Тесты ограничения частоты предупреждений."""
+
+    def test_suppressed_lines_are_counted_in_next_warning(self):
+        sampler = SampledWarning(interval=60)
+
+        with (
+            patch('apps.services.parse_failures.logger.warning') as warning,
+            patch('apps.services.parse_failures.time.monotonic', side_effect=[0, 1, 2, 100, 101]),
+        ):
+            sampler.warn(NO_MATCH, 'первая')
+            sampler.warn(NO_MATCH, 'подавлена', count=5)
+            sampler.warn(BAD_VALUE, 'другая причина')
+            sampler.warn(NO_MATCH, 'после паузы', count=2)
+            sampler.warn(NO_MATCH, 'снова подавлена')
+
+        messages = [call.args[0] for call in warning.call_args_list]
+        assert messages == [
+            'первая',
+            'другая причина',
+            'после паузы (и ещё 6 таких строк с прошлого предупреждения)',
+        ]
+
+
+@pytest.mark.services
+class TestDeadLetterFile:
+    """Тесты dead-letter файла."""
+
+    def test_rotates_by_size_and_keeps_backups(self, tmp_path):
+        path = tmp_path / 'dead' / 'letter.jsonl'
+        dead_letter = DeadLetterFile(path, max_bytes=100, backups=2)
+
+        for index in range(5):
+            dead_letter.write([{'line': f'{index}' * 40}])
+
+        assert read_entries(path) == [{'line': '4' * 40}]
+        assert read_entries(path.with_name('letter.jsonl.1')) == [{'line': '3' * 40}]
+        assert read_entries(path.with_name('letter.jsonl.2')) == [{'line': '2' * 40}]
+        assert not path.with_name('letter.jsonl.3').exists()
+
+
+@pytest.mark.services
+class TestParseFailures:
+    """Тесты счётчиков отвергнутых строк."""
+
+    def test_counts_reasons_and_writes_offsets(self, tmp_path):
+        dead_letter = DeadLetterFile(tmp_path / 'dead_letter.jsonl')
+        failures = ParseFailures(dead_letter)
+        lines = ['ok line', 'мусор', 'ok', 'bad time']
+
+        with patch('apps.services.parse_failures.logger.warning'):
+            failures.record(
+                Path('/var/log/nginx/access.log'),
+                7,
+                1000,
+                lines,
+                parsed=2,
+                rejects=[(1, NO_MATCH, 'no'), (3, BAD_VALUE, 'time')],
+            )
+
+        assert failures.stats() == {
+            'parsed_lines': 2,
+            'rejected_lines': {NO_MATCH: 1, BAD_VALUE: 1},
+            'failure_ratio': 0.5,
+        }
+        assert read_entries(dead_letter.path) == [
+            {
+                'file': '/var/log/nginx/access.log',
+                'offset': 1008,
+                'server_id': 7,
+                'reason': NO_MATCH,
+                'line': 'мусор',
+            },
+            {
+                'file': '/var/log/nginx/access.log',
+                'offset': 1022,
+                'server_id': 7,
+                'reason': BAD_VALUE,
+                'line': 'bad time',
+            },
+        ]
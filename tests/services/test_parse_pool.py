@@ -0,0 +1,57 @@
+import pytest
+
+from apps.services.nginx_log_parser import NginxLogParser
+from apps.services.parse_failures import BAD_VALUE
+from apps.services.parse_failures import NO_MATCH
+from apps.services.parse_pool import ParsePool
+from apps.services.parse_pool import parse_rows
+
+LINE = (
+    '10.0.0.{index} - - [25/Dec/2024:10:30:15 +0300] "GET /api/{index} HTTP/1.1" '
+    '200 {index} "-" "curl/8.4.0"'
+)
+
+
+@pytest.mark.services
+class TestParsePool:
+    """Тесты разбора пачек строк в пуле процессов."""
+
+    def test_parse_rows_skips_invalid_lines(self):
+        parser = NginxLogParser('-', server_id=7)
+
+        rows, rejects = parse_rows(
+            parser,
+            [
+                LINE.format(index=1),
+                'invalid line',
+                LINE.format(index=2).replace('25/Dec/2024', '32/Dec/2024'),
+                LINE.format(index=3),
+            ],
+        )
+
+        assert [(row[0], row[4], row[7]) for row in rows] == [(7, '/api/1', 1), (7, '/api/3', 3)]
+        assert [(index, reason) for index, reason, _ in rejects] == [
+            (1, NO_MATCH),
+            (2, BAD_VALUE),
+        ]
+
+    async def test_results_match_inline_parsing_in_order(self):
+        parsers = [NginxLogParser('-', server_id=1), NginxLogParser('-', 2, log_format='main')]
+        batches = [
+            [LINE.format(index=index) + ' "-"' * (batch % 2) for index in range(batch, batch + 5)]
+            for batch in range(8)
+        ]
+
+        pool = ParsePool(workers=2)
+        try:
+            futures = [
+                pool.submit(parsers[batch % 2], lines) for batch, lines in enumerate(batches)
+            ]
+            results = [await future for future in futures]
+        finally:
+            pool.close()
+
+        assert results == [
+            parse_rows(parsers[batch % 2], lines) for batch, lines in enumerate(batches)
+        ]
+        assert all(len(rows) == 5 and not rejects for rows, rejects in results)
@@ -0,0 +1,217 @@
+import uuid
+
+from datetime import UTC
+from datetime import datetime
+from datetime import timedelta
+
+import asyncpg
+import pytest
+
+from sqlalchemy import text
+
+from apps.api.v1.models.server_model import ServerModel
+from apps.services.log_batch_writer import LogBatchWriter
+from apps.services.log_rows import record_to_row
+from apps.services.partitions import Partition
+from apps.services.partitions import PartitionManager
+from apps.services.partitions import parse_partition
+from tests.conftest import get_test_connector
+
+SCHEMA = 'nginx_parser_schema'
+NOW = datetime(2024, 12, 25, 10, 30, tzinfo=UTC)
+DAY = timedelta(days=1)
+
+
+def day(offset: int) -> datetime:
+    return datetime(2024, 12, 25, tzinfo=UTC) + offset * DAY
+
+
+def make_row(timestamp: datetime, offset: int) -> tuple:
+    return record_to_row(
+        {
+            'server_id': 501,
+            'timestamp': timestamp,
+            'remote_addr': '10.5.0.1',
+            'method': 'GET',
+            'uri': '/partitioned',
+            'http_version': 'HTTP/1.1',
+            'status': 200,
+            'size': 1,
+            'source_key': uuid.UUID(int=offset + 1),
+        }
+    )
+
+
+def manager(**kwargs) -> PartitionManager:
+    return PartitionManager(db_connector=get_test_connector(), interval_days=1, **kwargs)
+
+
+@pytest.mark.services
+class TestPartitions:
+    """Тесты секционирования таблицы логов."""
+
+    @pytest.fixture(autouse=True)
+    async def clean_tables(self, session):
+        partitions = await session.execute(
+            text(
+                'SELECT relname FROM pg_class WHERE relnamespace = :schema ::regnamespace '
+                "AND relname LIKE 'log\\_entry\\_model\\_p%' AND relkind = 'r'"
+            ),
+            {'schema': SCHEMA},
+        )
+        for (name,) in partitions:
+            await session.execute(text(f'DROP TABLE {SCHEMA}.{name}'))
+        await session.execute(
+            text(f'TRUNCATE {SCHEMA}.log_entry_model, {SCHEMA}.server_model CASCADE')
+        )
+        session.add(ServerModel(id=501, name='partition-server', ip_address='10.5.0.1'))
+        await session.commit()
+
+    async def write(self, *timestamps: datetime) -> LogBatchWriter:
+        async with LogBatchWriter(
+            batch_size=1000, flush_interval=60, db_connector=get_test_connector()
+        ) as writer:
+            await writer.add_rows(
+                [make_row(timestamp, offset) for offset, timestamp in enumerate(timestamps)]
+            )
+        return writer
+
+    async def rows_by_partition(self, session) -> dict[str, int]:
+        result = await session.execute(
+            text(
+                'SELECT tableoid::regclass::text, count(*) '
+                f'FROM {SCHEMA}.log_entry_model GROUP BY 1'
+            )
+        )
+        return {name.removeprefix(f'{SCHEMA}.'): count for name, count in result}
+
+    def test_parse_partition_bounds(self):
+        archive = parse_partition(
+            'log_entry_model_archive', "FOR VALUES FROM (MINVALUE) TO ('2024-12-25 03:00:00+03')"
+        )
+        daily = parse_partition(
+            'log_entry_model_p20241225',
+            "FOR VALUES FROM ('2024-12-25 00:00:00+00') TO ('2024-12-26 00:00:00+00')",
+        )
+
+        assert parse_partition('log_entry_model_default', 'DEFAULT').is_default
+        assert (archive.lower, archive.upper) == (None, day(0))
+        assert (daily.lower, daily.upper) == (day(0), day(1))
+
+    def test_missing_ranges_start_at_current_interval(self):
+        ranges = manager(precreate=2).missing_ranges([], NOW)
+
+        assert ranges == [(day(0), day(1)), (day(1), day(2)), (day(2), day(3))]
+
+    def test_missing_ranges_continue_existing_partitions(self):
+        partitions = [
+            Partition('log_entry_model_default', is_default=True),
+            Partition('log_entry_model_archive', None, day(-1)),
+            Partition('log_entry_model_p20241224', day(-1), day(0)),
+        ]
+
+        ranges = manager(precreate=0).missing_ranges(partitions, NOW)
+
+        assert ranges == [(day(0), day(1))]
+
+    def test_expired_ranges_are_neither_created_nor_kept(self):
+        partitions = [
+            Partition('log_entry_model_archive', None, day(-10)),
+            Partition('log_entry_model_p20241215', day(-10), day(-9)),
+            Partition('log_entry_model_p20241216', day(-9), day(-8)),
+        ]
+        retention = manager(precreate=0, retention_days=9)
+
+        assert retention.missing_ranges(partitions, NOW)[0] == (day(-8), day(-7))
+        assert [p.name for p in retention.expired(partitions, NOW)] == [
+            'log_entry_model_archive',
+            'log_entry_model_p20241215',
+        ]
+
+    async def test_maintain_moves_rows_out_of_default(self, session):
+        await self.write(NOW, NOW + DAY, NOW - 3 * DAY)
+
+        result = await manager(precreate=1).maintain(NOW)
+
+        assert result.created == ['log_entry_model_p20241225', 'log_entry_model_p20241226']
+        assert result.moved == 2
+        assert await self.rows_by_partition(session) == {
+            'log_entry_model_default': 1,
+            'log_entry_model_p20241225': 1,
+            'log_entry_model_p20241226': 1,
+        }
+        assert (await manager(precreate=1).maintain(NOW)).created == []
+
+    async def test_default_is_locked_before_rows_are_moved(self, session, monkeypatch):
+        await self.write(NOW)
+        execute = asyncpg.Connection.execute
+        modes = []
+
+        async def execute_and_check_locks(connection, query, *args, **kwargs):
+            status = await execute(connection, query, *args, **kwargs)
+            if query.startswith('WITH moved'):
+                modes.extend(
+                    await connection.fetchval(
+                        'SELECT array_agg(mode) FROM pg_locks '
+                        'WHERE pid = pg_backend_pid() AND relation = $1::regclass',
+                        f'{SCHEMA}.log_entry_model_default',
+                    )
+                )
+            return status
+
+        monkeypatch.setattr(asyncpg.Connection, 'execute', execute_and_check_locks)
+        result = await manager(precreate=0).maintain(NOW)
+
+        assert result.moved == 1
+        assert 'ShareRowExclusiveLock' in modes
+
+    async def test_duplicates_are_skipped_in_partitions(self, session):
+        await manager(precreate=0).maintain(NOW)
+
+        await self.write(NOW)
+        writer = await self.write(NOW)
+
+        assert writer.duplicate_rows == 1
+        assert await self.rows_by_partition(session) == {'log_entry_model_p20241225': 1}
+
+    async def test_retention_drops_whole_partitions(self, session):
+        await manager(precreate=0).maintain(NOW - 2 * DAY)
+        await manager(precreate=0).maintain(NOW)
+        await self.write(NOW - 2 * DAY, NOW)
+
+        result = await manager(precreate=0, retention_days=1).maintain(NOW)
+
+        assert result.detached == result.dropped == ['log_entry_model_p20241223']
+        assert await self.rows_by_partition(session) == {'log_entry_model_p20241225': 1}
+
+    async def test_expired_partition_can_be_kept_detached(self, session):
+        await manager(precreate=0).maintain(NOW - DAY)
+        await self.write(NOW - DAY)
+
+        result = await manager(precreate=0, retention_days=1, drop_expired=False).maintain(
+            NOW + DAY
+        )
+
+        detached = await session.execute(
+            text(f'SELECT count(*) FROM {SCHEMA}.log_entry_model_p20241224')
+        )
+        assert result.detached == ['log_entry_model_p20241224']
+        assert result.dropped == []
+        assert detached.scalar() == 1
+        assert await self.rows_by_partition(session) == {}
+
+    async def test_time_filter_prunes_partitions(self, session):
+        await manager(precreate=0).maintain(NOW - 2 * DAY)
+        await manager(precreate=1).maintain(NOW)
+
+        plan = await session.execute(
+            text(
+                f'EXPLAIN SELECT count(*) FROM {SCHEMA}.log_entry_model '
+                "WHERE timestamp >= '2024-12-25 00:00:00+00'"
+            )
+        )
+        scanned = ' '.join(row[0] for row in plan)
+
+        assert 'log_entry_model_p20241225' in scanned
+        assert 'log_entry_model_p20241223' not in scanned
+        assert 'log_entry_model_p20241224' not in scanned
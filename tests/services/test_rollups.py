@@ -0,0 +1,301 @@
+import math
+import uuid
+
+from datetime import UTC
+from datetime import datetime
+from datetime import timedelta
+
+import pytest
+
+from sqlalchemy import func
+from sqlalchemy import select
+from sqlalchemy import text
+
+from apps.api.v1.handlers.analytics_handler import status_codes_query
+from apps.api.v1.handlers.analytics_handler import time_series_query
+from apps.api.v1.models.dimension_models import UriModel
+from apps.api.v1.models.log_entry_model import LogEntryModel
+from apps.api.v1.models.server_model import ServerModel
+from apps.services.ddsketch import RELATIVE_ACCURACY
+from apps.services.log_batch_writer import LogBatchWriter
+from apps.services.log_rows import ColumnBatch
+from apps.services.log_rows import record_to_row
+from apps.services.rollups import RollupPlan
+from apps.services.rollups import compact_rollups
+from apps.services.rollups import estimate_quantiles
+from apps.services.rollups import estimate_top
+from apps.services.rollups import estimate_unique_ips
+from apps.services.rollups import minute_rollups
+from apps.services.rollups import plan_rollups
+from tests.conftest import get_test_connector
+
+SCHEMA = 'nginx_parser_schema'
+NOW = datetime(2024, 12, 25, 10, 30, 20, tzinfo=UTC)
+MINUTE = timedelta(minutes=1)
+HOUR = timedelta(hours=1)
+
+
+def at(hour: int, minute: int = 0, second: int = 0) -> datetime:
+    return datetime(2024, 12, 25, hour, minute, second, tzinfo=UTC)
+
+
+def make_row(
+    timestamp: datetime,
+    status: int = 200,
+    size: int = 100,
+    key: int | None = None,
+    remote_addr: str = '10.6.0.1',
+    uri: str = '/rollup',
+    request_time: float | None = None,
+):
+    return record_to_row(
+        {
+            'server_id': 601,
+            'timestamp': timestamp,
+            'remote_addr': remote_addr,
+            'method': 'GET',
+            'uri': uri,
+            'http_version': 'HTTP/1.1',
+            'status': status,
+            'size': size,
+            'request_time': request_time,
+            'source_key': uuid.UUID(int=key) if key is not None else None,
+        }
+    )
+
+
+@pytest.mark.services
+class TestRollupPlan:
+    """Тесты разбиения окна аналитики на источники."""
+
+    def test_short_window_reads_raw_rows(self):
+        assert plan_rollups(NOW - timedelta(seconds=30), NOW) == RollupPlan(
+            raw=((NOW - timedelta(seconds=30), None),)
+        )
+
+    def test_whole_hours_come_from_hour_rollups(self):
+        plan = plan_rollups(NOW - 3 * HOUR, NOW)
+
+        assert plan.raw == ((NOW - 3 * HOUR, at(7, 31)), (at(10, 30), None))
+        assert plan.minutes == ((at(7, 31), at(8)), (at(10), at(10, 30)))
+        assert plan.hours == (at(8), at(10))
+
+    def test_interval_not_multiple_of_hour_uses_minutes(self):
+        plan = plan_rollups(NOW - 3 * HOUR, NOW, bucket_seconds=300)
+
+        assert plan.minutes == ((at(7, 31), at(10, 30)),)
+        assert plan.hours is None
+
+    def test_interval_not_multiple_of_minute_reads_raw_rows(self):
+        plan = plan_rollups(NOW - 3 * HOUR, NOW, bucket_seconds=90)
+
+        assert plan == RollupPlan(raw=((NOW - 3 * HOUR, None),))
+
+    def test_aligned_window_has_no_left_edge(self):
+        plan = plan_rollups(at(8), NOW, bucket_seconds=3600)
+
+        assert plan.raw == ((at(10, 30), None),)
+        assert plan.hours == (at(8), at(10))
+
+    def test_minute_rollups_of_batch(self):
+        batch = ColumnBatch.from_rows(
+            [
+                make_row(at(9, 1, 5), size=10),
+                make_row(at(9, 1, 59), size=20),
+                make_row(at(9, 2), size=5),
+                make_row(at(9, 1, 30), status=404, size=1),
+            ]
+        )
+
+        assert minute_rollups([batch]) == [
+            (at(9, 1), 601, 200, 2, 30),
+            (at(9, 1), 601, 404, 1, 1),
+            (at(9, 2), 601, 200, 1, 5),
+        ]
+
+
+@pytest.mark.services
+class TestRollups:
+    """Тесты сводок аналитики."""
+
+    @pytest.fixture(autouse=True)
+    async def clean_tables(self, session):
+        await session.execute(
+            text(f'TRUNCATE {SCHEMA}.log_entry_model, {SCHEMA}.server_model CASCADE')
+        )
+        session.add(ServerModel(id=601, name='rollup-server', ip_address='10.6.0.1'))
+        await session.commit()
+
+    async def write(self, *rows: tuple) -> LogBatchWriter:
+        async with LogBatchWriter(
+            batch_size=1000, flush_interval=60, db_connector=get_test_connector()
+        ) as writer:
+            await writer.add_rows(list(rows))
+        return writer
+
+    async def rollups(self, session, table: str) -> list[tuple]:
+        result = await session.execute(
+            text(
+                f'SELECT bucket, status, requests, bytes FROM {SCHEMA}.{table} '
+                'ORDER BY bucket, status'
+            )
+        )
+        return [tuple(row) for row in result]
+
+    async def raw_status_counts(self, session, since: datetime) -> dict[int, int]:
+        result = await session.execute(
+            select(LogEntryModel.status, func.count())
+            .where(LogEntryModel.timestamp >= since)
+            .group_by(LogEntryModel.status)
+        )
+        return dict(result.all())
+
+    async def test_writer_adds_only_new_rows_to_minute_rollups(self, session):
+        await self.write(make_row(at(9, 1, 5), key=1), make_row(at(9, 1, 50), key=2))
+        writer = await self.write(make_row(at(9, 1, 5), key=1), make_row(at(9, 2), key=3))
+        await self.write(make_row(at(9, 2, 30), status=500, size=7))
+
+        assert writer.duplicate_rows == 1
+        assert await self.rollups(session, 'log_rollup_minute_model') == [
+            (at(9, 1), 200, 2, 200),
+            (at(9, 2), 200, 1, 100),
+            (at(9, 2), 500, 1, 7),
+        ]
+
+    async def test_compaction_folds_finished_hours(self, session):
+        await self.write(
+            make_row(at(8, 10), key=1),
+            make_row(at(8, 50), status=404, size=1, key=2),
+            make_row(at(9, 5), key=3),
+            make_row(at(10, 1), key=4),
+        )
+
+        assert await compact_rollups(get_test_connector(), NOW) == [at(8), at(9)]
+        assert await compact_rollups(get_test_connector(), NOW) == []
+        assert await self.rollups(session, 'log_rollup_hour_model') == [
+            (at(8), 200, 1, 100),
+            (at(8), 404, 1, 1),
+            (at(9), 200, 1, 100),
+        ]
+
+        await self.write(make_row(at(8, 20), key=5))
+
+        assert await compact_rollups(get_test_connector(), NOW) == [at(8)]
+        assert (await self.rollups(session, 'log_rollup_hour_model'))[0] == (at(8), 200, 2, 200)
+
+    async def test_queries_match_raw_rows(self, session):
+        since = datetime.now(UTC) - 3 * HOUR
+        now = datetime.now(UTC)
+        timestamps = [since - MINUTE, since + timedelta(seconds=1)] + [
+            since + offset * 7 * MINUTE for offset in range(1, 26)
+        ]
+        await self.write(
+            *(
+                make_row(timestamp, status=404 if offset % 4 == 0 else 200, key=offset)
+                for offset, timestamp in enumerate(timestamps)
+            )
+        )
+        # Один час свёрнут, остальные читаются по минутам.
+        await compact_rollups(get_test_connector(), since + 2 * HOUR)
+
+        status_counts = await session.execute(status_codes_query(since, now))
+        series = await session.execute(time_series_query(since, now, 3600))
+
+        assert dict(status_counts.all()) == await self.raw_status_counts(session, since)
+        assert sum(row.requests for row in series) == len(timestamps) - 1
+
+    async def test_unique_ips_estimated_from_sketches(self, session):
+        since = datetime.now(UTC) - 3 * HOUR
+        now = datetime.now(UTC)
+        rows = [
+            make_row(since + offset * MINUTE, key=offset, remote_addr=f'10.6.{offset % 7}.{offset}')
+            for offset in range(0, 180, 3)
+        ]
+        await self.write(*rows[:40])
+        # Повтор уже записанных строк не меняет скетчи.
+        await self.write(*rows[30:])
+        await self.write(make_row(since - MINUTE, remote_addr='10.6.9.9'))
+        await compact_rollups(get_test_connector(), since + 2 * HOUR)
+        await self.write(make_row(since + 30 * MINUTE, remote_addr='10.6.8.8'))
+
+        exact = await session.scalar(
+            select(func.count(LogEntryModel.remote_addr.distinct())).where(
+                LogEntryModel.timestamp >= since
+            )
+        )
+
+        assert exact == len(rows) + 1
+        assert await estimate_unique_ips(session, since, now) == exact
+
+    async def test_top_estimated_from_sketches(self, session):
+        since = datetime.now(UTC) - 3 * HOUR
+        now = datetime.now(UTC)
+        rows = [
+            make_row(
+                since + offset * MINUTE,
+                size=offset,
+                key=offset,
+                remote_addr=f'10.6.0.{offset % 5}',
+                uri=f'/top/{offset % 3}',
+            )
+            for offset in range(0, 180, 2)
+        ]
+        await self.write(*rows[:50])
+        # Повтор части строк: скетчи их минут пересчитываются по таблице.
+        await self.write(*rows[40:])
+        await compact_rollups(get_test_connector(), since + 2 * HOUR)
+        await self.write(make_row(since + 30 * MINUTE, remote_addr='10.6.0.1', uri='/top/1'))
+
+        for column, value, query in (
+            ('top_ips', LogEntryModel.remote_addr, select(LogEntryModel.remote_addr)),
+            (
+                'top_uris',
+                UriModel.value,
+                select(UriModel.value).join(UriModel, UriModel.id == LogEntryModel.uri_id),
+            ),
+        ):
+            exact = await session.execute(
+                query.add_columns(func.count(), func.sum(LogEntryModel.size))
+                .where(LogEntryModel.timestamp >= since)
+                .group_by(value)
+            )
+            top = await estimate_top(session, since, now, column, 10)
+
+            assert {(value, requests, size) for value, requests, _, size in top} == {
+                tuple(row) for row in exact
+            }
+            assert {error for _, _, error, _ in top} == {0}
+
+    async def test_quantiles_estimated_from_sketches(self, session):
+        since = datetime.now(UTC) - 3 * HOUR
+        now = datetime.now(UTC)
+        rows = [
+            make_row(
+                since + offset * MINUTE,
+                size=offset**2,
+                key=offset,
+                request_time=offset / 1000 if offset % 4 else None,
+            )
+            for offset in range(0, 180, 2)
+        ]
+        await self.write(*rows[:50])
+        # Повтор части строк: скетчи их минут пересчитываются по таблице.
+        await self.write(*rows[40:])
+        await compact_rollups(get_test_connector(), since + 2 * HOUR)
+        await self.write(make_row(since + 30 * MINUTE, size=5, request_time=0.5))
+
+        for column, value in (
+            ('sizes', LogEntryModel.size),
+            ('request_times', LogEntryModel.request_time),
+        ):
+            exact = sorted(
+                await session.scalars(
+                    select(value).where(LogEntryModel.timestamp >= since, value.is_not(None))
+                )
+            )
+            sketch = await estimate_quantiles(session, since, now, column)
+
+            assert sketch.count() == len(exact)
+            for q in (0.5, 0.95, 0.99):
+                expected = exact[math.ceil(q * len(exact)) - 1]
+                assert abs(sketch.quantile(q) - expected) <= RELATIVE_ACCURACY * expected
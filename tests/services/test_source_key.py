@@ -0,0 +1,55 @@
+from unittest.mock import patch
+
+import pytest
+
+from apps.services.source_key import file_identity
+from apps.services.source_key import source_key
+from apps.services.source_key import split_lines
+from apps.services.tail_checkpoint import first_line_fingerprint
+from apps.services.tail_checkpoint import head_fingerprint
+
+
+@pytest.mark.services
+class TestSourceKey:
+    """Тесты ключей источника строк."""
+
+    def test_key_depends_on_identity_and_offset(self):
+        assert source_key('abc', 10) == source_key('abc', 10)
+        assert source_key('abc', 10) != source_key('abc', 11)
+        assert source_key('abc', 10) != source_key('abd', 10)
+
+    def test_offsets_are_exact_for_blank_lines_and_utf8(self):
+        data = 'первая\n\n  \nвторая\xff\nтретья'.encode()
+        data = data.replace(b'\xc3\xbf', b'\xff')
+
+        lines, offsets = split_lines(data, 100)
+
+        assert lines == ['первая', 'вторая�', 'третья']
+        assert [data[offset - 100 :].split(b'\n')[0] for offset in offsets] == [
+            'первая'.encode(),
+            'вторая'.encode() + b'\xff',
+            'третья'.encode(),
+        ]
+
+    def test_offsets_do_not_depend_on_block_boundaries(self):
+        data = b'a\nbb\n\nccc\ndddd\n'
+        whole = split_lines(data, 0)
+
+        cut = data.index(b'ccc')
+        head, tail = split_lines(data[:cut], 0), split_lines(data[cut:], cut)
+
+        assert (head[0] + tail[0], head[1] + tail[1]) == whole
+
+    def test_file_identity(self):
+        assert file_identity('abc', 1, 2) == 'abc'
+        assert file_identity('', 1, 2) == '1:2'
+        assert file_identity('', None, None) is None
+        with patch('apps.services.source_key.SETTINGS.DEDUP_SOURCE_KEYS', False):
+            assert file_identity('abc', 1, 2) is None
+
+    def test_head_fingerprint_matches_file_fingerprint(self, tmp_path):
+        path = tmp_path / 'access.log'
+        path.write_bytes(b'first line\nsecond line\n')
+
+        assert head_fingerprint(path.read_bytes()) == first_line_fingerprint(path)
+        assert head_fingerprint(b'x' * 2000 + b'\n') == ''
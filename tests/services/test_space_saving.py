@@ -0,0 +1,68 @@
+import random
+
+import pytest
+
+from apps.services.space_saving import CAPACITY
+from apps.services.space_saving import SpaceSaving
+
+
+def zipf_counts(seed: int, distinct: int = 5_000, requests: int = 50_000) -> dict[str, list[int]]:
+    generator = random.Random(seed)
+    weights = [1 / rank for rank in range(1, distinct + 1)]
+    counts: dict[str, list[int]] = {}
+    for rank in generator.choices(range(distinct), weights, k=requests):
+        counter = counts.setdefault(f'/page/{rank}', [0, 0])
+        counter[0] += 1
+        counter[1] += rank
+    return counts
+
+
+@pytest.mark.services
+class TestSpaceSaving:
+    """Тесты сводки Space-Saving."""
+
+    def test_small_counts_are_exact(self):
+        summary = SpaceSaving.from_counts({'a': (3, 30), 'b': (5, 10)})
+        summary.update(SpaceSaving.from_counts({'a': (1, 2), 'c': (1, 1)}))
+
+        assert summary.top(2) == [('b', 5, 0, 10), ('a', 4, 0, 32)]
+        assert summary.min_count() == 0
+
+    def test_truncated_summary_keeps_most_frequent(self):
+        counts = {f'v{index}': (index, 0) for index in range(1, CAPACITY + 11)}
+
+        summary = SpaceSaving.from_counts(counts)
+
+        assert len(summary.counters) == CAPACITY
+        assert summary.min_count() == 11
+        assert summary.top(1) == [(f'v{CAPACITY + 10}', CAPACITY + 10, 0, 0)]
+
+    def test_merged_counts_bound_true_counts(self):
+        parts = [zipf_counts(seed) for seed in range(6)]
+        exact: dict[str, int] = {}
+        summary = SpaceSaving()
+        for counts in parts:
+            for value, (requests, _) in counts.items():
+                exact[value] = exact.get(value, 0) + requests
+            summary.update(SpaceSaving.from_counts(counts))
+
+        total = sum(exact.values())
+        top = summary.top(10)
+        expected = sorted(exact, key=exact.get, reverse=True)[:10]
+
+        assert [value for value, *_ in top] == expected
+        for value, requests, error, _ in top:
+            assert requests - error <= exact[value] <= requests
+            assert error <= total / CAPACITY
+
+    def test_bytes_round_trip(self):
+        summary = SpaceSaving.from_counts(zipf_counts(1))
+
+        restored = SpaceSaving.from_bytes(summary.to_bytes())
+
+        assert restored.counters == summary.counters
+        assert SpaceSaving.from_bytes(b'').counters == {}
+
+    def test_unknown_format_rejected(self):
+        with pytest.raises(ValueError):
+            SpaceSaving.from_bytes(b'\x02' + SpaceSaving().to_bytes()[1:])
@@ -0,0 +1,204 @@
+import asyncio
+import socket
+
+from unittest.mock import patch
+
+import pytest
+
+from sqlalchemy import text
+
+from apps.api.v1.models.server_model import ServerModel
+from apps.services.syslog_receiver import SyslogMessage
+from apps.services.syslog_receiver import SyslogPipeline
+from apps.services.syslog_receiver import SyslogRoutes
+from apps.services.syslog_receiver import kernel_drops
+from apps.services.syslog_receiver import parse_address
+from apps.services.syslog_receiver import parse_route_option
+from apps.services.syslog_receiver import parse_syslog
+from tests.conftest import get_test_connector
+from tests.helpers import stop
+from tests.helpers import wait_for
+
+LOG_LINE = (
+    '192.168.1.{index} - - [25/Dec/2024:10:30:15 +0300] "GET /api/items/{index} HTTP/1.1" '
+    '200 {index} "-" "curl/8.4.0"'
+)
+
+
+@pytest.mark.services
+class TestParseSyslog:
+    """Тесты снятия конверта syslog."""
+
+    @pytest.mark.parametrize(
+        ('data', 'expected'),
+        [
+            (
+                b'<190>Dec 25 10:30:15 web01 shop: GET /\n',
+                SyslogMessage('web01', 'shop', 'GET /'),
+            ),
+            (
+                b'<190>Dec  5 10:30:15 web01 nginx[42]: a: b',
+                SyslogMessage('web01', 'nginx', 'a: b'),
+            ),
+            (b'<190>Dec 25 10:30:15 shop: GET /', SyslogMessage('', 'shop', 'GET /')),
+            (b'<13>Dec 25 10:30:15 web01 no tag here', SyslogMessage('web01', '', 'no tag here')),
+            (
+                b'<165>1 2024-12-25T10:30:15.003Z web01 shop 4321 - - GET /',
+                SyslogMessage('web01', 'shop', 'GET /'),
+            ),
+            (
+                b'<165>1 2024-12-25T10:30:15Z - - - ID47 '
+                b'[exampleSDID@32473 iut="3" note="a\\]b"][other@1 x="y"] \xef\xbb\xbfGET /',
+                SyslogMessage('', '', 'GET /'),
+            ),
+        ],
+    )
+    def test_envelope_is_stripped(self, data, expected):
+        assert parse_syslog(data) == expected
+
+    @pytest.mark.parametrize('data', [b'GET / HTTP/1.1', b'<190>', b'<190>1 2024-12-25 web01'])
+    def test_malformed_message_is_rejected(self, data):
+        with pytest.raises(ValueError):
+            parse_syslog(data)
+
+
+@pytest.mark.services
+class TestSyslogOptions:
+    """Тесты маршрутов и адресов приёмника."""
+
+    def test_routes_prefer_hostname_then_tag_then_default(self):
+        routes = SyslogRoutes({'web01': 1, 'shop': 2}, default_server_id=3)
+
+        assert routes.resolve('web01', 'shop') == 1
+        assert routes.resolve('web02', 'shop') == 2
+        assert routes.resolve('web02', 'api') == 3
+        assert SyslogRoutes({'shop': 2}).resolve('web02', 'api') is None
+        assert routes.server_ids == {1, 2, 3}
+
+    def test_options_are_parsed(self):
+        assert parse_route_option('web01.example.com:4') == ('web01.example.com', 4)
+        assert parse_address('0.0.0.0:514') == ('0.0.0.0', 514)
+        assert parse_address('5140') == ('127.0.0.1', 5140)
+
+    @pytest.mark.parametrize('value', ['web01', 'web01:x'])
+    def test_invalid_route_is_rejected(self, value):
+        with pytest.raises(ValueError):
+            parse_route_option(value)
+
+    def test_kernel_drops_are_read_for_udp_socket(self):
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+            sock.bind(('127.0.0.1', 0))
+            drops = kernel_drops([sock])
+
+        assert drops is None or drops == 0
+
+
+@pytest.mark.services
+class TestSyslogPipeline:
+    """Тесты приёма syslog с записью в БД."""
+
+    @pytest.fixture(autouse=True)
+    async def clean_tables(self, session):
+        await session.execute(
+            text(
+                'TRUNCATE nginx_parser_schema.log_entry_model, nginx_parser_schema.server_model CASCADE'
+            )
+        )
+        session.add(ServerModel(id=401, name='syslog-web', ip_address='10.4.0.1'))
+        session.add(ServerModel(id=402, name='syslog-shop', ip_address='10.4.0.2'))
+        await session.commit()
+
+    async def rows_by_server(self, session) -> dict[int, int]:
+        result = await session.execute(
+            text(
+                'SELECT server_id, COUNT(*) FROM nginx_parser_schema.log_entry_model '
+                'GROUP BY server_id'
+            )
+        )
+        return dict(result.all())
+
+    async def test_udp_and_tcp_messages_reach_database(self, session):
+        pipeline = SyslogPipeline(
+            SyslogRoutes({'web01': 401, 'shop': 402}),
+            udp=[('127.0.0.1', 0)],
+            tcp=[('127.0.0.1', 0)],
+            flush_interval=0.05,
+            db_connector=get_test_connector(),
+        )
+
+        async def listening() -> bool:
+            return bool(pipeline.udp_readers and pipeline.tcp_servers)
+
+        task = asyncio.create_task(pipeline.run())
+        await wait_for(listening)
+        udp_port = pipeline.udp_readers[0].address[1]
+        tcp_port = pipeline.tcp_servers[0].sockets[0].getsockname()[1]
+
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+            for index in range(5):
+                message = f'<190>Dec 25 10:30:15 web01 nginx: {LOG_LINE.format(index=index)}'
+                sock.sendto(message.encode(), ('127.0.0.1', udp_port))
+            sock.sendto(b'<190>Dec 25 10:30:15 web09 api: unrouted', ('127.0.0.1', udp_port))
+            sock.sendto(b'not syslog at all', ('127.0.0.1', udp_port))
+
+        _, writer = await asyncio.open_connection('127.0.0.1', tcp_port)
+        framed = f'<190>Dec 25 10:30:15 web02 shop: {LOG_LINE.format(index=1)}'.encode()
+        writer.write(b'%d %s' % (len(framed), framed))
+        writer.write(f'<190>Dec 25 10:30:15 web02 shop: {LOG_LINE.format(index=2)}\n'.encode())
+        await writer.drain()
+
+        async def all_rows_written() -> bool:
+            return await self.rows_by_server(session) == {401: 5, 402: 2}
+
+        await wait_for(all_rows_written)
+        stats = pipeline.stats()
+        writer.close()
+        await stop(task)
+
+        assert stats['syslog']['unrouted'] == 1
+        assert stats['syslog']['malformed'] == 1
+        assert stats['syslog']['kernel_drops'] in (None, 0)
+
+    async def test_buffered_messages_are_written_on_shutdown(self, session):
+        pipeline = SyslogPipeline(
+            SyslogRoutes(default_server_id=401),
+            udp=[('127.0.0.1', 0)],
+            flush_interval=60,
+            db_connector=get_test_connector(),
+        )
+
+        async def listening() -> bool:
+            return bool(pipeline.udp_readers)
+
+        async def all_received() -> bool:
+            return len(pipeline._buffers[401]) == 3
+
+        task = asyncio.create_task(pipeline.run())
+        await wait_for(listening)
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+            for index in range(3):
+                message = f'<190>Dec 25 10:30:15 web01 nginx: {LOG_LINE.format(index=index)}'
+                sock.sendto(message.encode(), pipeline.udp_readers[0].address)
+        await wait_for(all_received)
+        await stop(task)
+
+        assert await self.rows_by_server(session) == {401: 3}
+
+    async def test_reading_pauses_when_backlog_is_full(self):
+        pipeline = SyslogPipeline(SyslogRoutes(default_server_id=401))
+        pipeline.backlog = 2
+
+        with patch('apps.services.syslog_receiver.LINE_BATCH_SIZE', 1):
+            for index in range(3):
+                pipeline.receive(
+                    f'<190>Dec 25 10:30:15 web01 nginx: {LOG_LINE.format(index=index)}'.encode()
+                )
+
+        assert pipeline.stats()['syslog']['paused']
+
+        feeder = asyncio.create_task(pipeline._feed())
+        await asyncio.sleep(0.05)
+        feeder.cancel()
+
+        assert pipeline.line_queue.qsize() == 3
+        assert not pipeline.stats()['syslog']['paused']
@@ -0,0 +1,177 @@
+import asyncio
+import contextlib
+
+import pytest
+
+from apps.services.nginx_log_parser import NginxLogParser
+from apps.services.tail_checkpoint import CheckpointTracker
+from apps.services.tail_checkpoint import TailCheckpoint
+from apps.services.tail_checkpoint import TailCheckpointStore
+from apps.services.tail_checkpoint import first_line_fingerprint
+
+LINE = (
+    '192.168.1.{index} - - [25/Dec/2024:10:30:15 +0300] "GET /api/{index} HTTP/1.1" 200 1 "-" "-"'
+)
+
+
+def lines(start: int, stop: int) -> list[str]:
+    return [LINE.format(index=index) for index in range(start, stop)]
+
+
+def write_lines(path, start: int, stop: int) -> None:
+    with open(path, 'a') as f:
+        f.writelines(f'{line}\n' for line in lines(start, stop))
+
+
+async def collect(tail, expected: int) -> list[str]:
+    collected: list[str] = []
+    async with asyncio.timeout(5):
+        while len(collected) < expected:
+            collected.extend(await anext(tail))
+    return collected
+
+
+@pytest.mark.services
+class TestTailCheckpointStore:
+    """Тесты файлового хранилища чекпоинтов."""
+
+    def test_save_and_load_roundtrip(self, tmp_path):
+        store_path = tmp_path / 'state' / 'checkpoints.json'
+        checkpoint = TailCheckpoint(device=1, inode=2, offset=300, fingerprint='abc')
+
+        TailCheckpointStore(store_path).save(tmp_path / 'access.log', checkpoint)
+
+        assert TailCheckpointStore(store_path).load(tmp_path / 'access.log') == checkpoint
+        assert TailCheckpointStore(store_path).load(tmp_path / 'other.log') is None
+        assert not (tmp_path / 'state' / 'checkpoints.json.tmp').exists()
+
+    def test_corrupted_file_is_ignored(self, tmp_path):
+        store_path = tmp_path / 'checkpoints.json'
+        store_path.write_text('{not json')
+
+        assert TailCheckpointStore(store_path).load(tmp_path / 'access.log') is None
+
+    def test_fingerprint_needs_complete_first_line(self, tmp_path):
+        log_file = tmp_path / 'access.log'
+        log_file.write_text('partial')
+        assert first_line_fingerprint(log_file) == ''
+
+        log_file.write_text('complete\nsecond')
+        fingerprint = first_line_fingerprint(log_file)
+
+        write_lines(log_file, 0, 3)
+        assert first_line_fingerprint(log_file) == fingerprint != ''
+
+
+@pytest.mark.services
+class TestCheckpointTracker:
+    """Тесты трекера подтверждённых пачек."""
+
+    def test_durable_waits_for_all_previous_batches(self):
+        tracker = CheckpointTracker()
+        first = TailCheckpoint(device=1, inode=1, offset=100, fingerprint='')
+        second = TailCheckpoint(device=1, inode=1, offset=200, fingerprint='')
+
+        seqs = [tracker.register(first), tracker.register(None), tracker.register(second)]
+
+        tracker.complete([seqs[2]])
+        assert tracker.durable is None
+
+        tracker.complete([seqs[0]])
+        assert tracker.durable == first
+
+        tracker.complete([seqs[1]])
+        assert tracker.durable == second
+        assert tracker.in_flight == 0
+
+
+@pytest.mark.services
+class TestTailResume:
+    """Продолжение чтения с чекпоинта и обработка ротации."""
+
+    @pytest.fixture
+    def log_file(self, tmp_path):
+        path = tmp_path / 'access.log'
+        write_lines(path, 0, 3)
+        return path
+
+    async def test_resumes_from_checkpoint_offset(self, log_file):
+        first = NginxLogParser(str(log_file))
+        await first.read_new_lines().__anext__()
+        first.device, first.inode = log_file.stat().st_dev, log_file.stat().st_ino
+        checkpoint = first.checkpoint()
+
+        write_lines(log_file, 3, 5)
+
+        tail = NginxLogParser(str(log_file)).tail_log_file(checkpoint)
+        try:
+            assert await collect(tail, 2) == lines(3, 5)
+        finally:
+            await tail.aclose()
+
+    async def test_without_checkpoint_starts_at_end(self, log_file):
+        tail = NginxLogParser(str(log_file)).tail_log_file()
+        next_batch = asyncio.create_task(anext(tail))
+        await asyncio.sleep(0.1)
+
+        write_lines(log_file, 3, 4)
+
+        try:
+            assert await asyncio.wait_for(next_batch, timeout=5) == lines(3, 4)
+        finally:
+            await tail.aclose()
+
+    async def test_drains_file_rotated_while_stopped(self, log_file):
+        stat = log_file.stat()
+        checkpoint = TailCheckpoint(
+            device=stat.st_dev,
+            inode=stat.st_ino,
+            offset=len(LINE.format(index=0)) + 1,
+            fingerprint=first_line_fingerprint(log_file),
+        )
+        log_file.rename(log_file.with_name('access.log.1'))
+        write_lines(log_file, 10, 12)
+
+        tail = NginxLogParser(str(log_file)).tail_log_file(checkpoint)
+        try:
+            assert await collect(tail, 4) == lines(1, 3) + lines(10, 12)
+        finally:
+            await tail.aclose()
+
+    async def test_foreign_file_with_same_inode_is_read_from_start(self, log_file):
+        stat = log_file.stat()
+        checkpoint = TailCheckpoint(
+            device=stat.st_dev, inode=stat.st_ino, offset=10, fingerprint='other-file'
+        )
+
+        tail = NginxLogParser(str(log_file)).tail_log_file(checkpoint)
+        try:
+            assert await collect(tail, 3) == lines(0, 3)
+        finally:
+            await tail.aclose()
+
+    @pytest.mark.parametrize('use_inotify', [True, False])
+    async def test_rename_rotation_while_running(self, log_file, use_inotify, monkeypatch):
+        monkeypatch.setattr('apps.services.file_watcher.SETTINGS.MONITOR_USE_INOTIFY', use_inotify)
+        parser = NginxLogParser(str(log_file))
+        tail = parser.tail_log_file()
+        consumer = asyncio.create_task(collect(tail, 4))
+        await asyncio.sleep(0.1)
+
+        rotated = log_file.with_name('access.log.1')
+        log_file.rename(rotated)
+        write_lines(rotated, 3, 5)
+        log_file.touch()
+        await asyncio.sleep(0.1)
+        write_lines(log_file, 5, 7)
+
+        try:
+            collected = await asyncio.wait_for(consumer, timeout=10)
+        finally:
+            if not consumer.done():
+                consumer.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await tail.aclose()
+
+        assert collected == lines(3, 7)
+        assert parser.inode == log_file.stat().st_ino
@@ -3,8 +3,12 @@ from datetime import datetime
 from datetime import timedelta
 
 from sqlalchemy import insert
+from sqlalchemy import select
 from sqlalchemy.dialects.postgresql import Insert
 
+from apps.api.v1.models.dimension_models import ReferrerModel
+from apps.api.v1.models.dimension_models import UriModel
+from apps.api.v1.models.dimension_models import UserAgentModel
 from apps.api.v1.models.log_entry_model import LogEntryModel
 
 ENTRIES_PER_SERVER = 20
@@ -26,6 +30,8 @@ USER_AGENTS = (
     'python-httpx/0.27.0',
 )
 
+REFERRER = 'https://example.com/'
+
 OLDEST_ENTRY_AGE = timedelta(hours=20)
 ENTRY_INTERVAL = timedelta(minutes=5)
 
@@ -38,6 +44,7 @@ def get_log_entry_model_init() -> list[Insert]:
     серверам и укладывается в промежуток от 20 до 2 часов назад. Записи
     заведомо старше часа, поэтому не попадают в выборки тестов, которые
     добавляют собственные данные и фильтруют их по последнему часу.
+    URI, referrer и user agent вставляются в справочники перед записями.
     """
     start = datetime.now(tz=UTC) - OLDEST_ENTRY_AGE
     log_entries = []
@@ -49,14 +56,26 @@ def get_log_entry_model_init() -> list[Insert]:
                 'timestamp': start + ENTRY_INTERVAL * index,
                 'remote_addr': CLIENT_IPS[index % len(CLIENT_IPS)],
                 'method': method,
-                'uri': uri,
+                'uri_id': _dimension_id(UriModel, uri),
                 'http_version': 'HTTP/1.1',
                 'status': status,
                 'size': size,
-                'referrer': 'https://example.com/' if index % 3 else None,
-                'user_agent': USER_AGENTS[index % len(USER_AGENTS)],
+                'referrer_id': _dimension_id(ReferrerModel, REFERRER) if index % 3 else None,
+                'user_agent_id': _dimension_id(
+                    UserAgentModel, USER_AGENTS[index % len(USER_AGENTS)]
+                ),
                 'server_id': index // ENTRIES_PER_SERVER + 1,
             }
         )
 
-    return [insert(LogEntryModel).values(log_entries)]
+    dimensions = [
+        insert(UriModel).values([{'value': uri} for uri in dict.fromkeys(r[1] for r in REQUESTS)]),
+        insert(ReferrerModel).values(value=REFERRER),
+        insert(UserAgentModel).values([{'value': agent} for agent in USER_AGENTS]),
+    ]
+    return [*dimensions, insert(LogEntryModel).values(log_entries)]
+
+
+def _dimension_id(model: type, value: str):
+    """id значения справочника подзапросом: справочники вставляются тем же деревом."""
+    return select(model.id).where(model.value == value).scalar_subquery()